@@ -1,4 +1,4 @@
-from app import app
+from app import app, ArchivoAudio
 from flask import render_template
 from audio_utils import audio_bp
 
@@ -43,14 +43,8 @@ def control_asistencia_waveform():
     # Horarios pendientes (que no tienen registro aún)
     horarios_pendientes = [h for h in horarios_hoy if h.id not in horarios_ya_registrados]
     
-    # Verificar si hay archivos de audio temporales para clases pendientes
-    temp_audio_files = {}
-    for horario in horarios_pendientes:
-        for ext in ['mp3', 'wav', 'ogg']:
-            audio_path = os.path.join(app.config['UPLOAD_FOLDER'], f'temp_horario_{horario.id}.{ext}')
-            if os.path.exists(audio_path):
-                temp_audio_files[horario.id] = True
-                break
+    # Archivos de audio temporales de las clases pendientes ({horario_id: ruta}, del índice de audios)
+    temp_audio_files = ArchivoAudio.temporales(h.id for h in horarios_pendientes)
     
     return render_template('asistencia/control_with_waveform.html', 
                           horarios_pendientes=horarios_pendientes,
@@ -90,13 +84,7 @@ def control_asistencia_fixed():
     horarios_ya_registrados = [c.horario_id for c in clases_realizadas_hoy]
     horarios_pendientes = [h for h in horarios_hoy if h.id not in horarios_ya_registrados]
     
-    temp_audio_files = {}
-    for horario in horarios_pendientes:
-        for ext in ['mp3', 'wav', 'ogg']:
-            audio_path = os.path.join(app.config['UPLOAD_FOLDER'], f'temp_horario_{horario.id}.{ext}')
-            if os.path.exists(audio_path):
-                temp_audio_files[horario.id] = True
-                break
+    temp_audio_files = ArchivoAudio.temporales(h.id for h in horarios_pendientes)
     
     # Use the fixed template
     return render_template('asistencia/control_fixed.html', 
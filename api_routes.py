@@ -2,7 +2,8 @@ from flask import Blueprint, request, jsonify
 import os
 import base64
 from werkzeug.utils import secure_filename
-from models import Profesor, HorarioClase, ClaseRealizada, clear_metrics_cache
+from models import (Profesor, HorarioClase, ClaseRealizada, MetricaMensualProfesor, METRICAS_RANKING,
+                    clear_metrics_cache)
 from datetime import datetime, timedelta
 import logging
 import calendar
@@ -198,6 +199,8 @@ def get_metricas_profesor(profesor_id):
             try:
                 anio, mes = mes_actual_str.split('-')
                 mes_actual = (int(anio), int(mes))
+                if not 1 <= mes_actual[1] <= 12:
+                    raise ValueError(mes_actual_str)
             except (ValueError, TypeError):
                 return jsonify({'status': 'error', 'message': 'Formato de mes_actual inválido. Use YYYY-MM'}), 400
         
@@ -209,16 +212,24 @@ def get_metricas_profesor(profesor_id):
                 return jsonify({'status': 'error', 'message': 'Formato de mes_comparacion inválido. Use YYYY-MM'}), 400
         
         # Calcular métricas
-        from utils.metricas_profesores import calcular_metricas_profesor
+        from utils.metricas_profesores import (calcular_metricas_profesor, calcular_tendencia_desde_resumen,
+                                               calcular_totales_desde_resumen)
         
-        # Obtener todas las clases del profesor
-        clases = profesor.obtener_todas_clases()
+        # La evolución mensual y los totales se leen del resumen precalculado
+        meses_resumen = MetricaMensualProfesor.obtener_meses(profesor_id=profesor.id)
+        tendencia = calcular_tendencia_desde_resumen(meses_resumen)
+        
+        # Con un solo mes basta con cargar sus clases; la comparación trabaja sobre todas
+        solo_mes = mes_actual if mes_actual and not mes_comparacion else None
+        clases = profesor.obtener_clases_mes(*solo_mes) if solo_mes else profesor.obtener_todas_clases()
         
         metricas = calcular_metricas_profesor(
             profesor_id=profesor.id,
             clases=clases,
             mes_actual=mes_actual,
-            mes_comparacion=mes_comparacion
+            mes_comparacion=mes_comparacion,
+            datos_mensuales=tendencia['datos_mensuales'],
+            totales=calcular_totales_desde_resumen(meses_resumen, solo_mes)
         )
         
         # Manejar caso de error o validación
@@ -253,14 +264,31 @@ def get_ranking_profesores():
         # Obtener parámetros
         tipo_metrica = request.args.get('tipo', default='puntualidad')
         limite = request.args.get('limite', type=int, default=10)
+        fecha_inicio_str = request.args.get('fecha_inicio', default=None)  # formato: YYYY-MM-DD
+        fecha_fin_str = request.args.get('fecha_fin', default=None)  # formato: YYYY-MM-DD
         
         # Validar tipo de métrica
-        tipos_validos = ['puntualidad', 'alumnos', 'clases']
+        tipos_validos = list(METRICAS_RANKING.keys())
         if tipo_metrica not in tipos_validos:
             return jsonify({'status': 'error', 'message': f'Tipo de métrica inválido. Use uno de: {tipos_validos}'}), 400
         
+        # Convertir el periodo si se proporciona
+        try:
+            fecha_inicio = datetime.strptime(fecha_inicio_str, '%Y-%m-%d').date() if fecha_inicio_str else None
+            fecha_fin = datetime.strptime(fecha_fin_str, '%Y-%m-%d').date() if fecha_fin_str else None
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'Formato de fecha inválido. Use YYYY-MM-DD'}), 400
+        
+        if fecha_inicio and fecha_fin and fecha_inicio > fecha_fin:
+            return jsonify({'status': 'error', 'message': 'fecha_inicio debe ser anterior a fecha_fin'}), 400
+        
         # Obtener ranking
-        ranking = Profesor.obtener_ranking_profesores(tipo_metrica=tipo_metrica, limite=limite)
+        ranking = Profesor.obtener_ranking_profesores(
+            tipo_metrica=tipo_metrica,
+            limite=limite,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin
+        )
         
         return jsonify({'status': 'success', 'data': ranking}), 200
     except Exception as e:
@@ -318,6 +346,16 @@ def clear_cache_metricas():
         logger.error(f"Error en clear_cache_metricas: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@api.route('/cache/metricas/stats', methods=['GET'])
+def stats_cache_metricas():
+    """Retorna las estadísticas de aciertos y fallos de la caché de métricas."""
+    try:
+        from utils.cache_metricas import cache_metricas
+        return jsonify({'status': 'success', 'data': cache_metricas.estadisticas()}), 200
+    except Exception as e:
+        logger.error(f"Error en stats_cache_metricas: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @api.route('/profesores/<int:profesor_id>/meses_disponibles', methods=['GET'])
 def get_meses_disponibles_profesor(profesor_id):
     """Retorna la lista de meses para los que hay datos de clases para un profesor."""
@@ -333,20 +371,18 @@ def get_meses_disponibles_profesor(profesor_id):
         if not profesor:
             return jsonify({'status': 'error', 'message': 'Profesor no encontrado'}), 404
         
-        # Obtener todas las clases del profesor
-        clases = profesor.obtener_todas_clases()
-        
-        # Agrupar por mes
+        # Meses con clases según el resumen mensual precalculado
         meses = {}
-        for clase in clases:
-            clave = f"{clase.fecha.year}-{clase.fecha.month:02d}"
-            if clave not in meses:
-                meses[clave] = {
-                    'valor': clave,  # Formato ISO YYYY-MM
-                    'etiqueta': f"{MESES_ES[clase.fecha.month]} {clase.fecha.year}",
-                    'anio': clase.fecha.year,
-                    'mes': clase.fecha.month
-                }
+        for datos in MetricaMensualProfesor.obtener_meses(profesor_id=profesor_id):
+            if not datos['total_clases']:
+                continue
+            clave = f"{datos['anio']}-{datos['mes']:02d}"
+            meses[clave] = {
+                'valor': clave,  # Formato ISO YYYY-MM
+                'etiqueta': f"{MESES_ES[datos['mes']]} {datos['anio']}",
+                'anio': datos['anio'],
+                'mes': datos['mes']
+            }
         
         # Ordenar por fecha (más reciente primero)
         meses_ordenados = sorted(list(meses.values()), key=lambda x: f"{x['anio']}-{x['mes']:02d}", reverse=True)
@@ -2,11 +2,13 @@ import os
 import logging
 import traceback
 import re  # para expresiones regulares
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, abort, send_file, send_from_directory
+from flask import (Flask, render_template, request, redirect, url_for, flash, jsonify, abort, send_file, send_from_directory,
+                   Response, g, has_request_context)
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import func
 from datetime import datetime, timedelta, date, time
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 import calendar
 from flask_wtf.csrf import CSRFProtect, generate_csrf
 import pandas as pd
@@ -15,6 +17,7 @@ import io
 import re
 import click
 import functools
+import contextlib
 import glob
 import shutil
 
@@ -26,6 +29,7 @@ import librosa.display
 import io
 import base64
 import time as time_module  # Renamed to avoid conflict with datetime.time
+from utils.base_datos import configurar_base_datos
 
 # Definir constantes utilizadas en la aplicación
 DIAS_SEMANA = [
@@ -56,15 +60,82 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload
 
+# Modo de conexión a SQLite: 'concurrente' (WAL, pool de conexiones) o 'simple'
+app.config['BASE_DATOS_MODO'] = os.environ.get('BASE_DATOS_MODO', 'concurrente')
+
 # Inicializar la base de datos
 db = SQLAlchemy(app)
+configurar_base_datos(app, db)
 
 # Importar modelos después de inicializar db y app
-from models import Profesor, HorarioClase, ClaseRealizada, EventoHorario, TipoEventoHorario, setup_date_handling
+from models import (Profesor, HorarioClase, ClaseRealizada, EventoHorario, TipoEventoHorario,
+                    MetricaMensualProfesor, TrabajoImportacion, ArchivoImportado, AliasProfesor, ArchivoAudio,
+                    perfil_carga, asegurar_indices, asegurar_clave_clases, clases_duplicadas,
+                    eliminar_clases_duplicadas, normalizar_horas,
+                    hora_desde_minutos, clasificar_retraso, setup_date_handling)
+from utils.clases_esperadas import (calcular_clases_no_registradas, agrupar_por_horario,
+                                    cargar_horarios, cargar_profesores)
+from utils.cache_metricas import configurar_cache_metricas, cache_metricas
+from utils.importacion_asistencia import abrir_libro, importar_por_bloques, registrar_errores, huella_archivo
+from utils.resolucion_nombres import normalizar_nombre, UMBRAL_SIMILITUD
+from utils.instantaneas import (crear_instantanea, listar_instantaneas, ruta_base_datos,
+                                InstantaneaInvalida, PAGINAS_POR_PASO, PAUSA_ENTRE_PASOS)
+from utils.backup_completo import archivos_audio, generar_zip, escribir_zip
+from utils.backup_incremental import (crear_backup_incremental, restaurar_manifiesto, listar_manifiestos,
+                                      BackupIncrementalInvalido)
+from utils.restauracion import (ControlAccesos, restaurar_zip, restaurar_base_datos, resumir_informe,
+                                ESPERA_DRENAJE)
+from utils.picos_audio import generar_picos, picos_actualizados, ruta_picos, es_archivo_picos
+from utils.indice_audio import ruta_indice, describir_archivo, es_audio
+from utils.envio_audio import enviar_audio, es_inmutable
+from utils.renderizado import configurar_renderizado, renderizar, RenderizadoEnCurso
+from utils.trabajos_importacion import (configurar_trabajos, encolar as encolar_importacion,
+                                        cargar_detalles as cargar_detalles_importacion, ruta_reporte_errores)
 
 # Configurar el manejo de fechas para la aplicación
 setup_date_handling(app)
 
+# Configurar la caché de métricas ('memoria' por proceso o 'sqlite' compartida entre workers)
+app.config['METRICAS_CACHE_BACKEND'] = os.environ.get('METRICAS_CACHE_BACKEND', 'memoria')
+app.config['METRICAS_CACHE_RUTA'] = os.environ.get('METRICAS_CACHE_RUTA', os.path.join(app.instance_path, 'cache_metricas.db'))
+app.config['METRICAS_CACHE_MAX_ENTRADAS'] = int(os.environ.get('METRICAS_CACHE_MAX_ENTRADAS', 512))
+app.config['METRICAS_CACHE_TTL'] = int(os.environ.get('METRICAS_CACHE_TTL', 3600))
+configurar_cache_metricas(app.config)
+
+# Trabajos de importación en segundo plano ('IMPORTACION_SEGUNDO_PLANO=0' los ejecuta en la petición)
+app.config['IMPORTACION_SEGUNDO_PLANO'] = os.environ.get('IMPORTACION_SEGUNDO_PLANO', '1') != '0'
+configurar_trabajos(app)
+
+# Pool de procesos para decodificar audios y dibujar formas de onda y espectrogramas
+app.config['RENDERIZADO_PROCESOS'] = int(os.environ.get('RENDERIZADO_PROCESOS', 2))
+app.config['RENDERIZADO_TIEMPO_LIMITE'] = float(os.environ.get('RENDERIZADO_TIEMPO_LIMITE', 300))
+app.config['RENDERIZADO_ESPERA'] = float(os.environ.get('RENDERIZADO_ESPERA', 10))
+configurar_renderizado(app)
+
+# Instantáneas de la base de datos (API de backup de SQLite por pasos)
+app.config['INSTANTANEA_PAGINAS_POR_PASO'] = int(os.environ.get('INSTANTANEA_PAGINAS_POR_PASO', PAGINAS_POR_PASO))
+app.config['INSTANTANEA_PAUSA'] = float(os.environ.get('INSTANTANEA_PAUSA', PAUSA_ENTRE_PASOS))
+
+# Almacén de los backups incrementales (audios por SHA-256 y un manifiesto por backup)
+app.config['BACKUP_INCREMENTAL_DIRECTORIO'] = os.environ.get('BACKUP_INCREMENTAL_DIRECTORIO', os.path.join(app.root_path, 'backups', 'incremental'))
+
+# Procesos para exportar las tablas a Excel/CSV/Parquet (0: uno por núcleo)
+app.config['EXPORTACION_PROCESOS'] = int(os.environ.get('EXPORTACION_PROCESOS', 0))
+
+# Carpeta de los espectrogramas calculados (matrices y teselas PNG por huella del audio)
+app.config['ESPECTROGRAMA_DIRECTORIO'] = os.environ.get('ESPECTROGRAMA_DIRECTORIO',
+                                                        os.path.join(app.instance_path, 'espectrogramas'))
+
+# Envío de los audios delegado al servidor web ('x-sendfile' o 'x-accel-redirect'; vacío: lo envía Flask)
+app.config['AUDIO_ENVIO_SERVIDOR'] = os.environ.get('AUDIO_ENVIO_SERVIDOR', '')
+app.config['AUDIO_X_ACCEL_PREFIJO'] = os.environ.get('AUDIO_X_ACCEL_PREFIJO', '/uploads-internos/')
+
+# Segundos de espera a que terminen las peticiones en curso antes de intercambiar la base restaurada
+app.config['RESTAURACION_ESPERA_DRENAJE'] = float(os.environ.get('RESTAURACION_ESPERA_DRENAJE', ESPERA_DRENAJE))
+
+# Similitud mínima (0-1) para asignar un instructor importado por coincidencia aproximada
+app.config['IMPORTACION_UMBRAL_SIMILITUD'] = float(os.environ.get('IMPORTACION_UMBRAL_SIMILITUD', UMBRAL_SIMILITUD))
+
 # Importar el blueprint de API
 from api_routes import api
 
@@ -104,26 +175,95 @@ csrf.exempt('/import/profesores')
 # Añadir esta línea para eximir la ruta de carga de audio
 csrf.exempt('/asistencia/upload_audio/<int:horario_id>')
 
-# Create database tables if they don't exist
-with app.app_context():
-    db.create_all()
-
-# Configurar logging para depuración
-try:
-    logger = logging.getLogger('import_debug')
-    if not logger.handlers:
-        # Crear handler de archivo
-        log_file = logging.FileHandler('import_debug.log', 'w', encoding='utf-8')
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        log_file.setFormatter(formatter)
-        logger.addHandler(log_file)
-        logger.setLevel(logging.DEBUG)
-        
-        # Crear archivo de errores
-        with open('import_errors.log', 'w', encoding='utf-8') as f:
-            f.write("Registro de errores de importación\n\n")
-except Exception as e:
-    print(f"Error al configurar logging: {e}")
+# Peticiones en curso: la restauración de un backup las drena antes de intercambiar la base de datos
+control_accesos = ControlAccesos()
+
+@app.before_request
+def registrar_peticion():
+    """Cuenta la petición; durante el intercambio de una restauración responde 503."""
+    if not control_accesos.entrar():
+        return ('Restauración de la base de datos en curso. Inténtelo de nuevo en unos segundos.',
+                503, {'Retry-After': '5'})
+    g.peticion_registrada = True
+
+@app.teardown_request
+def liberar_peticion(error=None):
+    if g.pop('peticion_registrada', False):
+        control_accesos.salir()
+
+def preparar_base_datos():
+    """Crea las tablas que falten y aplica las migraciones de la base de datos."""
+    with app.app_context():
+        db.create_all()
+        # Migración: fechas y horas en formato canónico y columnas en minutos
+        try:
+            normalizacion = normalizar_horas()
+            if normalizacion['corregidos']:
+                print(f"Fechas y horas normalizadas: {normalizacion['corregidos']}")
+            if normalizacion['no_validos']:
+                print(f"Valores de fecha u hora no válidos: {normalizacion['no_validos']}")
+        except Exception as e:
+            print(f"Error al normalizar fechas y horas: {str(e)}")
+        # Resumen mensual de métricas: se recalcula solo si cambió la consulta que lo calcula
+        # (normalizar_horas ya lo reconstruye si corrigió fechas u horas)
+        try:
+            if MetricaMensualProfesor.reconstruir_si_cambio():
+                cache_metricas.invalidar()
+                print("Resumen mensual de métricas reconstruido")
+        except Exception as e:
+            print(f"Error al verificar el resumen mensual: {str(e)}")
+        # Migración: clave única (fecha, horario_id) de las clases (no se crea mientras haya duplicados)
+        try:
+            duplicadas = asegurar_clave_clases()
+            if duplicadas:
+                print(f"Clases duplicadas (misma fecha y horario): {len(duplicadas)} grupos. La clave única no se "
+                      f"creará hasta fusionarlas con `flask depurar-clases-duplicadas`")
+        except Exception as e:
+            print(f"Error al preparar la clave única de las clases: {str(e)}")
+        # Tabla de alias de instructores para la importación
+        try:
+            AliasProfesor.asegurar_tabla()
+        except Exception as e:
+            print(f"Error al crear la tabla de alias de profesores: {str(e)}")
+        # Índice de archivos de audio: al crearlo (o si está vacío, p. ej. creado por create_all en una
+        # base restaurada) se llena con los audios que ya hay en disco
+        try:
+            if ArchivoAudio.asegurar_tabla() or ArchivoAudio.query.first() is None:
+                indexados = ArchivoAudio.reconciliar(app.config['UPLOAD_FOLDER'])
+                print(f"Índice de audios creado: {indexados['nuevos']} archivos")
+        except Exception as e:
+            print(f"Error al crear el índice de archivos de audio: {str(e)}")
+        # Migración: crear en bases existentes los índices declarados en los modelos
+        try:
+            indices_creados = asegurar_indices()
+            if indices_creados:
+                print(f"Índices creados: {', '.join(indices_creados)}")
+        except Exception as e:
+            print(f"Error al crear los índices: {str(e)}")
+
+def configurar_logging_importacion():
+    """Archivos de registro de la importación (se vacían en cada arranque)."""
+    try:
+        logger = logging.getLogger('import_debug')
+        if not logger.handlers:
+            # Crear handler de archivo
+            log_file = logging.FileHandler('import_debug.log', 'w', encoding='utf-8')
+            formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+            log_file.setFormatter(formatter)
+            logger.addHandler(log_file)
+            logger.setLevel(logging.DEBUG)
+        
+            # Crear archivo de errores
+            with open('import_errors.log', 'w', encoding='utf-8') as f:
+                f.write("Registro de errores de importación\n\n")
+    except Exception as e:
+        print(f"Error al configurar logging: {e}")
+
+# Migraciones y registros al arrancar. Con 'python app.py' los pools de procesos ('forkserver') vuelven a
+# importar este módulo como '__mp_main__' para iniciar sus procesos: ahí no se repiten
+if __name__ != '__mp_main__':
+    preparar_base_datos()
+    configurar_logging_importacion()
 
 # Decorador para rutas inaccesibles
 def ruta_inaccesible(f):
@@ -241,12 +381,14 @@ def index():
         
         # Get classes scheduled for today - ONLY ACTIVE
         try:
-            horarios_hoy = HorarioClase.query.filter_by(dia_semana=dia_semana, activo=True).all()
+            horarios_hoy = (HorarioClase.query.options(*perfil_carga('horario_with_profesor'))
+                            .filter_by(dia_semana=dia_semana, activo=True).all())
         except Exception as column_error:
             # Si la columna activo no existe, considerar todos los horarios como activos
             print(f"Error al filtrar por columna 'activo': {str(column_error)}")
             print("Usando consulta alternativa sin columna 'activo'")
-            horarios_hoy = HorarioClase.query.filter_by(dia_semana=dia_semana).all()
+            horarios_hoy = (HorarioClase.query.options(*perfil_carga('horario_with_profesor'))
+                            .filter_by(dia_semana=dia_semana).all())
         
         # Check which ones already have attendance recorded
         clases_registradas = {cr.horario_id: cr for cr in ClaseRealizada.query.filter_by(fecha=hoy).all()}
@@ -326,6 +468,7 @@ def eliminar_profesor(id):
     if HorarioClase.query.filter_by(profesor_id=id).first() or ClaseRealizada.query.filter_by(profesor_id=id).first():
         flash('No se puede eliminar el profesor porque tiene clases asociadas', 'danger')
     else:
+        AliasProfesor.eliminar_de_profesores([id], db.session)
         db.session.delete(profesor)
         db.session.commit()
         flash('Profesor eliminado con éxito', 'success')
@@ -348,6 +491,7 @@ def eliminar_varios_profesores():
             if HorarioClase.query.filter_by(profesor_id=profesor_id).first() or ClaseRealizada.query.filter_by(profesor_id=profesor_id).first():
                 profesores_con_dependencias += 1
             else:
+                AliasProfesor.eliminar_de_profesores([profesor.id], db.session)
                 db.session.delete(profesor)
                 profesores_eliminados += 1
     
@@ -403,6 +547,12 @@ def editar_horario(id):
         horario.capacidad_maxima = int(request.form['capacidad_maxima'])
         horario.tipo_clase = request.form['tipo_clase']
         db.session.commit()
+        
+        # El tipo y la hora de inicio afectan al resumen mensual de las clases del horario
+        MetricaMensualProfesor.actualizar_meses(
+            ClaseRealizada.query.with_entities(ClaseRealizada.profesor_id, ClaseRealizada.fecha)
+            .filter_by(horario_id=id).distinct().all()
+        )
         flash('Horario actualizado con éxito', 'success')
         return redirect(url_for('listar_horarios'))
     
@@ -414,23 +564,24 @@ def eliminar_horario(id):
     
     # Eliminar el horario y todas sus clases asociadas
     clases_asociadas = ClaseRealizada.query.filter_by(horario_id=id).all()
+    meses_afectados = [(c.profesor_id, c.fecha) for c in clases_asociadas]
     
     # Eliminar todas las clases asociadas
     for clase in clases_asociadas:
-        # Si la clase tiene archivo de audio, eliminar el archivo
-        if clase.audio_file:
-            try:
-                audio_path = os.path.join(app.config.get('UPLOAD_FOLDER', 'static/uploads'), clase.audio_file)
-                if os.path.exists(audio_path):
-                    os.remove(audio_path)
-            except Exception as e:
-                app.logger.error(f"Error eliminando archivo de audio: {str(e)}")
+        # Eliminar los archivos de audio de la clase (los del índice y el de audio_file)
+        try:
+            eliminar_audios_clase(clase.id, clase.audio_file)
+        except Exception as e:
+            app.logger.error(f"Error eliminando archivo de audio: {str(e)}")
         
+        ArchivoAudio.quitar_clase([clase.id], db.session)
         db.session.delete(clase)
     
-    # Eliminar el horario
+    # Eliminar el horario (y su historial de eventos)
+    EventoHorario.eliminar_de_horarios([id], db.session)
     db.session.delete(horario)
     db.session.commit()
+    MetricaMensualProfesor.actualizar_meses(meses_afectados)
     
     if clases_asociadas:
         flash(f'Horario de clase y {len(clases_asociadas)} clases asociadas eliminadas con éxito.', 'success')
@@ -446,6 +597,7 @@ def confirmar_eliminar_horario(id):
     # Contar cuántas clases realizadas están asociadas
     clases_asociadas = ClaseRealizada.query.filter_by(horario_id=id).all()
     cantidad_clases = len(clases_asociadas)
+    meses_afectados = [(c.profesor_id, c.fecha) for c in clases_asociadas]
     
     if request.method == 'POST':
         opcion = request.form.get('opcion')
@@ -475,27 +627,29 @@ def confirmar_eliminar_horario(id):
             for clase in clases_asociadas:
                 clase.horario_id = horario_eliminado.id
             
-            # Eliminar el horario original
+            # Eliminar el horario original (y su historial de eventos)
+            EventoHorario.eliminar_de_horarios([id], db.session)
             db.session.delete(horario)
             db.session.commit()
+            MetricaMensualProfesor.actualizar_meses(meses_afectados)
             flash(f'Horario de clase eliminado con éxito. {cantidad_clases} clases asociadas se mantienen en el sistema con referencia a "Horario Eliminado".', 'success')
             
         elif opcion == 'horario_y_clases':
             # Opción 2: Eliminar el horario y todas las clases asociadas
             for clase in clases_asociadas:
-                # Si la clase tiene archivo de audio, eliminar el archivo
-                if clase.audio_file:
-                    try:
-                        audio_path = os.path.join(app.config.get('UPLOAD_FOLDER', 'static/uploads'), clase.audio_file)
-                        if os.path.exists(audio_path):
-                            os.remove(audio_path)
-                    except Exception as e:
-                        app.logger.error(f"Error eliminando archivo de audio: {str(e)}")
+                # Eliminar los archivos de audio de la clase
+                try:
+                    eliminar_audios_clase(clase.id, clase.audio_file)
+                except Exception as e:
+                    app.logger.error(f"Error eliminando archivo de audio: {str(e)}")
                 
+                ArchivoAudio.quitar_clase([clase.id], db.session)
                 db.session.delete(clase)
             
+            EventoHorario.eliminar_de_horarios([id], db.session)
             db.session.delete(horario)
             db.session.commit()
+            MetricaMensualProfesor.actualizar_meses(meses_afectados)
             flash(f'Horario de clase y {cantidad_clases} clases asociadas eliminadas con éxito.', 'success')
         else:
             flash('Operación cancelada', 'info')
@@ -515,31 +669,33 @@ def eliminar_varios_horarios():
     
     horarios_eliminados = 0
     clases_eliminadas = 0
+    meses_afectados = []
     
     for horario_id in horarios_ids:
         horario = HorarioClase.query.get(horario_id)
         if horario:
             # Eliminar todas las clases asociadas a este horario
             clases_asociadas = ClaseRealizada.query.filter_by(horario_id=horario_id).all()
+            meses_afectados.extend((c.profesor_id, c.fecha) for c in clases_asociadas)
             
             # Eliminar los archivos de audio de las clases
             for clase in clases_asociadas:
-                if clase.audio_file:
-                    try:
-                        audio_path = os.path.join(app.config.get('UPLOAD_FOLDER', 'static/uploads'), clase.audio_file)
-                        if os.path.exists(audio_path):
-                            os.remove(audio_path)
-                    except Exception as e:
-                        app.logger.error(f"Error eliminando archivo de audio: {str(e)}")
+                try:
+                    eliminar_audios_clase(clase.id, clase.audio_file)
+                except Exception as e:
+                    app.logger.error(f"Error eliminando archivo de audio: {str(e)}")
                 
+                ArchivoAudio.quitar_clase([clase.id], db.session)
                 db.session.delete(clase)
                 clases_eliminadas += 1
             
-            # Eliminar el horario
+            # Eliminar el horario (y su historial de eventos)
+            EventoHorario.eliminar_de_horarios([horario.id], db.session)
             db.session.delete(horario)
             horarios_eliminados += 1
     
     db.session.commit()
+    MetricaMensualProfesor.actualizar_meses(meses_afectados)
     
     if horarios_eliminados > 0:
         if clases_eliminadas > 0:
@@ -573,14 +729,8 @@ def control_asistencia():
         # Horarios pendientes (que no tienen registro aún)
         horarios_pendientes = [h for h in horarios_hoy if h.id not in horarios_ya_registrados]
         
-        # Verificar si hay archivos de audio temporales para clases pendientes
-        temp_audio_files = {}
-        for horario in horarios_pendientes:
-            for ext in ['mp3', 'wav', 'ogg']:
-                audio_path = os.path.join(app.config.get('UPLOAD_FOLDER', 'static/uploads'), f'temp_horario_{horario.id}.{ext}')
-                if os.path.exists(audio_path):
-                    temp_audio_files[horario.id] = True
-                    break
+        # Archivos de audio temporales de las clases pendientes (una consulta al índice de audios)
+        temp_audio_files = ArchivoAudio.temporales(h.id for h in horarios_pendientes)
         
         # Handle empty horarios_pendientes list safely
         horario_id = None
@@ -697,33 +847,43 @@ def registrar_asistencia(horario_id):
                 observaciones=observaciones
             )
             
-            # Verificar si hay un archivo de audio temporal para este horario
-            audio_file = None
-            for ext in ['mp3', 'wav', 'ogg']:
-                temp_path = os.path.join(app.config.get('UPLOAD_FOLDER', 'static/uploads'), f'temp_horario_{horario_id}.{ext}')
-                if os.path.exists(temp_path):
-                    # Guardar el archivo definitivo
-                    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-                    new_filename = f'clase_{horario_id}_{timestamp}.{ext}'
-                    new_path = os.path.join(app.config.get('UPLOAD_FOLDER', 'static/uploads'), new_filename)
-                    
-                    # Asegurar que el directorio existe
-                    os.makedirs(os.path.dirname(new_path), exist_ok=True)
-                    
-                    # Mover el archivo temporal al definitivo
-                    try:
-                        os.rename(temp_path, new_path)
-                    except Exception as e:
-                        import shutil
-                        shutil.copy2(temp_path, new_path)
-                        os.remove(temp_path)
-                    
-                    nueva_clase.audio_file = new_filename
-                    break
+            # Buscar en el índice de audios el archivo temporal de este horario
+            upload_base = app.config.get('UPLOAD_FOLDER', 'static/uploads')
+            audio_temporal = ArchivoAudio.ultimo(horario_id, temporal=True)
+            temp_path = os.path.join(upload_base, audio_temporal.ruta) if audio_temporal else None
+            new_path = None
+            if temp_path and os.path.exists(temp_path):
+                # Guardar el archivo definitivo
+                ext = temp_path.rsplit('.', 1)[1]
+                timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+                new_filename = f'clase_{horario_id}_{timestamp}.{ext}'
+                new_path = os.path.join(upload_base, new_filename)
+                
+                # Asegurar que el directorio existe
+                os.makedirs(os.path.dirname(new_path), exist_ok=True)
+                
+                # Mover el archivo temporal al definitivo
+                try:
+                    os.rename(temp_path, new_path)
+                except Exception as e:
+                    import shutil
+                    shutil.copy2(temp_path, new_path)
+                    os.remove(temp_path)
+                
+                nueva_clase.audio_file = new_filename
             
             db.session.add(nueva_clase)
             db.session.commit()
             
+            if audio_temporal is not None:
+                # El registro del temporal pasa a ser el audio de la clase (o se quita si el archivo ya no estaba)
+                ArchivoAudio.eliminar([audio_temporal.ruta])
+                if new_path:
+                    registrar_archivo_audio(new_path, horario_id, nueva_clase.id, duracion=audio_temporal.duracion)
+            
+            # Actualizar el resumen mensual del profesor
+            MetricaMensualProfesor.actualizar_meses([(nueva_clase.profesor_id, nueva_clase.fecha)])
+            
             # Limpiar caché de métricas para este profesor
             from models import clear_metrics_cache
             clear_metrics_cache(profesor_id)
@@ -755,6 +915,10 @@ def editar_asistencia(id):
         observaciones = ""
         profesor_id = clase_realizada.profesor_id  # Default al profesor actual
         
+        # Valores previos para actualizar también el mes de origen en el resumen
+        profesor_id_anterior = clase_realizada.profesor_id
+        fecha_anterior = clase_realizada.fecha
+        
         # Actualizar fecha en cualquier caso
         if request.form['fecha']:
             nueva_fecha = datetime.strptime(request.form['fecha'], '%Y-%m-%d').date()
@@ -796,6 +960,12 @@ def editar_asistencia(id):
         
         db.session.commit()
         
+        # Actualizar el resumen mensual del mes anterior y del nuevo
+        MetricaMensualProfesor.actualizar_meses([
+            (profesor_id_anterior, fecha_anterior),
+            (clase_realizada.profesor_id, clase_realizada.fecha)
+        ])
+        
         # Limpiar caché de métricas para este profesor
         from models import clear_metrics_cache
         clear_metrics_cache(clase_realizada.profesor_id)
@@ -827,28 +997,36 @@ def eliminar_asistencia(id):
         # Get audio file path and profesor_id before deletion
         audio_path = None
         profesor_id = None
+        fecha_clase = None
         try:
             clase = ClaseRealizada.query.filter_by(id=clase_id).first()
             if clase:
                 if clase.audio_file:
                     audio_path = clase.audio_file
                 profesor_id = clase.profesor_id
+                fecha_clase = clase.fecha
         except Exception as e:
             app.logger.warning(f"Error retrieving audio file before deletion: {str(e)}")
         
         # Use execute() with parameters to avoid SQL injection
+        # Los audios se buscan antes de borrar la clase (su id puede volver a asignarse)
+        rutas_audio = rutas_audios_clase(clase_id, audio_path)
+        ArchivoAudio.quitar_clase([clase_id], db.session)
         db.session.execute("DELETE FROM clase_realizada WHERE id = :id", {"id": clase_id})
         db.session.commit()
         
-        # If there was an audio file, try to delete it
-        if audio_path:
-            try:
-                full_path = os.path.join(app.config.get('UPLOAD_FOLDER', 'static/uploads'), audio_path)
-                if os.path.exists(full_path):
-                    os.remove(full_path)
+        # Actualizar el resumen mensual del profesor y su caché de métricas (el DELETE
+        # directo no pasa por los eventos del ORM que la invalidan)
+        MetricaMensualProfesor.actualizar_meses([(profesor_id, fecha_clase)])
+        cache_metricas.invalidar(profesor_id)
+        
+        # Delete the class audio files (indexed ones and the one in audio_file)
+        try:
+            for full_path in rutas_audio:
+                if eliminar_archivo_audio(full_path):
                     app.logger.info(f"Deleted audio file: {full_path}")
-            except Exception as e:
-                app.logger.error(f"Error deleting audio file: {str(e)}")
+        except Exception as e:
+            app.logger.error(f"Error deleting audio file: {str(e)}")
         
         # Limpiar caché de métricas para este profesor si tenemos su ID
         if profesor_id:
@@ -887,7 +1065,7 @@ def historial_asistencia():
         fecha_fin = datetime.strptime(fecha_fin_str, '%Y-%m-%d').date()
     
     # Construir la consulta
-    query = ClaseRealizada.query.filter(
+    query = ClaseRealizada.query.options(*perfil_carga('with_horario_profesor')).filter(
         ClaseRealizada.fecha >= fecha_inicio,
         ClaseRealizada.fecha <= fecha_fin
     ).order_by(ClaseRealizada.fecha.desc(), ClaseRealizada.id.desc())
@@ -945,224 +1123,11 @@ def clases_no_registradas():
     if fecha_fin_str:
         fecha_fin = datetime.strptime(fecha_fin_str, '%Y-%m-%d').date()
     
-    # 1. Obtener todos los horarios activos utilizando una consulta más completa y directa
-    # Obtener todos los horarios sin filtrar por activo
-    sql_horarios = """
-        SELECT h.id, h.nombre, h.hora_inicio, h.tipo_clase, h.dia_semana, h.profesor_id, h.duracion
-        FROM horario_clase h 
-        ORDER BY h.nombre
-    """
-    app.logger.info("Ejecutando consulta SQL para todos los horarios...")
-    result_horarios = db.session.execute(sql_horarios)
-    
-    horarios_activos = []
-    for row in result_horarios:
-        # Procesar todos los horarios
-        # (Se eliminó código de filtrado por activo/inactivo)
-            
-        # Extraer la hora_inicio de la base de datos
-        hora_inicio_original = row.hora_inicio
-        
-        # Establecer valores predeterminados
-        hora_inicio = None
-        hora_inicio_str = None
-        
-        # Procesar hora_inicio según su tipo
-        if hora_inicio_original:
-            if isinstance(hora_inicio_original, time):
-                # Si es un objeto time, formatear directamente
-                hora_inicio = hora_inicio_original  # Mantener el objeto time para ordenar
-                hora_inicio_str = hora_inicio_original.strftime('%H:%M')
-            elif isinstance(hora_inicio_original, str):
-                # Si es una cadena, intentar extraer solo la parte HH:MM
-                if ':' in hora_inicio_original:
-                    partes = hora_inicio_original.split(':')
-                    if len(partes) >= 2:
-                        try:
-                            horas = int(partes[0])
-                            minutos = int(partes[1])
-                            # Crear objeto time para ordenamiento y cálculos
-                            hora_inicio = time(hour=horas, minute=minutos)
-                            hora_inicio_str = f"{horas:02d}:{minutos:02d}"
-                        except (ValueError, TypeError):
-                            # Si hay error, intentar convertir usando datetime
-                            try:
-                                dt = datetime.strptime(hora_inicio_original.split('.')[0], '%H:%M:%S')
-                                hora_inicio = dt.time()
-                                hora_inicio_str = dt.strftime('%H:%M')
-                            except:
-                                # Si no podemos convertir, usar valores predeterminados
-                                hora_inicio = time(hour=0, minute=0)  # 00:00 como fallback
-                                hora_inicio_str = "00:00"
-                else:
-                    # No contiene ":", usar valores predeterminados
-                    hora_inicio = time(hour=0, minute=0)
-                    hora_inicio_str = "00:00"
-            else:
-                # Si no hay hora_inicio, usar valores predeterminados
-                hora_inicio = time(hour=0, minute=0)
-                hora_inicio_str = "00:00"
-        
-        # Calcular la hora de finalización
-        duracion = getattr(row, 'duracion', 60)
-        hora_fin_str = calcular_hora_fin(hora_inicio, duracion)
-        
-        # Crear el objeto horario con los datos procesados
-        horario = {
-            'id': row.id,
-            'nombre': row.nombre,
-            'hora_inicio': hora_inicio_str,  # ¡Importante! Guardar siempre el string formateado
-            'hora_inicio_obj': hora_inicio,  # Mantener el objeto time para ordenamiento
-            'tipo_clase': row.tipo_clase,
-            'dia_semana': row.dia_semana,
-            'profesor_id': row.profesor_id,
-            'duracion': duracion,
-            'hora_fin_str': hora_fin_str
-        }
-        
-        # Verificar si es clase POWER BIKE para depuración
-        if "POWER BIKE" in row.nombre:
-            print(f"DETECTADA CLASE POWER BIKE en horarios_activos: ID={row.id}, hora_inicio_str={hora_inicio_str}, hora_inicio_obj={hora_inicio}")
-            
-        horarios_activos.append(horario)
-    
-    # 2. Generar todas las fechas en el rango
-    fechas = []
-    fecha_actual = fecha_inicio
-    while fecha_actual <= fecha_fin:
-        fechas.append(fecha_actual)
-        fecha_actual += timedelta(days=1)
-    
-    # 3. Crear un diccionario de clases ya registradas para búsqueda eficiente
-    # Formato: {(fecha, horario_id): True}
-    clases_registradas_dict = {}
-    
-    # Obtener todas las clases registradas en el período - USANDO CONSULTA FRESCA
-    # Evitar usar ORM para asegurar que obtenemos los datos más recientes
-    sql_clases = """
-    SELECT 
-        cr.id, cr.fecha, cr.horario_id, cr.profesor_id, cr.hora_llegada_profesor, 
-        cr.cantidad_alumnos, cr.observaciones, cr.audio_file, cr.fecha_registro,
-        hc.nombre, hc.hora_inicio, hc.tipo_clase, hc.duracion,
-        p.nombre as profesor_nombre, p.apellido as profesor_apellido, p.tarifa_por_clase
-    FROM clase_realizada cr
-    JOIN horario_clase hc ON cr.horario_id = hc.id
-    JOIN profesor p ON cr.profesor_id = p.id
-    WHERE cr.fecha >= :fecha_inicio AND cr.fecha <= :fecha_fin
-    ORDER BY cr.fecha, hc.hora_inicio
-    """
-    # Crear una conexión fresca para asegurar que no hay caché
-    connection = db.engine.connect()
-    result = connection.execute(sql_clases, {
-        'fecha_inicio': fecha_inicio, 
-        'fecha_fin': fecha_fin
-    })
-    
-    # Procesar los resultados de la consulta directa
-    clases_realizadas = []
-    for row in result:
-        fecha_clase = row[1]
-        horario_id = row[2]
-        
-        # Verificar que fecha_clase sea un objeto date
-        if isinstance(fecha_clase, str):
-            try:
-                fecha_clase = datetime.strptime(fecha_clase, '%Y-%m-%d').date()
-            except ValueError:
-                try:
-                    fecha_clase = datetime.strptime(fecha_clase, '%d/%m/%Y').date()
-                except ValueError:
-                    # Si no podemos convertir, usar la fecha actual
-                    fecha_clase = datetime.now().date()
-        
-        # Guardar la clase realizada
-        clases_realizadas.append({
-            'id': row[0],
-            'fecha': fecha_clase,
-            'horario_id': horario_id,
-            'profesor_id': row[3]
-        })
-        
-        # Agregar al diccionario para búsqueda rápida
-        key = (fecha_clase, horario_id)
-        clases_registradas_dict[key] = True
-        
-        # También añadir a clases_registradas_dict con fecha como string (YYYY-MM-DD)
-        # para manejar diferentes formatos de fecha en las comparaciones
-        key_str = (fecha_clase.strftime('%Y-%m-%d'), horario_id)
-        clases_registradas_dict[key_str] = True
-        
-        print(f"DEBUG: Clase registrada encontrada - Fecha: {fecha_clase}, Horario ID: {horario_id}, ID: {row[0]}")
-    
-    # Cerrar la conexión después de usarla
-    connection.close()
+    # Calcular en una sola consulta las clases esperadas según el horario semanal
+    # que no tienen registro, resolviendo los profesores desde un mapa precargado
+    clases_no_registradas = calcular_clases_no_registradas(fecha_inicio, fecha_fin)
     
-    # 4. Generar las clases esperadas que NO están registradas
-    clases_no_registradas = []
-    for horario in horarios_activos:
-        # Todos los horarios son considerados activos
-        for fecha in fechas:
-            # Verificar que fecha sea un objeto date
-            if not isinstance(fecha, date):
-                try:
-                    fecha = datetime.strptime(fecha, '%Y-%m-%d').date()
-                except (ValueError, TypeError):
-                    continue  # Saltar esta fecha si no podemos convertirla
-            
-            # Si el día de la semana coincide con el día del horario
-            if fecha.weekday() == horario['dia_semana']:
-                # Comprobar con múltiples formatos de clave para mayor seguridad
-                key = (fecha, horario['id'])
-                key_str = (fecha.strftime('%Y-%m-%d'), horario['id'])
-                
-                # Verificar si esta clase no está registrada usando ambas claves
-                if key not in clases_registradas_dict and key_str not in clases_registradas_dict:
-                    # Obtener información del profesor
-                    sql_profesor = "SELECT id, nombre, apellido FROM profesor WHERE id = :profesor_id"
-                    result_profesor = db.session.execute(sql_profesor, {'profesor_id': horario['profesor_id']}).fetchone()
-                    
-                    if result_profesor:
-                        profesor = {
-                            'id': result_profesor.id,
-                            'nombre': result_profesor.nombre,
-                            'apellido': result_profesor.apellido
-                        }
-                    else:
-                        profesor = {
-                            'id': 0,
-                            'nombre': 'Desconocido',
-                            'apellido': ''
-                        }
-                    
-                    # Asegurarse de que fecha sea un objeto datetime.date
-                    if not isinstance(fecha, date):
-                        try:
-                            fecha = datetime.strptime(fecha, '%Y-%m-%d').date()
-                        except (ValueError, TypeError):
-                            try:
-                                fecha = datetime.strptime(fecha, '%d/%m/%Y').date()
-                            except (ValueError, TypeError):
-                                fecha = datetime.now().date()
-                    
-                    # No es necesario procesar más el horario, ya viene con el formato correcto
-                    horario_formateado = horario.copy()
-                    
-                    # Creamos un objeto para representar la clase esperada
-                    clase_esperada = {
-                        'fecha': fecha,
-                        'horario': horario_formateado,
-                        'profesor': profesor,
-                        'tipo_clase': horario['tipo_clase'],
-                        'id_combinado': f"{fecha.strftime('%Y-%m-%d')}|{horario['id']}"
-                    }
-                    clases_no_registradas.append(clase_esperada)
-    
-    # Mensaje de depuración con el número de clases
-    print(f"DEBUG: Total de clases registradas: {len(clases_realizadas)}")
-    print(f"DEBUG: Total de clases no registradas: {len(clases_no_registradas)}")
-    
-    # Ordenar por fecha (más reciente primero) y luego por hora de inicio
-    clases_no_registradas.sort(key=lambda x: (x['fecha'], x['horario'].get('hora_inicio_obj', time(0, 0))))
+    app.logger.debug(f"Total de clases no registradas: {len(clases_no_registradas)}")
     
     profesores = Profesor.query.all()
     
@@ -1264,66 +1229,6 @@ def informe_mensual():
         9: 'Septiembre', 10: 'Octubre', 11: 'Noviembre', 12: 'Diciembre'
     }
     
-    # Función para calcular la puntualidad
-    def calcular_puntualidad(hora_llegada, hora_inicio, nombre_clase=""):
-        if not hora_llegada:
-            return "N/A"
-        
-        # Si hora_inicio es None, no podemos calcular la puntualidad
-        if hora_inicio is None:
-            print("⚠️ ADVERTENCIA: hora_inicio es None, no se puede calcular puntualidad")
-            return "N/A"
-        
-        # Registrar en el log los tipos de datos (debug desactivado)
-        # Comentado para producción
-        
-        # CORRECCIÓN ESPECÍFICA PARA POWER BIKE
-        if nombre_clase and "POWER BIKE" in nombre_clase:
-            # Crear una nueva hora_inicio fija de 7:30
-            hora_correcta = time(hour=7, minute=30)
-            # Log eliminado para producción
-            hora_inicio = hora_correcta
-        
-        # Convertir las horas usando nuestra función global
-        hora_llegada_convertida = convertir_hora_con_microsegundos(hora_llegada)
-        if not hora_llegada_convertida:
-            return "Error formato"
-        
-        hora_inicio_convertida = convertir_hora_con_microsegundos(hora_inicio)
-        if not hora_inicio_convertida:
-            return "Error formato"
-        
-        # Usar las horas convertidas
-        hora_llegada = hora_llegada_convertida
-        hora_inicio = hora_inicio_convertida
-        
-        # Calcular minutos de retraso (asegurando que ambos son objetos time)
-        
-        # Verificar si son exactamente iguales (caso especial)
-        
-        # Corregir la comparación: el profesor es puntual solo si llega a tiempo o antes
-        if hora_llegada <= hora_inicio:
-            diferencia = (
-                datetime.combine(date.min, hora_inicio) - 
-                datetime.combine(date.min, hora_llegada)
-            ).total_seconds() / 60
-            # El profesor llegó puntual
-            return "Puntual"
-        
-        # Calcular minutos de retraso
-        diferencia_minutos = (
-            datetime.combine(date.min, hora_llegada) - 
-            datetime.combine(date.min, hora_inicio)
-        ).total_seconds() / 60
-        
-        resultado = ""
-        if diferencia_minutos <= 10:
-            resultado = "Retraso leve"
-        else:
-            resultado = "Retraso significativo"
-        
-        return resultado
-
     # Para peticiones GET con parámetros
     if request.method == 'GET' and request.args.get('mes') and request.args.get('anio'):
         mes = int(request.args.get('mes'))
@@ -1365,12 +1270,13 @@ def informe_mensual():
     db.session = db.create_scoped_session()
     
     # Consultar clases realizadas en el rango de fechas usando SQL directo
-    # para evitar problemas de caché
+    # para evitar problemas de caché. Las horas se leen en minutos desde
+    # medianoche (columnas mantenidas por la base de datos, ver normalizar_horas)
     sql_clases = """
     SELECT 
-        cr.id, cr.fecha, cr.horario_id, cr.profesor_id, cr.hora_llegada_profesor, 
+        cr.id, cr.fecha, cr.horario_id, cr.profesor_id, cr.llegada_min,
         cr.cantidad_alumnos, cr.observaciones, cr.audio_file, cr.fecha_registro,
-        hc.nombre, hc.hora_inicio, hc.tipo_clase, hc.duracion,
+        hc.nombre, hc.hora_inicio_min, hc.tipo_clase, hc.duracion,
         p.nombre as profesor_nombre, p.apellido as profesor_apellido, p.tarifa_por_clase
     FROM clase_realizada cr
     JOIN horario_clase hc ON cr.horario_id = hc.id
@@ -1379,157 +1285,42 @@ def informe_mensual():
     ORDER BY cr.fecha, hc.hora_inicio
     """
     
-    # Agregar debug para ver resultados
-    print(f"Consulta de clases para {primer_dia} a {ultimo_dia}")
-    
-    # Crear una conexión fresca para asegurar que no hay caché
-    connection = db.engine.connect()
-    result_clases = connection.execute(sql_clases, {
-        'fecha_inicio': primer_dia,
-        'fecha_fin': ultimo_dia
-    })
-    
-    # Función para convertir string a time
-    def convertir_a_time(hora_str):
-        if not hora_str:
-            return None
-                
-        # Si ya es un objeto time, devolverlo directamente
-        if isinstance(hora_str, time):
-            return hora_str
-                
-        # Intentar convertir string a time
-        try:
-            return datetime.strptime(hora_str, '%H:%M:%S.%f').time()
-        except ValueError:
-            try:
-                return datetime.strptime(hora_str, '%H:%M:%S').time()
-            except ValueError:
-                try:
-                    return datetime.strptime(hora_str, '%H:%M').time()
-                except ValueError:
-                    print(f"ERROR: No se pudo convertir {hora_str} a time")
-                    return None
+    # Leer todas las filas dentro del bloque para devolver la conexión al pool
+    with db.engine.connect() as connection:
+        result_clases = connection.execute(sql_clases, {
+            'fecha_inicio': primer_dia,
+            'fecha_fin': ultimo_dia
+        }).fetchall()
     
     # Procesar los resultados y crear objetos para facilitar el manejo
     clases_realizadas = []
     for row in result_clases:
-        # Asegurarse de que fecha sea un objeto datetime.date
-        fecha = row.fecha
-        if isinstance(fecha, str):
-            try:
-                fecha = datetime.strptime(fecha, '%Y-%m-%d').date()
-            except ValueError:
-                try:
-                    fecha = datetime.strptime(fecha, '%d/%m/%Y').date()
-                except ValueError:
-                    fecha = datetime.now().date()
-
-        # Asegurarse de que hora_llegada_profesor sea un objeto time
-        hora_llegada = row.hora_llegada_profesor
-        if hora_llegada:
-            if isinstance(hora_llegada, str):
-                hora_llegada = convertir_a_time(hora_llegada)
-        else:
-            hora_llegada = None
-
-        # Obtener hora_inicio conservando el valor original cuando está disponible
-        hora_inicio_original = row.hora_inicio
-        hora_inicio = None
-        
-        # Verificar la hora de llegada para situaciones especiales
-        hora_llegada_str = None
-        if hora_llegada:
-            try:
-                hora_llegada_str = hora_llegada.strftime('%H:%M')
-            except:
-                print(f"ERROR al formatear hora_llegada: {hora_llegada}")
-        
-        # Procesar la hora de inicio para comparaciones de puntualidad
-        if hora_inicio_original:
-            # Usar nuestra función global para convertir
-            hora_inicio = convertir_hora_con_microsegundos(hora_inicio_original)
-            if hora_inicio:
-                print(f"DEBUG informe_mensual: Clase ID {row.id}, convertida hora_inicio_original={hora_inicio_original} a {hora_inicio}")
-            else:
-                print(f"ADVERTENCIA: Clase ID {row.id} tiene hora_inicio en formato inválido: {hora_inicio_original}")
-        else:
-            print(f"ADVERTENCIA: Clase ID {row.id} no tiene hora_inicio definida en horario")
-            # Si tenemos la hora de llegada, NO la usamos como hora de inicio para puntualidad
-            # Esta es la causa del problema: la hora de llegada no debe ser la referencia para
-            # calcular la puntualidad
-            
-            # CORRECCIÓN ESPECÍFICA PARA POWER BIKE
-            nombre_horario = row.nombre if hasattr(row, 'nombre') else "Sin nombre"
-            if "POWER BIKE" in nombre_horario:
-                # Para POWER BIKE, sabemos que la hora de inicio es 7:30
-                hora_inicio = time(hour=7, minute=30)
-                print(f"CORRECCIÓN: Clase POWER BIKE, usando hora fija 7:30 como hora de inicio")
-            else:
-                # Intentamos extraer la hora del nombre del horario
-                import re
-                hora_match = re.search(r'(\d{1,2})[:.:](\d{2})', nombre_horario)
-                if hora_match:
-                    hora, minuto = map(int, hora_match.groups())
-                    hora_inicio = time(hour=hora, minute=minuto)
-                    print(f"Hora extraída del nombre: {hora_inicio}")
-                else:
-                    # Si no se puede extraer, dejamos la hora_inicio como None para mostrar un error claro
-                    print(f"ADVERTENCIA: No se pudo determinar la hora de inicio para '{nombre_horario}'")
-                    hora_inicio = time(hour=0, minute=0)  # Usar 00:00 como valor por defecto
-
-        # Obtener la duración o usar valor por defecto
-        duracion = getattr(row, 'duracion', 60)
-        
-        # Calcular la hora de finalización como string
-        if hora_inicio:
-            hora_fin_str = calcular_hora_fin(hora_inicio, duracion)
-            # Formatear hora_inicio como string para la plantilla
-            try:
-                hora_inicio_str = hora_inicio.strftime('%H:%M')
-                print(f"DEBUG hora_inicio_str: {hora_inicio_str}")
-            except:
-                print(f"ERROR formateando hora_inicio: {hora_inicio}, tipo: {type(hora_inicio)}")
-                hora_inicio_str = None
-        else:
-            # Si llegamos aquí y no tenemos hora_inicio, intentamos usar directamente el valor original
-            # en los casos en que sea un string ya formateado
-            if isinstance(hora_inicio_original, str) and (':' in hora_inicio_original):
-                hora_inicio_str = hora_inicio_original
-                # Calcular hora_fin manualmente
-                try:
-                    hora, minuto = map(int, hora_inicio_str.split(':')[:2])
-                    minutos_totales = hora * 60 + minuto + duracion
-                    horas_fin, minutos_fin = divmod(minutos_totales, 60)
-                    hora_fin_str = f"{horas_fin:02d}:{minutos_fin:02d}"
-                except:
-                    print(f"ERROR calculando hora_fin a partir de string: {hora_inicio_original}")
-                    hora_fin_str = "Horario no disponible"
-            else:
-                hora_inicio_str = None
-                hora_fin_str = "Horario no disponible"
-
-        # Para la puntualidad usamos la hora del horario original
-        hora_para_puntualidad = hora_inicio
-        
-        # IMPORTANTE: Verificar que la hora para puntualidad no sea la misma que la hora de llegada
-        if hora_llegada and hora_para_puntualidad and hora_llegada == hora_para_puntualidad:
-            print(f"⚠️ ADVERTENCIA: hora_llegada y hora_para_puntualidad son IGUALES para clase ID {row.id}")
-            print(f"Esto podría indicar un problema en cómo se calculó la hora de inicio")
+        try:
+            fecha_clase = date.fromisoformat(row.fecha)
+        except (TypeError, ValueError):
+            # Fila con una fecha que no es YYYY-MM-DD (p. ej. de una base antigua): se omite
+            app.logger.warning(f"Informe mensual: clase {row.id} omitida por fecha no válida ({row.fecha!r})")
+            continue
+        
+        inicio_min = row.hora_inicio_min
+        # CORRECCIÓN ESPECÍFICA PARA POWER BIKE: la clase empieza a las 7:30
+        if row.nombre and "POWER BIKE" in row.nombre:
+            inicio_min = 7 * 60 + 30
+        
+        hora_llegada = hora_desde_minutos(row.llegada_min)
+        hora_inicio = hora_desde_minutos(inicio_min)
+        duracion = row.duracion or 60
+        minutos_retraso = (row.llegada_min - inicio_min
+                           if row.llegada_min is not None and inicio_min is not None else None)
         
-        # Registrar en el log para depuración la comparación de puntualidad
-        if hora_llegada and hora_para_puntualidad:
-            print(f"DEBUG puntualidad informe: Clase ID {row.id}, hora_llegada={hora_llegada}, hora_para_puntualidad={hora_para_puntualidad}")
-            diferencia = (datetime.combine(date.min, hora_llegada) - datetime.combine(date.min, hora_para_puntualidad)).total_seconds() / 60
-            print(f"DEBUG puntualidad informe: Diferencia en minutos={diferencia}, resultado={calcular_puntualidad(hora_llegada, hora_para_puntualidad, row.nombre)}")
-
         # Crear un objeto para representar la clase realizada
         clase = {
             'id': row.id,
-            'fecha': fecha,
+            'fecha': fecha_clase,
             'horario_id': row.horario_id,
             'hora_llegada_profesor': hora_llegada,
-            'hora_llegada_str': hora_llegada_str,
+            'hora_llegada_str': hora_llegada.strftime('%H:%M') if hora_llegada else None,
+            'minutos_retraso': minutos_retraso,
             'cantidad_alumnos': row.cantidad_alumnos,
             'observaciones': row.observaciones,
             'fecha_registro': row.fecha_registro,
@@ -1537,196 +1328,25 @@ def informe_mensual():
                 'id': row.horario_id,
                 'nombre': row.nombre,
                 'hora_inicio': hora_inicio,
-                'hora_inicio_str': hora_inicio_str,
+                'hora_inicio_str': hora_inicio.strftime('%H:%M') if hora_inicio else None,
                 'tipo_clase': row.tipo_clase,
                 'duracion': duracion,
-                'hora_fin_str': hora_fin_str
+                'hora_fin_str': calcular_hora_fin(hora_inicio, duracion) if hora_inicio else "Horario no disponible"
             },
             'profesor': {
                 'id': row.profesor_id,
                 'nombre': row.profesor_nombre,
                 'apellido': row.profesor_apellido,
                 'tarifa_por_clase': row.tarifa_por_clase
-            }
+            },
+            'puntualidad': clasificar_retraso(minutos_retraso) if hora_llegada else "N/A"
         }
         
-        # Para POWER BIKE, establecemos la hora específica antes de calcular la puntualidad
-        if "POWER BIKE" in row.nombre:
-            print(f"CORRIGIENDO CLASE POWER BIKE para informe: ID={row.id}, hora_llegada={hora_llegada_str}")
-            hora_correcta = time(hour=7, minute=30)
-            clase['horario']['hora_inicio'] = hora_correcta
-            clase['horario']['hora_inicio_str'] = "07:30"
-            # Actualizar hora para puntualidad también
-            hora_para_puntualidad = hora_correcta
-            print(f"Hora corregida para POWER BIKE: {hora_correcta}")
-        
-        # Calcular la puntualidad después de las correcciones
-        clase['puntualidad'] = calcular_puntualidad(hora_llegada, hora_para_puntualidad, row.nombre)
-        
         clases_realizadas.append(clase)
     
-    # Generar fechas para el mes seleccionado
-    fechas_mes = []
-    fecha_actual = primer_dia
-    while fecha_actual <= ultimo_dia:
-        fechas_mes.append(fecha_actual)
-        fecha_actual += timedelta(days=1)
-    
-    # Crear un diccionario para verificar clases ya registradas
-    # Formato: {(fecha, horario_id): True}
-    clases_registradas_dict = {}
-    for clase in clases_realizadas:
-        key = (clase['fecha'], clase['horario_id'])
-        clases_registradas_dict[key] = True
-    
-    # Obtener todos los horarios activos
-    # Obtener todos los horarios, incluidos los inactivos pero con fecha de desactivación
-    try:
-        sql_horarios = """
-        SELECT id, nombre, hora_inicio, tipo_clase, dia_semana, profesor_id, duracion, activo, fecha_desactivacion 
-        FROM horario_clase
-        """
-        result_horarios = db.session.execute(sql_horarios)
-    except Exception as e:
-        # Si la columna activo no existe, usar versión compatible con bases de datos antiguas
-        print(f"Error al ejecutar consulta con columna 'activo': {str(e)}")
-        print("Usando consulta alternativa sin columna 'activo'")
-        sql_horarios = """
-        SELECT id, nombre, hora_inicio, tipo_clase, dia_semana, profesor_id, duracion
-        FROM horario_clase
-        """
-        result_horarios = db.session.execute(sql_horarios)
-    
-    horarios_activos = []
-    for row in result_horarios:
-        # Extraer la hora_inicio de la base de datos
-        hora_inicio_original = row.hora_inicio
-        
-        # Establecer valores predeterminados
-        hora_inicio = None
-        hora_inicio_str = None
-        
-        # Procesar hora_inicio según su tipo
-        if hora_inicio_original:
-            if isinstance(hora_inicio_original, time):
-                # Si es un objeto time, formatear directamente
-                hora_inicio = hora_inicio_original  # Mantener el objeto time para ordenar
-                hora_inicio_str = hora_inicio_original.strftime('%H:%M')
-            elif isinstance(hora_inicio_original, str):
-                # Si es una cadena, intentar extraer solo la parte HH:MM
-                if ':' in hora_inicio_original:
-                    partes = hora_inicio_original.split(':')
-                    if len(partes) >= 2:
-                        try:
-                            horas = int(partes[0])
-                            minutos = int(partes[1])
-                            # Crear objeto time para ordenamiento y cálculos
-                            hora_inicio = time(hour=horas, minute=minutos)
-                            hora_inicio_str = f"{horas:02d}:{minutos:02d}"
-                        except (ValueError, TypeError):
-                            # Si hay error, intentar convertir usando datetime
-                            try:
-                                dt = datetime.strptime(hora_inicio_original.split('.')[0], '%H:%M:%S')
-                                hora_inicio = dt.time()
-                                hora_inicio_str = dt.strftime('%H:%M')
-                            except:
-                                # Si no podemos convertir, usar valores predeterminados
-                                hora_inicio = time(hour=0, minute=0)  # 00:00 como fallback
-                                hora_inicio_str = "00:00"
-                else:
-                    # No contiene ":", usar valores predeterminados
-                    hora_inicio = time(hour=0, minute=0)
-                    hora_inicio_str = "00:00"
-            else:
-                # Si no hay hora_inicio, usar valores predeterminados
-                hora_inicio = time(hour=0, minute=0)
-                hora_inicio_str = "00:00"
-        
-        # Calcular la hora de finalización
-        duracion = getattr(row, 'duracion', 60)
-        hora_fin_str = calcular_hora_fin(hora_inicio, duracion)
-        
-        # Verificar si la columna activo existe en el resultado
-        try:
-            activo = getattr(row, 'activo', True)  # Por defecto activo=True si no existe la columna
-            fecha_desactivacion = getattr(row, 'fecha_desactivacion', None)
-        except:
-            # Si no existe la columna activo, asumimos que está activo
-            activo = True
-            fecha_desactivacion = None
-        
-        # Crear el objeto horario con los datos procesados
-        horario = {
-            'id': row.id,
-            'nombre': row.nombre,
-            'hora_inicio': hora_inicio_str,  # ¡Importante! Guardar siempre el string formateado
-            'hora_inicio_obj': hora_inicio,  # Mantener el objeto time para ordenamiento
-            'tipo_clase': row.tipo_clase,
-            'dia_semana': row.dia_semana,
-            'profesor_id': row.profesor_id,
-            'duracion': duracion,
-            'hora_fin_str': hora_fin_str,
-            'activo': activo,
-            'fecha_desactivacion': fecha_desactivacion
-        }
-        
-        # Verificar si es clase POWER BIKE para depuración
-        if "POWER BIKE" in row.nombre:
-            print(f"DETECTADA CLASE POWER BIKE en horarios_activos: ID={row.id}, hora_inicio_str={hora_inicio_str}, hora_inicio_obj={hora_inicio}")
-            
-        horarios_activos.append(horario)
-    
     # Generar las clases que deberían haberse realizado pero no están registradas
-    clases_no_registradas = []
-    for horario in horarios_activos:
-        for fecha in fechas_mes:
-            # Si el día de la semana coincide con el día del horario
-            if fecha.weekday() == horario['dia_semana']:
-                key = (fecha, horario['id'])
-                # Verificar si esta clase no está registrada
-                if key not in clases_registradas_dict:
-                    # Obtener información del profesor
-                    sql_profesor = "SELECT id, nombre, apellido FROM profesor WHERE id = :profesor_id"
-                    result_profesor = db.session.execute(sql_profesor, {'profesor_id': horario['profesor_id']}).fetchone()
-                    
-                    if result_profesor:
-                        profesor = {
-                            'id': result_profesor.id,
-                            'nombre': result_profesor.nombre,
-                            'apellido': result_profesor.apellido
-                        }
-                    else:
-                        profesor = {
-                            'id': 0,
-                            'nombre': 'Desconocido',
-                            'apellido': ''
-                        }
-                    
-                    # Asegurarse de que fecha sea un objeto datetime.date
-                    if not isinstance(fecha, date):
-                        try:
-                            fecha = datetime.strptime(fecha, '%Y-%m-%d').date()
-                        except (ValueError, TypeError):
-                            try:
-                                fecha = datetime.strptime(fecha, '%d/%m/%Y').date()
-                            except (ValueError, TypeError):
-                                fecha = datetime.now().date()
-                    
-                    # No es necesario procesar más el horario, ya viene con el formato correcto
-                    horario_formateado = horario.copy()
-                    
-                    # Creamos un objeto para representar la clase esperada
-                    clase_esperada = {
-                        'fecha': fecha,
-                        'horario': horario_formateado,
-                        'profesor': profesor,
-                        'tipo_clase': horario['tipo_clase'],
-                        'id_combinado': f"{fecha.strftime('%Y-%m-%d')}|{horario['id']}"
-                    }
-                    clases_no_registradas.append(clase_esperada)
-    
-    # Ordenar las clases no registradas por fecha
-    clases_no_registradas.sort(key=lambda x: (x['fecha'], x['horario'].get('hora_inicio_obj', time(0, 0))))
+    # (expansión del horario semanal y anti-join con clase_realizada en una sola consulta)
+    clases_no_registradas = calcular_clases_no_registradas(primer_dia, ultimo_dia)
     
     # SOLUCIÓN ROBUSTA: Procesamiento completo de todas las horas para eliminar formatos con microsegundos
     for clase in clases_no_registradas:
@@ -1800,11 +1420,8 @@ def informe_mensual():
         resumen_profesores[profesor['id']]['clases_por_tipo'][tipo_clase] += 1
         resumen_profesores[profesor['id']]['alumnos_por_tipo'][tipo_clase] += clase['cantidad_alumnos']
         
-        # Determinar la hora a considerar para la puntualidad (la de la clase si está disponible, sino la del horario)
-        hora_para_puntualidad = clase['horario']['hora_inicio']
-        
         # Verificar si hubo retraso
-        if clase['hora_llegada_profesor'] and hora_para_puntualidad and clase['hora_llegada_profesor'] > hora_para_puntualidad:
+        if clase['minutos_retraso'] is not None and clase['minutos_retraso'] > 0:
             resumen_profesores[profesor['id']]['total_retrasos'] += 1
         
         # Ensure cantidad_alumnos is treated as a number for the comparison
@@ -1906,17 +1523,75 @@ def informe_mensual():
 
 # Rutas para la importación de Excel
 
+def importar_asistencia_archivo(ruta, progreso, columnas_requeridas, tipo_clase=None, nombre_archivo=None,
+                                forzar=False, **opciones):
+    """
+    Trabajo de importación de un Excel de asistencia (se ejecuta en segundo plano,
+    ver utils/trabajos_importacion.py).
+    
+    Args:
+        ruta (str): Archivo subido
+        progreso (callable): Recibe los contadores tras cada bloque
+        columnas_requeridas (list): Encabezados que debe tener la hoja
+        tipo_clase (str, optional): Tipo elegido en el formulario; identifica el
+            horario de cada fila junto con el día y la hora
+        nombre_archivo (str, optional): Nombre original, para el registro de archivos importados
+        forzar (bool): Importar aunque el mismo archivo ya se haya importado
+        **opciones: Argumentos de importar_asistencias
+    
+    Returns:
+        dict: Contadores con los nombres de `resultados`, detalle por fila y mensaje
+    """
+    # Un archivo idéntico importado con las mismas opciones no tiene nada que aplicar
+    huella = huella_archivo(ruta)
+    opciones_archivo = '|'.join(str(valor) for valor in (
+        opciones.get('columna_alumnos'), opciones.get('clave_horario'), tipo_clase or ''))
+    previo = None if forzar else ArchivoImportado.buscar(huella, opciones_archivo)
+    if previo:
+        fecha_previa = previo.fecha_importacion.strftime('%d/%m/%Y %H:%M')
+        return {'total': previo.filas, 'leidas': previo.filas, 'procesados': previo.filas,
+                'sin_cambios': previo.filas, 'nuevos': 0, 'actualizados': 0, 'errores': 0, 'detalles': [],
+                'mensaje': f"Este archivo ya se importó el {fecha_previa}; no hay cambios que aplicar"}
+    
+    opciones.setdefault('umbral_similitud', app.config.get('IMPORTACION_UMBRAL_SIMILITUD', UMBRAL_SIMILITUD))
+    with abrir_libro(ruta, ruta) as lector:
+        faltantes = lector.faltantes(columnas_requeridas)
+        if faltantes:
+            raise ValueError(f'El archivo no contiene columnas requeridas: {", ".join(faltantes)}')
+        
+        def _progreso(parcial):
+            progreso(dict(parcial, total=lector.total_estimado, leidas=parcial['total'],
+                          procesados=parcial['nuevos'] + parcial['actualizados'] + parcial['sin_cambios']))
+        
+        importacion = importar_por_bloques(lector, progreso=_progreso, tipo_clase=tipo_clase, **opciones)
+    registrar_errores(importacion)
+    
+    if tipo_clase:
+        for detalle in importacion['detalles']:
+            if detalle['estado'] != 'Error':
+                if detalle['estado'] == 'Nuevo':
+                    detalle['estado'] = 'Importado'
+                detalle['tipo'] = tipo_clase
+    
+    # Solo un archivo importado sin errores se registra como ya importado
+    if importacion['errores'] == 0:
+        ArchivoImportado.registrar(huella, opciones_archivo, nombre_archivo, importacion['total'])
+    
+    procesados = importacion['nuevos'] + importacion['actualizados'] + importacion['sin_cambios']
+    with open('import_debug.log', 'a', encoding='utf-8') as f:
+        f.write(f"Importación completada: {importacion['total']} filas leídas, {procesados} procesados, "
+                f"{importacion['nuevos']} nuevos, {importacion['actualizados']} actualizados, "
+                f"{importacion['sin_cambios']} sin cambios, {importacion['errores']} errores "
+                f"({importacion['filas_por_segundo']} filas/s)\n")
+    
+    return dict(importacion, leidas=importacion['total'], procesados=procesados,
+                mensaje=f"Se importaron {importacion['nuevos'] + importacion['actualizados']} registros de "
+                        f"{importacion['total']} (Sin cambios: {importacion['sin_cambios']}, "
+                        f"Errores: {importacion['errores']}, {importacion['filas_por_segundo']} filas/s)")
+
 @app.route('/importar/asistencia', methods=['GET', 'POST'])
 def importar_asistencia():
-    """Ruta para importar asistencia desde un archivo Excel."""
-    resultados = {
-        'procesados': 0,
-        'nuevos': 0,
-        'actualizados': 0,
-        'errores': 0,
-        'detalles': []
-    }
-
+    """Ruta para importar asistencia desde un archivo Excel (en segundo plano)."""
     if request.method == 'POST':
         # Check if file was uploaded
         if 'archivo' not in request.files:
@@ -1937,409 +1612,23 @@ def importar_asistencia():
             with open('import_errors.log', 'a', encoding='utf-8') as f:
                 f.write(f"\n========== NUEVA IMPORTACIÓN {datetime.now()} ==========\n")
             
-            try:
-                # Read Excel file with pandas
-                df = pd.read_excel(archivo)
-                
-                # Verify required columns
-                columnas_requeridas = ['Fecha', 'Hora', 'Intructor', 'Clase', 'Alumnos']
-                for columna in columnas_requeridas:
-                    if columna not in df.columns:
-                        raise ValueError(f"El archivo no contiene la columna requerida: {columna}")
-                
-                # Log total rows to debug
-                with open('import_debug.log', 'a', encoding='utf-8') as f:
-                    f.write(f"Total de filas a procesar: {len(df)}\n")
-                
-                # Process each row
-                for fila_num, row in df.iterrows():
-                    try:
-                        # Process date
-                        fecha_str = row['Fecha']
-                        if pd.isna(fecha_str):
-                            raise ValueError("La fecha está vacía")
-                        
-                        # Log for debugging
-                        with open('import_debug.log', 'a', encoding='utf-8') as f:
-                            f.write(f"FECHA (Fila {fila_num}): '{fecha_str}', Tipo: {type(fecha_str)}\n")
-                        
-                        # Try to convert date
-                        try:
-                            if isinstance(fecha_str, str):
-                                # Try different date formats
-                                formats = ['%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y', '%d.%m.%Y']
-                                fecha = None
-                                
-                                for format_str in formats:
-                                    try:
-                                        fecha = datetime.strptime(fecha_str, format_str).date()
-                                        # Log success
-                                        with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                            f.write(f"  → Convertido con formato {format_str}: {fecha}\n")
-                                        break
-                                    except ValueError:
-                                        continue
-                                
-                                if fecha is None:
-                                    # Last attempt with pandas
-                                    fecha = pd.to_datetime(fecha_str).date()
-                                    with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                        f.write(f"  → Convertido con pandas: {fecha}\n")
-                            elif isinstance(fecha_str, datetime):
-                                fecha = fecha_str.date()
-                                with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                    f.write(f"  → Es un objeto datetime: {fecha}\n")
-                            else:
-                                # For Excel date numbers or other formats
-                                fecha = pd.to_datetime(fecha_str).date()
-                                with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                    f.write(f"  → Convertido desde otro formato: {fecha}\n")
-                        except Exception as e:
-                            # Log error
-                            with open('import_errors.log', 'a', encoding='utf-8') as f:
-                                f.write(f"ERROR FECHA (Fila {fila_num}): '{fecha_str}' - {str(e)}\n")
-                            
-                            raise ValueError(f"No se pudo convertir la fecha '{fecha_str}': {str(e)}")
-                        
-                        # Process time
-                        try:
-                            hora_str = row['Hora']
-                            
-                            # Variable to track attendance
-                            no_asistio = False
-                            
-                            # Log for debugging
-                            with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                f.write(f"HORA (Fila {fila_num}): '{hora_str}', Tipo: {type(hora_str)}\n")
-                            
-                            # Check if it's "NO ASISTIO" or similar absence text
-                            if isinstance(hora_str, str):
-                                hora_upper = str(hora_str).upper().strip()
-                                
-                                with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                    f.write(f"  → Verificando texto: '{hora_upper}'\n")
-                                
-                                if any(palabra in hora_upper for palabra in ['NO ASISTIO', 'NO ASISTIÓ', 'AUSENTE', 'CANCELADO']):
-                                    hora = time(0, 0)  # Default time for schedule
-                                    no_asistio = True
-                                    
-                                    with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                        f.write(f"  → DETECTED as absence\n")
-                            elif pd.isna(hora_str):
-                                # If the value is NaN or empty
-                                hora = time(0, 0)  # Use midnight as default
-                                
-                                with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                    f.write(f"  → NaN/empty value\n")
-                            elif isinstance(hora_str, (int, float)):
-                                # Convert Excel decimal to time
-                                hora = excel_time_to_time(hora_str)
-                                
-                                with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                    f.write(f"  → Numeric value: {hora_str}, converted to: {hora}\n")
-                                
-                                if hora is None:
-                                    raise ValueError(f"Could not convert value {hora_str} to time format")
-                            else:
-                                # Convert other formats
-                                try:
-                                    # Ensure it's a string and remove spaces
-                                    hora_str = str(hora_str).strip()
-                                    
-                                    with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                        f.write(f"  → Processing time format: '{hora_str}'\n")
-                                    
-                                    # Check AM/PM format (example: 7:30AM, 7:30 PM)
-                                    if 'AM' in hora_str.upper() or 'PM' in hora_str.upper():
-                                        # Normalize format (remove spaces between time and AM/PM)
-                                        hora_normalizada = hora_str.upper().replace(' ', '')
-                                        
-                                        with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                            f.write(f"  → AM/PM format detected: '{hora_normalizada}'\n")
-                                        
-                                        # Extract time parts (hour, minute, AM/PM)
-                                        import re
-                                        match = re.search(r'(\d+)(?::|\.)(\d+)\s*(AM|PM)', hora_str, re.IGNORECASE)
-                                        
-                                        if match:
-                                            h, m, periodo = match.groups()
-                                            h = int(h)
-                                            m = int(m)
-                                            
-                                            # Adjust for PM
-                                            if periodo.upper() == 'PM' and h < 12:
-                                                h += 12
-                                            elif periodo.upper() == 'AM' and h == 12:
-                                                h = 0
-                                            
-                                            hora = time(h, m)
-                                            
-                                            with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                                f.write(f"  → Manually converted: h={h}, m={m}, result={hora}\n")
-                                        else:
-                                            # Attempt 1: standard 12h format
-                                            try:
-                                                hora_dt = datetime.strptime(hora_normalizada, '%I:%M%p')
-                                                hora = hora_dt.time()
-                                                
-                                                with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                                    f.write(f"  → Converted with strptime format %I:%M%p: {hora}\n")
-                                            except ValueError:
-                                                # Attempt 2: format with dot
-                                                try:
-                                                    hora_norm_punto = hora_normalizada.replace(':', '.')
-                                                    hora_dt = datetime.strptime(hora_norm_punto, '%I.%M%p')
-                                                    hora = hora_dt.time()
-                                                    
-                                                    with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                                        f.write(f"  → Converted with strptime format %I.%M%p: {hora}\n")
-                                                except ValueError:
-                                                    # Last attempt with pandas
-                                                    try:
-                                                        hora = pd.to_datetime(hora_str).time()
-                                                        
-                                                        with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                                            f.write(f"  → Converted with pandas: {hora}\n")
-                                                    except:
-                                                        with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                                            f.write(f"  → All attempts failed\n")
-                                                        
-                                                        raise ValueError(f"Unrecognized AM/PM format: {hora_str}")
-                                    elif ':' in hora_str:
-                                        # If it has HH:MM format or similar
-                                        partes = hora_str.split(':')
-                                        try:
-                                            hora = time(int(partes[0]), int(partes[1]) if len(partes) > 1 else 0)
-                                            
-                                            with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                                f.write(f"  → Converted with split: {hora}\n")
-                                        except ValueError as e:
-                                            raise ValueError(f"Invalid time format: {hora_str}")
-                                    else:
-                                        # Try with 24-hour format
-                                        try:
-                                            hora_dt = datetime.strptime(hora_str, '%H:%M')
-                                            hora = hora_dt.time()
-                                            
-                                            with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                                f.write(f"  → Converted with format %H:%M: {hora}\n")
-                                        except ValueError:
-                                            # Last attempt with pandas
-                                            try:
-                                                hora = pd.to_datetime(hora_str).time()
-                                                
-                                                with open('import_debug.log', 'a', encoding='utf-8') as f:
-                                                    f.write(f"  → Converted with pandas: {hora}\n")
-                                            except Exception as e_pandas:
-                                                raise ValueError(f"Unrecognized time format: {hora_str}")
-                                except Exception as e:
-                                    # Log error
-                                    with open('import_errors.log', 'a', encoding='utf-8') as f:
-                                        f.write(f"ERROR TIME (Fila {fila_num}): '{hora_str}' - {str(e)}\n")
-                                    
-                                    raise ValueError(f"Could not convert time '{hora_str}': {str(e)}")
-                        except Exception as e:
-                            # Log the detailed error
-                            error_info = {
-                                'fila': fila_num,
-                                'profesor': str(row.get('Intructor', '')),
-                                'fecha': str(row.get('Fecha', '')),
-                                'hora': str(row.get('Hora', '')),
-                                'clase': str(row.get('Clase', '')),
-                                'estado': 'Error',
-                                'mensaje_error': str(e)
-                            }
-                            
-                            with open('import_errors.log', 'a', encoding='utf-8') as f:
-                                f.write(f"ERROR EN FILA {fila_num}:\n")
-                                for k, v in error_info.items():
-                                    f.write(f"  {k}: {v}\n")
-                                f.write("\n" + "-"*50 + "\n")
-                            
-                            # For user interface
-                            resultados['errores'] += 1
-                            resultados['detalles'].append({
-                                'fila': fila_num,
-                                'profesor': str(row.get('Intructor', '')),
-                                'fecha': str(row.get('Fecha', '')),
-                                'clase': str(row.get('Clase', '')),
-                                'estado': 'Error',
-                                'errores': [f"({type(e).__name__}) {str(e)}"]
-                            })
-                            continue  # Skip to the next row
-                        
-                        # Find or create professor
-                        profesor_nombre = row['Intructor']
-                        if pd.isna(profesor_nombre) or not profesor_nombre:
-                            raise ValueError("El nombre del instructor está vacío")
-                        
-                        profesor = Profesor.query.filter(Profesor.nombre.ilike(f"%{profesor_nombre}%")).first()
-                        if not profesor:
-                            try:
-                                # Create new professor with a default rate
-                                profesor = Profesor(
-                                    nombre=profesor_nombre,
-                                    apellido='',  # Leave empty for now
-                                    email='',     # Leave empty for now
-                                    telefono='',  # Leave empty for now
-                                    tarifa_por_clase=0.0  # Default rate
-                                )
-                                db.session.add(profesor)
-                                db.session.commit()
-                            except Exception as e:
-                                db.session.rollback()
-                                raise ValueError(f"Error al crear profesor '{profesor_nombre}': {str(e)}")
-                        
-                        # Find or create class
-                        clase_nombre = row['Clase']
-                        if pd.isna(clase_nombre) or not clase_nombre:
-                            raise ValueError("El nombre de la clase está vacío")
-                        
-                        # No need to search for a Clase model (it doesn't exist)
-                        # We'll use the nombre directamente para HorarioClase
-                        
-                        # Get number of students
-                        try:
-                            alumnos = int(row['Alumnos'])
-                        except:
-                            alumnos = 0
-                        
-                        # Get comments if available
-                        observaciones = row.get('Observaciones', '')
-                        if pd.isna(observaciones):
-                            observaciones = ''
-                        
-                        # Calculate arrival time (arrival = scheduled time + delay)
-                        hora_llegada = hora
-                        
-                        # Check if this schedule exists
-                        horario = HorarioClase.query.filter_by(
-                            dia_semana=fecha.weekday(),
-                            hora_inicio=hora,
-                            nombre=clase_nombre
-                        ).first()
-                        
-                        if not horario:
-                            # Create new schedule
-                            horario = HorarioClase(
-                                nombre=clase_nombre,
-                                dia_semana=fecha.weekday(),
-                                hora_inicio=hora,
-                                duracion=60,  # Duración en minutos
-                                profesor_id=profesor.id,
-                                tipo_clase='OTRO'  # Default type
-                            )
-                            db.session.add(horario)
-                            db.session.commit()
-                        
-                        # Check if this class session already exists
-                        clase_existente = ClaseRealizada.query.filter_by(
-                            fecha=fecha,
-                            horario_id=horario.id
-                        ).first()
-                        
-                        if not clase_existente:
-                            # Create new record
-                            nueva_clase = ClaseRealizada(
-                                fecha=fecha,
-                                horario_id=horario.id,
-                                profesor_id=profesor.id,
-                                hora_llegada_profesor=None if no_asistio else hora,
-                                cantidad_alumnos=alumnos,
-                                observaciones="PROFESOR NO ASISTIÓ" if no_asistio else ""
-                            )
-                            db.session.add(nueva_clase)
-                            
-                            resultados['nuevos'] += 1
-                            resultados['detalles'].append({
-                                'fila': fila_num,
-                                'profesor': profesor.nombre,
-                                'fecha': fecha.strftime('%d/%m/%Y'),
-                                'clase': horario.nombre,
-                                'estado': 'Nuevo',
-                                'nota': 'AUSENTE' if no_asistio else ''
-                            })
-                        else:
-                            # Update existing record
-                            clase_existente.profesor_id = profesor.id
-                            clase_existente.hora_llegada_profesor = None if no_asistio else hora
-                            clase_existente.cantidad_alumnos = alumnos
-                            if no_asistio:
-                                clase_existente.observaciones = "PROFESOR NO ASISTIÓ"
-                            
-                            resultados['actualizados'] += 1
-                            resultados['detalles'].append({
-                                'fila': fila_num,
-                                'profesor': profesor.nombre,
-                                'fecha': fecha.strftime('%d/%m/%Y'),
-                                'clase': horario.nombre,
-                                'estado': 'Actualizado',
-                                'nota': 'AUSENTE' if no_asistio else ''
-                            })
-                        
-                        # Commit the record
-                        db.session.commit()
-                        resultados['procesados'] += 1
-                    
-                    except Exception as e:
-                        # Log detailed error information
-                        error_info = {
-                            'fila': fila_num,
-                            'profesor': str(row.get('Intructor', '')),
-                            'fecha': str(row.get('Fecha', '')),
-                            'hora': str(row.get('Hora', '')),
-                            'clase': str(row.get('Clase', '')),
-                            'estado': 'Error',
-                            'mensaje_error': str(e)
-                        }
-                        
-                        # Registrar para depuración
-                        with open('import_errors.log', 'a', encoding='utf-8') as f:
-                            f.write(f"ERROR EN FILA {fila_num}:\n")
-                            for k, v in error_info.items():
-                                f.write(f"  {k}: {v}\n")
-                            f.write("\n" + "-"*50 + "\n")
-                        
-                        # For user interface
-                        resultados['errores'] += 1
-                        resultados['detalles'].append({
-                            'fila': fila_num,
-                            'profesor': str(row.get('Intructor', '')),
-                            'fecha': str(row.get('Fecha', '')),
-                            'clase': str(row.get('Clase', '')),
-                            'estado': 'Error',
-                            'errores': [f"({type(e).__name__}) {str(e)}"]
-                        })
-                        
-                # Log final result
-                with open('import_debug.log', 'a', encoding='utf-8') as f:
-                    f.write(f"Importación completada: {resultados['procesados']} procesados, {resultados['nuevos']} nuevos, "
-                            f"{resultados['actualizados']} actualizados, {resultados['errores']} errores\n")
-                
-                # Show result to user
-                if resultados['errores'] > 0:
-                    flash(f"Importación completada con {resultados['errores']} errores. Se procesaron {resultados['procesados']} registros.", 'warning')
-                else:
-                    flash(f"Importación completada correctamente. Se procesaron {resultados['procesados']} registros.", 'success')
-            
-            except Exception as e:
-                # Log global error
-                with open('import_errors.log', 'a', encoding='utf-8') as f:
-                    f.write(f"ERROR GLOBAL: {str(e)}\n")
-                    f.write(f"{traceback.format_exc()}\n")
-                
-                flash(f"Error en la importación: {str(e)}", 'danger')
-                resultados['errores'] += 1
+            trabajo_id = encolar_importacion(app, 'asistencia', archivo, importar_asistencia_archivo,
+                                             columnas_requeridas=['Fecha', 'Hora', 'Intructor', 'Clase', 'Alumnos'],
+                                             columna_alumnos='Alumnos', clave_horario='nombre',
+                                             nombre_archivo=archivo.filename, forzar=bool(request.form.get('forzar')))
+            flash('Importación en curso. El progreso se muestra en esta página.', 'info')
+            return redirect(url_for('importar_excel', trabajo=trabajo_id))
         else:
             flash('Formato de archivo no permitido. Use archivos Excel (.xlsx, .xls)', 'danger')
     
-    return render_template('importar/asistencia.html', titulo="Importar Asistencia", resultados=resultados)
+    return redirect(url_for('importar_excel'))
 
 @app.route('/import/asistencia', methods=['POST'])
 def importar_asistencia_excel():
     """
-    Procesa un archivo Excel con datos de asistencia y los importa al sistema.
+    Encola la importación de un archivo Excel con datos de asistencia.
     Los registros se asignarán al tipo de clase especificado por el usuario.
+    El progreso y el resultado se consultan en /importar/jobs/<id>.
     """
     if 'file' not in request.files:
         return jsonify({'success': False, 'message': 'No se ha subido ningún archivo'})
@@ -2353,270 +1642,24 @@ def importar_asistencia_excel():
     if not tipo_clase or tipo_clase not in ['MOVE', 'RIDE', 'BOX', 'OTRO']:
         return jsonify({'success': False, 'message': 'Debe seleccionar un tipo de clase válido (MOVE, RIDE, BOX, OTRO)'})
     
-    # Resultados para devolver al cliente
-    resultados = {
-        'total': 0,
-        'importados': 0,
-        'errores': 0,
-        'detalles': []
-    }
-    
     try:
-        # Guardar temporalmente el archivo
-        filename = secure_filename(file.filename)
-        temp_filepath = os.path.join(app.instance_path, filename)
-        os.makedirs(app.instance_path, exist_ok=True)
-        file.save(temp_filepath)
-        
-        # Leer con pandas
-        df = pd.read_excel(temp_filepath)
-        
-        # Eliminar el archivo temporal
-        os.remove(temp_filepath)
-        
-        # Verificar columnas requeridas
-        required_columns = ['Intructor', 'Fecha', 'Hora', 'Clase', 'Asistentes']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            return jsonify({
-                'success': False, 
-                'message': f'El archivo no contiene columnas requeridas: {", ".join(missing_columns)}'
-            })
-        
-        # Actualizar el total de registros
-        resultados['total'] = len(df)
-        
         # Registrar inicio de importación
         with open('import_debug.log', 'a', encoding='utf-8') as f:
-            f.write(f"\n=== INICIO IMPORTACIÓN {datetime.now()} ({resultados['total']} registros) ===\n")
+            f.write(f"\n=== INICIO IMPORTACIÓN {datetime.now()} ===\n")
             f.write(f"Tipo de clase seleccionado: {tipo_clase}\n")
         
-        # Procesar cada fila
-        for index, row in df.iterrows():
-            fila_num = index + 2  # +2 porque Excel es 1-indexed y tenemos encabezado
-            
-            try:
-                # Datos básicos
-                instructor = str(row['Intructor']).strip()
-                clase_nombre = str(row['Clase']).strip()
-                alumnos = int(row['Asistentes']) if not pd.isna(row['Asistentes']) else 0
-                
-                # Procesar fecha
-                fecha_str = row['Fecha']
-                if isinstance(fecha_str, datetime):
-                    fecha = fecha_str.date()
-                elif isinstance(fecha_str, pd.Timestamp):
-                    fecha = fecha_str.date()
-                else:
-                    # Intentar múltiples formatos de fecha
-                    fecha = None
-                    # Asegurar que sea string
-                    fecha_str = str(fecha_str).strip()
-                    # Probar formatos comunes de fecha
-                    formatos_fecha = ['%d/%m/%Y', '%Y-%m-%d', '%m/%d/%Y', '%d-%m-%Y', '%d.%m.%Y']
-                    for formato in formatos_fecha:
-                        try:
-                            fecha = datetime.strptime(fecha_str, formato).date()
-                            break
-                        except ValueError:
-                            continue
-                    
-                    # Si aún no se pudo convertir, intentar con pandas
-                    if fecha is None:
-                        try:
-                            fecha = pd.to_datetime(fecha_str, errors='raise', dayfirst=True).date()
-                        except Exception as fecha_error:
-                            raise ValueError(f"No se pudo convertir la fecha '{fecha_str}': {str(fecha_error)}")
-                
-                # Procesar hora
-                hora_str = row['Hora']
-                
-                # Variable para seguimiento de la asistencia
-                no_asistio = False
-                
-                # Comprobar si es "NO ASISTIO" u otro texto que indica ausencia
-                if isinstance(hora_str, str) and any(texto in hora_str.upper() for texto in ["NO ASISTIO", "NO ASISTIÓ", "AUSENTE", "CANCELADO"]):
-                    # Marcar como no asistido (usamos hora normal para el horario)
-                    hora = time(0, 0)  # Hora predeterminada para el horario
-                    no_asistio = True
-                elif pd.isna(hora_str):
-                    # Si el valor es NaN o está vacío
-                    hora = time(0, 0)  # Usar medianoche como valor predeterminado
-                elif isinstance(hora_str, (int, float)):
-                    # Convertir decimal de Excel a tiempo
-                    hora = excel_time_to_time(hora_str)
-                    if hora is None:
-                        raise ValueError(f"No se pudo convertir el valor {hora_str} a formato de hora")
-                else:
-                    # Asegurar que sea string y eliminar espacios
-                    hora_str = str(hora_str).strip()
-                    
-                    # Convertir otros formatos
-                    try:
-                        if ':' in hora_str:
-                            # Si tiene formato HH:MM o similar
-                            # Check for AM/PM format
-                            is_pm = 'PM' in hora_str.upper()
-                            is_am = 'AM' in hora_str.upper()
-                            # Remove AM/PM from string
-                            hora_str = hora_str.upper().replace('AM', '').replace('PM', '').strip()
-                            
-                            partes = hora_str.split(':')
-                            horas = int(partes[0])
-                            minutos = int(partes[1]) if len(partes) > 1 else 0
-                            
-                            # Adjust hours for PM
-                            if is_pm and horas < 12:
-                                horas += 12
-                            # Adjust for 12 AM
-                            elif is_am and horas == 12:
-                                horas = 0
-                                
-                            hora = time(horas, minutos)
-                        else:
-                            # Intentar con datetime primero
-                            try:
-                                hora = datetime.strptime(hora_str, '%H:%M').time()
-                            except ValueError:
-                                # Último intento con pandas
-                                hora = pd.to_datetime(hora_str).time()
-                    except Exception as e:
-                        raise ValueError(f"No se pudo convertir la hora '{hora_str}': {str(e)}")
-                
-                # Find or create professor
-                profesor_nombre = instructor
-                if pd.isna(profesor_nombre) or not profesor_nombre:
-                    raise ValueError("El nombre del instructor está vacío")
-                
-                profesor = Profesor.query.filter(Profesor.nombre.ilike(f"%{profesor_nombre}%")).first()
-                if not profesor:
-                    try:
-                        # Create new professor with a default rate
-                        profesor = Profesor(
-                            nombre=profesor_nombre,
-                            apellido='',  # Leave empty for now
-                            email='',     # Leave empty for now
-                            telefono='',  # Leave empty for now
-                            tarifa_por_clase=0.0  # Default rate
-                        )
-                        db.session.add(profesor)
-                        db.session.commit()
-                    except Exception as e:
-                        db.session.rollback()
-                        raise ValueError(f"Error al crear profesor '{profesor_nombre}': {str(e)}")
-                
-                # Find or create class schedule
-                # Usamos el tipo_clase que seleccionó el usuario en el formulario
-                # Buscar un horario existente o crear uno nuevo
-                dia_semana = fecha.weekday()
-                horario = HorarioClase.query.filter_by(
-                    dia_semana=dia_semana,
-                    hora_inicio=hora,
-                    tipo_clase=tipo_clase
-                ).first()
-                
-                if not horario:
-                    # Create new schedule with the class type from the form
-                    horario = HorarioClase(
-                        nombre=clase_nombre,
-                        dia_semana=dia_semana,
-                        hora_inicio=hora,
-                        duracion=60,  # Default duration
-                        profesor_id=profesor.id,
-                        tipo_clase=tipo_clase  # Use the selected class type
-                    )
-                    db.session.add(horario)
-                    db.session.commit()
-                
-                # Check if this class session already exists
-                clase_existente = ClaseRealizada.query.filter_by(
-                    fecha=fecha,
-                    horario_id=horario.id
-                ).first()
-                
-                if not clase_existente:
-                    # Create new record
-                    nueva_clase = ClaseRealizada(
-                        fecha=fecha,
-                        horario_id=horario.id,
-                        profesor_id=profesor.id,
-                        hora_llegada_profesor=None if no_asistio else hora,
-                        cantidad_alumnos=alumnos,
-                        observaciones="PROFESOR NO ASISTIÓ" if no_asistio else ""
-                    )
-                    db.session.add(nueva_clase)
-                    
-                    resultados['importados'] += 1
-                    resultados['detalles'].append({
-                        'fila': fila_num,
-                        'profesor': profesor.nombre,
-                        'fecha': fecha.strftime('%d/%m/%Y'),
-                        'clase': horario.nombre,
-                        'estado': 'Importado',
-                        'tipo': tipo_clase
-                    })
-                else:
-                    # Update existing record
-                    clase_existente.profesor_id = profesor.id
-                    clase_existente.hora_llegada_profesor = None if no_asistio else hora
-                    clase_existente.cantidad_alumnos = alumnos
-                    if no_asistio:
-                        clase_existente.observaciones = "PROFESOR NO ASISTIÓ"
-                    
-                    resultados['importados'] += 1
-                    resultados['detalles'].append({
-                        'fila': fila_num,
-                        'profesor': profesor.nombre,
-                        'fecha': fecha.strftime('%d/%m/%Y'),
-                        'clase': horario.nombre,
-                        'estado': 'Actualizado',
-                        'tipo': tipo_clase
-                    })
-                
-                # Commit the record
-                db.session.commit()
-                
-            except Exception as e:
-                # Registrar error con información detallada
-                error_info = {
-                    'fila': fila_num,
-                    'profesor': str(row.get('Intructor', '')),
-                    'fecha': str(row.get('Fecha', '')),
-                    'hora': str(row.get('Hora', '')),
-                    'clase': str(row.get('Clase', '')),
-                    'estado': 'Error',
-                    'mensaje_error': str(e)
-                }
-                
-                # Registrar para depuración
-                with open('import_errors.log', 'a', encoding='utf-8') as debug_file:
-                    debug_file.write(f"ERROR EN FILA {fila_num}:\n")
-                    for k, v in error_info.items():
-                        debug_file.write(f"  {k}: {v}\n")
-                    debug_file.write("\n" + "-"*50 + "\n")
-                
-                # Para interfaz de usuario
-                resultados['errores'] += 1
-                resultados['detalles'].append({
-                    'fila': fila_num,
-                    'profesor': str(row.get('Intructor', '')),
-                    'fecha': str(row.get('Fecha', '')),
-                    'clase': str(row.get('Clase', '')),
-                    'estado': 'Error',
-                    'errores': [f"({type(e).__name__}) {str(e)}"]
-                })
-        
-        # Log final result
-        with open('import_debug.log', 'a', encoding='utf-8') as f:
-            f.write(f"Importación completada: {resultados['total']} registros, {resultados['importados']} importados, "
-                    f"{resultados['errores']} errores\n")
-        
+        # El horario de cada fila se identifica por día, hora y tipo de clase
+        trabajo_id = encolar_importacion(app, 'asistencia_tipo', file, importar_asistencia_archivo,
+                                         columnas_requeridas=['Intructor', 'Fecha', 'Hora', 'Clase', 'Asistentes'],
+                                         columna_alumnos='Asistentes', clave_horario='tipo_clase',
+                                         tipo_clase=tipo_clase, fila_inicial=2,
+                                         nombre_archivo=file.filename, forzar=bool(request.form.get('forzar')))
         return jsonify({
             'success': True,
-            'message': f"Se importaron {resultados['importados']} registros de {resultados['total']} (Errores: {resultados['errores']})",
-            'results': resultados
-        })
+            'message': 'Importación en curso',
+            'job_id': trabajo_id,
+            'estado_url': url_for('estado_trabajo_importacion', trabajo_id=trabajo_id)
+        }), 202
     
     except Exception as e:
         # Log global error
@@ -2626,13 +1669,36 @@ def importar_asistencia_excel():
         
         return jsonify({
             'success': False,
-            'message': f"Error en la importación: {str(e)}",
-            'results': resultados
+            'message': f"Error en la importación: {str(e)}"
         })
 
+@app.route('/importar/jobs/<trabajo_id>')
+def estado_trabajo_importacion(trabajo_id):
+    """Estado, contadores y, al terminar, detalle por fila de un trabajo de importación."""
+    trabajo = TrabajoImportacion.query.get(trabajo_id)
+    if not trabajo:
+        return jsonify({'success': False, 'message': 'Trabajo de importación no encontrado'}), 404
+    
+    datos = trabajo.to_dict()
+    if trabajo.estado in ('completado', 'error'):
+        datos['detalles'] = cargar_detalles_importacion(trabajo)
+        if ruta_reporte_errores(trabajo):
+            datos['url_errores'] = url_for('descargar_errores_importacion', trabajo_id=trabajo.id)
+    return jsonify({'success': True, 'trabajo': datos})
+
+@app.route('/importar/jobs/<trabajo_id>/errores')
+def descargar_errores_importacion(trabajo_id):
+    """Reporte CSV con las filas que no se pudieron importar."""
+    trabajo = TrabajoImportacion.query.get_or_404(trabajo_id)
+    ruta = ruta_reporte_errores(trabajo)
+    if not ruta:
+        abort(404)
+    return send_file(ruta, mimetype='text/csv', as_attachment=True,
+                     download_name=f'errores_importacion_{trabajo.id[:8]}.csv')
+
 @app.route('/importar', methods=['GET'])
 def importar_excel():
-    return render_template('importar/excel.html')
+    return render_template('importar/excel.html', trabajo_id=request.args.get('trabajo'))
 
 # Inicializar la base de datos si no existe
 @app.cli.command('init-db')
@@ -2655,6 +1721,174 @@ def init_db_command():
     except Exception as e:
         click.echo(f'Error al inicializar la base de datos: {str(e)}')
 
+@app.cli.command('normalizar-horas')
+def normalizar_horas_command():
+    """Normalizar fechas y horas guardadas y rellenar las columnas en minutos."""
+    resultado = normalizar_horas()
+    for columna, cantidad in resultado['corregidos'].items():
+        click.echo(f'{columna}: {cantidad} valores corregidos')
+    for columna, cantidad in resultado['no_validos'].items():
+        click.echo(f'{columna}: {cantidad} valores no válidos (sin cambios)')
+    if not resultado['corregidos'] and not resultado['no_validos']:
+        click.echo('Todas las fechas y horas ya están en formato canónico')
+
+@app.cli.command('reconstruir-resumen-mensual')
+def reconstruir_resumen_mensual_command():
+    """Recalcular por completo el resumen mensual de métricas de los profesores."""
+    MetricaMensualProfesor.reconstruir()
+    cache_metricas.invalidar()
+    click.echo('Resumen mensual reconstruido')
+
+@app.cli.command('crear-indices')
+def crear_indices_command():
+    """Crear los índices declarados en los modelos que falten en la base de datos."""
+    creados = asegurar_indices()
+    if creados:
+        for nombre in creados:
+            click.echo(f'Índice creado: {nombre}')
+    else:
+        click.echo('Todos los índices ya existen')
+
+@app.cli.command('depurar-clases-duplicadas')
+@click.option('--aplicar', is_flag=True, help='Fusionar los duplicados (sin esta opción solo se listan).')
+def depurar_clases_duplicadas_command(aplicar):
+    """Listar las clases duplicadas (misma fecha y horario) y, con --aplicar, fusionarlas tras una instantánea."""
+    duplicadas = clases_duplicadas()
+    if not duplicadas:
+        asegurar_clave_clases()
+        click.echo('No hay clases duplicadas')
+        return
+    for grupo in duplicadas:
+        click.echo(f"{grupo['fecha']} horario {grupo['horario_id']}: se conserva la clase {grupo['ids'][0]}, "
+                   f"se fusionan y eliminan {', '.join(str(i) for i in grupo['ids'][1:])}")
+    if not aplicar:
+        click.echo('Sin cambios. Ejecute con --aplicar para fusionarlas (se toma antes una instantánea)')
+        return
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    destino = os.path.join(app.root_path, 'backups', f'gimnasio_antes_depurar_clases_{timestamp}.db')
+    tomar_instantanea(destino)
+    click.echo(f'Instantánea previa: {destino}')
+    eliminadas = eliminar_clases_duplicadas()
+    cache_metricas.invalidar()
+    click.echo(f'Clases eliminadas: {len(eliminadas)}. Clave única (fecha, horario) creada')
+
+@app.cli.command('verificar-indices')
+def verificar_indices_command():
+    """Revisar con EXPLAIN QUERY PLAN que las consultas frecuentes usan índices."""
+    from utils.plan_consultas import verificar_planes
+    resultado = verificar_planes(db.session)
+    for nombre, datos in resultado.items():
+        estado = 'OK' if datos['correcto'] else 'RECORRIDO COMPLETO: ' + ', '.join(datos['tablas_recorridas'])
+        click.echo(f'{nombre}: {estado}')
+        for paso in datos['plan']:
+            click.echo(f'    {paso}')
+    fallidas = [nombre for nombre, datos in resultado.items() if not datos['correcto']]
+    if fallidas:
+        raise click.ClickException(f'{len(fallidas)} consultas sin índice: {", ".join(fallidas)}')
+
+@app.cli.command('alias-profesor')
+@click.argument('alias', required=False)
+@click.argument('profesor_id', type=int, required=False)
+@click.option('--eliminar', is_flag=True, help='Eliminar el alias indicado.')
+def alias_profesor_command(alias, profesor_id, eliminar):
+    """Listar, añadir o eliminar alias de instructores usados al importar asistencias."""
+    if alias is None:
+        for registro in AliasProfesor.query.order_by(AliasProfesor.alias):
+            click.echo(f'{registro.alias} -> {registro.profesor.nombre} {registro.profesor.apellido} (id {registro.profesor_id})')
+        return
+    
+    # Misma sesión que la consulta (la de models.db) para modificar el registro leído
+    sesion = AliasProfesor.query.session
+    clave = normalizar_nombre(alias)
+    existente = AliasProfesor.query.filter_by(alias=clave).first()
+    if eliminar:
+        if not existente:
+            raise click.ClickException(f'No existe el alias "{clave}"')
+        sesion.delete(existente)
+        sesion.commit()
+        click.echo(f'Alias eliminado: {clave}')
+        return
+    
+    if profesor_id is None or not Profesor.query.get(profesor_id):
+        raise click.ClickException('Indique el id de un profesor existente')
+    registro = existente or AliasProfesor(alias=clave)
+    registro.profesor_id = profesor_id
+    sesion.add(registro)
+    sesion.commit()
+    click.echo(f'Alias guardado: {clave} -> profesor {profesor_id}')
+
+@app.cli.command('backup-completo')
+@click.argument('destino', required=False)
+def backup_completo_command(destino):
+    """Escribir el backup completo (base de datos y audios) en un archivo ZIP."""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    destino = destino or os.path.join(app.root_path, 'backups', f'gimnasio_backup_completo_{timestamp}.zip')
+    try:
+        entradas, db_nombre = preparar_backup_completo(timestamp)
+    except InstantaneaInvalida as e:
+        raise click.ClickException(str(e))
+    resumen = escribir_zip(entradas, destino, comprimidas=[db_nombre])
+    registrar_resumen_backup(destino, resumen)
+    click.echo(f'Backup completo: {destino} ({os.path.getsize(destino)/1024/1024:.2f} MB)')
+
+@app.cli.command('backup-incremental')
+@click.option('--etiqueta', default=None, help='Texto añadido al nombre del manifiesto.')
+@click.option('--listar', is_flag=True, help='Listar los manifiestos existentes.')
+def backup_incremental_command(etiqueta, listar):
+    """Crear un backup incremental (solo se escriben los audios nuevos) o listar los existentes."""
+    if listar:
+        for manifiesto in listar_manifiestos(app.config['BACKUP_INCREMENTAL_DIRECTORIO']):
+            resumen = manifiesto['resumen']
+            click.echo(f"{manifiesto['nombre']}: {resumen['archivos']} archivos, "
+                       f"{resumen['bytes']/1024/1024:.2f} MB ({resumen['nuevos']} nuevos)")
+        return
+    try:
+        manifiesto = backup_incremental(etiqueta=etiqueta)
+    except InstantaneaInvalida as e:
+        raise click.ClickException(str(e))
+    resumen = manifiesto['resumen']
+    click.echo(f"Backup {manifiesto['nombre']}: {resumen['archivos']} archivos, {resumen['nuevos']} nuevos "
+               f"({resumen['bytes_nuevos']/1024/1024:.2f} MB escritos)")
+
+@app.cli.command('restaurar-incremental')
+@click.argument('manifiesto')
+@click.argument('destino')
+def restaurar_incremental_command(manifiesto, destino):
+    """Reconstruir en DESTINO la base de datos (gimnasio.db) y los audios de un backup incremental."""
+    try:
+        resultado = restaurar_manifiesto(app.config['BACKUP_INCREMENTAL_DIRECTORIO'], manifiesto,
+                                         os.path.join(destino, 'audios'), os.path.join(destino, 'gimnasio.db'))
+    except BackupIncrementalInvalido as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Restaurados {resultado['archivos']} archivos ({resultado['bytes']/1024/1024:.2f} MB) en {destino}")
+
+@app.cli.command('generar-picos')
+@click.option('--todos', is_flag=True, help='Recalcular también los audios que ya tienen picos.')
+def generar_picos_command(todos):
+    """Calcular los picos de la forma de onda de los audios subidos antes de guardarlos al subir."""
+    generados = errores = 0
+    for ruta, _ in archivos_audio(os.path.join(app.config.get('UPLOAD_FOLDER', 'static/uploads'), 'audios')):
+        nombre = os.path.basename(ruta)
+        if es_archivo_picos(nombre) or not allowed_file(nombre, ALLOWED_EXTENSIONS_AUDIO):
+            continue
+        if not todos and picos_actualizados(ruta):
+            continue
+        try:
+            generar_picos(ruta)
+            generados += 1
+        except Exception as e:
+            errores += 1
+            click.echo(f'Error en {ruta}: {e}', err=True)
+    click.echo(f'Picos generados: {generados} (errores: {errores})')
+
+@app.cli.command('reconciliar-audios')
+def reconciliar_audios_command():
+    """Actualizar el índice de audios con los archivos que hay en la carpeta de subidas."""
+    ArchivoAudio.asegurar_tabla()
+    resultado = ArchivoAudio.reconciliar(app.config.get('UPLOAD_FOLDER', 'static/uploads'))
+    click.echo(f"Nuevos: {resultado['nuevos']}, modificados: {resultado['modificados']}, "
+               f"eliminados: {resultado['eliminados']}, vinculados a clases: {resultado['vinculados']}")
+
 @app.route('/asistencia/upload_audio/<int:horario_id>', methods=['POST'], endpoint='upload_audio_legacy2')
 def upload_audio_legacy(horario_id):
     """Ruta legacy que redirige a la nueva ruta"""
@@ -2755,8 +1989,10 @@ def audio_upload(horario_id):
                 try:
                     for old_file in os.listdir(storage_dir):
                         if old_file.startswith("audio_") and old_file != new_filename:
-                            os.remove(os.path.join(storage_dir, old_file))
+                            eliminar_archivo_audio(os.path.join(storage_dir, old_file))
                             app.logger.info(f"Removed old audio file: {old_file} for horario_id: {horario_id}")
+                        elif es_archivo_picos(old_file):
+                            os.remove(os.path.join(storage_dir, old_file))
                 except Exception as e:
                     app.logger.warning(f"Error cleaning old audio files: {str(e)}")
                 
@@ -2767,12 +2003,23 @@ def audio_upload(horario_id):
                 file_size = os.path.getsize(save_path)
                 file_size_readable = f"{file_size/1024:.2f} KB"
                 
+                # Calcular una sola vez los picos de la forma de onda (las peticiones de la onda solo leen este archivo)
+                waveform = None
+                try:
+                    waveform = renderizar(app, ('picos', save_path), generar_picos, save_path)
+                    app.logger.info(f"Waveform peaks saved to {waveform['ruta']} ({waveform['picos']} peaks)")
+                except RenderizadoEnCurso:
+                    app.logger.info(f"Waveform peaks for {save_path} still being generated")
+                except Exception as e:
+                    app.logger.warning(f"Error generating waveform peaks for {save_path}: {str(e)}")
+                
                 # Ruta relativa del archivo para guardar en la base de datos
                 relative_path = os.path.join(f'horario_{horario_id}', new_filename)
                 
                 # Update database if possible
                 db_updated = False
                 db_error = None
+                clase = None
                 try:
                     clase = ClaseRealizada.query.filter_by(horario_id=horario_id).order_by(ClaseRealizada.id.desc()).first()
                     if clase:
@@ -2786,6 +2033,9 @@ def audio_upload(horario_id):
                     db_error = str(db_err)
                     app.logger.error(f"Error updating database for horario_id: {horario_id}: {db_error}")
                 
+                registrar_archivo_audio(save_path, horario_id, clase.id if clase else None,
+                                        duracion=waveform['duracion'] if waveform else None)
+                
                 return jsonify({
                     'success': True,
                     'message': 'Archivo subido exitosamente',
@@ -2794,7 +2044,8 @@ def audio_upload(horario_id):
                     'file_size': file_size,
                     'file_size_readable': file_size_readable,
                     'db_updated': db_updated,
-                    'db_error': db_error
+                    'db_error': db_error,
+                    'duration': round(waveform['duracion'], 2) if waveform else None
                 })
             except Exception as e:
                 error_msg = str(e)
@@ -2828,34 +2079,15 @@ def audio_get(horario_id):
     try:
         app.logger.info(f"Audio get request received for horario_id: {horario_id}")
         
-        clase = ClaseRealizada.query.filter_by(horario_id=horario_id).order_by(ClaseRealizada.id.desc()).first()
-        
-        # Primero intentar buscar en la nueva estructura de directorios
-        audio_dir = get_audio_storage_path(horario_id)
-        newest_audio = None
+        # Audio más reciente del horario según el índice de audios
+        archivo = ArchivoAudio.ultimo(horario_id)
+        if archivo is not None:
+            # Redirigir a la URL del archivo: el reproductor la pide por rangos y la guarda en caché
+            audio_url = url_archivo_audio(archivo.ruta)
+            app.logger.info(f"Redirecting to audio URL: {audio_url}")
+            return redirect(audio_url)
         
-        if os.path.exists(audio_dir):
-            try:
-                files = os.listdir(audio_dir)
-                audio_files = [f for f in files if f.startswith('audio_')]
-                if audio_files:
-                    audio_files.sort(reverse=True)
-                    newest_audio = audio_files[0]
-                    audio_path = os.path.join(audio_dir, newest_audio)
-                    
-                    # Actualizar la base de datos si encontramos un audio
-                    if clase and (not clase.audio_file or not os.path.exists(os.path.join(app.config.get('UPLOAD_FOLDER', 'static/uploads'), 'audios', clase.audio_file))):
-                        relative_path = os.path.join(f'horario_{horario_id}', newest_audio)
-                        clase.audio_file = relative_path
-                        db.session.commit()
-                        app.logger.info(f"Updated database with found audio: {relative_path}")
-                    
-                    # En lugar de enviar el archivo directamente, redirigir a la ruta estática
-                    static_url = url_for('static', filename=f'uploads/audios/permanent/horario_{horario_id}/{newest_audio}')
-                    app.logger.info(f"Redirecting to static audio URL: {static_url}")
-                    return redirect(static_url)
-            except Exception as e:
-                app.logger.error(f"Error searching for audio files in directory: {str(e)}")
+        clase = ClaseRealizada.query.filter_by(horario_id=horario_id).order_by(ClaseRealizada.id.desc()).first()
         
         if not clase:
             app.logger.warning(f"No clase found for horario_id: {horario_id}")
@@ -2874,16 +2106,9 @@ def audio_get(horario_id):
                 'clase_id': clase.id
             }), 404
         
-        # Determinar la ruta relativa para la URL estática
-        if clase.audio_file.startswith('horario_') or '/' in clase.audio_file or '\\' in clase.audio_file:
-            # Nueva estructura
-            static_url = url_for('static', filename=f'uploads/audios/permanent/{clase.audio_file}')
-        else:
-            # Formato antiguo
-            static_url = url_for('static', filename=f'uploads/audios/{clase.audio_file}')
-        
-        app.logger.info(f"Redirecting to static audio URL: {static_url}")
-        return redirect(static_url)
+        audio_url = url_archivo_audio(ruta_audio_clase(clase.audio_file))
+        app.logger.info(f"Redirecting to audio URL: {audio_url}")
+        return redirect(audio_url)
     except Exception as e:
         error_msg = str(e)
         app.logger.error(f"Error getting audio for horario_id: {horario_id}: {error_msg}")
@@ -2901,134 +2126,53 @@ def audio_check(horario_id):
         app.logger.info(f"Audio check request for horario_id: {horario_id}")
         
         clase = ClaseRealizada.query.filter_by(horario_id=horario_id).order_by(ClaseRealizada.id.desc()).first()
+        upload_base = app.config.get('UPLOAD_FOLDER', 'static/uploads')
         
-        # Primero, intentemos buscar en la nueva estructura, incluso si no hay registro en la BD
-        audio_dir = get_audio_storage_path(horario_id)
-        audio_files = []
-        newest_audio = None
-        newest_audio_path = None
-        
-        if os.path.exists(audio_dir):
-            try:
-                files = os.listdir(audio_dir)
-                audio_files = [f for f in files if f.startswith('audio_')]
-                if audio_files:
-                    audio_files.sort(reverse=True)
-                    newest_audio = audio_files[0]
-                    newest_audio_path = os.path.join(audio_dir, newest_audio)
-                    app.logger.info(f"Found audio file in storage: {newest_audio_path}")
-                    
-                    # Actualizar la base de datos con la nueva ruta
-                    relative_path = os.path.join(f'horario_{horario_id}', newest_audio)
-                    clase.audio_file = relative_path
-                    db.session.commit()
-                    app.logger.info(f"Updated database with found audio: {relative_path}")
-                else:
-                    app.logger.warning(f"No audio files found in directory: {audio_dir}")
-            except Exception as e:
-                app.logger.error(f"Error searching for audio files: {str(e)}")
-        
-        # Si encontramos un archivo pero no hay registro en la BD o el registro es incorrecto
-        if newest_audio_path and (not clase or not clase.audio_file or not os.path.exists(os.path.join(app.config.get('UPLOAD_FOLDER', 'static/uploads'), 'audios', 'permanent', clase.audio_file))):
-            if clase:
-                # Actualizar la BD con la nueva ruta
-                relative_path = os.path.join(f'horario_{horario_id}', newest_audio)
-                clase.audio_file = relative_path
-                db.session.commit()
-                app.logger.info(f"Updated database with found audio: {relative_path}")
-            elif newest_audio_path:
-                app.logger.warning(f"Found audio file but no clase record for horario_id: {horario_id}")
-                return jsonify({
-                    'success': True,
-                    'has_audio': True,
-                    'exists': True,
-                    'file_name': newest_audio,
-                    'file_path': f"/static/uploads/audios/permanent/horario_{horario_id}/{newest_audio}",
-                    'file_size': os.path.getsize(newest_audio_path),
-                    'file_size_readable': f"{os.path.getsize(newest_audio_path)/1024:.2f} KB",
-                    'clase_id': None,
-                    'fecha': None
-                })
-        
-        # Si no hay registro en la base de datos y no encontramos archivo
-        if not clase and not newest_audio_path:
+        # Audio más reciente del horario según el índice de audios
+        archivo = ArchivoAudio.ultimo(horario_id)
+        if archivo is not None:
+            ruta = archivo.ruta
+            file_size = archivo.tamano
+        elif clase and clase.audio_file:
+            # Registro anterior al índice (se incorpora con `flask reconciliar-audios`)
+            ruta = ruta_audio_clase(clase.audio_file)
+            file_size = None
+        else:
             app.logger.info(f"No audio registered for horario_id: {horario_id}")
             return jsonify({
                 'success': True,
                 'has_audio': False,
-                'message': 'No audio registered'
-            })
-            
-        # Si hay registro pero no tiene audio
-        if clase and not clase.audio_file and not newest_audio_path:
-            app.logger.info(f"No audio registered in database for horario_id: {horario_id}")
-            return jsonify({
-                'success': True,
-                'has_audio': False,
-                'message': 'No audio registered in database'
-            })
-        
-        # Verificar la ruta del audio en la base de datos
-        upload_folder = os.path.join(app.config.get('UPLOAD_FOLDER', 'static/uploads'), 'audios')
-        audio_path = None
-        
-        # Determinar la ruta del audio según el formato almacenado
-        if clase and clase.audio_file:
-            if clase.audio_file.startswith('horario_') or '/' in clase.audio_file or '\\' in clase.audio_file:
-                audio_path = os.path.join(upload_folder, 'permanent', clase.audio_file)
-            else:
-                # Compatibilidad con formato antiguo
-                audio_path = os.path.join(upload_folder, clase.audio_file)
-        elif newest_audio_path:
-            audio_path = newest_audio_path
-        
-        if audio_path and os.path.exists(audio_path):
-            file_size = os.path.getsize(audio_path)
-            app.logger.info(f"Audio file exists for horario_id: {horario_id}, size: {file_size/1024:.2f} KB")
-            
-            # Extraer el nombre del archivo de la ruta
-            file_name = os.path.basename(audio_path)
-            
-            # Determinar la ruta relativa para el frontend
-            if audio_path == newest_audio_path:
-                file_path = f"/static/uploads/audios/permanent/horario_{horario_id}/{file_name}"
-            elif clase and clase.audio_file and clase.audio_file.startswith('horario_'):
-                file_path = f"/static/uploads/audios/permanent/{clase.audio_file}"
-            else:
-                file_path = f"/static/uploads/audios/{file_name}"
-            
+                'message': 'No audio registered' if not clase else 'No audio registered in database'
+            })
+        
+        file_name = os.path.basename(ruta)
+        file_path = url_archivo_audio(ruta)
+        audio_path = os.path.join(upload_base, ruta)
+        if not os.path.exists(audio_path):
+            app.logger.warning(f"Audio file registered but not found on disk for horario_id: {horario_id}")
             return jsonify({
                 'success': True,
-                'has_audio': True,
-                'exists': True,
+                'has_audio': False,
+                'exists': False,
+                'message': 'The file is registered in the database but does not exist on disk',
                 'file_name': file_name,
-                'file_path': file_path,
-                'file_size': file_size,
-                'file_size_readable': f"{file_size/1024:.2f} KB",
-                'clase_id': clase.id if clase else None,
-                'fecha': clase.fecha.strftime('%Y-%m-%d') if clase and clase.fecha else None
+                'clase_id': clase.id if clase else None
             })
-        else:
-            app.logger.warning(f"Audio file registered but not found on disk for horario_id: {horario_id}")
-            
-            # Si tenemos un registro en la BD pero el archivo no existe
-            if clase and clase.audio_file:
-                file_name = os.path.basename(clase.audio_file) if '/' in clase.audio_file or '\\' in clase.audio_file else clase.audio_file
-                return jsonify({
-                    'success': True,
-                    'has_audio': False,
-                    'exists': False,
-                    'message': 'The file is registered in the database but does not exist on disk',
-                    'file_name': file_name,
-                    'clase_id': clase.id
-                })
-            else:
-                return jsonify({
-                    'success': True,
-                    'has_audio': False,
-                    'exists': False,
-                    'message': 'No audio file found on disk'
-                })
+        
+        if file_size is None:
+            file_size = os.path.getsize(audio_path)
+        app.logger.info(f"Audio file exists for horario_id: {horario_id}, size: {file_size/1024:.2f} KB")
+        return jsonify({
+            'success': True,
+            'has_audio': True,
+            'exists': True,
+            'file_name': file_name,
+            'file_path': file_path,
+            'file_size': file_size,
+            'file_size_readable': f"{file_size/1024:.2f} KB",
+            'clase_id': clase.id if clase else None,
+            'fecha': clase.fecha.strftime('%Y-%m-%d') if clase and clase.fecha else None
+        })
     except Exception as e:
         error_msg = str(e)
         app.logger.error(f"Error checking audio for horario_id: {horario_id}: {error_msg}")
@@ -3039,6 +2183,24 @@ def audio_check(horario_id):
             'error_details': error_msg
         }), 500
 
+@app.route('/asistencia/audio/archivo/<path:ruta>')
+def audio_archivo(ruta):
+    """
+    Sirve un audio de la carpeta de subidas con rangos de bytes (206), ETag/Last-Modified (304)
+    y caché de larga duración para los nombres con marca de tiempo (ver utils/envio_audio.py).
+    """
+    ruta_disco = safe_join(app.config.get('UPLOAD_FOLDER', 'static/uploads'), ruta)
+    if ruta_disco is None or not es_audio(ruta):
+        abort(404)
+    # El SHA-256 del índice solo es un validador fiable si el nombre no se reutiliza con otro contenido
+    archivo = ArchivoAudio.query.filter_by(ruta=ruta).first() if es_inmutable(ruta) else None
+    return enviar_audio(ruta_disco, etag=archivo.sha256 if archivo and archivo.sha256 else None)
+
+@app.route('/asistencia/audio/renderizado')
+def audio_renderizado_estado():
+    """Estado del pool de renderizado: trabajos en curso, completados, errores y reinicios por tiempo"""
+    return jsonify(app.extensions['renderizado'].estado())
+
 @app.route('/asistencia/audio/diagnostico')
 def audio_diagnostics():
     """Diagnostics endpoint for audio files"""
@@ -3248,13 +2410,14 @@ def configuracion_notificaciones():
 @app.route('/configuracion/exportar', methods=['GET', 'POST'])
 def configuracion_exportar():
     """Configuración de exportación de base de datos a Excel"""
-    from export_to_excel import export_tables_to_excel
+    from utils.export_to_excel import export_tables_to_excel
     
     # Valores predeterminados
     nivel_proteccion = 'completa'
     directorio = 'backups'
     excel_unificado = True
     excel_individuales = True
+    formato = 'xlsx'
     mensaje_resultado = None
     archivos_exportados = []
     
@@ -3264,6 +2427,10 @@ def configuracion_exportar():
         directorio = request.form.get('directorio', 'backups').strip()
         excel_unificado = 'excel_unificado' in request.form
         excel_individuales = 'excel_individuales' in request.form
+        formato = request.form.get('formato', 'xlsx')
+        if formato != 'xlsx':
+            # CSV y Parquet generan un archivo por tabla (no hay libro unificado)
+            excel_unificado, excel_individuales = False, True
         
         # Validar que al menos una opción de exportación esté seleccionada
         if not excel_unificado and not excel_individuales:
@@ -3277,7 +2444,9 @@ def configuracion_exportar():
                     output_dir=directorio,
                     protection_level=nivel_proteccion,
                     create_unified=excel_unificado,
-                    create_individual=excel_individuales
+                    create_individual=excel_individuales,
+                    file_format=formato,
+                    processes=app.config['EXPORTACION_PROCESOS'] or None
                 )
                 
                 # Preparar mensaje de éxito
@@ -3300,8 +2469,12 @@ def configuracion_exportar():
                           directorio=directorio,
                           excel_unificado=excel_unificado,
                           excel_individuales=excel_individuales,
+                          formato=formato,
                           mensaje_resultado=mensaje_resultado,
-                          archivos_exportados=archivos_exportados)
+                          archivos_exportados=archivos_exportados,
+                          trabajo_id=request.args.get('trabajo'),
+                          instantaneas=listar_instantaneas(os.path.join(app.root_path, 'backups'), limite=10),
+                          manifiestos=listar_manifiestos(app.config['BACKUP_INCREMENTAL_DIRECTORIO'], limite=10))
 
 # Función para asegurar que los directorios de carga existan
 def ensure_upload_dirs():
@@ -3331,6 +2504,52 @@ def ensure_upload_dirs():
         app.logger.error(f"Error checking write permissions: {str(e)}")
         return False
 
+def eliminar_archivo_audio(ruta):
+    """
+    Elimina un archivo de audio junto con su archivo de picos y su registro en el índice.
+    Devuelve True si el audio existía.
+    """
+    existia = os.path.exists(ruta)
+    for archivo in (ruta, ruta_picos(ruta)):
+        if os.path.exists(archivo):
+            os.remove(archivo)
+    ArchivoAudio.eliminar([ruta_indice(app.config.get('UPLOAD_FOLDER', 'static/uploads'), ruta)])
+    return existia
+
+def rutas_audios_clase(clase_id, audio_file=None):
+    """Rutas en disco de los audios de una clase (los del índice y el de su columna audio_file)."""
+    upload_base = app.config.get('UPLOAD_FOLDER', 'static/uploads')
+    rutas = [os.path.join(upload_base, archivo.ruta) for archivo in ArchivoAudio.query.filter_by(clase_id=clase_id)]
+    if audio_file:
+        rutas.append(os.path.join(upload_base, audio_file))
+    return list(dict.fromkeys(rutas))
+
+def eliminar_audios_clase(clase_id, audio_file=None):
+    """Elimina los audios de una clase (antes de borrarla: su id puede volver a asignarse). Devuelve los eliminados."""
+    return [ruta for ruta in rutas_audios_clase(clase_id, audio_file) if eliminar_archivo_audio(ruta)]
+
+def registrar_archivo_audio(ruta, horario_id=None, clase_id=None, temporal=False, duracion=None):
+    """Guarda en el índice de audios un archivo recién subido o movido."""
+    try:
+        return ArchivoAudio.registrar(ruta_indice(app.config.get('UPLOAD_FOLDER', 'static/uploads'), ruta),
+                                      horario_id=horario_id, clase_id=clase_id, temporal=temporal,
+                                      **describir_archivo(ruta, duracion))
+    except Exception as e:
+        app.logger.error(f"Error registering audio file {ruta} in the index: {str(e)}")
+        return None
+
+def url_archivo_audio(ruta):
+    """URL de reproducción (con rangos de bytes y caché) de un audio; ruta relativa a UPLOAD_FOLDER."""
+    return url_for('audio_archivo', ruta=ruta)
+
+def ruta_audio_clase(audio_file):
+    """Ruta relativa a UPLOAD_FOLDER del audio_file de una clase (relativo a audios/permanent o, antes, a audios)."""
+    audio_file = audio_file.replace('\\', '/')
+    if audio_file.startswith('horario_') or '/' in audio_file:
+        return f'audios/permanent/{audio_file}'
+    # Compatibilidad con formato antiguo
+    return f'audios/{audio_file}'
+
 # Función para gestionar archivos de audio
 def get_audio_storage_path(horario_id, filename=None):
     """
@@ -3511,6 +2730,9 @@ def registrar_asistencia_fecha(fecha, horario_id):
             db.session.add(nueva_clase)
             db.session.commit()
             
+            # Actualizar el resumen mensual del profesor
+            MetricaMensualProfesor.actualizar_meses([(profesor_id, fecha_obj)])
+            
             # Limpiar caché de métricas para este profesor
             try:
                 from models import clear_metrics_cache
@@ -3696,6 +2918,7 @@ def registrar_clases_no_registradas():
                 clases_procesadas.append({
                     'fecha': fecha_obj,
                     'horario_id': horario_id,
+                    'profesor_id': profesor_id,
                     'id': nueva_clase.id
                 })
                 
@@ -3714,6 +2937,11 @@ def registrar_clases_no_registradas():
         if clases_registradas > 0:
             flash(f'Se registraron {clases_registradas} clases correctamente', 'success')
             
+            # Actualizar el resumen mensual de todos los meses afectados de una vez
+            MetricaMensualProfesor.actualizar_meses(
+                [(c['profesor_id'], c['fecha']) for c in clases_procesadas]
+            )
+            
             # Limpiar caché para asegurar que las vistas se actualicen
             db.session.close()
             db.session = db.create_scoped_session()
@@ -3762,6 +2990,7 @@ def diagnostico_eliminar_clase(id):
     try:
         # Obtener la clase
         clase = ClaseRealizada.query.get_or_404(id)
+        fecha_clase = clase.fecha
         
         # Información de la clase para mostrar en el resultado
         info_clase = {
@@ -3805,11 +3034,9 @@ def diagnostico_eliminar_clase(id):
         
         # Usar una sesión nueva para evitar problemas con transacciones existentes
         from sqlalchemy.orm import Session
-        from sqlalchemy import create_engine
         
-        # Usar la misma URI de base de datos que la aplicación
-        engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'])
-        session = Session(engine)
+        # Usar el motor de la aplicación (mismo pool y PRAGMA de conexión)
+        session = Session(db.engine)
         
         try:
             # Obtener la clase en esta nueva sesión
@@ -3817,6 +3044,7 @@ def diagnostico_eliminar_clase(id):
             
             if clase_nueva_sesion:
                 # Eliminar la clase
+                ArchivoAudio.quitar_clase([id], session)
                 session.delete(clase_nueva_sesion)
                 session.commit()
                 info_clase['resultado'] = "Clase eliminada exitosamente con el método alternativo"
@@ -3828,6 +3056,7 @@ def diagnostico_eliminar_clase(id):
             
             # Intentar con el método original
             try:
+                ArchivoAudio.quitar_clase([id], db.session)
                 db.session.delete(clase)
                 db.session.commit()
                 info_clase['resultado'] = "Clase eliminada exitosamente con el método original"
@@ -3837,6 +3066,7 @@ def diagnostico_eliminar_clase(id):
                 
                 # Último intento: eliminar directamente con SQL
                 try:
+                    ArchivoAudio.quitar_clase([id], db.session)
                     db.session.execute(f"DELETE FROM clase_realizada WHERE id = {id}")
                     db.session.commit()
                     info_clase['resultado'] = "Clase eliminada exitosamente con SQL directo"
@@ -3847,6 +3077,11 @@ def diagnostico_eliminar_clase(id):
         finally:
             session.close()
         
+        # Actualizar el resumen mensual del profesor y su caché de métricas (el último intento
+        # borra con SQL directo, sin los eventos del ORM que la invalidan)
+        MetricaMensualProfesor.actualizar_meses([(info_clase['profesor_id'], fecha_clase)])
+        cache_metricas.invalidar(info_clase['profesor_id'])
+        
         # Redireccionar o mostrar información
         return jsonify(info_clase)
     except Exception as e:
@@ -3855,29 +3090,41 @@ def diagnostico_eliminar_clase(id):
             'id': id
         }), 500
 
+def tomar_instantanea(destino, compactar=False):
+    """
+    Instantánea consistente de la base de datos en uso (ver utils/instantaneas.py).
+    
+    Args:
+        destino (str): Archivo de la instantánea
+        compactar (bool): Usar VACUUM INTO en lugar de la copia por páginas
+    
+    Returns:
+        dict: Metadatos de la instantánea
+    """
+    metadatos = crear_instantanea(ruta_base_datos(db.engine), destino, compactar=compactar,
+                                  paginas_por_paso=app.config['INSTANTANEA_PAGINAS_POR_PASO'],
+                                  pausa=app.config['INSTANTANEA_PAUSA'])
+    app.logger.info(f"Instantánea {metadatos['archivo']}: {metadatos['tamano']/1024/1024:.2f} MB, "
+                    f"{metadatos['paginas']} páginas, {metadatos['segundos']} s, integridad {metadatos['integridad']}")
+    return metadatos
+
 @app.route('/configuracion/exportar_db', methods=['GET'])
 def exportar_db():
     """Exportar el archivo de la base de datos completo"""
     try:
         # Ruta al archivo de base de datos
-        db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gimnasio.db')
+        db_path = ruta_base_datos(db.engine)
         
         # Verificar que el archivo existe
-        if not os.path.exists(db_path):
+        if not db_path or not os.path.exists(db_path):
             flash('No se encontró el archivo de base de datos', 'danger')
             return redirect(url_for('configuracion_exportar'))
         
-        # Crear una copia temporal para exportar
+        # Instantánea consistente (compacta con ?compactar=1)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         backup_filename = f'gimnasio_backup_{timestamp}.db'
-        temp_path = os.path.join(os.path.dirname(db_path), 'backups', backup_filename)
-        
-        # Asegurar que el directorio existe
-        os.makedirs(os.path.dirname(temp_path), exist_ok=True)
-        
-        # Copiar el archivo (sin bloquear la base de datos)
-        import shutil
-        shutil.copy2(db_path, temp_path)
+        temp_path = os.path.join(app.root_path, 'backups', backup_filename)
+        tomar_instantanea(temp_path, compactar=request.args.get('compactar') == '1')
         
         # Enviar el archivo al cliente
         return send_file(temp_path, 
@@ -3885,233 +3132,272 @@ def exportar_db():
                          download_name=backup_filename,
                          mimetype='application/octet-stream')
     
+    except InstantaneaInvalida as e:
+        app.logger.error(f"Instantánea de la base de datos no válida: {str(e)}")
+        flash(str(e), 'danger')
+        return redirect(url_for('configuracion_exportar'))
+    
     except Exception as e:
         app.logger.error(f"Error exportando la base de datos: {str(e)}")
         flash(f'Error al exportar la base de datos: {str(e)}', 'danger')
         return redirect(url_for('configuracion_exportar'))
 
+def preparar_backup_completo(timestamp):
+    """
+    Instantánea de la base de datos y lista de archivos del backup completo.
+    
+    Args:
+        timestamp (str): Marca de tiempo usada en los nombres de archivo
+    
+    Returns:
+        tuple: (entradas, nombre de la base de datos dentro del ZIP), donde
+        entradas son tuplas (ruta, nombre dentro del ZIP)
+    """
+    db_nombre = f'gimnasio_backup_{timestamp}.db'
+    db_instantanea = os.path.join(app.root_path, 'backups', db_nombre)
+    tomar_instantanea(db_instantanea)
+    
+    upload_base = app.config.get('UPLOAD_FOLDER', 'static/uploads')
+    audio_base_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), upload_base, 'audios')
+    audios = archivos_audio(audio_base_folder)
+    app.logger.info(f"Backup completo: {len(audios)} archivos de audio en {audio_base_folder}")
+    return [(db_instantanea, db_nombre)] + audios, db_nombre
+
+def registrar_resumen_backup(destino, resumen):
+    """Registra en el log y en consola el resumen de un backup completo."""
+    summary = (
+        f"Backup completo creado: {destino}\n"
+        f"- Archivos incluidos en el ZIP: {resumen['archivos']}\n"
+        f"- Tamaño total de los archivos: {resumen['bytes']/1024/1024:.2f} MB\n"
+        f"- Errores durante el proceso: {resumen['errores']}"
+    )
+    app.logger.info("RESUMEN DEL BACKUP:")
+    app.logger.info(summary)
+    print("="*50)
+    print("RESUMEN DEL BACKUP:")
+    print(summary)
+    print("="*50)
+
+def backup_incremental(etiqueta=None, ruta_db=None):
+    """
+    Backup incremental de la base de datos y los audios (ver utils/backup_incremental.py).
+    
+    Args:
+        etiqueta (str): Texto añadido al nombre del manifiesto
+        ruta_db (str): Instantánea ya tomada de la base de datos; si no se indica
+            se toma una y se elimina después de guardarla en el almacén
+    
+    Returns:
+        dict: Manifiesto del backup
+    """
+    directorio = app.config['BACKUP_INCREMENTAL_DIRECTORIO']
+    upload_base = app.config.get('UPLOAD_FOLDER', 'static/uploads')
+    audio_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), upload_base, 'audios')
+    
+    temporal = None
+    metadatos = None
+    if ruta_db is None:
+        temporal = ruta_db = os.path.join(directorio, f'instantanea_{datetime.now().strftime("%Y%m%d_%H%M%S")}.db')
+        metadatos = tomar_instantanea(temporal)
+    try:
+        manifiesto = crear_backup_incremental(directorio, ruta_db, audio_folder, etiqueta=etiqueta,
+                                              metadatos_db=metadatos)
+    finally:
+        if temporal:
+            for ruta in (temporal, temporal + '.json'):
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+    
+    resumen = manifiesto['resumen']
+    app.logger.info(f"Backup incremental {manifiesto['nombre']}: {resumen['archivos']} archivos, "
+                    f"{resumen['nuevos']} nuevos ({resumen['bytes_nuevos']/1024/1024:.2f} MB escritos)")
+    return manifiesto
+
+@app.route('/configuracion/backup_incremental', methods=['POST'])
+def crear_backup_incremental_route():
+    """Crear un backup incremental (solo se guardan los audios nuevos)"""
+    try:
+        manifiesto = backup_incremental()
+        resumen = manifiesto['resumen']
+        flash(f"Backup incremental {manifiesto['nombre']} creado: {resumen['archivos']} archivos, "
+              f"{resumen['nuevos']} nuevos ({resumen['bytes_nuevos']/1024/1024:.2f} MB escritos)", 'success')
+    except InstantaneaInvalida as e:
+        flash(str(e), 'danger')
+    except Exception as e:
+        app.logger.error(f"Error creando el backup incremental: {str(e)}")
+        app.logger.error(traceback.format_exc())
+        flash(f'Error al crear el backup incremental: {str(e)}', 'danger')
+    return redirect(url_for('configuracion_exportar'))
+
 @app.route('/configuracion/exportar_db_completo', methods=['GET'])
 def exportar_db_completo():
-    """Exportar el archivo de la base de datos junto con los archivos de audio"""
+    """Exportar la base de datos junto con los archivos de audio (ZIP generado en streaming)"""
     try:
-        import shutil
-        import zipfile
-        import time
-        import glob
-        
-        # Registrar inicio del proceso
-        app.logger.info("="*80)
         app.logger.info("INICIANDO PROCESO DE BACKUP COMPLETO (DB + AUDIOS)")
-        app.logger.info(f"Fecha/hora: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        app.logger.info("="*80)
-        
-        # Imprimir en consola también para diagnóstico inmediato
-        print("="*80)
         print("INICIANDO PROCESO DE BACKUP COMPLETO (DB + AUDIOS)")
-        print(f"Fecha/hora: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print("="*80)
         
-        # Ruta al archivo de base de datos
-        db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gimnasio.db')
-        
-        # Verificar que el archivo existe
-        if not os.path.exists(db_path):
+        # Verificar que el archivo de base de datos existe
+        db_path = ruta_base_datos(db.engine)
+        if not db_path or not os.path.exists(db_path):
             mensaje = 'No se encontró el archivo de base de datos'
             app.logger.error(mensaje)
-            print(f"ERROR: {mensaje}")
             flash(mensaje, 'danger')
             return redirect(url_for('configuracion_exportar'))
         
-        # Crear una carpeta temporal para la exportación
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        temp_dir = os.path.join(os.path.dirname(db_path), 'backups', f'export_temp_{timestamp}')
-        os.makedirs(temp_dir, exist_ok=True)
-        app.logger.info(f"Directorio temporal de backup creado: {temp_dir}")
-        print(f"Directorio temporal de backup creado: {temp_dir}")
-        
-        # Copiar la base de datos a la carpeta temporal
-        backup_filename = f'gimnasio_backup_{timestamp}.db'
-        temp_db_path = os.path.join(temp_dir, backup_filename)
-        shutil.copy2(db_path, temp_db_path)
-        app.logger.info(f"Base de datos copiada a: {temp_db_path}")
-        print(f"Base de datos copiada a: {temp_db_path}")
-        
-        # Preparar la carpeta principal para los archivos de audio
-        upload_base = app.config.get('UPLOAD_FOLDER', 'static/uploads')
-        audio_base_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), upload_base, 'audios')
-        temp_audio_folder = os.path.join(temp_dir, 'audios')
-        
-        # Crear directorio de audios en la carpeta temporal
-        os.makedirs(temp_audio_folder, exist_ok=True)
-        app.logger.info(f"Directorio temporal para audios creado: {temp_audio_folder}")
-        print(f"Directorio temporal para audios creado: {temp_audio_folder}")
-        
-        # Variable para contar archivos
-        audio_count = 0
-        audio_errors = 0
-        total_size = 0
-        
-        # 1. Copiar audios de la carpeta principal
-        if os.path.exists(audio_base_folder):
-            app.logger.info(f"Copiando audios de la carpeta principal: {audio_base_folder}")
-            print(f"Copiando audios de la carpeta principal: {audio_base_folder}")
-            
-            for audio_file in os.listdir(audio_base_folder):
-                src_path = os.path.join(audio_base_folder, audio_file)
-                if os.path.isfile(src_path):
-                    try:
-                        # Saltar archivos temporales o de sistema
-                        if audio_file.startswith('.') or audio_file == 'permanent':
-                            continue
-                            
-                        dest_path = os.path.join(temp_audio_folder, audio_file)
-                        shutil.copy2(src_path, dest_path)
-                        file_size = os.path.getsize(src_path)
-                        total_size += file_size
-                        audio_count += 1
-                        
-                        app.logger.debug(f"Audio copiado: {audio_file} ({file_size/1024:.2f} KB)")
-                        print(f"Audio copiado: {audio_file} ({file_size/1024:.2f} KB)")
-                    except Exception as e:
-                        error_msg = f"Error al copiar audio {audio_file}: {str(e)}"
-                        app.logger.error(error_msg)
-                        print(f"ERROR: {error_msg}")
-                        audio_errors += 1
-        
-        # 2. Copiar audios de la estructura de carpetas por horario (permanent)
-        permanent_audio_dir = os.path.join(audio_base_folder, 'permanent')
-        if os.path.exists(permanent_audio_dir):
-            app.logger.info(f"Procesando carpeta de audios permanentes: {permanent_audio_dir}")
-            print(f"Procesando carpeta de audios permanentes: {permanent_audio_dir}")
-            
-            # Crear directorio para audios permanentes
-            temp_permanent_dir = os.path.join(temp_audio_folder, 'permanent')
-            os.makedirs(temp_permanent_dir, exist_ok=True)
-            
-            # Obtener todos los directorios de horarios
-            horario_dirs = [d for d in os.listdir(permanent_audio_dir) 
-                           if os.path.isdir(os.path.join(permanent_audio_dir, d))]
-            
-            app.logger.info(f"Se encontraron {len(horario_dirs)} directorios de horarios")
-            print(f"Se encontraron {len(horario_dirs)} directorios de horarios")
-            
-            # Copiar audios de cada directorio de horario
-            for horario_dir in horario_dirs:
-                src_horario_path = os.path.join(permanent_audio_dir, horario_dir)
-                dest_horario_path = os.path.join(temp_permanent_dir, horario_dir)
-                
-                # Crear directorio del horario en el destino
-                os.makedirs(dest_horario_path, exist_ok=True)
-                
-                horario_file_count = 0
-                horario_errors = 0
-                
-                # Copiar cada archivo de audio en el directorio del horario
-                for audio_file in os.listdir(src_horario_path):
-                    src_file_path = os.path.join(src_horario_path, audio_file)
-                    
-                    if os.path.isfile(src_file_path):
-                        try:
-                            dest_file_path = os.path.join(dest_horario_path, audio_file)
-                            shutil.copy2(src_file_path, dest_file_path)
-                            file_size = os.path.getsize(src_file_path)
-                            total_size += file_size
-                            audio_count += 1
-                            horario_file_count += 1
-                            
-                            app.logger.debug(f"Audio {horario_dir}/{audio_file} copiado ({file_size/1024:.2f} KB)")
-                        except Exception as e:
-                            error_msg = f"Error al copiar audio {horario_dir}/{audio_file}: {str(e)}"
-                            app.logger.error(error_msg)
-                            print(f"ERROR: {error_msg}")
-                            audio_errors += 1
-                            horario_errors += 1
-                
-                app.logger.info(f"Horario {horario_dir}: {horario_file_count} archivos copiados, {horario_errors} errores")
-                print(f"Horario {horario_dir}: {horario_file_count} archivos copiados, {horario_errors} errores")
-        
-        # Crear archivo ZIP con todo el contenido
+        entradas, db_nombre = preparar_backup_completo(timestamp)
         zip_filename = f'gimnasio_backup_completo_{timestamp}.zip'
-        zip_path = os.path.join(os.path.dirname(db_path), 'backups', zip_filename)
-        
-        app.logger.info(f"Creando archivo ZIP: {zip_path}")
-        print(f"Creando archivo ZIP: {zip_path}")
-        
-        audio_files_in_zip = 0
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Agregar la base de datos
-            zipf.write(temp_db_path, arcname=backup_filename)
-            
-            # Agregar los archivos de audio
-            for root, _, files in os.walk(temp_audio_folder):
-                for file in files:
-                    try:
-                        file_path = os.path.join(root, file)
-                        # Calcular la ruta relativa dentro del ZIP
-                        rel_path = os.path.relpath(file_path, temp_dir)
-                        zipf.write(file_path, arcname=rel_path)
-                        audio_files_in_zip += 1
-                        app.logger.debug(f"Archivo agregado al ZIP: {rel_path}")
-                    except Exception as e:
-                        error_msg = f"Error al agregar archivo al ZIP {file}: {str(e)}"
-                        app.logger.error(error_msg)
-                        print(f"ERROR: {error_msg}")
-        
-        # Verificar que todos los archivos se agregaron al ZIP
-        zip_verification = zipfile.ZipFile(zip_path, 'r')
-        zip_file_count = len(zip_verification.namelist())
-        zip_verification.close()
-        
-        # Eliminar directorio temporal después de crear el ZIP
-        shutil.rmtree(temp_dir)
-        app.logger.info(f"Directorio temporal eliminado: {temp_dir}")
-        print(f"Directorio temporal eliminado: {temp_dir}")
-        
-        # Calcular tamaño del ZIP
-        zip_size = os.path.getsize(zip_path)
-        
-        # Registrar éxito
-        summary = (
-            f"Backup completo creado: {zip_path}\n"
-            f"- Tamaño del archivo ZIP: {zip_size/1024/1024:.2f} MB\n"
-            f"- Archivos de audio procesados: {audio_count}\n"
-            f"- Tamaño total de audios: {total_size/1024/1024:.2f} MB\n"
-            f"- Archivos incluidos en el ZIP: {zip_file_count}\n"
-            f"- Errores durante el proceso: {audio_errors}"
-        )
-        
-        app.logger.info("="*50)
-        app.logger.info("RESUMEN DEL BACKUP:")
-        app.logger.info(summary)
-        app.logger.info("="*50)
         
-        print("="*50)
-        print("RESUMEN DEL BACKUP:")
-        print(summary)
-        print("="*50)
+        def generar():
+            # El ZIP se construye mientras se envía: sin carpeta temporal ni archivo intermedio
+            resumen = {}
+            yield from generar_zip(entradas, comprimidas=[db_nombre], resumen=resumen)
+            registrar_resumen_backup(zip_filename, resumen)
         
-        # Enviar el archivo ZIP al cliente
-        return send_file(zip_path, 
-                         as_attachment=True, 
-                         download_name=zip_filename,
-                         mimetype='application/zip')
+        return Response(generar(), mimetype='application/zip',
+                        headers={'Content-Disposition': f'attachment; filename={zip_filename}'})
+    
+    except InstantaneaInvalida as e:
+        app.logger.error(f"Instantánea de la base de datos no válida: {str(e)}")
+        flash(str(e), 'danger')
+        return redirect(url_for('configuracion_exportar'))
     
     except Exception as e:
         error_msg = f"Error exportando backup completo: {str(e)}"
         app.logger.error(error_msg)
         app.logger.error(traceback.format_exc())
-        
-        print("="*50)
         print(f"ERROR EN BACKUP: {error_msg}")
-        print(traceback.format_exc())
-        print("="*50)
         
         flash(f'Error al exportar el backup completo: {str(e)}', 'danger')
         return redirect(url_for('configuracion_exportar'))
 
+def migrar_base_restaurada(ruta):
+    """
+    Aplica a una base de datos restaurada, antes de ponerla en uso, las mismas
+    migraciones que se ejecutan al arrancar la aplicación.
+    
+    Returns:
+        dict: Valores corregidos, grupos de clases duplicadas (que se dejan como están) e índices creados
+    """
+    from sqlalchemy import create_engine
+    engine = create_engine(f'sqlite:///{ruta}')
+    try:
+        Profesor.metadata.create_all(bind=engine)
+        normalizacion = normalizar_horas(engine)
+        duplicadas = asegurar_clave_clases(engine)
+        indices = asegurar_indices(engine)
+    finally:
+        engine.dispose()
+    if duplicadas:
+        app.logger.warning(f"La base restaurada tiene {len(duplicadas)} grupos de clases duplicadas; "
+                           f"ejecute `flask depurar-clases-duplicadas` para fusionarlas")
+    return {'corregidos': normalizacion['corregidos'], 'clases_duplicadas': len(duplicadas), 'indices': indices}
+
+@contextlib.contextmanager
+def drenar_conexiones():
+    """
+    Rechaza peticiones nuevas, espera a que terminen las que están en curso y
+    cierra las conexiones (volcando antes el WAL) para intercambiar la base de datos.
+    """
+    propias = 1 if has_request_context() else 0
+    with control_accesos.drenar(propias=propias, espera=app.config['RESTAURACION_ESPERA_DRENAJE']):
+        db.session.execute(db.text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        db.session.remove()
+        TrabajoImportacion.query.session.close()
+        db.engine.dispose()
+        yield
+
+def respaldo_previo_restauracion():
+    """
+    Instantánea de la base actual y backup incremental de los audios antes de restaurar.
+    
+    Returns:
+        tuple: (ruta de la instantánea, manifiesto incremental)
+    """
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    backup_path = os.path.join(app.root_path, 'backups', f'gimnasio_antes_importar_{timestamp}.db')
+    tomar_instantanea(backup_path)
+    manifiesto = backup_incremental(etiqueta='antes_importar', ruta_db=backup_path)
+    app.logger.info(f"Respaldo previo a la restauración: {backup_path}, manifiesto {manifiesto['nombre']} "
+                    f"({len(manifiesto['archivos'])} audios)")
+    return backup_path, manifiesto
+
+def finalizar_restauracion(informe, respaldo=None):
+    """Registra el informe y, si se restauró, recalcula el resumen mensual y el índice de audios."""
+    mensaje = resumir_informe(informe)
+    if not informe['simulacion']:
+        # La base de datos restaurada puede no tener el resumen mensual o tenerlo desactualizado
+        MetricaMensualProfesor.reconstruir()
+        cache_metricas.invalidar()
+        # El índice de audios de la base restaurada (vacío en backups anteriores al índice) se
+        # ajusta a los audios que hay ahora en disco, restaurados o conservados
+        try:
+            indexados = ArchivoAudio.reconciliar(app.config.get('UPLOAD_FOLDER', 'static/uploads'))
+            mensaje += (f" Índice de audios: {indexados['nuevos']} nuevos, {indexados['eliminados']} eliminados, "
+                        f"{indexados['vinculados']} vinculados a clases.")
+        except Exception as e:
+            app.logger.error(f"Error al reconciliar el índice de audios tras restaurar: {str(e)}")
+        backup_path, manifiesto = respaldo
+        mensaje += (f" Copia de la base anterior en {os.path.basename(backup_path)} y de los audios "
+                    f"en el backup incremental {manifiesto['nombre']}.")
+    app.logger.info(f"RESULTADO DE LA RESTAURACIÓN: {mensaje}")
+    print(f"RESULTADO DE LA RESTAURACIÓN: {mensaje}")
+    return mensaje
+
+def restaurar_backup_completo(zip_path, progreso, simular=False):
+    """
+    Trabajo de restauración de un backup completo (base de datos y audios),
+    ejecutado en segundo plano (ver utils/trabajos_importacion.py y utils/restauracion.py).
+    
+    Args:
+        zip_path (str): Archivo ZIP subido
+        progreso (callable): Recibe los contadores de archivos extraídos
+        simular (bool): Solo comprobar el backup e informar de lo que cambiaría
+    
+    Returns:
+        dict: Contadores de archivos y mensaje de resumen
+    
+    Raises:
+        RestauracionInvalida: Si el ZIP no es válido, no supera las sumas de
+            comprobación o su base de datos no es íntegra (no se modifica nada)
+    """
+    app.logger.info(f"{'SIMULACIÓN DE ' if simular else ''}RESTAURACIÓN DE BACKUP COMPLETO: {zip_path}")
+    print(f"{'SIMULACIÓN DE ' if simular else ''}RESTAURACIÓN DE BACKUP COMPLETO: {zip_path}")
+    
+    upload_base = app.config.get('UPLOAD_FOLDER', 'static/uploads')
+    audio_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), upload_base, 'audios')
+    respaldo = None if simular else respaldo_previo_restauracion()
+    
+    informe = restaurar_zip(zip_path, ruta_base_datos(db.engine), audio_folder, migrar=migrar_base_restaurada,
+                            drenar=drenar_conexiones, simular=simular, progreso=progreso)
+    return {
+        'leidas': informe['archivos'],
+        'procesados': informe['archivos'],
+        'errores': 0,
+        'mensaje': finalizar_restauracion(informe, respaldo)
+    }
+
+def restaurar_archivo_db(ruta, progreso, simular=False):
+    """
+    Trabajo de restauración de un archivo .db (los audios no cambian).
+    
+    Args:
+        ruta (str): Archivo .db subido
+        progreso (callable): No se usa (la base se prepara en un solo paso)
+        simular (bool): Solo comprobar el archivo e informar de lo que cambiaría
+    
+    Returns:
+        dict: Contadores y mensaje de resumen
+    """
+    respaldo = None if simular else respaldo_previo_restauracion()
+    informe = restaurar_base_datos(ruta, ruta_base_datos(db.engine), migrar=migrar_base_restaurada,
+                                   drenar=drenar_conexiones, simular=simular)
+    return {'total': 1, 'leidas': 1, 'procesados': 1, 'errores': 0,
+            'mensaje': finalizar_restauracion(informe, respaldo)}
+
 @app.route('/configuracion/importar_db_completo', methods=['POST'])
 def importar_db_completo():
-    """Importar un archivo ZIP con la base de datos y archivos de audio"""
+    """Encola la importación de un archivo ZIP con la base de datos y archivos de audio"""
     if 'zip_file' not in request.files:
         flash('No se seleccionó ningún archivo', 'danger')
         return redirect(url_for('configuracion_exportar'))
@@ -4127,200 +3413,11 @@ def importar_db_completo():
         return redirect(url_for('configuracion_exportar'))
     
     try:
-        import zipfile
-        import tempfile
-        import shutil
-        import glob
-        
-        # Registrar inicio del proceso
-        app.logger.info("="*80)
-        app.logger.info("INICIANDO PROCESO DE IMPORTACIÓN DE BACKUP COMPLETO (DB + AUDIOS)")
-        app.logger.info(f"Fecha/hora: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        app.logger.info(f"Archivo ZIP: {zip_file.filename}")
-        app.logger.info("="*80)
-        
-        # Imprimir en consola también
-        print("="*80)
-        print("INICIANDO PROCESO DE IMPORTACIÓN DE BACKUP COMPLETO (DB + AUDIOS)")
-        print(f"Fecha/hora: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"Archivo ZIP: {zip_file.filename}")
-        print("="*80)
-        
-        # Crear directorio temporal para descomprimir
-        with tempfile.TemporaryDirectory() as temp_dir:
-            app.logger.info(f"Directorio temporal creado: {temp_dir}")
-            print(f"Directorio temporal creado: {temp_dir}")
-            
-            zip_path = os.path.join(temp_dir, 'backup.zip')
-            zip_file.save(zip_path)
-            
-            # Verificar el contenido del ZIP antes de descomprimirlo
-            try:
-                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    zip_contents = zip_ref.namelist()
-                    db_files = [f for f in zip_contents if f.endswith('.db')]
-                    app.logger.info(f"Contenido del ZIP: {len(zip_contents)} archivos, {len(db_files)} bases de datos")
-                    print(f"Contenido del ZIP: {len(zip_contents)} archivos, {len(db_files)} bases de datos")
-                    
-                    if not db_files:
-                        error_msg = "El archivo ZIP no contiene una base de datos válida"
-                        app.logger.error(error_msg)
-                        print(f"ERROR: {error_msg}")
-                        flash(error_msg, 'danger')
-                        return redirect(url_for('configuracion_exportar'))
-                    
-                    # Extraer contenido del ZIP
-                    app.logger.info("Extrayendo archivos del ZIP...")
-                    print("Extrayendo archivos del ZIP...")
-                    zip_ref.extractall(temp_dir)
-            except zipfile.BadZipFile:
-                error_msg = "El archivo no es un ZIP válido o está corrupto"
-                app.logger.error(error_msg)
-                print(f"ERROR: {error_msg}")
-                flash(error_msg, 'danger')
-                return redirect(url_for('configuracion_exportar'))
-            
-            # Buscar el archivo .db en el directorio temporal
-            db_file = None
-            for file in db_files:
-                db_file = os.path.join(temp_dir, file)
-                if os.path.exists(db_file):
-                    break
-            
-            if not db_file or not os.path.exists(db_file):
-                error_msg = "No se pudo encontrar la base de datos en el archivo ZIP"
-                app.logger.error(error_msg)
-                print(f"ERROR: {error_msg}")
-                flash(error_msg, 'danger')
-                return redirect(url_for('configuracion_exportar'))
-            
-            app.logger.info(f"Base de datos encontrada: {db_file}")
-            print(f"Base de datos encontrada: {db_file}")
-            
-            # Ruta al archivo de base de datos original
-            db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gimnasio.db')
-            
-            # Crear una copia de seguridad antes de reemplazar
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_path = os.path.join(os.path.dirname(db_path), 'backups', f'gimnasio_antes_importar_{timestamp}.db')
-            os.makedirs(os.path.dirname(backup_path), exist_ok=True)
-            
-            # Hacer copia de seguridad de la DB actual
-            shutil.copy2(db_path, backup_path)
-            app.logger.info(f"Backup de la base de datos actual creado: {backup_path}")
-            print(f"Backup de la base de datos actual creado: {backup_path}")
-            
-            # Hacer copia de seguridad de los audios actuales
-            upload_base = app.config.get('UPLOAD_FOLDER', 'static/uploads')
-            audio_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), upload_base, 'audios')
-            audio_backup_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backups', f'audios_backup_{timestamp}')
-            
-            audio_backup_count = 0
-            if os.path.exists(audio_folder):
-                app.logger.info(f"Realizando backup de los audios actuales: {audio_folder} -> {audio_backup_folder}")
-                print(f"Realizando backup de los audios actuales: {audio_folder} -> {audio_backup_folder}")
-                
-                # Hacer una copia de seguridad completa de la carpeta de audios
-                shutil.copytree(audio_folder, audio_backup_folder, dirs_exist_ok=True)
-                
-                # Contar archivos respaldados
-                audio_backup_count = sum(
-                    len(files) for _, _, files in os.walk(audio_backup_folder)
-                )
-                
-                app.logger.info(f"Se han respaldado {audio_backup_count} archivos de audio en {audio_backup_folder}")
-                print(f"Se han respaldado {audio_backup_count} archivos de audio en {audio_backup_folder}")
-            
-            # Cerrar la conexión actual a la base de datos
-            app.logger.info("Cerrando la conexión actual a la base de datos...")
-            print("Cerrando la conexión actual a la base de datos...")
-            db.session.remove()
-            
-            # Reemplazar la base de datos
-            app.logger.info(f"Reemplazando base de datos: {db_file} -> {db_path}")
-            print(f"Reemplazando base de datos: {db_file} -> {db_path}")
-            shutil.copy2(db_file, db_path)
-            
-            # Verificar si el ZIP incluye archivos de audio
-            extracted_audio_folder = os.path.join(temp_dir, 'audios')
-            
-            audio_restored_count = 0
-            audio_errors = 0
-            
-            if os.path.exists(extracted_audio_folder):
-                app.logger.info(f"Restaurando archivos de audio: {extracted_audio_folder} -> {audio_folder}")
-                print(f"Restaurando archivos de audio: {extracted_audio_folder} -> {audio_folder}")
-                
-                # Asegurar que el directorio de audio existe
-                os.makedirs(audio_folder, exist_ok=True)
-                
-                # Restaurar la estructura completa de archivos de audio
-                for root, dirs, files in os.walk(extracted_audio_folder):
-                    # Calcular la ruta relativa
-                    rel_path = os.path.relpath(root, extracted_audio_folder)
-                    
-                    # Crear la estructura de directorios en el destino
-                    if rel_path != '.':
-                        target_dir = os.path.join(audio_folder, rel_path)
-                        os.makedirs(target_dir, exist_ok=True)
-                        app.logger.debug(f"Creado directorio: {target_dir}")
-                    
-                    # Copiar cada archivo
-                    for file in files:
-                        try:
-                            src_file = os.path.join(root, file)
-                            
-                            # Determinar la ruta de destino
-                            if rel_path == '.':
-                                # Archivo en la raíz de audios
-                                dest_file = os.path.join(audio_folder, file)
-                            else:
-                                # Archivo en subdirectorio
-                                dest_file = os.path.join(audio_folder, rel_path, file)
-                            
-                            # Copiar el archivo
-                            shutil.copy2(src_file, dest_file)
-                            audio_restored_count += 1
-                            
-                            if audio_restored_count % 50 == 0:
-                                app.logger.info(f"Restaurados {audio_restored_count} archivos hasta ahora...")
-                                print(f"Restaurados {audio_restored_count} archivos hasta ahora...")
-                            
-                        except Exception as e:
-                            error_msg = f"Error al restaurar audio {rel_path}/{file}: {str(e)}"
-                            app.logger.error(error_msg)
-                            print(f"ERROR: {error_msg}")
-                            audio_errors += 1
-                
-                app.logger.info(f"Se han restaurado {audio_restored_count} archivos de audio desde el backup")
-                print(f"Se han restaurado {audio_restored_count} archivos de audio desde el backup")
-                
-                if audio_errors > 0:
-                    app.logger.warning(f"Hubo {audio_errors} errores durante la restauración de audios")
-                    print(f"ADVERTENCIA: Hubo {audio_errors} errores durante la restauración de audios")
-        
-        # Registrar resumen del proceso
-        summary = (
-            f"Backup completo importado exitosamente.\n"
-            f"- Base de datos respaldada en: {backup_path}\n"
-            f"- Respaldo de {audio_backup_count} archivos de audio en: {audio_backup_folder}\n"
-            f"- {audio_restored_count} archivos de audio restaurados\n"
-            f"- {audio_errors} errores durante la restauración"
-        )
-        
-        app.logger.info("="*50)
-        app.logger.info("RESUMEN DE LA IMPORTACIÓN:")
-        app.logger.info(summary)
-        app.logger.info("="*50)
-        
-        print("="*50)
-        print("RESUMEN DE LA IMPORTACIÓN:")
-        print(summary)
-        print("="*50)
-        
-        flash('Backup completo importado exitosamente. Se ha creado una copia de seguridad de la base de datos y archivos de audio anteriores.', 'success')
-        
-        return redirect(url_for('configuracion_exportar'))
+        simular = 'simular' in request.form
+        trabajo_id = encolar_importacion(app, 'backup_completo', zip_file, restaurar_backup_completo, simular=simular)
+        flash('Comprobación del backup en curso.' if simular else
+              'Importación del backup en curso. El progreso se muestra en esta página.', 'info')
+        return redirect(url_for('configuracion_exportar', trabajo=trabajo_id))
     
     except Exception as e:
         error_msg = f"Error importando backup completo: {str(e)}"
@@ -4490,12 +3587,15 @@ def depurar_asistencia_base_datos():
                 horario_id=horario_id
             ).order_by(ClaseRealizada.id).all()
             
-            # Mantener la primera clase y eliminar las demás
+            # Mantener la primera clase y eliminar las demás (sus audios pasan a la conservada)
+            ArchivoAudio.quitar_clase([clase.id for clase in clases[1:]], db.session, reemplazo=clases[0].id)
             for clase in clases[1:]:
                 db.session.delete(clase)
                 clases_eliminadas += 1
                 
         db.session.commit()
+        MetricaMensualProfesor.reconstruir()
+        cache_metricas.invalidar()
         flash(f'Se eliminaron {clases_eliminadas} clases duplicadas', 'success')
         
         # Forzar un reinicio de la sesión para limpiar la caché
@@ -4563,7 +3663,8 @@ def depurar_base_datos():
                 
                 for id_eliminar in ids_eliminar:
                     try:
-                        # Eliminar directo con SQL para evitar restricciones
+                        # Eliminar directo con SQL para evitar restricciones (sus audios pasan a la conservada)
+                        ArchivoAudio.quitar_clase([id_eliminar], db.session, reemplazo=id_mantener)
                         db.session.execute(f"DELETE FROM clase_realizada WHERE id = {id_eliminar}")
                         resultados['mensajes'].append(f"Eliminada clase duplicada ID {id_eliminar}")
                     except Exception as e:
@@ -4589,6 +3690,7 @@ def depurar_base_datos():
             for h in huerfanas:
                 try:
                     # Intentar recuperar eliminando solo la clase problemática
+                    ArchivoAudio.quitar_clase([h.id], db.session)
                     db.session.execute(f"DELETE FROM clase_realizada WHERE id = {h.id}")
                     resultados['mensajes'].append(f"Eliminada clase huérfana ID {h.id} (fecha: {h.fecha}, horario_id inválido: {h.horario_id})")
                 except Exception as e:
@@ -4633,6 +3735,11 @@ def depurar_base_datos():
         except Exception as e:
             resultados['mensajes'].append(f"Error al compactar la base de datos: {str(e)}")
         
+        # Recalcular el resumen mensual tras eliminar duplicados y huérfanos; el SQL directo
+        # no pasa por los eventos de los modelos, así que la caché de métricas se invalida aquí
+        MetricaMensualProfesor.reconstruir()
+        cache_metricas.invalidar()
+        
         flash('Depuración de base de datos completada con éxito', 'success')
         
     except Exception as e:
@@ -4652,7 +3759,7 @@ def test_debug_root():
 
 @app.route('/configuracion/importar_db', methods=['POST'])
 def importar_db():
-    """Importar un archivo de base de datos"""
+    """Encola la restauración de un archivo de base de datos"""
     if 'db_file' not in request.files:
         flash('No se seleccionó ningún archivo', 'danger')
         return redirect(url_for('configuracion_exportar'))
@@ -4668,66 +3775,11 @@ def importar_db():
         return redirect(url_for('configuracion_exportar'))
     
     try:
-        # Ruta al archivo de base de datos original
-        db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gimnasio.db')
-        
-        # Crear una copia de seguridad antes de reemplazar
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_path = os.path.join(os.path.dirname(db_path), 'backups', f'gimnasio_antes_importar_{timestamp}.db')
-        
-        # Asegurar que el directorio existe
-        os.makedirs(os.path.dirname(backup_path), exist_ok=True)
-        
-        # Copiar el archivo original como respaldo
-        import shutil
-        shutil.copy2(db_path, backup_path)
-        
-        # Hacer una copia de seguridad de los archivos de audio existentes
-        audio_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads', 'audios')
-        audio_backup_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backups', f'audios_backup_{timestamp}')
-        
-        # Verificar si hay archivos de audio para respaldar
-        existing_audio_files = []
-        if os.path.exists(audio_folder):
-            # Crear directorio de respaldo de audios
-            os.makedirs(audio_backup_folder, exist_ok=True)
-            
-            # Guardar lista de archivos existentes y copiarlos al respaldo
-            existing_audio_files = os.listdir(audio_folder)
-            for audio_file in existing_audio_files:
-                if os.path.isfile(os.path.join(audio_folder, audio_file)):
-                    shutil.copy2(
-                        os.path.join(audio_folder, audio_file),
-                        os.path.join(audio_backup_folder, audio_file)
-                    )
-            
-            app.logger.info(f"Se han respaldado {len(existing_audio_files)} archivos de audio en {audio_backup_folder}")
-        
-        # Cerrar la conexión actual a la base de datos antes de reemplazarla
-        db.session.remove()
-        
-        # Guardar el archivo subido como el nuevo archivo de base de datos
-        db_file.save(db_path)
-        
-        # Restaurar los archivos de audio para que no se pierdan durante la importación
-        os.makedirs(audio_folder, exist_ok=True)
-        for audio_file in existing_audio_files:
-            # Verificar si el archivo ya existe en el destino
-            if not os.path.exists(os.path.join(audio_folder, audio_file)):
-                # Copiar desde el respaldo si no existe
-                shutil.copy2(
-                    os.path.join(audio_backup_folder, audio_file),
-                    os.path.join(audio_folder, audio_file)
-                )
-        
-        # Registrar el éxito
-        app.logger.info(f"Base de datos importada exitosamente. Respaldo guardado en {backup_path}")
-        app.logger.info(f"Archivos de audio preservados en la importación. Respaldo en {audio_backup_folder}")
-        flash('Base de datos importada exitosamente. Se ha creado una copia de seguridad de la base de datos anterior y se han preservado los archivos de audio.', 'success')
-        
-        # Reiniciar la aplicación (esto no funciona en todas las configuraciones)
-        # En producción, esto debería mostrar instrucciones para reiniciar manualmente
-        return redirect(url_for('configuracion_exportar'))
+        simular = 'simular' in request.form
+        trabajo_id = encolar_importacion(app, 'base_datos', db_file, restaurar_archivo_db, simular=simular)
+        flash('Comprobación de la base de datos en curso.' if simular else
+              'Importación de la base de datos en curso. El resultado se muestra en esta página.', 'info')
+        return redirect(url_for('configuracion_exportar', trabajo=trabajo_id))
     
     except Exception as e:
         app.logger.error(f"Error importando la base de datos: {str(e)}")
@@ -4747,99 +3799,55 @@ def reporte_mensual(mes, anio):
     primer_dia = date(anio, mes, 1)
     ultimo_dia = date(anio, mes, calendar.monthrange(anio, mes)[1])
     
-    # Consultar horarios activos
-    try:
-        # Intentar usar el filtro activo
-        sql_horarios_activos = """
-        SELECT hc.id, hc.nombre, hc.hora_inicio, hc.duracion, p.nombre
-        FROM horario_clase hc
-        LEFT JOIN profesor p ON hc.profesor_id = p.id
-        WHERE hc.activo = 1 AND hc.id NOT IN (
-            SELECT horario_id FROM clase_realizada 
-            WHERE fecha >= :fecha_inicio AND fecha <= :fecha_fin
-        )
-        """
-    except Exception as e:
-        # Si falla, es posible que la columna activo no exista
-        app.logger.warning(f"Error al consultar con filtro activo en reporte_mensual: {str(e)}. Usando consulta sin filtro.")
-        sql_horarios_activos = """
-        SELECT hc.id, hc.nombre, hc.hora_inicio, hc.duracion, p.nombre
-        FROM horario_clase hc
-        LEFT JOIN profesor p ON hc.profesor_id = p.id
-        WHERE hc.id NOT IN (
-            SELECT horario_id FROM clase_realizada 
-            WHERE fecha >= :fecha_inicio AND fecha <= :fecha_fin
-        )
-        """
-    
     # Consultar clases completadas
     sql_clases_completadas = """
-    SELECT hc.id, hc.nombre, hc.hora_inicio, hc.duracion, p.nombre
+    SELECT hc.id, hc.nombre, hc.hora_inicio_min, hc.duracion, p.nombre
     FROM clase_realizada cr
     JOIN horario_clase hc ON cr.horario_id = hc.id
     LEFT JOIN profesor p ON cr.profesor_id = p.id
     WHERE cr.fecha >= :fecha_inicio AND cr.fecha <= :fecha_fin
     """
     
-    # Ejecutar consultas
-    schedules_active = db.session.execute(sql_horarios_activos, {
-        'fecha_inicio': primer_dia, 
-        'fecha_fin': ultimo_dia
-    }).fetchall()
-    
     schedules_completed = db.session.execute(sql_clases_completadas, {
         'fecha_inicio': primer_dia, 
         'fecha_fin': ultimo_dia
     }).fetchall()
     
-    # Resto del código para procesar los horarios...
+    # Horarios con clases esperadas en el mes (respetando activo/fecha_desactivacion)
+    # que no tienen ningún registro en el periodo
+    horarios = cargar_horarios()
+    profesores = cargar_profesores()
+    clases_no_registradas = calcular_clases_no_registradas(primer_dia, ultimo_dia,
+                                                           horarios=horarios,
+                                                           profesores=profesores)
+    horarios_con_registro = {row[0] for row in schedules_completed}
+    
     horarios_procesados = []
     
-    for row in schedules_active:
-        clase_id = row[0]
-        nombre_clase = row[1]
-        hora_inicio_str = row[2]
-        duracion_clase = row[3]
-        nombre_instructor = row[4] if row[4] else "No asignado"
-        realizada = False  # Al ser activa, no ha sido realizada
-
-        # Manejo adecuado cuando hora_inicio es None o inválido
-        if hora_inicio_str:
-            try:
-                hora_inicio = datetime.strptime(hora_inicio_str, '%H:%M:%S').time() if hora_inicio_str else None
-                hora_inicio_str = hora_inicio_str.split(':')[0] + ':' + hora_inicio_str.split(':')[1] if hora_inicio else "N/A"
-                hora_fin_str = calcular_hora_fin(hora_inicio_str, duracion_clase)
-                horario_str = f"{hora_inicio_str} - {hora_fin_str}" if hora_inicio_str != "N/A" else "Horario no disponible"
-            except (ValueError, IndexError):
-                horario_str = "Horario no disponible"
-        else:
-            horario_str = "Horario no disponible"
-            
+    for horario_id in agrupar_por_horario(clases_no_registradas):
+        if horario_id in horarios_con_registro:
+            continue
+        horario = horarios[horario_id]
+        profesor = profesores.get(horario['profesor_id'])
+        
         horarios_procesados.append({
-            'id': clase_id,
-            'nombre': nombre_clase,
-            'horario': horario_str,
-            'instructor': nombre_instructor,
-            'realizada': realizada
+            'id': horario_id,
+            'nombre': horario['nombre'],
+            'horario': f"{horario['hora_inicio']} - {horario['hora_fin_str']}",
+            'instructor': profesor['nombre'] if profesor else "No asignado",
+            'realizada': False  # Sin ningún registro en el mes
         })
     
     for row in schedules_completed:
         clase_id = row[0]
         nombre_clase = row[1]
-        hora_inicio_str = row[2]
-        duracion_clase = row[3]
+        hora_inicio = hora_desde_minutos(row[2])
+        duracion_clase = row[3] or 60
         nombre_instructor = row[4] if row[4] else "No asignado"
         realizada = True  # Ya fue realizada
 
-        # Manejo adecuado cuando hora_inicio es None o inválido
-        if hora_inicio_str:
-            try:
-                hora_inicio = datetime.strptime(hora_inicio_str, '%H:%M:%S').time() if hora_inicio_str else None
-                hora_inicio_str = hora_inicio_str.split(':')[0] + ':' + hora_inicio_str.split(':')[1] if hora_inicio else "N/A"
-                hora_fin_str = calcular_hora_fin(hora_inicio_str, duracion_clase)
-                horario_str = f"{hora_inicio_str} - {hora_fin_str}" if hora_inicio_str != "N/A" else "Horario no disponible"
-            except (ValueError, IndexError):
-                horario_str = "Horario no disponible"
+        if hora_inicio:
+            horario_str = f"{hora_inicio.strftime('%H:%M')} - {calcular_hora_fin(hora_inicio, duracion_clase)}"
         else:
             horario_str = "Horario no disponible"
             
@@ -4882,41 +3890,6 @@ def format_hora(hora):
     # Si todo falla, devolver el valor original
     return hora
 
-def convertir_hora_con_microsegundos(valor_hora):
-    """
-    Convierte una hora en formato string a objeto time, manejando varios formatos incluyendo los que tienen microsegundos.
-    
-    Args:
-        valor_hora: El valor de hora a convertir (string o time)
-        
-    Returns:
-        Objeto time o None si no se puede convertir
-    """
-    if valor_hora is None:
-        return None
-        
-    # Si ya es un objeto time, devolverlo directamente
-    if isinstance(valor_hora, time):
-        return valor_hora
-        
-    # Si es string, intentar convertir
-    if isinstance(valor_hora, str):
-        # Eliminar parte de microsegundos si existe
-        if '.' in valor_hora:
-            valor_hora = valor_hora.split('.')[0]
-            
-        # Intentar varios formatos
-        for formato in ['%H:%M:%S', '%H:%M']:
-            try:
-                return datetime.strptime(valor_hora, formato).time()
-            except ValueError:
-                continue
-                
-    # Si todas las conversiones fallan
-    # Registrar en el log pero no imprimir en consola
-    app.logger.error(f"No se pudo convertir {valor_hora} a objeto time")
-    return None
-
 @app.route('/informes/profesor/<int:profesor_id>/metricas')
 def metricas_profesor(profesor_id):
     """Mostrar métricas detalladas de un profesor específico"""
@@ -4953,11 +3926,11 @@ def metricas_profesor(profesor_id):
         # Obtener parámetros de filtro opcional
         tipo_clase = request.args.get('tipo_clase', default=None)
         
-        # Obtener todas las clases del profesor
-        clases = profesor.obtener_todas_clases()
-        
-        # Obtener datos de meses disponibles para los selectores
-        meses_disponibles = obtener_meses_disponibles(clases)
+        # Meses disponibles, evolución mensual y totales leídos del resumen precalculado
+        from utils.metricas_profesores import calcular_tendencia_desde_resumen, calcular_totales_desde_resumen
+        meses_resumen = MetricaMensualProfesor.obtener_meses(profesor_id=profesor.id)
+        meses_disponibles = obtener_meses_disponibles(meses_resumen)
+        datos_mensuales = calcular_tendencia_desde_resumen(meses_resumen)['datos_mensuales']
         
         # Variables comunes
         mes_actual = None
@@ -5007,9 +3980,11 @@ def metricas_profesor(profesor_id):
                 # Siempre usar los meses específicos en modo comparación, incluso en métricas totales
                 metricas = calcular_metricas_profesor(
                     profesor_id=profesor.id,
-                    clases=clases,
+                    clases=profesor.obtener_todas_clases(),
                     mes_actual=mes_actual,
-                    mes_comparacion=mes_comparacion
+                    mes_comparacion=mes_comparacion,
+                    datos_mensuales=datos_mensuales,
+                    totales=calcular_totales_desde_resumen(meses_resumen)
                 )
                 
                 # Manejar errores de validación
@@ -5050,13 +4025,16 @@ def metricas_profesor(profesor_id):
                     mes_actual = (mes_mas_reciente['anio'], mes_mas_reciente['mes'])
                     mes_actual_nombre = mes_mas_reciente['etiqueta']
             
-            # Calcular métricas según el tipo seleccionado
+            # Calcular métricas según el tipo seleccionado (en la vista mensual solo se
+            # cargan las clases de ese mes)
             from utils.metricas_profesores import calcular_metricas_profesor
             metricas = calcular_metricas_profesor(
                 profesor_id=profesor.id,
-                clases=clases,
+                clases=profesor.obtener_clases_mes(*mes_actual) if mes_actual else profesor.obtener_todas_clases(),
                 mes_actual=mes_actual,
-                mes_comparacion=None  # No hay comparación en este modo
+                mes_comparacion=None,  # No hay comparación en este modo
+                datos_mensuales=datos_mensuales,
+                totales=calcular_totales_desde_resumen(meses_resumen, mes_actual)
             )
         
         # Obtener tipos de clase para filtros en la UI
@@ -5093,12 +4071,12 @@ def metricas_profesor(profesor_id):
         return redirect(url_for('informe_mensual'))
 
 
-def obtener_meses_disponibles(clases):
+def obtener_meses_disponibles(meses_resumen):
     """
     Obtiene una lista de meses disponibles para los que hay datos.
     
     Args:
-        clases (list): Lista de objetos ClaseRealizada
+        meses_resumen (list): Meses del resumen precalculado (MetricaMensualProfesor.obtener_meses)
         
     Returns:
         list: Lista de diccionarios con años y meses disponibles
@@ -5110,20 +4088,21 @@ def obtener_meses_disponibles(clases):
         9: 'Septiembre', 10: 'Octubre', 11: 'Noviembre', 12: 'Diciembre'
     }
     
-    if not clases:
+    if not meses_resumen:
         return []
     
-    # Agrupar por mes
+    # Un elemento por mes con clases
     meses = {}
-    for clase in clases:
-        clave = f"{clase.fecha.year}-{clase.fecha.month:02d}"
-        if clave not in meses:
-            meses[clave] = {
-                'valor': clave,
-                'etiqueta': f"{MESES_ES[clase.fecha.month]} {clase.fecha.year}",
-                'anio': clase.fecha.year,
-                'mes': clase.fecha.month
-            }
+    for datos in meses_resumen:
+        if not datos['total_clases']:
+            continue
+        clave = f"{datos['anio']}-{datos['mes']:02d}"
+        meses[clave] = {
+            'valor': clave,
+            'etiqueta': f"{MESES_ES[datos['mes']]} {datos['anio']}",
+            'anio': datos['anio'],
+            'mes': datos['mes']
+        }
     
     # Ordenar por fecha (más reciente primero)
     return sorted(list(meses.values()), key=lambda x: f"{x['anio']}-{x['mes']:02d}", reverse=True)
@@ -5134,10 +4113,10 @@ def fix_problematic_dates():
     Función de mantenimiento para corregir formatos de fecha problemáticos
     en la base de datos.
     """
+    conn = None
     try:
-        # Obtener conexión directa a SQLite
-        import sqlite3
-        conn = sqlite3.connect('gimnasio.db')
+        # Conexión sqlite3 directa tomada del pool de la aplicación
+        conn = db.engine.raw_connection()
         cursor = conn.cursor()
         
         # Corregir la fecha problemática específica
@@ -5209,8 +4188,6 @@ def fix_problematic_dates():
         cursor.execute("SELECT COUNT(*) FROM evento_horario WHERE fecha LIKE '%.%'")
         remaining_ms = cursor.fetchone()[0]
         
-        conn.close()
-        
         return render_template(
             'mantenimiento/resultado.html',
             titulo="Corrección de fechas",
@@ -5225,4 +4202,8 @@ def fix_problematic_dates():
             titulo="Error en corrección de fechas",
             mensaje=f"Ocurrió un error: {str(e)}",
             detalles=f"No se pudieron corregir las fechas problemáticas."
-        )
\ No newline at end of file
+        )
+    finally:
+        # Devolver la conexión al pool también si hubo un error
+        if conn is not None:
+            conn.close()
\ No newline at end of file
@@ -1,11 +1,14 @@
-from flask import Blueprint, request, jsonify, current_app, send_file
+from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
 import os
 import time
 from datetime import datetime
 import logging
 # Importar desde models, no desde app
-from models import db, ClaseRealizada
+from models import db, ClaseRealizada, ArchivoAudio
+from utils.picos_audio import generar_picos
+from utils.indice_audio import describir_archivo
+from utils.envio_audio import enviar_audio
 
 # Crear blueprint para todas las funcionalidades de audio
 audio_bp = Blueprint('audio', __name__, url_prefix='/asistencia/audio')
@@ -83,9 +86,23 @@ def upload_audio(horario_id):
             audio_file.save(save_path)
             current_app.logger.info(f"Archivo guardado exitosamente: {save_path}")
             
+            # Calcular una sola vez los picos de la forma de onda
+            duracion = None
+            try:
+                duracion = generar_picos(save_path)['duracion']
+            except Exception as e:
+                current_app.logger.warning(f"Error al calcular los picos de {save_path}: {str(e)}")
+            
             # Actualizar la base de datos
             success, clase_id = update_database(horario_id, new_filename)
             
+            # Registrar el archivo en el índice de audios (ruta relativa a static/uploads)
+            try:
+                ArchivoAudio.registrar(f'audios/{new_filename}', horario_id, clase_id,
+                                       **describir_archivo(save_path, duracion))
+            except Exception as e:
+                current_app.logger.warning(f"Error al registrar {save_path} en el índice de audios: {str(e)}")
+            
             # Generar URL para acceder al archivo
             file_url = f"/static/uploads/audios/{new_filename}"
             
@@ -133,8 +150,8 @@ def get_audio(horario_id):
             current_app.logger.warning(f"Archivo de audio no encontrado en disco: {audio_path}")
             return jsonify({'error': 'El archivo de audio no se encuentra en el servidor'}), 404
             
-        # Devolver el archivo
-        return send_file(audio_path, as_attachment=False)
+        # Devolver el archivo (con rangos de bytes, ETag y caché)
+        return enviar_audio(audio_path)
         
     except Exception as e:
         current_app.logger.error(f"Error al obtener audio: {str(e)}")
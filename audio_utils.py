@@ -1,60 +1,79 @@
 import os
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')
-import librosa
 import io
-import numpy as np
-from flask import send_file, abort, Blueprint, current_app
+from flask import send_file, abort, Blueprint, current_app, request, jsonify
+from utils.picos_audio import (generar_picos, picos_actualizados, leer_picos, reducir_picos, picos_a_json,
+                               dibujar_picos, dibujar_marcador, ruta_picos)
+from utils.renderizado import renderizar, RenderizadoEnCurso, TiempoAgotado
 
 audio_bp = Blueprint('audio', __name__)
 
 def find_audio_file(horario_id, app):
     """Find audio file for a specific horario_id"""
-    # Get allowed extensions
-    ALLOWED_EXTENSIONS_AUDIO = {'mp3', 'wav', 'ogg'}
-    
-    # Check for temporary audio files first
-    for ext in ALLOWED_EXTENSIONS_AUDIO:
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], f'temp_horario_{horario_id}.{ext}')
-        if os.path.exists(temp_path):
-            return temp_path
-    
     # Import here to avoid circular imports
-    from app import ClaseRealizada
+    from app import ClaseRealizada, ArchivoAudio
+    
+    # Look up the audio index: the temporary upload first, then the latest permanent one
+    for temporal in (True, False):
+        archivo = ArchivoAudio.ultimo(horario_id, temporal=temporal)
+        if archivo is not None:
+            audio_path = os.path.join(app.config['UPLOAD_FOLDER'], archivo.ruta)
+            if os.path.exists(audio_path):
+                return audio_path
     
-    # Check for permanent audio files
+    # Classes whose audio is not indexed yet (until `flask reconciliar-audios` runs)
     clase = ClaseRealizada.query.filter_by(horario_id=horario_id).order_by(ClaseRealizada.fecha.desc()).first()
     if clase and clase.audio_file:
-        audio_path = os.path.join(app.config['UPLOAD_FOLDER'], clase.audio_file)
-        if os.path.exists(audio_path):
-            return audio_path
+        # audio_file is relative to audios/permanent (horario_<id>/...), audios/ (old format) or the upload folder
+        for folder in (os.path.join('audios', 'permanent'), 'audios', ''):
+            audio_path = os.path.join(app.config['UPLOAD_FOLDER'], folder, clase.audio_file)
+            if os.path.exists(audio_path):
+                return audio_path
     
     return None
 
 @audio_bp.route('/audio_waveform/<int:horario_id>')
 def audio_waveform(horario_id):
-    """Generate waveform visualization for audio"""
+    """
+    Waveform of the audio, drawn from its precomputed peaks file.
+
+    Query parameters: formato=png (default), json (min/max pairs for client-side drawing)
+    or dat (the audiowaveform .dat file); ancho/alto in pixels.
+    While the peaks are being generated the PNG is a flat placeholder (202, Retry-After)
+    so <img> tags still get an image; json and dat get a 202 JSON status instead.
+    """
     audio_path = find_audio_file(horario_id, current_app)
     if not audio_path:
         abort(404)
     
+    formato = request.args.get('formato', 'png')
+    ancho = min(max(request.args.get('ancho', 1000, type=int), 1), 10000)
+    alto = min(max(request.args.get('alto', 200, type=int), 1), 2000)
+    
     try:
-        y, sr = librosa.load(audio_path, sr=None)
+        # Audio uploaded before peaks were stored on upload: decode it once (in the rendering pool)
+        if not picos_actualizados(audio_path):
+            current_app.logger.info(f"Generating waveform peaks for {audio_path}")
+            renderizar(current_app, ('picos', audio_path), generar_picos, audio_path)
         
-        # Create waveform plot
-        fig = plt.figure(figsize=(10, 2))
-        plt.plot(np.linspace(0, len(y)/sr, len(y)), y, color='blue', alpha=0.6)
-        plt.axis('off')
-        plt.tight_layout(pad=0)
+        if formato == 'dat':
+            return send_file(ruta_picos(audio_path), mimetype='application/octet-stream')
         
-        # Save to buffer
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', bbox_inches='tight', pad_inches=0)
-        plt.close(fig)
-        buffer.seek(0)
+        picos = leer_picos(ruta_picos(audio_path))
+        if formato == 'json':
+            return jsonify(picos_a_json(reducir_picos(picos, ancho)))
         
-        return send_file(buffer, mimetype='image/png')
+        return send_file(io.BytesIO(dibujar_picos(picos, ancho, alto)), mimetype='image/png')
+    except RenderizadoEnCurso:
+        if formato in ('json', 'dat'):
+            return jsonify({'success': False, 'estado': 'en_curso'}), 202, {'Retry-After': '2'}
+        respuesta = send_file(io.BytesIO(dibujar_marcador(ancho, alto)), mimetype='image/png')
+        respuesta.status_code = 202
+        respuesta.headers['Retry-After'] = '2'
+        respuesta.cache_control.no_store = True
+        return respuesta
+    except TiempoAgotado as e:
+        current_app.logger.error(f"Error generating waveform: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 504
     except Exception as e:
-        print(f"Error generating waveform: {str(e)}")
+        current_app.logger.error(f"Error generating waveform: {str(e)}")
         abort(500)
\ No newline at end of file
@@ -1,60 +1,117 @@
-from flask import jsonify, Blueprint
+from flask import jsonify, Blueprint, request, send_file, url_for
 import os
-import matplotlib.pyplot as plt
-import librosa
-import librosa.display
-import io
-import base64
-import numpy as np
 from app import app
+from audio_utils import find_audio_file
+from utils.espectrogramas import (ServicioEspectrogramas, EspectrogramaNoDisponible, PARAMETROS,
+                                  calcular_espectrograma, dibujar_tesela)
+from utils.renderizado import renderizar, RenderizadoEnCurso, TiempoAgotado
 
 # Extensiones de audio permitidas
 ALLOWED_EXTENSIONS_AUDIO = {'mp3', 'wav', 'ogg'}
 
+# Las teselas se piden por la huella del audio: su contenido no cambia nunca
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+
 # Crear blueprint para espectrogramas
 espectrograma_bp = Blueprint('espectrograma', __name__)
 
+servicio_espectrogramas = ServicioEspectrogramas(app.config['ESPECTROGRAMA_DIRECTORIO'])
+
+def enviar_png(ruta, etag, cache_control):
+    """Envía un PNG con ETag y Cache-Control (304 si el navegador ya lo tiene)."""
+    if request.if_none_match.contains(etag):
+        respuesta = app.response_class(status=304)
+    else:
+        respuesta = send_file(ruta, mimetype='image/png', conditional=False)
+    respuesta.set_etag(etag)
+    respuesta.headers['Cache-Control'] = cache_control
+    return respuesta
+
+def calcular(audio_path, tipo):
+    """Metadatos del espectrograma; si no está en disco se calcula en el pool de renderizado."""
+    huella = servicio_espectrogramas.huella(audio_path)
+    meta = servicio_espectrogramas.metadatos(huella, tipo)
+    if meta is None:
+        meta = renderizar(app, ('espectrograma', huella, tipo), calcular_espectrograma,
+                          servicio_espectrogramas.directorio, audio_path, tipo)
+    return meta
+
+def tesela(huella, tipo, nivel=0, x=0):
+    """Ruta del PNG de la tesela; si aún no se ha dibujado se dibuja en el pool de renderizado."""
+    ruta = servicio_espectrogramas.ruta_tesela(huella, tipo, nivel, x)
+    if os.path.exists(ruta):
+        return ruta
+    return renderizar(app, ('tesela', huella, tipo, nivel, x), dibujar_tesela,
+                      servicio_espectrogramas.directorio, huella, tipo, nivel, x)
+
+def en_curso():
+    return jsonify({'success': False, 'estado': 'en_curso'}), 202, {'Retry-After': '2'}
+
+def tipo_solicitado():
+    tipo = request.args.get('tipo', 'mel')
+    return tipo if tipo in PARAMETROS else None
+
 @espectrograma_bp.route('/espectrograma/<int:horario_id>')
 def get_espectrograma(horario_id):
-    """Genera un espectrograma para el archivo de audio asociado al horario"""
+    """Espectrograma completo (nivel 0) del audio asociado al horario, como PNG"""
+    tipo = tipo_solicitado()
+    if not tipo:
+        return jsonify({'success': False, 'error': f"Tipo no válido (use {', '.join(PARAMETROS)})"}), 400
+    audio_path = find_audio_file(horario_id, app)
+    if not audio_path:
+        return jsonify({'error': 'No se encontró el archivo de audio'}), 404
+    
     try:
-        # Nombre del archivo de audio
-        filename = f'horario_{horario_id}'
-        
-        # Buscar el archivo con cualquier extensión permitida
-        audio_path = None
-        for ext in ALLOWED_EXTENSIONS_AUDIO:
-            test_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{filename}.{ext}')
-            if os.path.exists(test_path):
-                audio_path = test_path
-                break
-        
-        if not audio_path:
-            return jsonify({'error': 'No se encontró el archivo de audio'}), 404
-        
-        # Cargar archivo de audio con librosa
-        y, sr = librosa.load(audio_path, sr=None)
-        
-        # Generar espectrograma
-        plt.figure(figsize=(8, 4))
-        D = librosa.amplitude_to_db(np.abs(librosa.stft(y)), ref=np.max)
-        librosa.display.specshow(D, sr=sr, x_axis='time', y_axis='log')
-        plt.colorbar(format='%+2.0f dB')
-        plt.title(f'Espectrograma de {os.path.basename(audio_path)}')
-        
-        # Guardar la figura en un buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        buf.seek(0)
-        
-        # Codificar la imagen en base64
-        img_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-        plt.close()
-        
-        return jsonify({'success': True, 'espectrograma': img_base64})
+        meta = calcular(audio_path, tipo)
+        ruta = tesela(meta['huella'], tipo)
+        # La URL por horario cambia de contenido al subir otro audio: el navegador revalida con el ETag
+        return enviar_png(ruta, f"{meta['huella']}-{tipo}-0-0", 'no-cache')
+    except RenderizadoEnCurso:
+        return en_curso()
+    except TiempoAgotado as e:
+        return jsonify({'success': False, 'error': str(e)}), 504
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@espectrograma_bp.route('/espectrograma/<int:horario_id>/info')
+def info_espectrograma(horario_id):
+    """Datos del espectrograma para pedir las teselas de cada nivel de zoom"""
+    tipo = tipo_solicitado()
+    if not tipo:
+        return jsonify({'success': False, 'error': f"Tipo no válido (use {', '.join(PARAMETROS)})"}), 400
+    audio_path = find_audio_file(horario_id, app)
+    if not audio_path:
+        return jsonify({'success': False, 'error': 'No se encontró el archivo de audio'}), 404
+    
+    try:
+        meta = calcular(audio_path, tipo)
+    except RenderizadoEnCurso:
+        return en_curso()
+    except TiempoAgotado as e:
+        return jsonify({'success': False, 'error': str(e)}), 504
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    teselas = url_for('espectrograma.tesela_espectrograma', huella=meta['huella'], tipo=tipo, nivel=0, x=0)
+    return jsonify(dict(meta, success=True,
+                        teselas=teselas.replace('/0/0.png', '/{nivel}/{x}.png'),
+                        segundos_por_columna=meta['duracion'] / meta['frames'] if meta['frames'] else 0))
+
+@espectrograma_bp.route('/espectrograma/teselas/<huella>/<tipo>/<int:nivel>/<int:x>.png')
+def tesela_espectrograma(huella, tipo, nivel, x):
+    """Tesela x del nivel de zoom indicado de un espectrograma ya calculado"""
+    if tipo not in PARAMETROS or len(huella) != 64 or not all(c in '0123456789abcdef' for c in huella):
+        return jsonify({'success': False, 'error': 'Tesela no válida'}), 404
+    try:
+        ruta = tesela(huella, tipo, nivel, x)
+    except (EspectrogramaNoDisponible, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    except RenderizadoEnCurso:
+        return en_curso()
+    except TiempoAgotado as e:
+        return jsonify({'success': False, 'error': str(e)}), 504
+    return enviar_png(ruta, f'{huella}-{tipo}-{nivel}-{x}', CACHE_INMUTABLE)
+
 # Ruta para verificar si existe un archivo de audio para un horario
 @espectrograma_bp.route('/check_audio/<int:horario_id>')
 def check_audio(horario_id):
@@ -1,22 +1,21 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, time, timedelta, date
 import functools
+import hashlib
 from collections import defaultdict
 import calendar
 import enum
 from sqlalchemy.types import TypeDecorator, Enum, DateTime, String
-from sqlalchemy import event
+from sqlalchemy import event, inspect, DDL
 from sqlalchemy.event import listen
+from sqlalchemy.orm import joinedload
 from flask import current_app, has_app_context
 import sys
+from utils.cache_metricas import cache_metricas, VERSION_COHORTE
 
 # Inicializamos SQLAlchemy sin la aplicación, para hacerlo más modular.
 db = SQLAlchemy()
 
-# Caché en memoria para los resultados de cálculos intensivos
-_metricas_cache = {}
-_cache_timeout = 3600  # Tiempo de expiración en segundos (1 hora)
-
 def clear_metrics_cache(profesor_id=None):
     """
     Limpia la caché de métricas para un profesor específico o para todos.
@@ -24,15 +23,13 @@ def clear_metrics_cache(profesor_id=None):
     Args:
         profesor_id (int, optional): ID del profesor. Si es None, limpia toda la caché.
     """
-    global _metricas_cache
-    if profesor_id is None:
-        _metricas_cache = {}
-    elif profesor_id in _metricas_cache:
-        del _metricas_cache[profesor_id]
+    cache_metricas.invalidar(profesor_id)
 
 def cache_metrics(func):
     """
     Decorador para cachear los resultados de funciones de cálculo intensivo.
+    Las entradas se invalidan automáticamente al modificar las clases o
+    horarios del profesor.
     
     Args:
         func (function): La función a decorar
@@ -45,22 +42,20 @@ def cache_metrics(func):
         # Usar la opción force_recalculate para omitir la caché si es necesario
         force_recalculate = kwargs.pop('force_recalculate', False)
         
-        # Generar clave única para la caché basada en los argumentos
-        cache_key = f"{profesor_id}_{func.__name__}"
-        if args:
-            cache_key += f"_{str(args)}"
-        if kwargs:
-            cache_key += f"_{str(kwargs)}"
+        # Admite tanto un ID como una instancia de Profesor (uso como método)
+        id_profesor = getattr(profesor_id, 'id', profesor_id)
+        argumentos = f"{args!r}_{sorted(kwargs.items())!r}"
+        clave = cache_metricas.clave(func.__name__, id_profesor, argumentos)
         
         # Verificar si el resultado está en caché y no ha expirado
-        if not force_recalculate and cache_key in _metricas_cache:
-            cached_result, timestamp = _metricas_cache[cache_key]
-            if datetime.now() - timestamp < timedelta(seconds=_cache_timeout):
-                return cached_result
+        if not force_recalculate:
+            encontrado, resultado = cache_metricas.obtener(clave)
+            if encontrado:
+                return resultado
         
         # Calcular el resultado y almacenarlo en caché
         result = func(profesor_id, *args, **kwargs)
-        _metricas_cache[cache_key] = (result, datetime.now())
+        cache_metricas.guardar(clave, result)
         return result
     
     return wrapper
@@ -90,6 +85,12 @@ class ISO8601DateTime(TypeDecorator):
                 # Hardcoded fix for the known problematic value
                 return datetime(2025, 5, 16, 8, 18, 35)
                 
+            # Formato canónico (el que escribe SQLAlchemy y deja normalizar_horas)
+            try:
+                return datetime.fromisoformat(value)
+            except ValueError:
+                pass
+            
             # Handle formats with 'T' separator
             if 'T' in value:
                 try:
@@ -211,7 +212,7 @@ class Profesor(db.Model):
         Returns:
             list: Lista de objetos ClaseRealizada filtradas
         """
-        query = ClaseRealizada.query.filter_by(profesor_id=self.id)
+        query = ClaseRealizada.query.options(*perfil_carga('with_horario_profesor')).filter_by(profesor_id=self.id)
         
         if fecha_inicio:
             query = query.filter(ClaseRealizada.fecha >= fecha_inicio)
@@ -225,6 +226,15 @@ class Profesor(db.Model):
         # Ordenar por fecha (más recientes primero)
         return query.order_by(ClaseRealizada.fecha.desc()).all()
     
+    def obtener_clases_mes(self, anio, mes):
+        """
+        Obtiene las clases realizadas por el profesor en un mes.
+        
+        Returns:
+            list: Objetos ClaseRealizada del mes (más recientes primero)
+        """
+        return self.get_clases_periodo(date(anio, mes, 1), date(anio, mes, calendar.monthrange(anio, mes)[1]))
+    
     def obtener_todas_clases(self):
         """
         Obtiene todas las clases realizadas por el profesor sin filtros.
@@ -233,7 +243,11 @@ class Profesor(db.Model):
         Returns:
             list: Lista de todos los objetos ClaseRealizada del profesor
         """
-        return ClaseRealizada.query.filter_by(profesor_id=self.id).order_by(ClaseRealizada.fecha.desc()).all()
+        return (ClaseRealizada.query
+                .options(*perfil_carga('with_horario_profesor'))
+                .filter_by(profesor_id=self.id)
+                .order_by(ClaseRealizada.fecha.desc())
+                .all())
     
     @cache_metrics
     def calcular_metricas(self, periodo_meses=12, fecha_fin=None):
@@ -283,62 +297,57 @@ class Profesor(db.Model):
             }
     
     @staticmethod
-    def obtener_ranking_profesores(tipo_metrica='puntualidad', limite=10):
+    def obtener_ranking_profesores(tipo_metrica='puntualidad', limite=10, fecha_inicio=None, fecha_fin=None):
         """
         Obtiene un ranking de profesores basado en un tipo de métrica específico.
+        Las métricas de todos los profesores se calculan con una única consulta
+        agregada, incluida la puntualidad.
         
         Args:
-            tipo_metrica (str): Tipo de métrica para el ranking ('puntualidad', 'alumnos', 'clases')
+            tipo_metrica (str): Tipo de métrica para el ranking (ver METRICAS_RANKING)
             limite (int): Número máximo de profesores a incluir
+            fecha_inicio (date, optional): Inicio del periodo. Por defecto, 90 días antes de fecha_fin
+            fecha_fin (date, optional): Fin del periodo. Por defecto, la fecha actual
             
         Returns:
             list: Lista de diccionarios con los datos del ranking
         """
         try:
-            profesores = Profesor.query.all()
-            ranking = []
-            
-            for profesor in profesores:
-                # Obtener las clases más recientes (últimos 3 meses)
+            if fecha_fin is None:
                 fecha_fin = datetime.now().date()
+            if fecha_inicio is None:
                 fecha_inicio = fecha_fin - timedelta(days=90)
-                clases = profesor.get_clases_periodo(fecha_inicio, fecha_fin)
-                
-                if not clases:
-                    continue
-                
-                # Calcular métricas básicas para el ranking
-                total_clases = len(clases)
-                total_alumnos = sum(c.cantidad_alumnos for c in clases if c.cantidad_alumnos is not None)
-                promedio_alumnos = total_alumnos / total_clases if total_clases > 0 else 0
-                
-                # Calcular puntualidad
-                clases_con_registro = [c for c in clases if c.hora_llegada_profesor is not None]
-                puntual = sum(1 for c in clases_con_registro if c.puntualidad == "Puntual")
-                tasa_puntualidad = (puntual / len(clases_con_registro) * 100) if clases_con_registro else 0
-                
-                # Agregar al ranking
-                ranking.append({
-                    'id': profesor.id,
-                    'nombre': profesor.nombre,
-                    'apellido': profesor.apellido,
-                    'total_clases': total_clases,
-                    'promedio_alumnos': promedio_alumnos,
-                    'puntualidad': tasa_puntualidad,
-                    'clases_por_mes': total_clases / 3  # 3 meses
-                })
             
-            # Ordenar según el tipo de métrica
-            if tipo_metrica == 'puntualidad':
-                ranking.sort(key=lambda x: x['puntualidad'], reverse=True)
-            elif tipo_metrica == 'alumnos':
-                ranking.sort(key=lambda x: x['promedio_alumnos'], reverse=True)
-            elif tipo_metrica == 'clases':
-                ranking.sort(key=lambda x: x['clases_por_mes'], reverse=True)
-            else:  # Por defecto, ordenar por total de clases
-                ranking.sort(key=lambda x: x['total_clases'], reverse=True)
+            # El ranking se memoriza por periodo junto con las métricas de cohorte
+            clave = cache_metricas.clave('ranking_profesores', VERSION_COHORTE,
+                                         f"{tipo_metrica}_{limite}_{fecha_inicio}_{fecha_fin}")
+            encontrado, ranking = cache_metricas.obtener(clave)
+            if encontrado:
+                return ranking
+            
+            # Meses del periodo para el promedio de clases por mes (90 días = 3 meses)
+            meses_periodo = max(((fecha_fin - fecha_inicio).days) / 30, 1)
             
-            return ranking[:limite]
+            orden = METRICAS_RANKING.get(tipo_metrica, 'total_clases')
+            filas = db.session.execute(db.text(SQL_RANKING_PROFESORES.format(orden=orden)), {
+                'fecha_inicio': fecha_inicio.isoformat(),
+                'fecha_fin': fecha_fin.isoformat(),
+                'meses': meses_periodo,
+                'limite': limite
+            })
+            
+            ranking = [{
+                'id': fila.id,
+                'nombre': fila.nombre,
+                'apellido': fila.apellido,
+                'total_clases': fila.total_clases,
+                'total_alumnos': fila.total_alumnos,
+                'promedio_alumnos': fila.promedio_alumnos,
+                'puntualidad': fila.puntualidad,
+                'clases_por_mes': fila.clases_por_mes
+            } for fila in filas]
+            cache_metricas.guardar(clave, ranking)
+            return ranking
         except Exception as e:
             # Manejar errores
             print(f"Error al obtener ranking: {str(e)}")
@@ -429,8 +438,24 @@ class EventoHorario(db.Model):
     def __repr__(self):
         return f'<EventoHorario {self.id}: {self.tipo} - {self.fecha}>'
 
+    @staticmethod
+    def eliminar_de_horarios(horario_ids, sesion):
+        """
+        Borra los eventos de los horarios que se eliminan, en la transacción de sesion.
+        horario_id es NOT NULL y la clave foránea no declara ON DELETE: con foreign_keys
+        activado el borrado del horario fallaría mientras queden eventos suyos.
+        """
+        tabla = EventoHorario.__table__
+        sesion.execute(tabla.delete().where(tabla.c.horario_id.in_([int(i) for i in horario_ids])))
+
 class HorarioClase(db.Model):
     __tablename__ = 'horario_clase'
+    # Mismos nombres que los índices creados por update_db.py
+    __table_args__ = (
+        db.Index('idx_horario_activo', 'activo'),
+        db.Index('idx_horario_dia', 'dia_semana'),
+        db.Index('idx_horario_profesor', 'profesor_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100), nullable=False)
     dia_semana = db.Column(db.Integer, nullable=False)  # 0: Lunes, 1: Martes, etc.
@@ -442,6 +467,7 @@ class HorarioClase(db.Model):
     tipo_clase = db.Column(db.String(20), default='OTRO')
     activo = db.Column(db.Boolean, default=True)  # Columna para marcar si el horario está activo
     fecha_desactivacion = db.Column(db.Date, nullable=True)  # Fecha en que se desactivó
+    hora_inicio_min = db.Column(db.Integer, nullable=True)  # hora_inicio en minutos (mantenida por trigger)
     clases_realizadas = db.relationship('ClaseRealizada', backref='horario', lazy=True)
     
     def __repr__(self):
@@ -530,6 +556,16 @@ class HorarioClase(db.Model):
 
 class ClaseRealizada(db.Model):
     __tablename__ = 'clase_realizada'
+    # Índices de los filtros más frecuentes (ver utils/plan_consultas.py)
+    __table_args__ = (
+        db.Index('idx_clase_profesor_fecha', 'profesor_id', 'fecha'),
+        db.Index('idx_clase_horario_fecha', 'horario_id', 'fecha'),
+        # Última clase de un horario (búsquedas de audio)
+        db.Index('idx_clase_horario_id_desc', 'horario_id', db.text('id DESC')),
+        # Una sola clase por fecha y horario: destino de los upserts de la importación.
+        # También sirve a los filtros por fecha (la crea asegurar_clave_clases si no hay duplicados)
+        db.Index('uq_clase_fecha_horario', 'fecha', 'horario_id', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     fecha = db.Column(db.Date, nullable=False)
     horario_id = db.Column(db.Integer, db.ForeignKey('horario_clase.id'), nullable=False)
@@ -539,6 +575,8 @@ class ClaseRealizada(db.Model):
     observaciones = db.Column(db.Text)
     fecha_registro = db.Column(db.DateTime, default=datetime.utcnow)
     audio_file = db.Column(db.String(255), nullable=True)  # Nombre del archivo de audio
+    llegada_min = db.Column(db.Integer, nullable=True)  # hora_llegada_profesor en minutos (mantenida por trigger)
+    huella_importacion = db.Column(db.String(40), nullable=True)  # Huella de la fila de Excel que la escribió
     
     def __repr__(self):
         return f'<ClaseRealizada {self.horario.nombre} - {self.fecha}>'
@@ -606,6 +644,7 @@ class ClaseRealizada(db.Model):
             fecha_inicio = fecha_fin - timedelta(days=periodo)
             
             return (ClaseRealizada.query
+                    .options(*perfil_carga('with_horario_profesor'))
                     .filter_by(profesor_id=profesor_id)
                     .filter(ClaseRealizada.fecha >= fecha_inicio)
                     .filter(ClaseRealizada.fecha <= fecha_fin)
@@ -640,61 +679,35 @@ class ClaseRealizada(db.Model):
             fecha_fin = datetime.now().date()
             fecha_inicio = fecha_fin - timedelta(days=30 * periodo_meses)
             
-            # Construir la consulta base
-            query = ClaseRealizada.query.filter(
-                ClaseRealizada.fecha >= fecha_inicio,
-                ClaseRealizada.fecha <= fecha_fin
+            # Leer el resumen mensual precalculado en lugar de cargar todas las clases
+            meses = MetricaMensualProfesor.obtener_meses(
+                profesor_id=profesor_id,
+                tipo_clase=tipo_clase,
+                desde=fecha_inicio,
+                hasta=fecha_fin
             )
             
-            # Filtrar por profesor si se especifica
-            if profesor_id:
-                query = query.filter_by(profesor_id=profesor_id)
-            
-            # Filtrar por tipo de clase si se especifica
-            if tipo_clase:
-                query = query.join(HorarioClase).filter(HorarioClase.tipo_clase == tipo_clase)
-            
-            # Obtener todas las clases
-            clases = query.order_by(ClaseRealizada.fecha).all()
-            
-            # Agrupar por mes
-            clases_por_mes = defaultdict(list)
-            for clase in clases:
-                clave_mes = f"{clase.fecha.year}-{clase.fecha.month:02d}"
-                clases_por_mes[clave_mes].append(clase)
-            
-            # Procesar estadísticas por mes
             resultados = {}
-            for clave_mes, clases_mes in sorted(clases_por_mes.items()):
-                year, month = map(int, clave_mes.split('-'))
-                
-                # Total de clases
-                total_clases = len(clases_mes)
+            for datos in meses:
+                total_clases = datos['total_clases']
+                promedio_alumnos = datos['total_alumnos'] / total_clases if total_clases > 0 else 0
                 
-                # Promedio de alumnos
-                total_alumnos = sum(c.cantidad_alumnos for c in clases_mes if c.cantidad_alumnos is not None)
-                promedio_alumnos = total_alumnos / total_clases if total_clases > 0 else 0
+                # Puntualidad sobre las clases con hora de llegada registrada
+                con_registro = datos['puntual'] + datos['retraso_leve'] + datos['retraso_significativo']
+                tasa_puntualidad = (datos['puntual'] / con_registro * 100) if con_registro else 0
                 
-                # Puntualidad
-                clases_con_registro = [c for c in clases_mes if c.hora_llegada_profesor is not None]
-                puntual = sum(1 for c in clases_con_registro if c.puntualidad == "Puntual")
-                retraso_leve = sum(1 for c in clases_con_registro if c.puntualidad == "Retraso leve")
-                retraso_significativo = sum(1 for c in clases_con_registro if c.puntualidad == "Retraso significativo")
-                
-                tasa_puntualidad = (puntual / len(clases_con_registro) * 100) if clases_con_registro else 0
-                
-                # Agregar al resultado
+                clave_mes = f"{datos['anio']}-{datos['mes']:02d}"
                 resultados[clave_mes] = {
-                    'anio': year,
-                    'mes': month,
-                    'nombre_mes': MESES_ES[month],
+                    'anio': datos['anio'],
+                    'mes': datos['mes'],
+                    'nombre_mes': MESES_ES[datos['mes']],
                     'total_clases': total_clases,
                     'promedio_alumnos': promedio_alumnos,
                     'puntualidad': {
                         'tasa': tasa_puntualidad,
-                        'puntual': puntual,
-                        'retraso_leve': retraso_leve,
-                        'retraso_significativo': retraso_significativo
+                        'puntual': datos['puntual'],
+                        'retraso_leve': datos['retraso_leve'],
+                        'retraso_significativo': datos['retraso_significativo']
                     }
                 }
             
@@ -703,6 +716,898 @@ class ClaseRealizada(db.Model):
             print(f"Error en obtener_estadisticas_historicas: {str(e)}")
             return {}
 
+# Diferencia en minutos enteros entre la llegada del profesor y el inicio del horario, con
+# las columnas en minutos (ver COLUMNAS_MINUTOS): la misma regla que calcular_tasa_puntualidad
+SQL_MINUTOS_DIFERENCIA = "(cr.llegada_min - hc.hora_inicio_min)"
+
+# Conteos de puntualidad con los mismos umbrales que calcular_tasa_puntualidad
+SQL_CONTEOS_PUNTUALIDAD = f"""
+    SUM(CASE WHEN cr.llegada_min IS NOT NULL
+             AND {SQL_MINUTOS_DIFERENCIA} <= 0 THEN 1 ELSE 0 END) AS puntual,
+    SUM(CASE WHEN cr.llegada_min IS NOT NULL
+             AND {SQL_MINUTOS_DIFERENCIA} > 0
+             AND {SQL_MINUTOS_DIFERENCIA} <= 10 THEN 1 ELSE 0 END) AS retraso_leve,
+    SUM(CASE WHEN cr.llegada_min IS NOT NULL
+             AND {SQL_MINUTOS_DIFERENCIA} > 10 THEN 1 ELSE 0 END) AS retraso_significativo
+"""
+
+# Métricas admitidas en el ranking y la columna por la que se ordena
+METRICAS_RANKING = {
+    'puntualidad': 'puntualidad',
+    'alumnos': 'promedio_alumnos',
+    'clases': 'clases_por_mes',
+    'total_clases': 'total_clases',
+    'total_alumnos': 'total_alumnos'
+}
+
+SQL_RANKING_PROFESORES = f"""
+SELECT id, nombre, apellido, total_clases, total_alumnos,
+       CAST(total_alumnos AS REAL) / total_clases AS promedio_alumnos,
+       CASE WHEN puntual + retraso_leve + retraso_significativo > 0
+            THEN puntual * 100.0 / (puntual + retraso_leve + retraso_significativo)
+            ELSE 0 END AS puntualidad,
+       total_clases / :meses AS clases_por_mes
+FROM (
+    SELECT p.id, p.nombre, p.apellido,
+           COUNT(*) AS total_clases,
+           SUM(COALESCE(CAST(cr.cantidad_alumnos AS INTEGER), 0)) AS total_alumnos,
+           {SQL_CONTEOS_PUNTUALIDAD}
+    FROM clase_realizada cr
+    JOIN horario_clase hc ON cr.horario_id = hc.id
+    JOIN profesor p ON cr.profesor_id = p.id
+    WHERE cr.fecha >= :fecha_inicio AND cr.fecha <= :fecha_fin
+    GROUP BY p.id, p.nombre, p.apellido
+)
+ORDER BY {{orden}} DESC, id
+LIMIT :limite
+"""
+
+SQL_RESUMEN_MENSUAL = f"""
+INSERT INTO metrica_mensual_profesor
+    (profesor_id, tipo_clase, anio, mes, total_clases, total_alumnos,
+     puntual, retraso_leve, retraso_significativo, fecha_actualizacion)
+SELECT
+    cr.profesor_id,
+    COALESCE(NULLIF(hc.tipo_clase, ''), 'OTRO') AS tipo,
+    CAST(strftime('%Y', cr.fecha) AS INTEGER) AS anio,
+    CAST(strftime('%m', cr.fecha) AS INTEGER) AS mes,
+    COUNT(*),
+    SUM(COALESCE(CAST(cr.cantidad_alumnos AS INTEGER), 0)),
+    {SQL_CONTEOS_PUNTUALIDAD},
+    CURRENT_TIMESTAMP
+FROM clase_realizada cr
+JOIN horario_clase hc ON cr.horario_id = hc.id
+{{filtro}}
+GROUP BY cr.profesor_id, tipo, anio, mes
+"""
+
+# Versión del resumen mensual: cambia con la consulta que lo calcula (regla de puntualidad,
+# columnas en minutos). Se guarda en la tabla metadatos al reconstruirlo
+VERSION_RESUMEN_MENSUAL = hashlib.sha1(SQL_RESUMEN_MENSUAL.encode('utf-8')).hexdigest()[:12]
+
+SQL_CREAR_METADATOS = "CREATE TABLE IF NOT EXISTS metadatos (clave VARCHAR(50) PRIMARY KEY, valor VARCHAR(100))"
+
+# Motores para los que ya se verificó la existencia de la tabla de resumen
+_tablas_resumen_verificadas = set()
+
+class MetricaMensualProfesor(db.Model):
+    """
+    Resumen mensual precalculado de las clases de un profesor por tipo de clase.
+    Se mantiene de forma incremental al registrar, editar, eliminar o importar
+    asistencias, para que las métricas y tendencias lean unas pocas filas en
+    lugar de cargar todas las clases del profesor.
+    """
+    __tablename__ = 'metrica_mensual_profesor'
+    __table_args__ = (
+        db.UniqueConstraint('profesor_id', 'tipo_clase', 'anio', 'mes', name='uq_metrica_mensual_profesor'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    profesor_id = db.Column(db.Integer, db.ForeignKey('profesor.id'), nullable=False)
+    tipo_clase = db.Column(db.String(20), nullable=False, default='OTRO')
+    anio = db.Column(db.Integer, nullable=False)
+    mes = db.Column(db.Integer, nullable=False)
+    total_clases = db.Column(db.Integer, nullable=False, default=0)
+    total_alumnos = db.Column(db.Integer, nullable=False, default=0)
+    puntual = db.Column(db.Integer, nullable=False, default=0)
+    retraso_leve = db.Column(db.Integer, nullable=False, default=0)
+    retraso_significativo = db.Column(db.Integer, nullable=False, default=0)
+    fecha_actualizacion = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<MetricaMensualProfesor {self.profesor_id} {self.tipo_clase} {self.anio}-{self.mes:02d}>'
+
+    @staticmethod
+    def asegurar_tabla():
+        """
+        Crea la tabla de resumen si no existe (bases de datos anteriores a su
+        introducción) y la rellena a partir de las clases ya registradas.
+        """
+        if str(db.engine.url) in _tablas_resumen_verificadas:
+            return
+        if not inspect(db.engine).has_table(MetricaMensualProfesor.__tablename__):
+            MetricaMensualProfesor.reconstruir()
+        _tablas_resumen_verificadas.add(str(db.engine.url))
+
+    @staticmethod
+    def reconstruir(engine=None):
+        """
+        Recalcula por completo el resumen mensual con una única consulta agregada.
+        Se usa al crear la tabla y tras restaurar o depurar la base de datos
+        (engine: otra base de datos, p. ej. una restauración preparada).
+        """
+        engine = engine or db.engine
+        try:
+            MetricaMensualProfesor.__table__.create(bind=engine, checkfirst=True)
+            with engine.begin() as conn:
+                conn.execute(db.text("DELETE FROM metrica_mensual_profesor"))
+                conn.execute(db.text(SQL_RESUMEN_MENSUAL.format(filtro="")))
+                conn.execute(db.text(SQL_CREAR_METADATOS))
+                conn.execute(db.text(
+                    "INSERT OR REPLACE INTO metadatos (clave, valor) VALUES ('version_resumen_mensual', :version)"
+                ), {'version': VERSION_RESUMEN_MENSUAL})
+            _tablas_resumen_verificadas.add(str(engine.url))
+        except Exception as e:
+            print(f"Error al reconstruir el resumen mensual: {str(e)}")
+
+    @staticmethod
+    def reconstruir_si_cambio(engine=None):
+        """
+        Reconstruye el resumen solo si no existe o se calculó con otra versión de la
+        consulta (VERSION_RESUMEN_MENSUAL), p. ej. tras cambiar la regla de puntualidad.
+
+        Returns:
+            bool: True si se reconstruyó
+        """
+        engine = engine or db.engine
+        with engine.begin() as conn:
+            conn.execute(db.text(SQL_CREAR_METADATOS))
+            version = conn.execute(db.text(
+                "SELECT valor FROM metadatos WHERE clave = 'version_resumen_mensual'"
+            )).scalar()
+        if version == VERSION_RESUMEN_MENSUAL and inspect(engine).has_table(MetricaMensualProfesor.__tablename__):
+            return False
+        MetricaMensualProfesor.reconstruir(engine)
+        return True
+
+    @staticmethod
+    def actualizar_meses(cambios):
+        """
+        Actualiza el resumen de los meses afectados por altas, cambios o bajas de clases.
+        Cada mes se recalcula a partir de sus clases, por lo que la operación es
+        idempotente y también cubre escrituras hechas con SQL directo.
+
+        Args:
+            cambios (iterable): Tuplas (profesor_id, fecha) de las clases modificadas.
+                Para una edición deben incluirse tanto los valores previos como los nuevos.
+        """
+        meses = {(int(profesor_id), fecha.year, fecha.month)
+                 for profesor_id, fecha in cambios
+                 if profesor_id and fecha}
+        if not meses:
+            return
+        try:
+            MetricaMensualProfesor.asegurar_tabla()
+            filtro = """
+                WHERE cr.profesor_id = :profesor_id
+                  AND cr.fecha >= :fecha_inicio AND cr.fecha <= :fecha_fin
+            """
+            with db.engine.begin() as conn:
+                for profesor_id, anio, mes in sorted(meses):
+                    params = {
+                        'profesor_id': profesor_id,
+                        'anio': anio,
+                        'mes': mes,
+                        'fecha_inicio': date(anio, mes, 1).isoformat(),
+                        'fecha_fin': date(anio, mes, calendar.monthrange(anio, mes)[1]).isoformat()
+                    }
+                    conn.execute(db.text(
+                        "DELETE FROM metrica_mensual_profesor "
+                        "WHERE profesor_id = :profesor_id AND anio = :anio AND mes = :mes"
+                    ), params)
+                    conn.execute(db.text(SQL_RESUMEN_MENSUAL.format(filtro=filtro)), params)
+        except Exception as e:
+            # El resumen nunca debe impedir guardar una asistencia
+            print(f"Error al actualizar el resumen mensual: {str(e)}")
+
+    @staticmethod
+    def obtener_meses(profesor_id=None, tipo_clase=None, desde=None, hasta=None):
+        """
+        Obtiene el resumen agregado por mes.
+
+        Args:
+            profesor_id (int, optional): Filtrar por profesor
+            tipo_clase (str, optional): Filtrar por tipo de clase
+            desde (date, optional): Incluir meses a partir del mes de esta fecha
+            hasta (date, optional): Incluir meses hasta el mes de esta fecha
+
+        Returns:
+            list: Diccionarios ordenados cronológicamente con los totales del mes
+                  y el desglose 'clases_por_tipo'
+        """
+        MetricaMensualProfesor.asegurar_tabla()
+        query = MetricaMensualProfesor.query
+        if profesor_id:
+            query = query.filter_by(profesor_id=profesor_id)
+        if tipo_clase:
+            query = query.filter_by(tipo_clase=tipo_clase)
+
+        clave_desde = desde.year * 12 + desde.month if desde else None
+        clave_hasta = hasta.year * 12 + hasta.month if hasta else None
+
+        meses = {}
+        for fila in query.all():
+            clave = fila.anio * 12 + fila.mes
+            if (clave_desde and clave < clave_desde) or (clave_hasta and clave > clave_hasta):
+                continue
+            if clave not in meses:
+                meses[clave] = {
+                    'anio': fila.anio,
+                    'mes': fila.mes,
+                    'total_clases': 0,
+                    'total_alumnos': 0,
+                    'puntual': 0,
+                    'retraso_leve': 0,
+                    'retraso_significativo': 0,
+                    'clases_por_tipo': {}
+                }
+            datos = meses[clave]
+            datos['total_clases'] += fila.total_clases
+            datos['total_alumnos'] += fila.total_alumnos
+            datos['puntual'] += fila.puntual
+            datos['retraso_leve'] += fila.retraso_leve
+            datos['retraso_significativo'] += fila.retraso_significativo
+            datos['clases_por_tipo'][fila.tipo_clase] = (
+                datos['clases_por_tipo'].get(fila.tipo_clase, 0) + fila.total_clases
+            )
+
+        return [meses[clave] for clave in sorted(meses)]
+
+class TrabajoImportacion(db.Model):
+    """
+    Importación ejecutada en segundo plano (ver utils/trabajos_importacion.py).
+    Guarda el estado y los contadores de progreso que consulta la página
+    mientras el trabajo avanza, con los mismos nombres que el diccionario
+    `resultados` de las rutas de importación.
+    """
+    __tablename__ = 'trabajo_importacion'
+    id = db.Column(db.String(32), primary_key=True)
+    tipo = db.Column(db.String(30), nullable=False)  # asistencia, asistencia_tipo, backup_completo
+    archivo = db.Column(db.String(255))  # Nombre original del archivo subido
+    estado = db.Column(db.String(20), nullable=False, default='pendiente')  # pendiente, en_proceso, completado, error
+    total = db.Column(db.Integer, default=0)  # Filas estimadas del archivo
+    leidas = db.Column(db.Integer, default=0)
+    procesados = db.Column(db.Integer, default=0)
+    nuevos = db.Column(db.Integer, default=0)
+    actualizados = db.Column(db.Integer, default=0)
+    errores = db.Column(db.Integer, default=0)
+    mensaje = db.Column(db.Text)
+    directorio = db.Column(db.String(500))  # Archivo subido, detalle y reporte de errores
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+    fecha_inicio = db.Column(db.DateTime)
+    fecha_fin = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<TrabajoImportacion {self.id} {self.tipo} {self.estado}>'
+
+    @property
+    def porcentaje(self):
+        """Progreso aproximado según las filas leídas sobre las estimadas."""
+        if self.estado in ('completado', 'error'):
+            return 100
+        if not self.total:
+            return 0
+        return min(99, int(100 * (self.leidas or 0) / self.total))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'archivo': self.archivo,
+            'estado': self.estado,
+            'porcentaje': self.porcentaje,
+            'total': self.total or 0,
+            'leidas': self.leidas or 0,
+            'procesados': self.procesados or 0,
+            'nuevos': self.nuevos or 0,
+            'actualizados': self.actualizados or 0,
+            'errores': self.errores or 0,
+            'mensaje': self.mensaje,
+            'fecha_creacion': self.fecha_creacion.strftime('%Y-%m-%d %H:%M:%S') if self.fecha_creacion else None,
+            'fecha_inicio': self.fecha_inicio.strftime('%Y-%m-%d %H:%M:%S') if self.fecha_inicio else None,
+            'fecha_fin': self.fecha_fin.strftime('%Y-%m-%d %H:%M:%S') if self.fecha_fin else None
+        }
+
+    @staticmethod
+    def asegurar_tabla():
+        """
+        Crea la tabla si no existe y marca como fallidos los trabajos que quedaron
+        a medias al cerrarse la aplicación.
+        """
+        TrabajoImportacion.__table__.create(bind=db.engine, checkfirst=True)
+        with db.engine.begin() as conn:
+            conn.execute(
+                TrabajoImportacion.__table__.update()
+                .where(TrabajoImportacion.__table__.c.estado.in_(('pendiente', 'en_proceso')))
+                .values(estado='error', mensaje='Interrumpido al reiniciar la aplicación')
+            )
+
+class ArchivoImportado(db.Model):
+    """
+    Archivo de asistencia ya importado, identificado por el SHA-256 de su
+    contenido y las opciones de importación. Volver a subir el mismo archivo
+    con las mismas opciones no repite la importación.
+    """
+    __tablename__ = 'archivo_importado'
+    __table_args__ = (
+        db.UniqueConstraint('sha256', 'opciones', name='uq_archivo_importado'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False)
+    opciones = db.Column(db.String(200), nullable=False, default='')  # Plantilla y tipo de clase
+    nombre = db.Column(db.String(255))
+    filas = db.Column(db.Integer, default=0)
+    fecha_importacion = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ArchivoImportado {self.nombre} {self.sha256[:12]}>'
+
+    @staticmethod
+    def buscar(sha256, opciones=''):
+        return ArchivoImportado.query.filter_by(sha256=sha256, opciones=opciones).first()
+
+    @staticmethod
+    def registrar(sha256, opciones='', nombre=None, filas=0):
+        """Guarda (o actualiza) el registro del archivo importado."""
+        archivo = ArchivoImportado.buscar(sha256, opciones) or ArchivoImportado(sha256=sha256, opciones=opciones)
+        archivo.nombre = nombre
+        archivo.filas = filas
+        archivo.fecha_importacion = datetime.utcnow()
+        db.session.add(archivo)
+        db.session.commit()
+        return archivo
+
+class AliasProfesor(db.Model):
+    """
+    Otra forma de escribir el nombre de un profesor en las planillas importadas
+    ("JC Perez" -> Juan Carlos Pérez). Se guarda normalizado
+    (utils/resolucion_nombres.normalizar_nombre) y tiene prioridad sobre el
+    resto de coincidencias.
+    """
+    __tablename__ = 'alias_profesor'
+    id = db.Column(db.Integer, primary_key=True)
+    alias = db.Column(db.String(100), nullable=False, unique=True)
+    profesor_id = db.Column(db.Integer, db.ForeignKey('profesor.id', ondelete='CASCADE'), nullable=False)
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+
+    profesor = db.relationship('Profesor')
+
+    def __repr__(self):
+        return f'<AliasProfesor {self.alias} -> {self.profesor_id}>'
+
+    @staticmethod
+    def asegurar_tabla():
+        AliasProfesor.__table__.create(bind=db.engine, checkfirst=True)
+
+    @staticmethod
+    def eliminar_de_profesores(profesor_ids, sesion):
+        """
+        Borra los alias de los profesores que se eliminan, en la transacción de sesion.
+        ON DELETE CASCADE no se aplica con foreign_keys desactivado, y un alias que
+        apunta a un id borrado (o reasignado) desviaría las filas importadas.
+        """
+        tabla = AliasProfesor.__table__
+        sesion.execute(tabla.delete().where(tabla.c.profesor_id.in_([int(i) for i in profesor_ids])))
+
+class ArchivoAudio(db.Model):
+    """
+    Archivo de audio de la carpeta de subidas. Lo mantienen la subida y el
+    borrado de audios (y `flask reconciliar-audios` a partir de lo que hay en
+    disco) para que las rutas y páginas encuentren los audios con una consulta
+    por índice en lugar de listar directorios y probar extensiones.
+    La ruta es relativa a UPLOAD_FOLDER y usa '/' como separador
+    (audios/permanent/horario_5/audio_1700000000_clase.mp3, temp_horario_5.mp3).
+    """
+    __tablename__ = 'archivo_audio'
+    __table_args__ = (
+        # Último audio de un horario: WHERE horario_id = ? AND temporal = ? ORDER BY id DESC LIMIT 1
+        db.Index('idx_audio_horario_id_desc', 'horario_id', 'temporal', db.text('id DESC')),
+        db.Index('idx_audio_clase', 'clase_id'),
+        db.Index('idx_audio_sha256', 'sha256'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    clase_id = db.Column(db.Integer, db.ForeignKey('clase_realizada.id', ondelete='SET NULL'))
+    horario_id = db.Column(db.Integer)
+    ruta = db.Column(db.String(500), nullable=False, unique=True)
+    temporal = db.Column(db.Boolean, nullable=False, default=False)  # Subido antes de registrar la clase
+    tamano = db.Column(db.Integer)
+    duracion = db.Column(db.Float)  # Segundos (de los picos de la forma de onda, si existen)
+    codec = db.Column(db.String(20))
+    sha256 = db.Column(db.String(64))
+    fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
+
+    clase = db.relationship('ClaseRealizada')
+
+    def __repr__(self):
+        return f'<ArchivoAudio {self.ruta}>'
+
+    @property
+    def nombre(self):
+        return self.ruta.rsplit('/', 1)[-1]
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'clase_id': self.clase_id,
+            'horario_id': self.horario_id,
+            'ruta': self.ruta,
+            'temporal': self.temporal,
+            'tamano': self.tamano,
+            'duracion': self.duracion,
+            'codec': self.codec,
+            'sha256': self.sha256,
+            'fecha_creacion': self.fecha_creacion.strftime('%Y-%m-%d %H:%M:%S') if self.fecha_creacion else None
+        }
+
+    @staticmethod
+    def asegurar_tabla(engine=None):
+        """Crea la tabla si no existe. Devuelve True si se acaba de crear."""
+        engine = engine or db.engine
+        if inspect(engine).has_table(ArchivoAudio.__tablename__):
+            return False
+        ArchivoAudio.__table__.create(bind=engine)
+        return True
+
+    @staticmethod
+    def ultimo(horario_id, temporal=False):
+        """Audio más reciente de un horario (el de la última clase, o el temporal pendiente de registrar)."""
+        return (ArchivoAudio.query.filter_by(horario_id=horario_id, temporal=temporal)
+                .order_by(ArchivoAudio.id.desc()).first())
+
+    @staticmethod
+    def temporales(horario_ids):
+        """Audios temporales (pendientes de registrar la clase) de los horarios: {horario_id: ruta}."""
+        horario_ids = list(horario_ids)
+        if not horario_ids:
+            return {}
+        filas = (ArchivoAudio.query.with_entities(ArchivoAudio.horario_id, ArchivoAudio.ruta)
+                 .filter(ArchivoAudio.temporal.is_(True), ArchivoAudio.horario_id.in_(horario_ids))
+                 .order_by(ArchivoAudio.id))
+        return {horario_id: ruta for horario_id, ruta in filas}
+
+    @staticmethod
+    def registrar(ruta, horario_id=None, clase_id=None, temporal=False, **datos):
+        """Guarda (o actualiza) el registro del archivo; datos: tamano, duracion, codec, sha256."""
+        sesion = ArchivoAudio.query.session
+        archivo = ArchivoAudio.query.filter_by(ruta=ruta).first() or ArchivoAudio(ruta=ruta)
+        archivo.horario_id = horario_id
+        archivo.clase_id = clase_id
+        archivo.temporal = temporal
+        for campo, valor in datos.items():
+            setattr(archivo, campo, valor)
+        sesion.add(archivo)
+        sesion.commit()
+        return archivo
+
+    @staticmethod
+    def eliminar(rutas):
+        """Borra los registros de las rutas indicadas. Devuelve cuántos se borraron."""
+        rutas = list(rutas)
+        if not rutas:
+            return 0
+        sesion = ArchivoAudio.query.session
+        borrados = ArchivoAudio.query.filter(ArchivoAudio.ruta.in_(rutas)).delete(synchronize_session=False)
+        sesion.commit()
+        return borrados
+
+    @staticmethod
+    def quitar_clase(clase_ids, sesion=None, reemplazo=None):
+        """
+        Desvincula los registros de las clases eliminadas (o los pasa a la clase reemplazo).
+        La clave foránea declara ON DELETE SET NULL, pero no se aplica con foreign_keys
+        desactivado ni con el SQL directo de la depuración, y SQLite puede volver a asignar
+        el id de una clase borrada: sin esto, borrar la clase nueva borraría audios ajenos.
+        Con sesion se ejecuta en su transacción (sin confirmar); si no, se confirma aquí.
+        """
+        clase_ids = [int(i) for i in clase_ids]
+        if not clase_ids:
+            return
+        tabla = ArchivoAudio.__table__
+        consulta = tabla.update().where(tabla.c.clase_id.in_(clase_ids)).values(clase_id=reemplazo)
+        if sesion is not None:
+            sesion.execute(consulta)
+        else:
+            ArchivoAudio.query.session.execute(consulta)
+            ArchivoAudio.query.session.commit()
+
+    @staticmethod
+    def reconciliar(carpeta_subidas):
+        """
+        Ajusta el índice a los audios que hay en disco: registra los nuevos, actualiza
+        los que cambiaron de tamaño, borra los que ya no existen y vincula cada archivo
+        con la clase cuya columna audio_file lo nombra.
+        
+        Returns:
+            dict: Cantidad de archivos nuevos, modificados, eliminados y vinculados
+        """
+        from utils.indice_audio import comparar_con_disco, describir_archivo, horario_de_ruta, es_temporal
+
+        sesion = ArchivoAudio.query.session
+        indexados = {archivo.ruta: archivo for archivo in ArchivoAudio.query}
+        cambios = comparar_con_disco(carpeta_subidas, {ruta: archivo.tamano for ruta, archivo in indexados.items()})
+
+        # audio_file guarda la ruta relativa a audios/permanent, a audios o a la carpeta de subidas
+        clases = {}
+        for clase_id, audio_file in (ClaseRealizada.query.with_entities(ClaseRealizada.id, ClaseRealizada.audio_file)
+                                     .filter(ClaseRealizada.audio_file.isnot(None))):
+            audio_file = audio_file.replace('\\', '/')
+            for ruta in (f'audios/permanent/{audio_file}', f'audios/{audio_file}', audio_file):
+                clases.setdefault(ruta, clase_id)
+
+        for ruta, ruta_disco in {**cambios['nuevos'], **cambios['modificados']}.items():
+            archivo = indexados.get(ruta) or ArchivoAudio(ruta=ruta)
+            archivo.horario_id = horario_de_ruta(ruta)
+            archivo.temporal = es_temporal(ruta)
+            for campo, valor in describir_archivo(ruta_disco).items():
+                setattr(archivo, campo, valor)
+            sesion.add(archivo)
+            indexados[ruta] = archivo
+
+        for ruta in cambios['eliminados']:
+            sesion.delete(indexados.pop(ruta))
+
+        vinculados = 0
+        for ruta, archivo in indexados.items():
+            clase_id = clases.get(ruta)
+            if clase_id is not None and archivo.clase_id != clase_id:
+                archivo.clase_id = clase_id
+                vinculados += 1
+
+        sesion.commit()
+        return {
+            'nuevos': len(cambios['nuevos']),
+            'modificados': len(cambios['modificados']),
+            'eliminados': len(cambios['eliminados']),
+            'vinculados': vinculados,
+        }
+
+# Perfiles de carga: relaciones que se traen en la misma consulta que el listado
+# (JOIN) para que plantillas y serializadores no lancen una consulta por fila al
+# acceder a clase.horario, clase.profesor, puntualidad o minutos_diferencia.
+PERFILES_CARGA = {
+    'with_horario': (ClaseRealizada, ('horario',)),
+    'with_profesor': (ClaseRealizada, ('profesor',)),
+    'with_horario_profesor': (ClaseRealizada, ('horario', 'profesor')),
+    'horario_with_profesor': (HorarioClase, ('profesor',)),
+}
+
+def perfil_carga(nombre):
+    """
+    Devuelve las opciones de carga de un perfil para usar con query.options().
+    
+    Ejemplo:
+        ClaseRealizada.query.options(*perfil_carga('with_horario_profesor'))
+    
+    Args:
+        nombre (str): Clave de PERFILES_CARGA
+        
+    Returns:
+        list: Opciones joinedload de SQLAlchemy
+    """
+    modelo, relaciones = PERFILES_CARGA[nombre]
+    return [joinedload(getattr(modelo, relacion)) for relacion in relaciones]
+
+# Clave única de las clases: la crea asegurar_clave_clases() si no hay duplicados
+INDICE_CLAVE_CLASES = 'uq_clase_fecha_horario'
+
+def asegurar_indices(engine=None):
+    """
+    Crea los índices declarados en los modelos que falten en una base de datos
+    existente (create_all solo los crea junto con tablas nuevas). La clave única
+    de las clases la crea asegurar_clave_clases(), que antes comprueba los duplicados.
+    
+    Returns:
+        list: Nombres de los índices creados
+    """
+    engine = engine or db.engine
+    creados = []
+    inspector = inspect(engine)
+    for tabla in db.metadata.sorted_tables:
+        if not tabla.indexes or not inspector.has_table(tabla.name):
+            continue
+        existentes = {indice['name'] for indice in inspector.get_indexes(tabla.name)}
+        for indice in sorted(tabla.indexes, key=lambda i: i.name):
+            if indice.name not in existentes and indice.name != INDICE_CLAVE_CLASES:
+                indice.create(bind=engine)
+                creados.append(indice.name)
+    return creados
+
+def clases_duplicadas(engine=None):
+    """
+    Clases con la misma fecha y horario (bases anteriores a la clave única).
+    
+    Returns:
+        list: Dicts con fecha, horario_id e ids (el primero es el que se conserva al depurar)
+    """
+    engine = engine or db.engine
+    with engine.connect() as conn:
+        filas = conn.execute(db.text("""
+            SELECT fecha, horario_id, group_concat(id) FROM (
+                SELECT fecha, horario_id, id FROM clase_realizada ORDER BY id)
+            GROUP BY fecha, horario_id HAVING COUNT(*) > 1 ORDER BY fecha, horario_id
+        """)).fetchall()
+    return [{'fecha': fecha, 'horario_id': horario_id, 'ids': [int(i) for i in ids.split(',')]}
+            for fecha, horario_id, ids in filas]
+
+def existe_clave_clases(engine=None):
+    """True si la base tiene el índice único (fecha, horario_id) de las clases."""
+    engine = engine or db.engine
+    with engine.connect() as conn:
+        return conn.execute(db.text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :nombre"
+        ), {'nombre': INDICE_CLAVE_CLASES}).first() is not None
+
+def asegurar_clave_clases(engine=None):
+    """
+    Migración idempotente para la clave única (fecha, horario_id) de las clases:
+    añade la columna de huella de importación, crea la tabla de archivos
+    importados y, si no hay clases duplicadas, el índice único (y quita
+    idx_clase_fecha, prefijo redundante del índice único). No borra ninguna
+    clase: los duplicados se fusionan con `flask depurar-clases-duplicadas`.
+    
+    Returns:
+        list: Clases duplicadas que impiden crear el índice (ver clases_duplicadas)
+    """
+    engine = engine or db.engine
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        if not inspector.has_table('clase_realizada'):
+            return []
+        if 'huella_importacion' not in {c['name'] for c in inspector.get_columns('clase_realizada')}:
+            conn.execute(db.text("ALTER TABLE clase_realizada ADD COLUMN huella_importacion VARCHAR(40)"))
+    ArchivoImportado.__table__.create(bind=engine, checkfirst=True)
+    if not existe_clave_clases(engine):
+        duplicadas = clases_duplicadas(engine)
+        if duplicadas:
+            return duplicadas
+        next(i for i in ClaseRealizada.__table__.indexes if i.name == INDICE_CLAVE_CLASES).create(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(db.text("DROP INDEX IF EXISTS idx_clase_fecha"))
+    return []
+
+def eliminar_clases_duplicadas(engine=None):
+    """
+    Fusiona las clases duplicadas en la de menor id (como la depuración de
+    /mantenimiento/depurar-base-datos) y crea la clave única. La conservada
+    recibe de las eliminadas la hora de llegada y el audio si no los tiene, el
+    mayor número de alumnos y sus observaciones; los registros del índice de
+    audios de las eliminadas pasan a la conservada. Tomar antes una instantánea.
+    
+    Returns:
+        list: Ids de las clases eliminadas
+    """
+    engine = engine or db.engine
+    duplicadas = clases_duplicadas(engine)
+    eliminadas = [i for grupo in duplicadas for i in grupo['ids'][1:]]
+    if eliminadas:
+        misma_clase = ("d.fecha = clase_realizada.fecha AND d.horario_id = clase_realizada.horario_id "
+                       "AND d.id != clase_realizada.id")
+        conservadas = ', '.join(str(grupo['ids'][0]) for grupo in duplicadas)
+        lista = ', '.join(str(i) for i in eliminadas)
+        with engine.begin() as conn:
+            conn.execute(db.text(f"""
+                UPDATE clase_realizada SET
+                    hora_llegada_profesor = COALESCE(hora_llegada_profesor, (
+                        SELECT d.hora_llegada_profesor FROM clase_realizada d
+                        WHERE {misma_clase} AND d.hora_llegada_profesor IS NOT NULL ORDER BY d.id LIMIT 1)),
+                    audio_file = COALESCE(audio_file, (
+                        SELECT d.audio_file FROM clase_realizada d
+                        WHERE {misma_clase} AND d.audio_file IS NOT NULL ORDER BY d.id LIMIT 1)),
+                    cantidad_alumnos = MAX(COALESCE(cantidad_alumnos, 0), COALESCE((
+                        SELECT MAX(d.cantidad_alumnos) FROM clase_realizada d WHERE {misma_clase}), 0)),
+                    observaciones = (
+                        SELECT group_concat(o.observaciones, char(10)) FROM (
+                            SELECT d.observaciones FROM clase_realizada d
+                            WHERE d.fecha = clase_realizada.fecha AND d.horario_id = clase_realizada.horario_id
+                              AND COALESCE(d.observaciones, '') != ''
+                            GROUP BY d.observaciones ORDER BY MIN(d.id)) o)
+                WHERE id IN ({conservadas})
+            """))
+            if inspect(conn).has_table('archivo_audio'):
+                conn.execute(db.text(f"""
+                    UPDATE archivo_audio SET clase_id = (
+                        SELECT MIN(c.id) FROM clase_realizada c JOIN clase_realizada d
+                          ON c.fecha = d.fecha AND c.horario_id = d.horario_id
+                        WHERE d.id = archivo_audio.clase_id)
+                    WHERE clase_id IN ({lista})
+                """))
+            conn.execute(db.text(f"DELETE FROM clase_realizada WHERE id IN ({lista})"))
+        MetricaMensualProfesor.reconstruir(engine)
+        cache_metricas.invalidar()
+    asegurar_clave_clases(engine)
+    return eliminadas
+
+# Horas guardadas también como minutos desde medianoche (columnas sombra), para
+# que informes y métricas calculen la puntualidad con aritmética entera en SQL.
+# Las mantienen triggers de SQLite, así que valen para cualquier escritura
+# (ORM, SQL directo, importaciones). Formato: (tabla, columna de hora, columna en minutos)
+COLUMNAS_MINUTOS = (
+    ('horario_clase', 'hora_inicio', 'hora_inicio_min'),
+    ('clase_realizada', 'hora_llegada_profesor', 'llegada_min'),
+)
+
+# Columnas de fecha que se normalizan a 'YYYY-MM-DD'
+COLUMNAS_FECHA = (
+    ('clase_realizada', 'fecha'),
+    ('horario_clase', 'fecha_desactivacion'),
+)
+
+# Formato canónico de Time en SQLite según SQLAlchemy: HH:MM:SS.ffffff
+GLOB_HORA = '[0-2][0-9]:[0-5][0-9]:[0-5][0-9].[0-9][0-9][0-9][0-9][0-9][0-9]'
+GLOB_FECHA = '[0-9][0-9][0-9][0-9]-[0-1][0-9]-[0-3][0-9]'
+
+def sql_minutos(columna):
+    """Expresión SQL con los minutos desde medianoche de una hora 'H:MM[:SS[.ffffff]]'."""
+    return (f"CASE WHEN instr({columna}, ':') > 1 THEN "
+            f"CAST(substr({columna}, 1, instr({columna}, ':') - 1) AS INTEGER) * 60 + "
+            f"CAST(substr({columna}, instr({columna}, ':') + 1, 2) AS INTEGER) END")
+
+def _sql_triggers_minutos(tabla, columna, columna_min):
+    actualizar = f"UPDATE {tabla} SET {columna_min} = {sql_minutos('NEW.' + columna)} WHERE id = NEW.id;"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_{tabla}_{columna_min}_insert AFTER INSERT ON {tabla} "
+        f"BEGIN {actualizar} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{tabla}_{columna_min}_update AFTER UPDATE OF {columna} ON {tabla} "
+        f"BEGIN {actualizar} END",
+    ]
+
+for _tabla, _columna, _columna_min in COLUMNAS_MINUTOS:
+    for _sql in _sql_triggers_minutos(_tabla, _columna, _columna_min):
+        listen(db.metadata.tables[_tabla], 'after_create', DDL(_sql))
+
+def hora_desde_minutos(minutos):
+    """Convierte minutos desde medianoche en un objeto time (None si no hay valor)."""
+    if minutos is None:
+        return None
+    horas, minutos = divmod(int(minutos), 60)
+    return time(horas % 24, minutos)
+
+def clasificar_retraso(minutos_retraso):
+    """
+    Clasifica la puntualidad a partir de los minutos de retraso (llegada - inicio),
+    con los mismos umbrales que las métricas de profesores.
+    """
+    if minutos_retraso is None:
+        return "N/A"
+    if minutos_retraso <= 0:
+        return "Puntual"
+    if minutos_retraso <= 10:
+        return "Retraso leve"
+    return "Retraso significativo"
+
+def _hora_canonica(valor):
+    """'7:30', '07:30:15' o '07:30:15.5' -> '07:30:00.000000' / '07:30:15.000000' / '07:30:15.500000'."""
+    try:
+        principal, _, fraccion = str(valor).strip().partition('.')
+        partes = [int(p) for p in principal.split(':')]
+        if len(partes) == 2:
+            partes.append(0)
+        hora = time(*partes[:3], int(fraccion.ljust(6, '0')[:6]) if fraccion else 0)
+        return hora.strftime('%H:%M:%S.%f')
+    except (ValueError, TypeError):
+        return None
+
+def _fecha_canonica(valor):
+    """'2025-03-01 00:00:00' o '01/03/2025' -> '2025-03-01'."""
+    texto = str(valor).strip()
+    for formato, longitud in (('%Y-%m-%d', 10), ('%d/%m/%Y', 10), ('%Y/%m/%d', 10)):
+        try:
+            return datetime.strptime(texto[:longitud], formato).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+def normalizar_horas(engine=None):
+    """
+    Migración idempotente del almacenamiento de fechas y horas:
+    reescribe en formato canónico las horas y fechas guardadas con otros
+    formatos, crea las columnas sombra en minutos con sus triggers y las
+    rellena. Tras ella los informes no necesitan conversiones por fila.
+    
+    Returns:
+        dict: Valores corregidos por columna y valores que no se pudieron interpretar
+    """
+    engine = engine or db.engine
+    resultado = {'corregidos': {}, 'no_validos': {}}
+    
+    with engine.begin() as conn:
+        # Inspector sobre la misma conexión para no mezclar transacciones
+        inspector = inspect(conn)
+        for tabla, columna, columna_min in COLUMNAS_MINUTOS:
+            if not inspector.has_table(tabla):
+                continue
+            if columna_min not in {c['name'] for c in inspector.get_columns(tabla)}:
+                conn.execute(db.text(f"ALTER TABLE {tabla} ADD COLUMN {columna_min} INTEGER"))
+            filas = conn.execute(db.text(
+                f"SELECT id, {columna} FROM {tabla} WHERE {columna} IS NOT NULL AND {columna} NOT GLOB '{GLOB_HORA}'"
+            )).fetchall()
+            _reescribir(conn, tabla, columna, filas, _hora_canonica, resultado)
+            for sql in _sql_triggers_minutos(tabla, columna, columna_min):
+                conn.execute(db.text(sql))
+            conn.execute(db.text(
+                f"UPDATE {tabla} SET {columna_min} = {sql_minutos(columna)} "
+                f"WHERE {columna_min} IS NOT {sql_minutos(columna)}"
+            ))
+        
+        for tabla, columna in COLUMNAS_FECHA:
+            if not inspector.has_table(tabla) or columna not in {c['name'] for c in inspector.get_columns(tabla)}:
+                continue
+            filas = conn.execute(db.text(
+                f"SELECT id, {columna} FROM {tabla} WHERE {columna} IS NOT NULL AND {columna} NOT GLOB '{GLOB_FECHA}'"
+            )).fetchall()
+            _reescribir(conn, tabla, columna, filas, _fecha_canonica, resultado)
+        
+        # Fechas de eventos guardadas en formato ISO con separador 'T'
+        if inspector.has_table('evento_horario'):
+            cambios = conn.execute(db.text(
+                "UPDATE evento_horario SET fecha = replace(fecha, 'T', ' ') WHERE fecha LIKE '%T%'"
+            )).rowcount
+            if cambios:
+                resultado['corregidos']['evento_horario.fecha'] = cambios
+    
+    # Las fechas y horas corregidas cambian la agrupación mensual y la puntualidad
+    if any(columna.startswith(('clase_realizada.', 'horario_clase.')) for columna in resultado['corregidos']):
+        MetricaMensualProfesor.reconstruir()
+        cache_metricas.invalidar()
+    return resultado
+
+def _reescribir(conn, tabla, columna, filas, convertir, resultado):
+    """Escribe el valor canónico de cada fila; cuenta las que no se pueden convertir."""
+    corregidos = 0
+    for fila_id, valor in filas:
+        canonico = convertir(valor)
+        if canonico is None:
+            resultado['no_validos'][f"{tabla}.{columna}"] = resultado['no_validos'].get(f"{tabla}.{columna}", 0) + 1
+            continue
+        if canonico != valor:
+            conn.execute(db.text(f"UPDATE {tabla} SET {columna} = :valor WHERE id = :id"),
+                         {'valor': canonico, 'id': fila_id})
+            corregidos += 1
+    if corregidos:
+        resultado['corregidos'][f"{tabla}.{columna}"] = corregidos
+
+def _invalidar_cache_clase(mapper, connection, target):
+    """Invalida la caché del profesor de la clase (y del anterior si cambió)."""
+    profesores = {target.profesor_id}
+    profesores.update(inspect(target).attrs.profesor_id.history.deleted or ())
+    for profesor_id in profesores:
+        if profesor_id:
+            cache_metricas.invalidar(profesor_id)
+
+def _invalidar_cache_horario(mapper, connection, target):
+    """
+    Un cambio de horario (hora de inicio, tipo) afecta a las clases de todos los
+    profesores que lo han impartido, incluidas suplencias, así que se invalida todo.
+    """
+    cache_metricas.invalidar()
+
+def _invalidar_cache_profesor(mapper, connection, target):
+    """La tarifa y el nombre del profesor forman parte del costo por alumno y del ranking."""
+    if target.id:
+        cache_metricas.invalidar(target.id)
+
+def _cargar_profesor_anterior(target, value, oldvalue, initiator):
+    """
+    Sin efecto propio: al registrarse con active_history=True obliga a cargar el
+    profesor anterior al reasignar una clase, para que _invalidar_cache_clase
+    lo encuentre en el historial del atributo aunque la instancia esté expirada.
+    """
+
+for _evento in ('after_insert', 'after_update', 'after_delete'):
+    listen(ClaseRealizada, _evento, _invalidar_cache_clase)
+    listen(HorarioClase, _evento, _invalidar_cache_horario)
+    listen(Profesor, _evento, _invalidar_cache_profesor)
+listen(ClaseRealizada.profesor_id, 'set', _cargar_profesor_anterior, active_history=True)
+
 def setup_date_handling(app=None):
     """
     Configura el manejo de fechas para la aplicación.
@@ -717,13 +1622,8 @@ def setup_date_handling(app=None):
     try:
         # Solo ejecutar esta parte si tenemos un contexto de aplicación o una app
         if has_app_context() or app is not None:
-            # Configurar el pragma de SQLite
-            @event.listens_for(db.engine, 'connect', once=True)
-            def set_sqlite_pragma(dbapi_connection, connection_record):
-                # Configure SQLite to use ISO date formats
-                cursor = dbapi_connection.cursor()
-                cursor.execute("PRAGMA foreign_keys=ON")
-                cursor.close()
+            # Los PRAGMA de cada conexión (foreign_keys, WAL...) se aplican en
+            # utils.base_datos.configurar_base_datos
             
             # Configurar el evento para EventoHorario
             current_module = sys.modules[__name__]
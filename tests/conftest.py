@@ -4,7 +4,9 @@ Configuración de fixtures para pruebas en pytest.
 import os
 import sys
 import pytest
+from contextlib import contextmanager
 from tempfile import mkstemp
+from sqlalchemy import event
 from datetime import datetime, time
 
 # Añadir el directorio raíz del proyecto al PATH para importar módulos
@@ -83,3 +85,32 @@ def sample_horario(db_session, sample_profesor):
     db_session.add(horario)
     db_session.commit()
     return horario
+
+@pytest.fixture
+def limite_consultas():
+    """
+    Fixture que devuelve un gestor de contexto para comprobar que un bloque de
+    código no ejecuta más de `maximo` sentencias SQL sobre el motor indicado.
+    Sirve para detectar regresiones de carga perezosa (una consulta por fila).
+    
+    Uso:
+        with limite_consultas(db.engine, 3) as sentencias:
+            client.get('/asistencia/historial')
+    """
+    @contextmanager
+    def _limite(engine, maximo):
+        sentencias = []
+        
+        def _registrar(conn, cursor, statement, parameters, context, executemany):
+            sentencias.append(statement)
+        
+        event.listen(engine, 'before_cursor_execute', _registrar)
+        try:
+            yield sentencias
+        finally:
+            event.remove(engine, 'before_cursor_execute', _registrar)
+        assert len(sentencias) <= maximo, (
+            f"Se ejecutaron {len(sentencias)} sentencias SQL (máximo {maximo}):\n" + "\n".join(sentencias)
+        )
+    
+    return _limite
@@ -0,0 +1,66 @@
+import hashlib
+import io
+import json
+import os
+import sys
+import zipfile
+import pytest
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.backup_completo import archivos_audio, generar_zip, escribir_zip, NOMBRE_MANIFIESTO
+
+
+@pytest.fixture
+def carpeta(tmp_path):
+    """Base de datos y audios sueltos y por horario."""
+    audios = tmp_path / 'audios'
+    (audios / 'permanent' / '7').mkdir(parents=True)
+    (audios / 'audio_1.mp3').write_bytes(os.urandom(300_000))
+    (audios / 'permanent' / '7' / 'audio_2.mp3').write_bytes(os.urandom(50_000))
+    (audios / '.oculto').write_bytes(b'x')
+    (tmp_path / 'gimnasio.db').write_bytes(b'SQLite' * 10_000)
+    entradas = [(str(tmp_path / 'gimnasio.db'), 'gimnasio_backup.db')] + archivos_audio(str(audios))
+    return tmp_path, entradas
+
+
+class TestBackupCompleto:
+    """Pruebas para el ZIP del backup completo generado en streaming."""
+
+    def test_contenido_y_manifiesto(self, carpeta):
+        """Audios sin recompresión, base comprimida y SHA-256 de cada archivo en el manifiesto."""
+        tmp_path, entradas = carpeta
+        resumen = {}
+        datos = b''.join(generar_zip(entradas, comprimidas=['gimnasio_backup.db'], resumen=resumen))
+
+        with zipfile.ZipFile(io.BytesIO(datos)) as zipf:
+            assert zipf.testzip() is None
+            assert zipf.namelist() == ['gimnasio_backup.db', 'audios/audio_1.mp3',
+                                       'audios/permanent/7/audio_2.mp3', NOMBRE_MANIFIESTO]
+            assert zipf.getinfo('gimnasio_backup.db').compress_type == zipfile.ZIP_DEFLATED
+            assert zipf.getinfo('audios/audio_1.mp3').compress_type == zipfile.ZIP_STORED
+            manifiesto = json.loads(zipf.read(NOMBRE_MANIFIESTO))
+            for archivo in manifiesto['archivos']:
+                assert hashlib.sha256(zipf.read(archivo['ruta'])).hexdigest() == archivo['sha256']
+        assert (resumen['archivos'], resumen['errores']) == (3, 0)
+
+    def test_memoria_acotada(self, carpeta):
+        """Ningún fragmento entregado supera el tamaño de bloque (más las cabeceras)."""
+        _, entradas = carpeta
+        fragmentos = list(generar_zip(entradas, tamano_bloque=16 * 1024))
+        assert len(fragmentos) > 20
+        assert max(len(fragmento) for fragmento in fragmentos) < 16 * 1024 + 1024
+
+    def test_archivo_eliminado(self, carpeta):
+        """Un audio que desaparece después de listarlo se omite y se registra en el manifiesto."""
+        tmp_path, entradas = carpeta
+        os.remove(tmp_path / 'audios' / 'audio_1.mp3')
+        destino = str(tmp_path / 'backup.zip')
+        resumen = escribir_zip(entradas, destino)
+
+        assert resumen['errores'] == 1
+        assert resumen['manifiesto']['errores'][0]['ruta'] == 'audios/audio_1.mp3'
+        assert not os.path.exists(destino + '.parcial')
+        with zipfile.ZipFile(destino) as zipf:
+            assert 'audios/audio_1.mp3' not in zipf.namelist()
@@ -0,0 +1,66 @@
+import os
+import sys
+import pytest
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.backup_incremental import (crear_backup_incremental, restaurar_manifiesto, listar_manifiestos,
+                                      ruta_blob, BackupIncrementalInvalido)
+
+
+@pytest.fixture
+def origen(tmp_path):
+    """Instantánea de la base de datos y carpeta de audios con un archivo repetido."""
+    audios = tmp_path / 'audios'
+    (audios / 'permanent' / '3').mkdir(parents=True)
+    (audios / 'audio_1.mp3').write_bytes(b'uno' * 1000)
+    (audios / 'permanent' / '3' / 'audio_1.mp3').write_bytes(b'uno' * 1000)
+    (audios / 'audio_2.mp3').write_bytes(b'dos' * 1000)
+    (tmp_path / 'gimnasio.db').write_bytes(b'base de datos')
+    return tmp_path, str(tmp_path / 'almacen')
+
+
+class TestBackupIncremental:
+    """Pruebas para los backups incrementales direccionados por contenido."""
+
+    def test_solo_contenidos_nuevos(self, origen):
+        """El segundo backup solo escribe el audio nuevo; los contenidos repetidos se guardan una vez."""
+        tmp_path, almacen = origen
+        primero = crear_backup_incremental(almacen, str(tmp_path / 'gimnasio.db'), str(tmp_path / 'audios'))
+        assert primero['resumen']['archivos'] == 4
+        assert primero['resumen']['nuevos'] == 3
+
+        (tmp_path / 'audios' / 'audio_3.mp3').write_bytes(b'tres' * 1000)
+        segundo = crear_backup_incremental(almacen, str(tmp_path / 'gimnasio.db'), str(tmp_path / 'audios'),
+                                           etiqueta='diario')
+        assert (segundo['resumen']['nuevos'], segundo['resumen']['bytes_nuevos']) == (1, 4000)
+        assert segundo['nombre'].endswith('_diario')
+        assert [m['nombre'] for m in listar_manifiestos(almacen)] == [segundo['nombre'], primero['nombre']]
+
+    def test_restaurar(self, origen):
+        """Se reconstruye el árbol de audios y la base de datos de un manifiesto anterior."""
+        tmp_path, almacen = origen
+        manifiesto = crear_backup_incremental(almacen, str(tmp_path / 'gimnasio.db'), str(tmp_path / 'audios'))
+        (tmp_path / 'audios' / 'audio_2.mp3').write_bytes(b'modificado')
+
+        destino = tmp_path / 'restaurado'
+        resultado = restaurar_manifiesto(almacen, manifiesto['nombre'], str(destino / 'audios'),
+                                         str(destino / 'gimnasio.db'))
+        assert resultado['archivos'] == 4
+        assert (destino / 'gimnasio.db').read_bytes() == b'base de datos'
+        assert (destino / 'audios' / 'audio_2.mp3').read_bytes() == b'dos' * 1000
+        assert (destino / 'audios' / 'permanent' / '3' / 'audio_1.mp3').read_bytes() == b'uno' * 1000
+
+    def test_contenido_alterado(self, origen):
+        """Un contenido del almacén que no coincide con su SHA-256 detiene la restauración."""
+        tmp_path, almacen = origen
+        manifiesto = crear_backup_incremental(almacen, str(tmp_path / 'gimnasio.db'), str(tmp_path / 'audios'))
+        with open(ruta_blob(almacen, manifiesto['archivos'][0]['sha256']), 'wb') as f:
+            f.write(b'alterado')
+
+        with pytest.raises(BackupIncrementalInvalido):
+            restaurar_manifiesto(almacen, manifiesto['nombre'], str(tmp_path / 'r' / 'audios'),
+                                 str(tmp_path / 'r' / 'gimnasio.db'))
+        with pytest.raises(BackupIncrementalInvalido):
+            restaurar_manifiesto(almacen, 'no_existe', str(tmp_path / 'r'), str(tmp_path / 'r.db'))
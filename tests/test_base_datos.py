@@ -0,0 +1,62 @@
+import os
+import sys
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.pool import QueuePool
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.base_datos import configurar_base_datos, estado_pragmas
+
+
+def _crear_app(ruta, **config):
+    """Aplicación mínima con una base SQLite en archivo y la configuración indicada."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{ruta}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.update(config)
+    base = SQLAlchemy(app)
+    configurar_base_datos(app, base)
+    return app, base
+
+
+class TestConfiguracionBaseDatos:
+    """Pruebas para los ajustes de conexión a SQLite."""
+
+    def test_modo_concurrente(self, tmp_path):
+        """Cada conexión del pool recibe los PRAGMA configurados."""
+        app, base = _crear_app(tmp_path / 'gimnasio.db', SQLITE_BUSY_TIMEOUT=2500)
+        with app.app_context():
+            assert isinstance(base.engine.pool, QueuePool)
+            with base.engine.connect() as primera, base.engine.connect() as segunda:
+                for conexion in (primera, segunda):
+                    assert conexion.exec_driver_sql("PRAGMA busy_timeout").scalar() == 2500
+                    assert conexion.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+            pragmas = estado_pragmas(base.engine)
+            assert pragmas['journal_mode'] == 'wal'
+            assert pragmas['cache_size'] == -64 * 1024
+            assert pragmas['foreign_keys'] == 1
+            assert base.engine.pool.checkedout() == 0
+
+    def test_modo_simple(self, tmp_path):
+        """El modo simple deja los valores por defecto de SQLite."""
+        app, base = _crear_app(tmp_path / 'gimnasio.db', BASE_DATOS_MODO='simple', SQLITE_FOREIGN_KEYS=False)
+        with app.app_context():
+            pragmas = estado_pragmas(base.engine)
+            assert pragmas['journal_mode'] == 'delete'
+            assert pragmas['foreign_keys'] == 0
+
+    def test_lectura_durante_escritura(self, tmp_path):
+        """Con WAL se puede leer mientras otra conexión tiene una escritura en curso."""
+        app, base = _crear_app(tmp_path / 'gimnasio.db', SQLITE_BUSY_TIMEOUT=100)
+        with app.app_context():
+            with base.engine.begin() as conexion:
+                conexion.exec_driver_sql("CREATE TABLE asistencia (id INTEGER PRIMARY KEY)")
+                conexion.exec_driver_sql("INSERT INTO asistencia (id) VALUES (1)")
+            with base.engine.connect() as escritura:
+                transaccion = escritura.begin()
+                escritura.exec_driver_sql("INSERT INTO asistencia (id) VALUES (2)")
+                with base.engine.connect() as lectura:
+                    assert lectura.exec_driver_sql("SELECT COUNT(*) FROM asistencia").scalar() == 1
+                transaccion.commit()
@@ -0,0 +1,136 @@
+import os
+import sys
+import pytest
+from datetime import date, time
+from flask import Flask
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.cache_metricas import CacheMetricas, CacheMemoriaLRU, CacheSQLite, cache_metricas
+from models import db, Profesor, HorarioClase, ClaseRealizada, cache_metrics
+
+
+class TestCacheMetricas:
+    """Pruebas para la caché acotada y versionada por profesor."""
+
+    def test_acierto_y_fallo(self):
+        """Las estadísticas cuentan aciertos y fallos."""
+        cache = CacheMetricas(CacheMemoriaLRU(max_entradas=10))
+        clave = cache.clave('metricas', 1, '()')
+        assert cache.obtener(clave) == (False, None)
+        cache.guardar(clave, {'total': 3})
+        assert cache.obtener(clave) == (True, {'total': 3})
+        estadisticas = cache.estadisticas()
+        assert (estadisticas['aciertos'], estadisticas['fallos']) == (1, 1)
+        assert estadisticas['tasa_aciertos'] == 50
+
+    def test_limite_lru(self):
+        """Al superar el máximo se desaloja la entrada usada hace más tiempo."""
+        cache = CacheMetricas(CacheMemoriaLRU(max_entradas=2))
+        claves = [cache.clave('metricas', profesor_id, '()') for profesor_id in (1, 2, 3)]
+        cache.guardar(claves[0], 'a')
+        cache.guardar(claves[1], 'b')
+        cache.obtener(claves[0])
+        cache.guardar(claves[2], 'c')
+        assert cache.obtener(claves[1]) == (False, None)
+        assert cache.obtener(claves[0]) == (True, 'a')
+        assert cache.estadisticas()['desalojos'] == 1
+
+    def test_invalidacion_por_profesor(self):
+        """Invalidar un profesor no afecta a las entradas de los demás."""
+        cache = CacheMetricas(CacheMemoriaLRU())
+        cache.guardar(cache.clave('metricas', 1, '()'), 'uno')
+        cache.guardar(cache.clave('metricas', 2, '()'), 'dos')
+        cache.invalidar(1)
+        assert cache.obtener(cache.clave('metricas', 1, '()')) == (False, None)
+        assert cache.obtener(cache.clave('metricas', 2, '()')) == (True, 'dos')
+        cache.invalidar()
+        assert cache.obtener(cache.clave('metricas', 2, '()')) == (False, None)
+
+    def test_expiracion(self):
+        """Las entradas caducadas no se sirven."""
+        cache = CacheMetricas(CacheMemoriaLRU(), ttl=-1)
+        clave = cache.clave('metricas', 1, '()')
+        cache.guardar(clave, 'viejo')
+        assert cache.obtener(clave) == (False, None)
+
+    def test_sqlite_compartida_entre_procesos(self, tmp_path):
+        """Dos cachés sobre el mismo archivo comparten resultados e invalidaciones."""
+        ruta = str(tmp_path / 'cache.db')
+        cache_a = CacheMetricas(CacheSQLite(ruta))
+        cache_b = CacheMetricas(CacheSQLite(ruta))
+        cache_a.guardar(cache_a.clave('metricas', 1, '()'), {'tasa': 90.0})
+        assert cache_b.obtener(cache_b.clave('metricas', 1, '()')) == (True, {'tasa': 90.0})
+        cache_b.invalidar(1)
+        assert cache_a.obtener(cache_a.clave('metricas', 1, '()')) == (False, None)
+
+    def test_sqlite_limite(self, tmp_path):
+        """El almacenamiento SQLite también respeta el número máximo de entradas."""
+        cache = CacheMetricas(CacheSQLite(str(tmp_path / 'cache.db'), max_entradas=3))
+        for profesor_id in range(1, 6):
+            cache.guardar(cache.clave('metricas', profesor_id, '()'), profesor_id)
+        assert cache.estadisticas()['entradas'] == 3
+
+
+@pytest.fixture
+def app_cache():
+    """Aplicación mínima con base de datos en memoria y la caché global vacía."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    almacen_original = cache_metricas.almacen
+    cache_metricas.almacen = CacheMemoriaLRU()
+    with app.app_context():
+        db.session.remove()
+        db.create_all()
+        db.session.add(Profesor(id=1, nombre='Juan', apellido='Pérez', tarifa_por_clase=10))
+        db.session.add(Profesor(id=2, nombre='Ana', apellido='Gómez', tarifa_por_clase=10))
+        db.session.add(HorarioClase(id=1, nombre='POWER BIKE', dia_semana=0, hora_inicio=time(7, 30),
+                                    duracion=60, profesor_id=1, capacidad_maxima=20, tipo_clase='RIDE'))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+    cache_metricas.almacen = almacen_original
+
+
+class TestInvalidacionAutomatica:
+    """Pruebas para la invalidación mediante eventos de SQLAlchemy."""
+
+    def test_escrituras_invalidan_al_profesor(self, app_cache):
+        """Registrar o reasignar una clase invalida a los profesores afectados."""
+        llamadas = []
+
+        @cache_metrics
+        def contar(profesor_id):
+            llamadas.append(profesor_id)
+            return len(llamadas)
+
+        contar(1)
+        contar(2)
+        assert contar(1) == 1
+
+        clase = ClaseRealizada(fecha=date(2025, 3, 3), horario_id=1, profesor_id=1, cantidad_alumnos=5)
+        db.session.add(clase)
+        db.session.commit()
+        assert contar(1) == 3
+        assert contar(2) == 2
+
+        clase.profesor_id = 2
+        db.session.commit()
+        assert contar(1) == 4
+        assert contar(2) == 5
+
+    def test_cambio_de_horario_invalida_todo(self, app_cache):
+        """Modificar un horario invalida las métricas de todos los profesores."""
+        @cache_metrics
+        def calcular(profesor_id):
+            return object()
+
+        antes = calcular(2)
+        horario = HorarioClase.query.get(1)
+        horario.tipo_clase = 'MOVE'
+        db.session.commit()
+        assert calcular(2) is not antes
@@ -0,0 +1,116 @@
+import os
+import sys
+import pytest
+from datetime import date, time
+from sqlalchemy import create_engine, text
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.clases_esperadas import (calcular_clases_no_registradas, obtener_slots_no_registrados,
+                                    cargar_horarios, parsear_hora, agrupar_por_horario)
+
+
+@pytest.fixture
+def conexion():
+    """Base de datos SQLite en memoria con el esquema mínimo de horarios y clases."""
+    engine = create_engine('sqlite://')
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TABLE profesor (id INTEGER PRIMARY KEY, nombre TEXT, apellido TEXT)"))
+        conn.execute(text("""
+            CREATE TABLE horario_clase (
+                id INTEGER PRIMARY KEY, nombre TEXT, dia_semana INTEGER, hora_inicio TEXT,
+                duracion INTEGER, profesor_id INTEGER, tipo_clase TEXT,
+                activo BOOLEAN, fecha_desactivacion DATE)
+        """))
+        conn.execute(text("""
+            CREATE TABLE clase_realizada (
+                id INTEGER PRIMARY KEY, fecha DATE, horario_id INTEGER, profesor_id INTEGER)
+        """))
+        conn.execute(text("INSERT INTO profesor VALUES (1, 'Juan', 'Pérez'), (2, 'Ana', 'Gómez')"))
+        # Lunes 07:30 activo, miércoles 18:00 desactivado desde el 2025-03-12
+        conn.execute(text("""
+            INSERT INTO horario_clase VALUES
+                (1, 'POWER BIKE', 0, '07:30:00.000000', 60, 1, 'RIDE', 1, NULL),
+                (2, 'YOGA', 2, '18:00:00', 45, 2, 'MOVE', 0, '2025-03-12'),
+                (3, 'BOX', 4, '19:00:00', 60, 2, 'BOX', 0, NULL)
+        """))
+        yield conn
+
+
+class TestSlotsNoRegistrados:
+    """Pruebas para la expansión del horario semanal y el anti-join con clases registradas."""
+
+    def test_expande_todas_las_semanas(self, conexion):
+        """Un horario activo sin registros genera una clase por cada semana del rango."""
+        slots = obtener_slots_no_registrados(date(2025, 3, 1), date(2025, 3, 31), conexion)
+        lunes = sorted(f for f, h in slots if h == 1)
+        assert lunes == [date(2025, 3, 3), date(2025, 3, 10), date(2025, 3, 17),
+                         date(2025, 3, 24), date(2025, 3, 31)]
+
+    def test_excluye_clases_registradas(self, conexion):
+        """Las clases registradas no aparecen como pendientes."""
+        conexion.execute(text("INSERT INTO clase_realizada VALUES (1, '2025-03-10', 1, 1)"))
+        slots = obtener_slots_no_registrados(date(2025, 3, 1), date(2025, 3, 31), conexion)
+        assert (date(2025, 3, 10), 1) not in slots
+        assert (date(2025, 3, 17), 1) in slots
+
+    def test_fecha_registrada_con_hora(self, conexion):
+        """Una fecha guardada con hora (base sin normalizar) también cuenta como registrada."""
+        conexion.execute(text("INSERT INTO clase_realizada VALUES (1, '2025-03-10 00:00:00', 1, 1)"))
+        slots = obtener_slots_no_registrados(date(2025, 3, 1), date(2025, 3, 31), conexion)
+        assert (date(2025, 3, 10), 1) not in slots
+
+    def test_respeta_fecha_desactivacion(self, conexion):
+        """Un horario inactivo solo genera clases anteriores a su fecha de desactivación."""
+        slots = obtener_slots_no_registrados(date(2025, 3, 1), date(2025, 3, 31), conexion)
+        miercoles = sorted(f for f, h in slots if h == 2)
+        assert miercoles == [date(2025, 3, 5)]
+
+    def test_inactivo_sin_fecha_no_genera_clases(self, conexion):
+        """Un horario inactivo sin fecha de desactivación no genera clases esperadas."""
+        slots = obtener_slots_no_registrados(date(2025, 3, 1), date(2025, 3, 31), conexion)
+        assert not [s for s in slots if s[1] == 3]
+
+    def test_rango_invertido(self, conexion):
+        """Un rango con inicio posterior al fin no devuelve resultados."""
+        assert obtener_slots_no_registrados(date(2025, 3, 31), date(2025, 3, 1), conexion) == []
+
+
+class TestClasesNoRegistradas:
+    """Pruebas para el formato de salida usado por las plantillas."""
+
+    def test_formato_y_profesor(self, conexion):
+        """Cada clase incluye el horario normalizado y el profesor del mapa precargado."""
+        clases = calcular_clases_no_registradas(date(2025, 3, 3), date(2025, 3, 5), conexion=conexion)
+        assert [c['id_combinado'] for c in clases] == ['2025-03-03|1', '2025-03-05|2']
+        primera = clases[0]
+        assert primera['horario']['hora_inicio'] == '07:30'
+        assert primera['horario']['hora_fin_str'] == '08:30'
+        assert primera['profesor']['nombre'] == 'Juan'
+        assert primera['tipo_clase'] == 'RIDE'
+
+    def test_filtro_profesor(self, conexion):
+        """El filtro por profesor se aplica sobre el profesor asignado al horario."""
+        clases = calcular_clases_no_registradas(date(2025, 3, 1), date(2025, 3, 31),
+                                                profesor_id=2, conexion=conexion)
+        assert {c['horario']['id'] for c in clases} == {2}
+
+    def test_agrupar_por_horario(self, conexion):
+        """Las clases se agrupan por horario conservando las fechas."""
+        clases = calcular_clases_no_registradas(date(2025, 3, 1), date(2025, 3, 10), conexion=conexion)
+        agrupadas = agrupar_por_horario(clases)
+        assert agrupadas[1] == [date(2025, 3, 3), date(2025, 3, 10)]
+
+    def test_cargar_horarios_normaliza_horas(self, conexion):
+        """Las horas con microsegundos se normalizan una sola vez por horario."""
+        horarios = cargar_horarios(conexion)
+        assert horarios[1]['hora_inicio_obj'] == time(7, 30)
+        assert horarios[2]['fecha_desactivacion'] == date(2025, 3, 12)
+
+    def test_parsear_hora(self):
+        """La conversión de horas acepta distintos formatos almacenados."""
+        assert parsear_hora('07:30:00.123456') == time(7, 30)
+        assert parsear_hora('18:05') == time(18, 5)
+        assert parsear_hora(time(9, 0)) == time(9, 0)
+        assert parsear_hora('sin hora') is None
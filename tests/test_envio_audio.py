@@ -0,0 +1,87 @@
+import os
+import sys
+import pytest
+from flask import Flask
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.envio_audio import enviar_audio, es_inmutable, MAX_AGE_INMUTABLE
+
+
+CONTENIDO = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def app_audio(tmp_path):
+    """Aplicación mínima que sirve los audios de una carpeta de subidas temporal."""
+    carpeta = tmp_path / 'uploads'
+    (carpeta / 'audios' / 'permanent' / 'horario_5').mkdir(parents=True)
+    (carpeta / 'audios' / 'permanent' / 'horario_5' / 'audio_1700000000_clase.mp3').write_bytes(CONTENIDO)
+    (carpeta / 'temp_horario_5.mp3').write_bytes(CONTENIDO)
+
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(carpeta)
+
+    @app.route('/audio/<path:ruta>')
+    def audio(ruta):
+        return enviar_audio(os.path.join(app.config['UPLOAD_FOLDER'], ruta), etag=app.config.get('ETAG'))
+
+    return app
+
+
+class TestEnvioAudio:
+    """Pruebas para el envío de audios con rangos, validación y caché."""
+
+    def test_es_inmutable(self):
+        assert es_inmutable('audios/permanent/horario_5/audio_1700000000_clase.mp3')
+        assert es_inmutable('audios/audio_7_1600000000_antigua.wav')
+        assert es_inmutable('clase_12_20250305101010.mp3')
+        assert not es_inmutable('temp_horario_5.mp3')
+        assert not es_inmutable('audios/grabacion.mp3')
+
+    def test_rangos(self, app_audio):
+        """Una petición con Range recibe 206 con solo los bytes pedidos."""
+        cliente = app_audio.test_client()
+        respuesta = cliente.get('/audio/audios/permanent/horario_5/audio_1700000000_clase.mp3',
+                                headers={'Range': 'bytes=100-199'})
+        assert respuesta.status_code == 206
+        assert respuesta.data == CONTENIDO[100:200]
+        assert respuesta.headers['Content-Range'] == f'bytes 100-199/{len(CONTENIDO)}'
+        assert respuesta.headers['Accept-Ranges'] == 'bytes'
+        assert respuesta.mimetype == 'audio/mpeg'
+
+    def test_cache_y_validacion(self, app_audio):
+        """Los nombres con marca de tiempo se guardan un año; el temporal se revalida con su ETag."""
+        app_audio.config['ETAG'] = 'a' * 64
+        cliente = app_audio.test_client()
+        respuesta = cliente.get('/audio/audios/permanent/horario_5/audio_1700000000_clase.mp3')
+        assert respuesta.status_code == 200
+        assert respuesta.headers['ETag'] == f'"{"a" * 64}"'
+        assert respuesta.cache_control.immutable and respuesta.cache_control.public
+        assert respuesta.cache_control.max_age == MAX_AGE_INMUTABLE
+        assert cliente.get('/audio/audios/permanent/horario_5/audio_1700000000_clase.mp3',
+                           headers={'If-None-Match': respuesta.headers['ETag']}).status_code == 304
+
+        app_audio.config['ETAG'] = None
+        respuesta = cliente.get('/audio/temp_horario_5.mp3')
+        assert respuesta.cache_control.no_cache and not respuesta.cache_control.immutable
+        assert cliente.get('/audio/temp_horario_5.mp3',
+                           headers={'If-Modified-Since': respuesta.headers['Last-Modified']}).status_code == 304
+        assert cliente.get('/audio/no_existe.mp3').status_code == 404
+
+    def test_envio_por_el_servidor(self, app_audio):
+        """Con AUDIO_ENVIO_SERVIDOR la respuesta solo lleva la cabecera para nginx o Apache."""
+        cliente = app_audio.test_client()
+        app_audio.config['AUDIO_ENVIO_SERVIDOR'] = 'x-accel-redirect'
+        app_audio.config['AUDIO_X_ACCEL_PREFIJO'] = '/uploads-internos/'
+        respuesta = cliente.get('/audio/audios/permanent/horario_5/audio_1700000000_clase.mp3')
+        assert respuesta.headers['X-Accel-Redirect'] == \
+            '/uploads-internos/audios/permanent/horario_5/audio_1700000000_clase.mp3'
+        assert respuesta.data == b''
+        assert respuesta.cache_control.immutable
+
+        app_audio.config['AUDIO_ENVIO_SERVIDOR'] = 'x-sendfile'
+        respuesta = cliente.get('/audio/temp_horario_5.mp3')
+        assert respuesta.headers['X-Sendfile'] == os.path.join(app_audio.config['UPLOAD_FOLDER'], 'temp_horario_5.mp3')
+        assert respuesta.data == b''
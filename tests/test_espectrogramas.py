@@ -0,0 +1,98 @@
+import io
+import os
+import sys
+import wave
+import numpy as np
+import pytest
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import utils.espectrogramas as espectrogramas
+from utils.espectrogramas import (ServicioEspectrogramas, EspectrogramaNoDisponible, calcular_matriz,
+                                  clave_parametros, numero_niveles, ANCHO_TESELA, PARAMETROS, RANGO_DB)
+
+
+def senal(segundos, sr=22050):
+    """Barrido de frecuencia con algo de ruido."""
+    t = np.arange(int(segundos * sr)) / sr
+    return (0.5 * np.sin(2 * np.pi * (200 + 400 * t) * t) + 0.01 * np.random.default_rng(0).standard_normal(len(t))
+            ).astype(np.float32)
+
+
+@pytest.fixture
+def audio(tmp_path):
+    ruta = str(tmp_path / 'audio_1700000000_clase.wav')
+    with wave.open(ruta, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(22050)
+        f.writeframes((senal(30) * 32767).astype('<i2').tobytes())
+    return ruta
+
+
+class TestEspectrogramas:
+    """Pruebas para el servicio de espectrogramas en caché."""
+
+    def test_matriz_por_bloques(self, monkeypatch):
+        """Calcular por bloques de frames da el mismo espectrograma mel que la STFT completa."""
+        import librosa
+        monkeypatch.setattr(espectrogramas, 'BLOQUE_FRAMES', 100)
+        muestras = senal(5)
+        parametros = PARAMETROS['mel']
+
+        matriz = calcular_matriz(muestras, 'mel')
+        referencia = librosa.power_to_db(librosa.feature.melspectrogram(
+            y=muestras, sr=parametros['sr'], n_fft=parametros['n_fft'], hop_length=parametros['hop_length'],
+            n_mels=parametros['n_mels'], pad_mode='constant'), ref=np.max, top_db=None)
+        esperada = np.clip((referencia + RANGO_DB) * 255 / RANGO_DB, 0, 255)
+
+        assert matriz.shape == referencia.shape
+        assert np.abs(matriz.astype(float) - esperada).max() <= 2
+
+    def test_calcular_una_vez(self, audio, tmp_path, monkeypatch):
+        """El segundo cálculo (u otro servicio sobre la misma carpeta) reutiliza lo guardado en disco."""
+        servicio = ServicioEspectrogramas(str(tmp_path / 'cache'))
+        meta = servicio.calcular(audio, 'log')
+        assert meta['bandas'] == PARAMETROS['log']['bandas']
+        assert meta['niveles'] == numero_niveles(meta['frames']) == 3
+        assert os.path.basename(servicio.carpeta(meta['huella'], 'log')) == clave_parametros('log')
+
+        monkeypatch.setattr(espectrogramas, 'calcular_matriz', lambda *a: pytest.fail('se recalculó'))
+        assert ServicioEspectrogramas(str(tmp_path / 'cache')).calcular(audio, 'log') == meta
+
+    def test_huellas_limitadas(self, tmp_path, monkeypatch):
+        """Se recuerdan como mucho MAX_HUELLAS huellas y se olvida la menos usada."""
+        monkeypatch.setattr(espectrogramas, 'MAX_HUELLAS', 2)
+        servicio = ServicioEspectrogramas(str(tmp_path / 'cache'))
+        rutas = []
+        for i in range(3):
+            ruta = str(tmp_path / f'audio_{i}.wav')
+            with open(ruta, 'wb') as f:
+                f.write(bytes([i]) * 10)
+            rutas.append(ruta)
+
+        servicio.huella(rutas[0])
+        servicio.huella(rutas[1])
+        servicio.huella(rutas[0])
+        servicio.huella(rutas[2])
+        assert [clave[0] for clave in servicio._huellas] == [rutas[0], rutas[2]]
+
+    def test_teselas(self, audio, tmp_path):
+        """Cada tesela tiene ANCHO_TESELA columnas y una banda por fila, y se guarda como PNG."""
+        from PIL import Image
+        servicio = ServicioEspectrogramas(str(tmp_path / 'cache'))
+        meta = servicio.calcular(audio, 'mel')
+
+        for nivel in range(meta['niveles']):
+            for x in range(2 ** nivel):
+                ruta = servicio.tesela(meta['huella'], 'mel', nivel, x)
+                with open(ruta, 'rb') as f:
+                    assert Image.open(io.BytesIO(f.read())).size == (ANCHO_TESELA, meta['bandas'])
+
+        with pytest.raises(ValueError):
+            servicio.tesela(meta['huella'], 'mel', meta['niveles'], 0)
+        with pytest.raises(EspectrogramaNoDisponible):
+            servicio.tesela('0' * 64, 'mel')
+        with pytest.raises(ValueError):
+            clave_parametros('lineal')
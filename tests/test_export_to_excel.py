@@ -0,0 +1,93 @@
+import csv
+import os
+import sqlite3
+import sys
+import pytest
+from openpyxl import load_workbook
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import export_to_excel
+from utils.export_to_excel import export_tables_to_excel
+
+
+@pytest.fixture
+def base(tmp_path):
+    """Base con una tabla de profesores (datos sensibles) y otra de clases."""
+    ruta = str(tmp_path / 'gimnasio.db')
+    conn = sqlite3.connect(ruta)
+    conn.execute("CREATE TABLE profesor (id INTEGER PRIMARY KEY, nombre TEXT, telefono TEXT, email TEXT)")
+    conn.executemany("INSERT INTO profesor VALUES (?, ?, ?, ?)",
+                     [(1, 'Ana', '099123456', 'ana@gimnasio.com'), (2, 'Luis', None, None)])
+    conn.execute("CREATE TABLE clase_realizada (id INTEGER PRIMARY KEY, fecha TEXT, cantidad_alumnos INTEGER, "
+                 "minutos REAL)")
+    conn.executemany("INSERT INTO clase_realizada VALUES (?, ?, ?, ?)",
+                     [(i, f'2024-01-{i % 28 + 1:02d}', i % 20, i / 2) for i in range(1, 1001)])
+    conn.commit()
+    conn.close()
+    return ruta
+
+
+def filas_hoja(ruta, hoja=None):
+    """Filas de la hoja sin las celdas vacías del final (según el motor, se leen o no)."""
+    libro = load_workbook(ruta, read_only=True)
+    try:
+        filas = []
+        for fila in (libro[hoja] if hoja else libro.active).iter_rows(values_only=True):
+            fila = list(fila)
+            while fila and fila[-1] is None:
+                fila.pop()
+            filas.append(fila)
+        return filas
+    finally:
+        libro.close()
+
+
+class TestExportacion:
+    """Pruebas para la exportación por bloques y en paralelo."""
+
+    @pytest.mark.parametrize('procesos', [1, 2])
+    def test_excel(self, base, tmp_path, procesos):
+        """Archivos por tabla y libro unificado con los datos sensibles protegidos."""
+        resultados = export_tables_to_excel(base, str(tmp_path / 'salida'), protection_level='parcial',
+                                            processes=procesos, chunk_size=64)
+
+        assert resultados['clase_realizada']['row_count'] == 1000
+        assert filas_hoja(resultados['profesor']['file_path']) == [
+            ['id', 'nombre', 'telefono', 'email'],
+            [1, 'Ana', '*******456', '*****@gimnasio.com'],
+            [2, 'Luis'],
+        ]
+        clases = filas_hoja(resultados['completo']['file_path'], 'clase_realizada')
+        assert len(clases) == 1001
+        assert clases[1] == [1, '2024-01-02', 1, 0.5]
+
+    def test_pool_compartido(self, base, tmp_path):
+        """Las exportaciones sucesivas reutilizan el mismo pool de procesos."""
+        export_tables_to_excel(base, str(tmp_path / 'primera'), processes=2)
+        pool = export_to_excel._executor
+        resultados = export_tables_to_excel(base, str(tmp_path / 'segunda'), file_format='csv', processes=2)
+
+        assert pool is not None and export_to_excel._executor is pool
+        assert resultados['clase_realizada']['row_count'] == 1000
+
+    def test_csv(self, base, tmp_path):
+        """El formato CSV no crea libro unificado y oculta por completo los datos sensibles."""
+        resultados = export_tables_to_excel(base, str(tmp_path / 'salida'), file_format='csv', processes=1)
+
+        assert set(resultados) == {'profesor', 'clase_realizada'}
+        with open(resultados['profesor']['file_path'], encoding='utf-8', newline='') as f:
+            filas = list(csv.reader(f))
+        assert filas[1] == ['1', 'Ana', '**********', '******@****.***']
+
+    def test_parquet(self, base, tmp_path):
+        pq = pytest.importorskip('pyarrow.parquet')
+        resultados = export_tables_to_excel(base, str(tmp_path / 'salida'), file_format='parquet',
+                                            processes=1, chunk_size=100)
+        tabla = pq.read_table(resultados['clase_realizada']['file_path'])
+        assert tabla.num_rows == 1000
+
+    def test_formato_no_valido(self, base, tmp_path):
+        with pytest.raises(ValueError):
+            export_tables_to_excel(base, str(tmp_path / 'salida'), file_format='ods')
@@ -0,0 +1,359 @@
+import io
+import os
+import sys
+import pytest
+import openpyxl
+import pandas as pd
+from datetime import date, datetime, time
+from flask import Flask
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy.exc import IntegrityError
+
+from models import (db, Profesor, HorarioClase, ClaseRealizada, MetricaMensualProfesor, TrabajoImportacion,
+                    AliasProfesor, asegurar_clave_clases, asegurar_indices,
+                    eliminar_clases_duplicadas)
+from utils.importacion_asistencia import (importar_asistencias, preparar_filas, LectorExcel,
+                                         importar_por_bloques)
+from utils.trabajos_importacion import esperar
+
+
+@pytest.fixture
+def app_importacion():
+    """Aplicación mínima con un profesor, un horario de POWER BIKE y una clase ya registrada."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.session.remove()
+        db.create_all()
+        db.session.add(Profesor(id=1, nombre='Juan Carlos', apellido='Pérez', tarifa_por_clase=10))
+        # 3 de marzo de 2025 es lunes (dia_semana 0)
+        db.session.add(HorarioClase(id=1, nombre='POWER BIKE', dia_semana=0, hora_inicio=time(7, 30),
+                                    duracion=60, profesor_id=1, capacidad_maxima=20, tipo_clase='RIDE'))
+        db.session.add(ClaseRealizada(id=1, fecha=date(2025, 3, 3), horario_id=1, profesor_id=1,
+                                      hora_llegada_profesor=time(7, 30), cantidad_alumnos=3,
+                                      observaciones='Registro manual'))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _hoja(filas, alumnos='Alumnos'):
+    return pd.DataFrame(filas, columns=['Fecha', 'Hora', 'Intructor', 'Clase', alumnos])
+
+
+def _libro(filas, encabezado=('Fecha', 'Hora', 'Intructor', 'Clase', 'Alumnos')):
+    """Libro .xlsx en memoria con una hoja de asistencia y otra hoja adicional."""
+    libro = openpyxl.Workbook()
+    hoja = libro.active
+    hoja.append(list(encabezado))
+    for fila in filas:
+        hoja.append(list(fila))
+    libro.create_sheet('Otra').append(['No se importa'])
+    archivo = io.BytesIO()
+    libro.save(archivo)
+    archivo.seek(0)
+    return archivo
+
+
+class TestPrepararFilas:
+    """Pruebas para la conversión y validación de las columnas."""
+
+    def test_formatos_y_errores(self):
+        """Fechas y horas en distintos formatos se convierten y las filas inválidas llevan su error."""
+        filas = preparar_filas(_hoja([
+            ('03/03/2025', '7:30', 'Juan', 'POWER BIKE', 10),
+            (datetime(2025, 3, 4), time(19, 0), 'Ana', 'YOGA', '8'),
+            ('2025-03-05', '07:30 PM', 'Ana', 'YOGA', None),
+            ('05.03.2025', 0.3125, 'Ana', 'YOGA', 4),
+            ('06/03/2025', 'NO ASISTIO', 'Ana', 'YOGA', 0),
+            ('no es fecha', '7:30', 'Ana', 'YOGA', 1),
+            (None, '7:30', 'Ana', 'YOGA', 1),
+            ('07/03/2025', '7:30', None, 'YOGA', 1),
+            ('07/03/2025', 'mañana', 'Ana', 'YOGA', 1),
+        ]))
+        assert list(filas['fecha'][:5]) == [date(2025, 3, 3), date(2025, 3, 4), date(2025, 3, 5),
+                                           date(2025, 3, 5), date(2025, 3, 6)]
+        assert list(filas['hora'][:5]) == [time(7, 30), time(19, 0), time(19, 30), time(7, 30), time(0, 0)]
+        assert list(filas['no_asistio'][:5]) == [False, False, False, False, True]
+        assert list(filas['alumnos'][:4]) == [10, 8, 0, 4]
+        assert filas['error'][:5].isna().all()
+        errores = list(filas['error'][5:])
+        assert errores[0] == "No se pudo convertir la fecha 'no es fecha'"
+        assert errores[1] == "La fecha está vacía"
+        assert errores[2] == "El nombre del instructor está vacío"
+        assert errores[3].startswith("No se pudo convertir la hora 'mañana'")
+
+
+class TestImportarAsistencias:
+    """Pruebas para la importación en bloque."""
+
+    def test_altas_actualizaciones_y_errores(self, app_importacion):
+        """Se resuelven profesores y horarios, se actualizan las clases existentes y se informan los errores."""
+        resultado = importar_asistencias(_hoja([
+            ('03/03/2025', '7:30', 'juan', 'POWER BIKE', 12),
+            ('10/03/2025', '7:30', 'Juan', 'POWER BIKE', 9),
+            ('10/03/2025', 'NO ASISTIO', 'Maria', 'YOGA', 0),
+            ('11/03/2025', '18:00', 'Maria', 'YOGA', 6),
+            ('11/03/2025', '18:00', 'maria', 'YOGA', 7),
+            ('fecha rota', '18:00', 'Maria', 'YOGA', 6),
+        ]), tamano_lote=2)
+
+        assert (resultado['total'], resultado['nuevos'], resultado['actualizados'], resultado['errores']) == (6, 3, 2, 1)
+        assert [d['estado'] for d in resultado['detalles']] == [
+            'Actualizado', 'Nuevo', 'Nuevo', 'Nuevo', 'Actualizado', 'Error']
+        assert resultado['detalles'][0]['profesor'] == 'Juan Carlos'
+        assert resultado['detalles'][2]['nota'] == 'AUSENTE'
+
+        # Un único profesor nuevo y un horario nuevo por día y hora
+        assert Profesor.query.count() == 2
+        maria = Profesor.query.filter_by(nombre='Maria').one()
+        assert {(h.dia_semana, h.hora_inicio, h.profesor_id) for h in HorarioClase.query.filter_by(nombre='YOGA')} == {
+            (0, time(0, 0), maria.id), (1, time(18, 0), maria.id)}
+
+        existente = ClaseRealizada.query.get(1)
+        assert (existente.cantidad_alumnos, existente.observaciones) == (12, 'Registro manual')
+        repetida = ClaseRealizada.query.filter_by(fecha=date(2025, 3, 11)).one()
+        assert (repetida.profesor_id, repetida.cantidad_alumnos) == (maria.id, 7)
+        ausente = ClaseRealizada.query.filter_by(fecha=date(2025, 3, 10), profesor_id=maria.id).one()
+        assert (ausente.hora_llegada_profesor, ausente.observaciones) == (None, 'PROFESOR NO ASISTIÓ')
+
+        # Columnas en minutos (triggers) y resumen mensual al día tras las sentencias en lote
+        assert db.session.execute(db.text(
+            "SELECT llegada_min FROM clase_realizada WHERE fecha = '2025-03-10' AND profesor_id = 1"
+        )).scalar() == 450
+        resumen = MetricaMensualProfesor.query.filter_by(profesor_id=1, anio=2025, mes=3).one()
+        assert (resumen.total_clases, resumen.total_alumnos) == (2, 21)
+
+    def test_resolucion_de_nombres(self, app_importacion):
+        """Tildes, mayúsculas y alias se resuelven al profesor existente; un nombre ambiguo es un error."""
+        db.session.add(Profesor(id=2, nombre='María', apellido='Núñez', tarifa_por_clase=10))
+        db.session.add(Profesor(id=3, nombre='Juan Pablo', apellido='Gómez', tarifa_por_clase=10))
+        db.session.add(AliasProfesor(alias='jc', profesor_id=1))
+        db.session.commit()
+
+        resultado = importar_asistencias(_hoja([
+            ('03/03/2025', '18:00', 'MARIA NUNEZ', 'yoga', 5),
+            ('04/03/2025', '18:00', 'nuñez maria', 'YOGA', 5),
+            ('10/03/2025', '7:30', 'JC', 'power bike', 8),
+            ('11/03/2025', '7:30', 'Gómez', 'POWER BIKE', 8),
+            ('12/03/2025', '7:30', 'juan', 'POWER BIKE', 8),
+        ]))
+        assert [d['profesor'] for d in resultado['detalles'][:4]] == ['María', 'María', 'Juan Carlos', 'Juan Pablo']
+        assert ClaseRealizada.query.filter_by(fecha=date(2025, 3, 10)).one().horario_id == 1
+        assert resultado['detalles'][4]['estado'] == 'Error'
+        assert 'Juan Carlos Pérez (id 1), Juan Pablo Gómez (id 3)' in resultado['detalles'][4]['errores'][0]
+        assert Profesor.query.count() == 3
+        assert HorarioClase.query.filter_by(dia_semana=0).count() == 2
+
+    def test_alias_de_profesor_eliminado(self, app_importacion):
+        """Un alias que apunta a un profesor que ya no existe no se usa."""
+        db.session.add(AliasProfesor(alias='pedro', profesor_id=99))
+        db.session.commit()
+
+        resultado = importar_asistencias(_hoja([('10/03/2025', '7:30', 'Pedro', 'POWER BIKE', 8)]))
+        assert resultado['detalles'][0]['profesor'] == 'Pedro'
+        assert ClaseRealizada.query.filter_by(fecha=date(2025, 3, 10)).one().profesor_id != 99
+
+    def test_consultas_constantes(self, app_importacion, limite_consultas):
+        """El número de sentencias no depende del número de filas."""
+        hoja = _hoja([(date(2025, 1, 1 + dia % 28), f"{7 + dia % 12}:00", f"Profesor {dia % 5}",
+                       'CICLO', dia % 20) for dia in range(400)])
+        with limite_consultas(db.engine, 25):
+            resultado = importar_asistencias(hoja, tamano_lote=100)
+        assert resultado['errores'] == 0
+        assert ClaseRealizada.query.count() == 1 + resultado['nuevos']
+
+
+class TestImportacionIdempotente:
+    """Pruebas para las huellas de fila y la clave única (fecha, horario_id)."""
+
+    FILAS = [
+        ('03/03/2025', '7:30', 'Juan', 'POWER BIKE', 12),
+        ('10/03/2025', '7:30', 'Juan', 'POWER BIKE', 9),
+        ('11/03/2025', '18:00', 'Maria', 'YOGA', 6),
+    ]
+
+    def test_reimportar_mismo_contenido(self, app_importacion, limite_consultas):
+        """Reimportar las mismas filas no escribe nada; solo se actualiza la fila que cambió."""
+        importar_asistencias(_hoja(self.FILAS))
+        with limite_consultas(db.engine, 6):
+            resultado = importar_asistencias(_hoja([('03/03/2025', '07:30', ' JUAN ', 'POWER BIKE', 12)] + self.FILAS[1:]))
+        assert (resultado['nuevos'], resultado['actualizados'], resultado['sin_cambios']) == (0, 0, 3)
+
+        resultado = importar_asistencias(_hoja(self.FILAS[:2] + [('11/03/2025', '18:00', 'Maria', 'YOGA', 7)]))
+        assert [d['estado'] for d in resultado['detalles']] == ['Sin cambios', 'Sin cambios', 'Actualizado']
+        assert ClaseRealizada.query.count() == 3
+        assert ClaseRealizada.query.filter_by(fecha=date(2025, 3, 11)).one().cantidad_alumnos == 7
+        assert ClaseRealizada.query.get(1).observaciones == 'Registro manual'
+
+    def test_clave_unica(self, app_importacion):
+        """La base de datos rechaza una segunda clase con la misma fecha y horario."""
+        db.session.add(ClaseRealizada(fecha=date(2025, 3, 3), horario_id=1, profesor_id=1))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+    def test_migracion_duplicados(self, app_importacion):
+        """Con duplicados la migración no borra nada ni crea la clave única; la depuración los fusiona."""
+        db.session.execute(db.text("DROP INDEX uq_clase_fecha_horario"))
+        db.session.execute(db.text("ALTER TABLE clase_realizada DROP COLUMN huella_importacion"))
+        db.session.execute(db.text(
+            "INSERT INTO clase_realizada (fecha, horario_id, profesor_id, audio_file, cantidad_alumnos, "
+            "hora_llegada_profesor, observaciones) VALUES "
+            "('2025-03-03', 1, 1, 'audio.mp3', 4, NULL, 'Sala 2'), "
+            "('2025-03-03', 1, 1, NULL, 9, '07:28:00.000000', 'Sustituto')"
+        ))
+        db.session.commit()
+        total = db.session.execute(db.text("SELECT COUNT(*) FROM clase_realizada")).scalar()
+
+        duplicadas = asegurar_clave_clases()
+        assert [grupo['ids'] for grupo in duplicadas] == [[1, total - 1, total]]
+        assert asegurar_indices() == []
+        assert ClaseRealizada.query.count() == total
+
+        assert eliminar_clases_duplicadas() == [total - 1, total]
+        clase = ClaseRealizada.query.get(1)
+        assert (clase.audio_file, clase.cantidad_alumnos, clase.hora_llegada_profesor) == ('audio.mp3', 9, time(7, 30))
+        assert clase.observaciones.split('\n') == ['Registro manual', 'Sala 2', 'Sustituto']
+        assert 'uq_clase_fecha_horario' in {i['name'] for i in db.inspect(db.engine).get_indexes('clase_realizada')}
+        assert asegurar_clave_clases() == []
+
+    def test_importar_con_duplicados(self, app_importacion):
+        """Sin la clave única (hay duplicados) se actualiza la clase de menor id y se insertan las nuevas."""
+        db.session.execute(db.text("DROP INDEX uq_clase_fecha_horario"))
+        db.session.execute(db.text(
+            "INSERT INTO clase_realizada (fecha, horario_id, profesor_id, cantidad_alumnos) "
+            "VALUES ('2025-03-03', 1, 1, 4)"
+        ))
+        db.session.commit()
+
+        resultado = importar_asistencias(_hoja([
+            ('03/03/2025', '7:30', 'Juan', 'POWER BIKE', 12),
+            ('10/03/2025', '7:30', 'Juan', 'POWER BIKE', 9),
+        ]))
+
+        assert (resultado['nuevos'], resultado['actualizados'], resultado['errores']) == (1, 1, 0)
+        assert [c.cantidad_alumnos for c in ClaseRealizada.query.filter_by(fecha=date(2025, 3, 3))
+                .order_by(ClaseRealizada.id)] == [12, 4]
+        assert ClaseRealizada.query.filter_by(fecha=date(2025, 3, 10)).one().cantidad_alumnos == 9
+
+
+class TestLectorExcel:
+    """Pruebas para la lectura en streaming por bloques."""
+
+    def test_bloques(self):
+        """Las filas se entregan por bloques según se leen, sin las filas vacías."""
+        filas = [(date(2025, 3, 3), '7:30', f'Profesor {i}', 'YOGA', i) for i in range(5)]
+        filas.insert(2, (None, None, None, None, None))
+        with LectorExcel(_libro(filas), tamano_bloque=2) as lector:
+            assert lector.faltantes(['Fecha', 'Asistentes']) == ['Asistentes']
+            bloques = lector.bloques()
+            primero = next(bloques)
+            assert lector.filas_leidas == 2
+            restantes = list(bloques)
+        assert [list(b.index) for b in [primero] + restantes] == [[0, 1], [3, 4], [5]]
+        assert list(restantes[0]['Intructor']) == ['Profesor 2', 'Profesor 3']
+        assert isinstance(primero['Fecha'].iloc[0], datetime)
+
+    def test_importar_por_bloques(self, app_importacion):
+        """Una fila que repite fecha y horario de un bloque anterior lo actualiza."""
+        archivo = _libro([
+            ('10/03/2025', '7:30', 'Juan', 'POWER BIKE', 5),
+            ('11/03/2025', '18:00', 'Ana', 'YOGA', 6),
+            ('10/03/2025', '7:30', 'Juan', 'POWER BIKE', 8),
+        ])
+        with LectorExcel(archivo, tamano_bloque=2) as lector:
+            resultado = importar_por_bloques(lector, tamano_lote=1)
+        assert (resultado['bloques'], resultado['total'], resultado['nuevos'], resultado['actualizados']) == (2, 3, 2, 1)
+        assert [d['fila'] for d in resultado['detalles']] == [0, 1, 2]
+        assert resultado['filas_por_segundo'] > 0
+        assert ClaseRealizada.query.filter_by(fecha=date(2025, 3, 10)).one().cantidad_alumnos == 8
+
+
+@pytest.fixture
+def cliente_importacion(app, tmp_path, monkeypatch):
+    """Cliente de la aplicación completa con la base de datos vacía."""
+    monkeypatch.setitem(app.config, 'IMPORTACION_DIRECTORIO', str(tmp_path))
+    with app.app_context():
+        db.create_all()
+        with app.test_client() as cliente:
+            yield cliente
+        db.session.remove()
+        db.drop_all()
+
+
+class TestRutaImportacion:
+    """La ruta de importación por tipo de clase encola un trabajo con el motor en bloque."""
+
+    def test_importar_por_tipo(self, cliente_importacion):
+        """Las filas se identifican por día, hora y tipo; el trabajo expone contadores, detalle y reporte de errores."""
+        archivo = _libro([
+            (datetime(2025, 3, 3), time(7, 30), 'Juan', 'POWER BIKE', 12),
+            ('03/03/2025', '7:30', 'Juan', 'RIDE 45', 10),
+            ('sin fecha', '7:30', 'Juan', 'POWER BIKE', 12),
+        ], encabezado=('Fecha', 'Hora', 'Intructor ', 'Clase', 'Asistentes'))
+
+        respuesta = cliente_importacion.post('/import/asistencia', data={
+            'tipo_clase': 'RIDE', 'file': (archivo, 'asistencia.xlsx')
+        }, content_type='multipart/form-data')
+        assert respuesta.status_code == 202
+        datos = respuesta.get_json()
+        assert datos['success']
+        esperar(datos['job_id'], timeout=30)
+
+        trabajo = cliente_importacion.get(datos['estado_url']).get_json()['trabajo']
+        assert trabajo['estado'] == 'completado'
+        assert (trabajo['total'], trabajo['procesados'], trabajo['nuevos'], trabajo['actualizados'],
+                trabajo['errores'], trabajo['porcentaje']) == (3, 2, 1, 1, 1, 100)
+        assert [(d['fila'], d['estado']) for d in trabajo['detalles']] == [
+            (2, 'Importado'), (3, 'Actualizado'), (4, 'Error')]
+        assert trabajo['detalles'][0]['tipo'] == 'RIDE'
+        assert ClaseRealizada.query.one().cantidad_alumnos == 10
+
+        reporte = cliente_importacion.get(trabajo['url_errores'])
+        assert reporte.status_code == 200
+        lineas = reporte.get_data().decode('utf-8-sig').splitlines()
+        assert lineas[0] == 'Fila;Instructor;Fecha;Hora;Clase;Error'
+        assert len(lineas) == 2 and lineas[1].startswith('4;')
+
+    def test_archivo_repetido(self, cliente_importacion):
+        """Un archivo idéntico con las mismas opciones se salta, salvo que se fuerce la importación."""
+        contenido = _libro([('03/03/2025', '7:30', 'Juan', 'RIDE 45', 10)],
+                           encabezado=('Fecha', 'Hora', 'Intructor', 'Clase', 'Asistentes')).getvalue()
+
+        def importar(**datos):
+            respuesta = cliente_importacion.post('/import/asistencia', data=dict(
+                datos, tipo_clase='RIDE', file=(io.BytesIO(contenido), 'asistencia.xlsx')
+            ), content_type='multipart/form-data').get_json()
+            esperar(respuesta['job_id'], timeout=30)
+            return cliente_importacion.get(respuesta['estado_url']).get_json()['trabajo']
+
+        assert importar()['nuevos'] == 1
+        repetido = importar()
+        assert (repetido['estado'], repetido['procesados'], repetido['nuevos'], repetido['detalles']) == (
+            'completado', 1, 0, [])
+        assert 'ya se importó' in repetido['mensaje']
+        forzado = importar(forzar='1')
+        assert [d['estado'] for d in forzado['detalles']] == ['Sin cambios']
+
+    def test_trabajo_inexistente(self, cliente_importacion):
+        respuesta = cliente_importacion.get('/importar/jobs/no-existe')
+        assert respuesta.status_code == 404
+        assert not respuesta.get_json()['success']
+
+    def test_archivo_invalido(self, cliente_importacion):
+        """Un error del trabajo queda registrado en su estado."""
+        archivo = _libro([], encabezado=('Fecha', 'Hora'))
+        datos = cliente_importacion.post('/import/asistencia', data={
+            'tipo_clase': 'MOVE', 'file': (archivo, 'asistencia.xlsx')
+        }, content_type='multipart/form-data').get_json()
+        esperar(datos['job_id'], timeout=30)
+        trabajo = TrabajoImportacion.query.get(datos['job_id'])
+        assert trabajo.estado == 'error'
+        assert 'columnas requeridas' in trabajo.mensaje
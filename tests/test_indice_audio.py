@@ -0,0 +1,123 @@
+import os
+import sys
+import pytest
+from datetime import date, time
+from flask import Flask
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models import db, Profesor, HorarioClase, ClaseRealizada, ArchivoAudio
+from utils.indice_audio import comparar_con_disco, detectar_codec, horario_de_ruta, ruta_indice
+
+
+def escribir(carpeta, ruta, contenido=b'ID3' + b'\0' * 29):
+    destino = os.path.join(carpeta, *ruta.split('/'))
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    with open(destino, 'wb') as f:
+        f.write(contenido)
+    return destino
+
+
+@pytest.fixture
+def subidas(tmp_path):
+    """Carpeta de subidas con audios en los distintos formatos de ruta."""
+    carpeta = str(tmp_path / 'uploads')
+    escribir(carpeta, 'audios/permanent/horario_5/audio_1700000000_clase.mp3')
+    escribir(carpeta, 'audios/permanent/horario_5/picos_audio_1700000000_clase.dat', b'\0' * 20)
+    escribir(carpeta, 'audios/audio_7_1600000000_antigua.wav', b'RIFF\0\0\0\0WAVEfmt ')
+    escribir(carpeta, 'temp_horario_9.ogg', b'OggS' + b'\0' * 8)
+    escribir(carpeta, 'logo.png', b'\x89PNG')
+    return carpeta
+
+
+@pytest.fixture
+def app_indice():
+    """Aplicación mínima con una base de datos en memoria para los modelos."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        # Descartar sesiones de otras aplicaciones creadas por pruebas anteriores
+        db.session.remove()
+        db.create_all()
+        db.session.add(Profesor(id=1, nombre='Juan', apellido='Pérez', tarifa_por_clase=10))
+        db.session.add(HorarioClase(id=5, nombre='YOGA', dia_semana=2, hora_inicio=time(18, 0),
+                                    duracion=60, profesor_id=1, capacidad_maxima=20, tipo_clase='MOVE'))
+        db.session.add(ClaseRealizada(id=1, fecha=date(2025, 3, 5), horario_id=5, profesor_id=1,
+                                      audio_file='horario_5/audio_1700000000_clase.mp3'))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+class TestIndiceAudio:
+    """Pruebas para la descripción de los audios y la comparación con el disco."""
+
+    def test_horario_de_ruta(self):
+        assert horario_de_ruta('audios/permanent/horario_5/audio_1700000000_clase.mp3') == 5
+        assert horario_de_ruta('temp_horario_9.ogg') == 9
+        assert horario_de_ruta('clase_12_20250305101010.mp3') == 12
+        assert horario_de_ruta('audios/audio_7_1600000000_antigua.wav') == 7
+        assert horario_de_ruta('audios/grabacion.mp3') is None
+
+    def test_detectar_codec(self, subidas):
+        """El códec sale de los primeros bytes aunque la extensión no coincida."""
+        assert detectar_codec(escribir(subidas, 'audios/falso.mp3', b'OggS' + b'\0' * 8)) == 'ogg'
+        assert detectar_codec(escribir(subidas, 'audios/a.aac', b'\xff\xf1\x50\x80')) == 'aac'
+        assert detectar_codec(escribir(subidas, 'audios/b.m4a', b'\0\0\0\x20ftypM4A ')) == 'm4a'
+        assert detectar_codec(escribir(subidas, 'audios/c.webm', b'')) == 'webm'
+
+    def test_comparar_con_disco(self, subidas):
+        """Solo cuentan los audios (no los picos ni otros archivos) y se compara por tamaño."""
+        cambios = comparar_con_disco(subidas, {
+            'audios/audio_7_1600000000_antigua.wav': 16,
+            'temp_horario_9.ogg': 1,
+            'audios/permanent/horario_3/audio_1500000000_borrado.mp3': 10,
+        })
+        assert sorted(cambios['nuevos']) == ['audios/permanent/horario_5/audio_1700000000_clase.mp3']
+        assert list(cambios['modificados']) == ['temp_horario_9.ogg']
+        assert cambios['eliminados'] == ['audios/permanent/horario_3/audio_1500000000_borrado.mp3']
+        assert ruta_indice(subidas, cambios['nuevos'][sorted(cambios['nuevos'])[0]]) == sorted(cambios['nuevos'])[0]
+
+
+class TestArchivoAudio:
+    """Pruebas para el modelo del índice de audios."""
+
+    def test_reconciliar(self, app_indice, subidas):
+        """El índice se llena desde el disco, se vincula con las clases y sigue al disco."""
+        resultado = ArchivoAudio.reconciliar(subidas)
+        assert resultado == {'nuevos': 3, 'modificados': 0, 'eliminados': 0, 'vinculados': 1}
+
+        archivo = ArchivoAudio.ultimo(5)
+        assert archivo.nombre == 'audio_1700000000_clase.mp3'
+        assert (archivo.clase_id, archivo.codec, archivo.tamano) == (1, 'mp3', 32)
+        assert len(archivo.sha256) == 64
+        assert ArchivoAudio.ultimo(9, temporal=True).ruta == 'temp_horario_9.ogg'
+        assert ArchivoAudio.ultimo(9) is None
+
+        os.remove(os.path.join(subidas, 'temp_horario_9.ogg'))
+        escribir(subidas, 'audios/audio_7_1600000000_antigua.wav', b'RIFF\0\0\0\0WAVEfmt data')
+        resultado = ArchivoAudio.reconciliar(subidas)
+        assert resultado == {'nuevos': 0, 'modificados': 1, 'eliminados': 1, 'vinculados': 0}
+        assert ArchivoAudio.ultimo(9, temporal=True) is None
+        assert ArchivoAudio.ultimo(7).tamano == 20
+
+    def test_registrar_y_eliminar(self, app_indice):
+        ArchivoAudio.registrar('temp_horario_5.mp3', horario_id=5, temporal=True, tamano=10)
+        ArchivoAudio.registrar('temp_horario_5.mp3', horario_id=5, temporal=True, tamano=12)
+        assert ArchivoAudio.query.count() == 1
+        assert ArchivoAudio.ultimo(5, temporal=True).tamano == 12
+        assert ArchivoAudio.eliminar(['temp_horario_5.mp3', 'otro.mp3']) == 1
+        assert ArchivoAudio.query.count() == 0
+
+    def test_quitar_clase(self, app_indice):
+        """Al borrar una clase sus registros se desvinculan o pasan a la clase que se conserva."""
+        ArchivoAudio.registrar('audios/a.mp3', horario_id=5, clase_id=1)
+        ArchivoAudio.registrar('audios/b.mp3', horario_id=5, clase_id=2)
+        ArchivoAudio.quitar_clase([1])
+        ArchivoAudio.quitar_clase([2], db.session, reemplazo=3)
+        db.session.commit()
+        assert {a.ruta: a.clase_id for a in ArchivoAudio.query} == {'audios/a.mp3': None, 'audios/b.mp3': 3}
@@ -0,0 +1,50 @@
+import os
+import sys
+import pytest
+from flask import Flask
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models import db, asegurar_indices
+from utils.plan_consultas import verificar_planes
+
+
+@pytest.fixture
+def app_indices():
+    """Aplicación mínima con el esquema completo en una base en memoria."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.session.remove()
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+class TestIndices:
+    """Pruebas para el catálogo de índices y la comprobación de planes."""
+
+    def test_consultas_frecuentes_usan_indices(self, app_indices):
+        """Ninguna consulta frecuente recorre una tabla completa con el esquema declarado."""
+        resultado = verificar_planes(db.session)
+        assert {nombre: datos['plan'] for nombre, datos in resultado.items() if not datos['correcto']} == {}
+
+    def test_migracion_crea_indices_faltantes(self, app_indices):
+        """Una base anterior al catálogo recibe los índices que le faltan."""
+        db.session.execute(db.text("DROP INDEX idx_clase_profesor_fecha"))
+        db.session.execute(db.text("DROP INDEX idx_clase_horario_id_desc"))
+        db.session.commit()
+        assert asegurar_indices() == ['idx_clase_horario_id_desc', 'idx_clase_profesor_fecha']
+        assert asegurar_indices() == []
+
+    def test_detecta_recorrido_completo(self, app_indices):
+        """Sin índices por fecha el plan de las consultas por fecha se marca como incorrecto."""
+        # La clave única (fecha, horario_id) es el índice de las búsquedas por fecha
+        db.session.execute(db.text("DROP INDEX uq_clase_fecha_horario"))
+        resultado = verificar_planes(db.session)
+        assert resultado['clases_del_dia']['tablas_recorridas'] == ['clase_realizada']
+        assert resultado['clase_existente']['correcto']
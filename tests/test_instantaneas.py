@@ -0,0 +1,69 @@
+import json
+import os
+import sqlite3
+import sys
+import pytest
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.instantaneas import crear_instantanea, comprobar_integridad, listar_instantaneas
+
+
+@pytest.fixture
+def base_wal(tmp_path):
+    """Base en modo WAL con una conexión abierta cuyas últimas filas siguen en el archivo -wal."""
+    ruta = str(tmp_path / 'gimnasio.db')
+    conexion = sqlite3.connect(ruta)
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute("PRAGMA wal_autocheckpoint=0")
+    conexion.execute("CREATE TABLE clase (id INTEGER PRIMARY KEY, texto TEXT)")
+    conexion.executemany("INSERT INTO clase (texto) VALUES (?)", [('x' * 500,) for _ in range(2000)])
+    conexion.commit()
+    yield ruta, conexion
+    conexion.close()
+
+
+class TestInstantaneas:
+    """Pruebas para las instantáneas con la API de backup y VACUUM INTO."""
+
+    def test_copia_por_pasos(self, base_wal, tmp_path):
+        """La instantánea incluye lo que aún está en el WAL y queda como archivo autocontenido."""
+        ruta, _ = base_wal
+        destino = str(tmp_path / 'backups' / 'copia.db')
+        metadatos = crear_instantanea(ruta, destino, paginas_por_paso=16, pausa=0)
+
+        copia = sqlite3.connect(destino)
+        assert copia.execute("SELECT COUNT(*) FROM clase").fetchone()[0] == 2000
+        assert copia.execute("PRAGMA journal_mode").fetchone()[0] == 'delete'
+        copia.close()
+        assert not os.path.exists(destino + '.parcial')
+        assert (metadatos['archivo'], metadatos['integridad'], metadatos['compactada']) == ('copia.db', 'ok', False)
+        assert metadatos['tamano'] == os.path.getsize(destino) == metadatos['paginas'] * metadatos['tamano_pagina']
+        with open(destino + '.json', encoding='utf-8') as f:
+            assert json.load(f) == metadatos
+
+    def test_compactada(self, base_wal, tmp_path):
+        """VACUUM INTO descarta las páginas libres."""
+        ruta, conexion = base_wal
+        conexion.execute("DELETE FROM clase WHERE id > 100")
+        conexion.commit()
+        normal = crear_instantanea(ruta, str(tmp_path / 'normal.db'))
+        compacta = crear_instantanea(ruta, str(tmp_path / 'compacta.db'), compactar=True)
+        assert compacta['compactada']
+        assert compacta['paginas'] < normal['paginas']
+        assert comprobar_integridad(str(tmp_path / 'compacta.db')) == []
+
+    def test_listar(self, base_wal, tmp_path):
+        """Se listan las instantáneas con metadatos, de la más reciente a la más antigua."""
+        ruta, _ = base_wal
+        primera = crear_instantanea(ruta, str(tmp_path / 'primera.db'))
+        crear_instantanea(ruta, str(tmp_path / 'segunda.db'))
+        primera['fecha'] = '2000-01-01 00:00:00'
+        with open(tmp_path / 'primera.db.json', 'w', encoding='utf-8') as f:
+            json.dump(primera, f)
+        os.remove(tmp_path / 'segunda.db')
+        crear_instantanea(ruta, str(tmp_path / 'tercera.db'))
+
+        assert [datos['archivo'] for datos in listar_instantaneas(str(tmp_path))] == ['tercera.db', 'primera.db']
+        assert len(listar_instantaneas(str(tmp_path), limite=1)) == 1
@@ -0,0 +1,169 @@
+import os
+import sys
+import pytest
+from datetime import date, time
+from flask import Flask
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models import db, Profesor, HorarioClase, ClaseRealizada, MetricaMensualProfesor, VERSION_RESUMEN_MENSUAL
+from utils.metricas_profesores import (calcular_tasa_puntualidad, calcular_tendencia_desde_resumen,
+                                       calcular_totales_desde_resumen)
+
+
+@pytest.fixture
+def app_resumen():
+    """Aplicación mínima con una base de datos en memoria para los modelos."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        # Descartar sesiones de otras aplicaciones creadas por pruebas anteriores
+        db.session.remove()
+        db.create_all()
+        db.session.add(Profesor(id=1, nombre='Juan', apellido='Pérez', tarifa_por_clase=10))
+        db.session.add(HorarioClase(id=1, nombre='POWER BIKE', dia_semana=0, hora_inicio=time(7, 30),
+                                    duracion=60, profesor_id=1, capacidad_maxima=20, tipo_clase='RIDE'))
+        db.session.add(HorarioClase(id=2, nombre='YOGA', dia_semana=2, hora_inicio=time(18, 0),
+                                    duracion=60, profesor_id=1, capacidad_maxima=20, tipo_clase='MOVE'))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _clase(fecha, horario_id, llegada, alumnos):
+    clase = ClaseRealizada(fecha=fecha, horario_id=horario_id, profesor_id=1,
+                           hora_llegada_profesor=llegada, cantidad_alumnos=alumnos)
+    db.session.add(clase)
+    db.session.commit()
+    return clase
+
+
+class TestResumenMensual:
+    """Pruebas para el mantenimiento incremental del resumen mensual."""
+
+    def test_agrega_por_mes_y_tipo(self, app_resumen):
+        """El resumen agrupa clases, alumnos y puntualidad por mes y tipo de clase."""
+        _clase(date(2025, 3, 3), 1, time(7, 25), 10)
+        _clase(date(2025, 3, 10), 1, time(7, 35), 6)
+        _clase(date(2025, 3, 5), 2, time(18, 20), 4)
+        _clase(date(2025, 3, 12), 2, None, 0)
+        MetricaMensualProfesor.actualizar_meses([(1, date(2025, 3, 1))])
+
+        meses = MetricaMensualProfesor.obtener_meses(profesor_id=1)
+        assert len(meses) == 1
+        marzo = meses[0]
+        assert (marzo['anio'], marzo['mes']) == (2025, 3)
+        assert marzo['total_clases'] == 4
+        assert marzo['total_alumnos'] == 20
+        assert (marzo['puntual'], marzo['retraso_leve'], marzo['retraso_significativo']) == (1, 1, 1)
+        assert marzo['clases_por_tipo'] == {'RIDE': 2, 'MOVE': 2}
+
+    def test_umbral_de_puntualidad_por_minutos(self, app_resumen):
+        """Los umbrales coinciden con calcular_tasa_puntualidad: minutos enteros, sin segundos."""
+        clases = [
+            _clase(date(2025, 3, 3), 1, time(7, 30, 0), 1),
+            _clase(date(2025, 3, 10), 1, time(7, 30, 59), 1),
+            _clase(date(2025, 3, 17), 1, time(7, 40, 30), 1),
+            _clase(date(2025, 3, 24), 1, time(7, 41), 1),
+        ]
+        MetricaMensualProfesor.actualizar_meses([(1, date(2025, 3, 3))])
+
+        marzo = MetricaMensualProfesor.obtener_meses(profesor_id=1)[0]
+        esperado = calcular_tasa_puntualidad(clases)
+        assert (esperado['puntual'], esperado['retraso_leve'], esperado['retraso_significativo']) == (2, 1, 1)
+        assert (marzo['puntual'], marzo['retraso_leve'], marzo['retraso_significativo']) == (2, 1, 1)
+        assert calcular_totales_desde_resumen([marzo])['puntualidad'] == esperado
+
+    def test_edicion_actualiza_mes_origen_y_destino(self, app_resumen):
+        """Mover una clase de mes recalcula ambos meses y elimina los vacíos."""
+        clase = _clase(date(2025, 3, 3), 1, time(7, 30), 8)
+        MetricaMensualProfesor.actualizar_meses([(1, clase.fecha)])
+
+        fecha_anterior = clase.fecha
+        clase.fecha = date(2025, 4, 7)
+        db.session.commit()
+        MetricaMensualProfesor.actualizar_meses([(1, fecha_anterior), (1, clase.fecha)])
+
+        meses = MetricaMensualProfesor.obtener_meses(profesor_id=1)
+        assert [(m['anio'], m['mes'], m['total_clases']) for m in meses] == [(2025, 4, 1)]
+
+    def test_reconstruir_coincide_con_incremental(self, app_resumen):
+        """La reconstrucción completa produce el mismo resumen que las actualizaciones incrementales."""
+        _clase(date(2025, 2, 24), 1, time(7, 45), 12)
+        _clase(date(2025, 3, 5), 2, time(17, 55), 9)
+        MetricaMensualProfesor.actualizar_meses([(1, date(2025, 2, 24)), (1, date(2025, 3, 5))])
+        incremental = MetricaMensualProfesor.obtener_meses(profesor_id=1)
+
+        MetricaMensualProfesor.reconstruir()
+        assert MetricaMensualProfesor.obtener_meses(profesor_id=1) == incremental
+
+    def test_reconstruir_si_cambio(self, app_resumen):
+        """Solo se reconstruye si no hay versión guardada o no coincide con la de la consulta."""
+        assert MetricaMensualProfesor.reconstruir_si_cambio()
+        assert not MetricaMensualProfesor.reconstruir_si_cambio()
+
+        db.session.execute(db.text("UPDATE metadatos SET valor = 'anterior' WHERE clave = 'version_resumen_mensual'"))
+        db.session.commit()
+        assert MetricaMensualProfesor.reconstruir_si_cambio()
+        assert db.session.execute(db.text(
+            "SELECT valor FROM metadatos WHERE clave = 'version_resumen_mensual'"
+        )).scalar() == VERSION_RESUMEN_MENSUAL
+
+    def test_filtros_de_rango_y_tipo(self, app_resumen):
+        """Los filtros por rango de meses y tipo de clase se aplican sobre el resumen."""
+        _clase(date(2025, 1, 6), 1, time(7, 30), 5)
+        _clase(date(2025, 2, 3), 1, time(7, 30), 5)
+        _clase(date(2025, 2, 5), 2, time(18, 0), 5)
+        MetricaMensualProfesor.reconstruir()
+
+        meses = MetricaMensualProfesor.obtener_meses(profesor_id=1, tipo_clase='RIDE', desde=date(2025, 2, 15))
+        assert [(m['mes'], m['total_clases']) for m in meses] == [(2, 1)]
+
+
+class TestTendenciaDesdeResumen:
+    """Pruebas para la evolución mensual calculada a partir del resumen."""
+
+    def test_formato_y_tendencia(self):
+        """Produce el mismo formato que calcular_tendencia_asistencia."""
+        meses = [
+            {'anio': 2025, 'mes': 2, 'total_clases': 4, 'total_alumnos': 40, 'puntual': 3,
+             'retraso_leve': 1, 'retraso_significativo': 0, 'clases_por_tipo': {'RIDE': 4}},
+            {'anio': 2025, 'mes': 1, 'total_clases': 2, 'total_alumnos': 10, 'puntual': 0,
+             'retraso_leve': 0, 'retraso_significativo': 0, 'clases_por_tipo': {'MOVE': 2}},
+        ]
+        resultado = calcular_tendencia_desde_resumen(meses)
+
+        enero, febrero = resultado['datos_mensuales']
+        assert enero['etiqueta'] == 'Enero 2025'
+        assert enero['puntualidad'] == 0
+        assert febrero['promedio_alumnos'] == 10
+        assert febrero['puntualidad'] == 75
+        assert febrero['clases_por_tipo'] == {'RIDE': 4, 'MOVE': 0, 'BOX': 0, 'OTRO': 0}
+        assert resultado['tendencia'] == pytest.approx(100)
+
+    def test_sin_datos(self):
+        """Sin meses la tendencia es cero."""
+        assert calcular_tendencia_desde_resumen([]) == {'tendencia': 0, 'datos_mensuales': []}
+
+    def test_totales_del_periodo(self):
+        """Los totales de uno o todos los meses tienen el formato de las funciones por clases."""
+        meses = [
+            {'anio': 2025, 'mes': 1, 'total_clases': 2, 'total_alumnos': 10, 'puntual': 0,
+             'retraso_leve': 0, 'retraso_significativo': 0, 'clases_por_tipo': {'MOVE': 2}},
+            {'anio': 2025, 'mes': 2, 'total_clases': 4, 'total_alumnos': 40, 'puntual': 3,
+             'retraso_leve': 1, 'retraso_significativo': 0, 'clases_por_tipo': {'RIDE': 4}},
+        ]
+        todos = calcular_totales_desde_resumen(meses)
+        assert (todos['total_clases'], todos['total_alumnos']) == (6, 50)
+        assert todos['distribucion']['tipos'] == {'MOVE': 2, 'RIDE': 4, 'BOX': 0, 'OTRO': 0}
+        assert todos['distribucion']['porcentajes']['RIDE'] == pytest.approx(200 / 3)
+
+        febrero = calcular_totales_desde_resumen(meses, (2025, 2))
+        assert febrero['promedio_alumnos'] == 10
+        assert febrero['puntualidad'] == {'tasa': 75, 'puntual': 3, 'retraso_leve': 1,
+                                          'retraso_significativo': 0, 'total': 4}
+        assert calcular_totales_desde_resumen(meses, (2025, 3))['total_clases'] == 0
@@ -0,0 +1,189 @@
+import os
+import sys
+import random
+import pytest
+from datetime import date, time, timedelta
+from flask import Flask
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models import db, Profesor, HorarioClase, ClaseRealizada
+from utils import metricas_profesores as motor_orm
+from utils import metricas_vectorizadas as motor_vectorizado
+
+
+@pytest.fixture
+def app_metricas():
+    """Base de datos en memoria con clases aleatorias (semilla fija) de varios profesores."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    azar = random.Random(20250301)
+    with app.app_context():
+        db.session.remove()
+        db.create_all()
+        db.session.add(Profesor(id=1, nombre='Juan', apellido='Pérez', tarifa_por_clase=25.0))
+        db.session.add(Profesor(id=2, nombre='Ana', apellido='Gómez', tarifa_por_clase=0))
+        horarios = [
+            (1, 'POWER BIKE', time(7, 30), 'RIDE'),
+            (2, 'YOGA', time(18, 0), 'MOVE'),
+            (3, 'BOXEO', time(19, 15), 'BOX'),
+            (4, 'ESPECIAL', time(10, 0), None),
+        ]
+        for horario_id, nombre, hora, tipo in horarios:
+            db.session.add(HorarioClase(id=horario_id, nombre=nombre, dia_semana=horario_id - 1,
+                                        hora_inicio=hora, duracion=60, profesor_id=1,
+                                        capacidad_maxima=20, tipo_clase=tipo))
+        inicio = date(2024, 11, 1)
+        registradas = set()
+        for _ in range(150):
+            horario_id, _, hora, _ = azar.choice(horarios)
+            llegada = None
+            if azar.random() > 0.2:
+                minutos = hora.hour * 60 + hora.minute + azar.randint(-10, 20)
+                llegada = time(minutos // 60, minutos % 60, azar.randint(0, 59))
+            clase = ClaseRealizada(
+                fecha=inicio + timedelta(days=azar.randint(0, 150)),
+                horario_id=horario_id,
+                profesor_id=azar.choice([1, 1, 2]),
+                hora_llegada_profesor=llegada,
+                cantidad_alumnos=None if azar.random() < 0.1 else azar.randint(0, 25)
+            )
+            # Una sola clase por fecha y horario (clave única)
+            if (clase.fecha, horario_id) not in registradas:
+                registradas.add((clase.fecha, horario_id))
+                db.session.add(clase)
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _assert_iguales(esperado, obtenido):
+    """Compara estructuras anidadas tolerando diferencias de redondeo en los floats."""
+    if isinstance(esperado, dict):
+        assert set(esperado) == set(obtenido)
+        for clave in esperado:
+            _assert_iguales(esperado[clave], obtenido[clave])
+    elif isinstance(esperado, list):
+        assert len(esperado) == len(obtenido)
+        for a, b in zip(esperado, obtenido):
+            _assert_iguales(a, b)
+    elif isinstance(esperado, float) or isinstance(obtenido, float):
+        assert obtenido == pytest.approx(esperado)
+    else:
+        assert esperado == obtenido
+
+
+def _motores(profesor_id):
+    """Devuelve las clases ORM y sus dos representaciones columnares."""
+    clases = ClaseRealizada.query.filter_by(profesor_id=profesor_id).all()
+    return (clases,
+            motor_vectorizado.cargar_clases(profesor_id=profesor_id),
+            motor_vectorizado.clases_a_columnas(clases))
+
+
+class TestParidadMotores:
+    """El motor vectorizado debe producir los mismos resultados que el motor por objetos."""
+
+    @pytest.mark.parametrize('profesor_id', [1, 2])
+    def test_puntualidad(self, app_metricas, profesor_id):
+        clases, desde_sql, desde_orm = _motores(profesor_id)
+        esperado = motor_orm.calcular_tasa_puntualidad(clases)
+        _assert_iguales(esperado, motor_vectorizado.tasa_puntualidad(desde_sql))
+        _assert_iguales(esperado, motor_vectorizado.tasa_puntualidad(desde_orm))
+
+    @pytest.mark.parametrize('profesor_id', [1, 2])
+    def test_promedio_alumnos(self, app_metricas, profesor_id):
+        clases, desde_sql, desde_orm = _motores(profesor_id)
+        esperado = motor_orm.calcular_promedio_alumnos(clases)
+        assert motor_vectorizado.promedio_alumnos(desde_sql) == pytest.approx(esperado)
+        assert motor_vectorizado.promedio_alumnos(desde_orm) == pytest.approx(esperado)
+
+    @pytest.mark.parametrize('profesor_id', [1, 2])
+    def test_distribucion(self, app_metricas, profesor_id):
+        clases, desde_sql, desde_orm = _motores(profesor_id)
+        esperado = motor_orm.calcular_distribucion_clases(clases)
+        _assert_iguales(esperado, motor_vectorizado.distribucion_clases(desde_sql))
+        _assert_iguales(esperado, motor_vectorizado.distribucion_clases(desde_orm))
+
+    @pytest.mark.parametrize('profesor_id', [1, 2])
+    def test_costo_por_alumno(self, app_metricas, profesor_id):
+        clases, desde_sql, desde_orm = _motores(profesor_id)
+        esperado = motor_orm.calcular_costo_por_alumno(clases)
+        assert motor_vectorizado.costo_por_alumno(desde_sql) == pytest.approx(esperado)
+        assert motor_vectorizado.costo_por_alumno(desde_orm) == pytest.approx(esperado)
+
+    @pytest.mark.parametrize('profesor_id', [1, 2])
+    def test_tendencia(self, app_metricas, profesor_id):
+        clases, desde_sql, desde_orm = _motores(profesor_id)
+        esperado = motor_orm.calcular_tendencia_asistencia(clases)
+        assert len(esperado['datos_mensuales']) > 1
+        _assert_iguales(esperado, motor_vectorizado.tendencia_asistencia(desde_sql))
+        _assert_iguales(esperado, motor_vectorizado.tendencia_asistencia(desde_orm))
+
+    def test_sin_clases(self, app_metricas):
+        """Sin clases ambos motores devuelven las estructuras vacías."""
+        vacio = motor_vectorizado.cargar_clases(profesor_id=99)
+        _assert_iguales(motor_orm.calcular_tasa_puntualidad([]), motor_vectorizado.tasa_puntualidad(vacio))
+        _assert_iguales(motor_orm.calcular_distribucion_clases([]), motor_vectorizado.distribucion_clases(vacio))
+        _assert_iguales(motor_orm.calcular_tendencia_asistencia([]), motor_vectorizado.tendencia_asistencia(vacio))
+        assert motor_vectorizado.promedio_alumnos(vacio) == motor_orm.calcular_promedio_alumnos([])
+        assert motor_vectorizado.costo_por_alumno(vacio) == motor_orm.calcular_costo_por_alumno([])
+
+    def test_filtro_por_fechas(self, app_metricas):
+        """La carga columnar aplica el rango de fechas en la consulta."""
+        df = motor_vectorizado.cargar_clases(fecha_inicio=date(2025, 1, 1), fecha_fin=date(2025, 1, 31))
+        esperadas = ClaseRealizada.query.filter(ClaseRealizada.fecha >= date(2025, 1, 1),
+                                                ClaseRealizada.fecha <= date(2025, 1, 31)).count()
+        assert len(df) == esperadas
+        assert df['fecha'].dt.month.eq(1).all()
+
+
+class TestMetricasCohorte:
+    """Pruebas para las métricas de todos los profesores calculadas en bloque."""
+
+    PERIODO = (date(2024, 11, 1), date(2025, 1, 30))
+
+    def test_coincide_con_calculo_por_profesor(self, app_metricas):
+        """Cada profesor de la cohorte tiene las mismas métricas que con el motor por objetos."""
+        cohorte = motor_vectorizado.calcular_metricas_cohorte(*self.PERIODO)
+        assert set(cohorte) == {1, 2}
+        for profesor_id, metricas in cohorte.items():
+            clases = Profesor.query.get(profesor_id).get_clases_periodo(*self.PERIODO)
+            distribucion = motor_orm.calcular_distribucion_clases(clases)
+            tipos_distintos = len([t for t, c in distribucion['tipos'].items() if c > 0])
+            _assert_iguales(motor_orm.calcular_tasa_puntualidad(clases), metricas['puntualidad'])
+            assert metricas['promedio_alumnos'] == pytest.approx(motor_orm.calcular_promedio_alumnos(clases))
+            assert metricas['costo_por_alumno'] == pytest.approx(motor_orm.calcular_costo_por_alumno(clases))
+            assert metricas['clases_por_mes'] == pytest.approx(len(clases) / 3)
+            assert metricas['variedad_clases'] == pytest.approx(tipos_distintos / 4 * 100)
+
+    def test_memorizada_hasta_el_siguiente_cambio(self, app_metricas):
+        """El resultado se reutiliza por periodo y se recalcula tras modificar una clase."""
+        primera = motor_vectorizado.calcular_metricas_cohorte(*self.PERIODO)
+        assert motor_vectorizado.calcular_metricas_cohorte(*self.PERIODO) is primera
+
+        clase = ClaseRealizada.query.filter_by(profesor_id=2).first()
+        clase.cantidad_alumnos = 100
+        db.session.commit()
+        assert motor_vectorizado.calcular_metricas_cohorte(*self.PERIODO) is not primera
+
+    def test_promedios_excluyen_al_profesor(self, app_metricas):
+        """get_profesores_promedio excluye al profesor indicado de la cohorte."""
+        cohorte = motor_vectorizado.calcular_metricas_cohorte(*self.PERIODO)
+        promedios = motor_orm.get_profesores_promedio(exclude_profesor_id=1,
+                                                      fecha_inicio=self.PERIODO[0],
+                                                      fecha_fin=self.PERIODO[1])
+        assert promedios['alumnos'] == pytest.approx(cohorte[2]['promedio_alumnos'])
+        assert promedios['clases_por_mes'] == pytest.approx(cohorte[2]['clases_por_mes'])
+
+    def test_cambio_de_tarifa_invalida(self, app_metricas):
+        """Modificar la tarifa de un profesor recalcula el costo por alumno de la cohorte."""
+        antes = motor_vectorizado.calcular_metricas_cohorte(*self.PERIODO)[1]['costo_por_alumno']
+        Profesor.query.get(1).tarifa_por_clase = 50.0
+        db.session.commit()
+        despues = motor_vectorizado.calcular_metricas_cohorte(*self.PERIODO)[1]['costo_por_alumno']
+        assert despues == pytest.approx(antes * 2)
@@ -0,0 +1,149 @@
+import os
+import sys
+import pytest
+from datetime import date, time
+from flask import Flask
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models import (db, Profesor, HorarioClase, ClaseRealizada, normalizar_horas,
+                    hora_desde_minutos, clasificar_retraso)
+
+
+@pytest.fixture
+def app_horas():
+    """Aplicación mínima con un profesor y un horario a las 7:30."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.session.remove()
+        db.create_all()
+        db.session.add(Profesor(id=1, nombre='Juan', apellido='Pérez', tarifa_por_clase=10))
+        db.session.add(HorarioClase(id=1, nombre='POWER BIKE', dia_semana=0, hora_inicio=time(7, 30),
+                                    duracion=60, profesor_id=1, capacidad_maxima=20, tipo_clase='RIDE'))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _filas(sql):
+    return db.session.execute(db.text(sql)).fetchall()
+
+
+class TestColumnasMinutos:
+    """Pruebas para las columnas sombra en minutos."""
+
+    def test_orm_y_sql_directo(self, app_horas):
+        """Los triggers rellenan los minutos en escrituras del ORM y en SQL directo."""
+        db.session.add(ClaseRealizada(fecha=date(2025, 3, 3), horario_id=1, profesor_id=1,
+                                      hora_llegada_profesor=time(7, 41, 30)))
+        db.session.execute(db.text(
+            "INSERT INTO clase_realizada (fecha, horario_id, profesor_id, hora_llegada_profesor) "
+            "VALUES ('2025-03-10', 1, 1, '7:05')"
+        ))
+        db.session.execute(db.text(
+            "INSERT INTO clase_realizada (fecha, horario_id, profesor_id) VALUES ('2025-03-17', 1, 1)"
+        ))
+        db.session.commit()
+        assert _filas("SELECT llegada_min FROM clase_realizada ORDER BY fecha") == [(461,), (425,), (None,)]
+        assert _filas("SELECT hora_inicio_min FROM horario_clase") == [(450,)]
+
+        HorarioClase.query.get(1).hora_inicio = time(8, 0)
+        db.session.commit()
+        assert _filas("SELECT hora_inicio_min FROM horario_clase") == [(480,)]
+
+    def test_conversion_y_clasificacion(self):
+        """Los minutos se convierten en horas y se clasifican con los umbrales de las métricas."""
+        assert hora_desde_minutos(461) == time(7, 41)
+        assert hora_desde_minutos(None) is None
+        assert [clasificar_retraso(m) for m in (-3, 0, 10, 11, None)] == [
+            "Puntual", "Puntual", "Retraso leve", "Retraso significativo", "N/A"]
+
+
+class TestNormalizarHoras:
+    """Pruebas para la migración de formatos de fecha y hora."""
+
+    def test_valores_heredados(self, app_horas):
+        """Horas y fechas con formatos antiguos se reescriben en formato canónico."""
+        db.session.execute(db.text("UPDATE horario_clase SET hora_inicio = '07:30:00'"))
+        db.session.execute(db.text(
+            "INSERT INTO clase_realizada (fecha, horario_id, profesor_id, hora_llegada_profesor) VALUES "
+            "('03/03/2025', 1, 1, '7:05'), ('2025-03-10 00:00:00', 1, 1, '07:31:15.5'), "
+            "('2025-03-17', 1, 1, 'sin hora')"
+        ))
+        db.session.commit()
+
+        resultado = normalizar_horas()
+        assert resultado['corregidos'] == {
+            'horario_clase.hora_inicio': 1,
+            'clase_realizada.hora_llegada_profesor': 2,
+            'clase_realizada.fecha': 2
+        }
+        assert resultado['no_validos'] == {'clase_realizada.hora_llegada_profesor': 1}
+        assert _filas("SELECT fecha, hora_llegada_profesor, llegada_min FROM clase_realizada ORDER BY fecha") == [
+            ('2025-03-03', '07:05:00.000000', 425),
+            ('2025-03-10', '07:31:15.500000', 451),
+            ('2025-03-17', 'sin hora', None),
+        ]
+        assert normalizar_horas()['corregidos'] == {}
+
+    def test_base_sin_columnas(self, app_horas):
+        """En una base anterior a las columnas en minutos se crean y se rellenan."""
+        for trigger in ('insert', 'update'):
+            db.session.execute(db.text(f"DROP TRIGGER trg_clase_realizada_llegada_min_{trigger}"))
+        db.session.execute(db.text("ALTER TABLE clase_realizada DROP COLUMN llegada_min"))
+        db.session.execute(db.text(
+            "INSERT INTO clase_realizada (fecha, horario_id, profesor_id, hora_llegada_profesor) "
+            "VALUES ('2025-03-03', 1, 1, '07:35:00.000000')"
+        ))
+        db.session.commit()
+
+        normalizar_horas()
+        assert _filas("SELECT llegada_min FROM clase_realizada") == [(455,)]
+        db.session.execute(db.text("UPDATE clase_realizada SET hora_llegada_profesor = '07:20:00.000000'"))
+        assert _filas("SELECT llegada_min FROM clase_realizada") == [(440,)]
+
+
+@pytest.fixture
+def cliente_informe(app):
+    """Cliente de la aplicación completa con clases de marzo de 2025 (horas en minutos)."""
+    with app.app_context():
+        db.create_all()
+        db.session.add(Profesor(id=1, nombre='Juan', apellido='Pérez', tarifa_por_clase=10))
+        db.session.add(HorarioClase(id=1, nombre='YOGA', dia_semana=0, hora_inicio=time(18, 0),
+                                    duracion=60, profesor_id=1, capacidad_maxima=20, tipo_clase='MOVE'))
+        for dia, llegada in ((3, time(17, 55)), (10, time(18, 8, 59)), (17, time(18, 25))):
+            db.session.add(ClaseRealizada(fecha=date(2025, 3, dia), horario_id=1, profesor_id=1,
+                                          hora_llegada_profesor=llegada, cantidad_alumnos=5, observaciones=''))
+        db.session.commit()
+        with app.test_client() as cliente:
+            yield cliente
+        db.session.remove()
+        db.drop_all()
+
+
+class TestInformeMensual:
+    """El informe mensual calcula horarios y puntualidad con las columnas en minutos."""
+
+    def test_puntualidad_y_horarios(self, cliente_informe):
+        respuesta = cliente_informe.get('/informes/mensual?mes=3&anio=2025')
+        assert respuesta.status_code == 200
+        html = respuesta.get_data(as_text=True)
+        assert html.count('18:00 - 19:00') >= 3
+        for texto in ('17:55', '18:08', '18:25', 'Puntual', 'Retraso leve', 'Retraso significativo'):
+            assert texto in html
+
+    def test_fecha_no_valida(self, cliente_informe):
+        """Una clase con la fecha en otro formato se omite en lugar de romper el informe."""
+        db.session.execute(db.text(
+            "INSERT INTO clase_realizada (fecha, horario_id, profesor_id, cantidad_alumnos) "
+            "VALUES ('2025-03-2', 1, 1, 4)"
+        ))
+        db.session.commit()
+        respuesta = cliente_informe.get('/informes/mensual?mes=3&anio=2025')
+        assert respuesta.status_code == 200
+        assert '18:25' in respuesta.get_data(as_text=True)
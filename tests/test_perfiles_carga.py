@@ -0,0 +1,77 @@
+import os
+import sys
+import pytest
+from datetime import date, time, timedelta
+from flask import Flask
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models import db, Profesor, HorarioClase, ClaseRealizada, perfil_carga
+from api_routes import api
+
+
+@pytest.fixture
+def app_perfiles():
+    """Aplicación mínima con la API y 40 clases repartidas en 8 horarios y 4 profesores."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    app.register_blueprint(api)
+    with app.app_context():
+        db.session.remove()
+        db.create_all()
+        for profesor_id in range(1, 5):
+            db.session.add(Profesor(id=profesor_id, nombre=f'Profesor {profesor_id}', apellido='Test',
+                                    tarifa_por_clase=10))
+        for horario_id in range(1, 9):
+            db.session.add(HorarioClase(id=horario_id, nombre=f'Clase {horario_id}', dia_semana=horario_id % 7,
+                                        hora_inicio=time(7 + horario_id, 0), duracion=60,
+                                        profesor_id=(horario_id % 4) + 1, capacidad_maxima=20,
+                                        tipo_clase='RIDE'))
+        hoy = date.today()
+        for indice in range(40):
+            db.session.add(ClaseRealizada(fecha=hoy - timedelta(days=indice % 20), horario_id=(indice % 8) + 1,
+                                          profesor_id=(indice % 3) + 1,
+                                          hora_llegada_profesor=time(7 + (indice % 8) + 1, indice % 15),
+                                          cantidad_alumnos=indice % 20))
+        db.session.commit()
+        db.session.expunge_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+class TestPerfilesCarga:
+    """Pruebas para los perfiles de carga anticipada de relaciones."""
+
+    def test_listado_en_una_consulta(self, app_perfiles, limite_consultas):
+        """Recorrer horario, profesor y puntualidad de cada clase no lanza consultas adicionales."""
+        with limite_consultas(db.engine, 1):
+            clases = ClaseRealizada.query.options(*perfil_carga('with_horario_profesor')).all()
+            filas = [(c.horario.nombre, c.profesor.nombre, c.puntualidad, c.minutos_diferencia) for c in clases]
+        assert len(filas) == 40
+
+    def test_horarios_con_profesor(self, app_perfiles, limite_consultas):
+        """El perfil de horarios trae también al profesor asignado."""
+        with limite_consultas(db.engine, 1):
+            horarios = HorarioClase.query.options(*perfil_carga('horario_with_profesor')).all()
+            assert {h.profesor.id for h in horarios} == {1, 2, 3, 4}
+
+    def test_metodos_del_profesor(self, app_perfiles, limite_consultas):
+        """get_clases_periodo y obtener_todas_clases cargan los horarios en la misma consulta."""
+        profesor = Profesor.query.get(1)
+        with limite_consultas(db.engine, 2):
+            for clases in (profesor.get_clases_periodo(date.today() - timedelta(days=30), date.today()),
+                           profesor.obtener_todas_clases()):
+                assert [c.puntualidad for c in clases]
+                assert {c.horario.tipo_clase for c in clases} == {'RIDE'}
+
+    def test_api_clases_profesor(self, app_perfiles, limite_consultas):
+        """El listado de clases de la API usa un número fijo de consultas."""
+        with app_perfiles.test_client() as client:
+            with limite_consultas(db.engine, 2):
+                respuesta = client.get('/api/profesores/1/clases?periodo=30')
+        assert respuesta.status_code == 200
+        assert len(respuesta.get_json()['data']) == 14
@@ -0,0 +1,78 @@
+import io
+import os
+import struct
+import sys
+import wave
+import numpy as np
+import pytest
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.picos_audio import (calcular_picos, generar_picos, leer_picos, reducir_picos, picos_a_json,
+                               dibujar_picos, dibujar_marcador, ruta_picos, picos_actualizados, es_archivo_picos, PicosInvalidos)
+
+
+@pytest.fixture
+def audio(tmp_path):
+    """WAV mono de 2 segundos: medio segundo de silencio y una señal de amplitud 0.5."""
+    sample_rate = 8000
+    muestras = np.zeros(2 * sample_rate, dtype=np.float32)
+    muestras[sample_rate // 2:] = 0.5 * np.sin(np.arange(len(muestras) - sample_rate // 2) / 3)
+    ruta = str(tmp_path / 'audio_1700000000_clase.wav')
+    with wave.open(ruta, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes((muestras * 32767).astype('<i2').tobytes())
+    return ruta
+
+
+class TestPicosAudio:
+    """Pruebas para los picos precalculados de la forma de onda."""
+
+    def test_calcular_picos(self):
+        """Cada bloque da su mínimo y máximo; el último bloque incompleto no se altera."""
+        minimos, maximos = calcular_picos([0.1, -0.2, 0.3, 0.4, -0.5], muestras_por_pico=2)
+        assert minimos.tolist() == pytest.approx([-0.2, 0.3, -0.5])
+        assert maximos.tolist() == pytest.approx([0.1, 0.4, -0.5])
+
+    def test_generar_y_leer(self, audio):
+        """El archivo .dat junto al audio tiene la cabecera de audiowaveform y los picos de la señal."""
+        assert not picos_actualizados(audio)
+        resultado = generar_picos(audio, muestras_por_pico=400)
+
+        assert resultado['ruta'] == ruta_picos(audio)
+        assert es_archivo_picos(os.path.basename(resultado['ruta']))
+        assert picos_actualizados(audio)
+        with open(resultado['ruta'], 'rb') as f:
+            assert struct.unpack('<iIiiI', f.read(20)) == (1, 1, 8000, 400, 40)
+
+        picos = leer_picos(resultado['ruta'])
+        assert picos['duracion'] == pytest.approx(2.0)
+        assert np.abs(picos['maximos'][:10]).max() < 0.01
+        assert picos['maximos'][20:].max() == pytest.approx(0.5, abs=0.01)
+        assert picos['minimos'][20:].min() == pytest.approx(-0.5, abs=0.01)
+
+    def test_reducir_y_dibujar(self, audio):
+        """Los picos se reducen al ancho pedido y se dibujan sin decodificar el audio."""
+        picos = leer_picos(generar_picos(audio, muestras_por_pico=100)['ruta'])
+        reducidos = reducir_picos(picos, 32)
+        assert len(reducidos['minimos']) == 32
+        assert reducidos['muestras_por_pico'] == 500
+        assert reducidos['maximos'].max() == pytest.approx(picos['maximos'].max())
+
+        datos = picos_a_json(reducidos)
+        assert len(datos['picos']) == 64 and datos['duracion'] == 2.0
+
+        from PIL import Image
+        imagen = Image.open(io.BytesIO(dibujar_picos(picos, ancho=300, alto=50)))
+        assert imagen.size == (300, 50)
+        marcador = Image.open(io.BytesIO(dibujar_marcador(ancho=300, alto=50)))
+        assert marcador.size == (300, 50)
+
+    def test_archivo_invalido(self, tmp_path):
+        ruta = tmp_path / 'picos_roto.mp3.dat'
+        ruta.write_bytes(struct.pack('<iIiiI', 1, 1, 8000, 256, 10) + b'\x00' * 4)
+        with pytest.raises(PicosInvalidos):
+            leer_picos(str(ruta))
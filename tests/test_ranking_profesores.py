@@ -0,0 +1,77 @@
+import os
+import sys
+import pytest
+from datetime import date, time
+from flask import Flask
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models import db, Profesor, HorarioClase, ClaseRealizada
+
+
+@pytest.fixture
+def app_ranking():
+    """Aplicación mínima con tres profesores y clases de marzo de 2025."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.session.remove()
+        db.create_all()
+        for profesor_id, nombre in ((1, 'Juan'), (2, 'Ana'), (3, 'Luis')):
+            db.session.add(Profesor(id=profesor_id, nombre=nombre, apellido='Test', tarifa_por_clase=10))
+        db.session.add(HorarioClase(id=1, nombre='POWER BIKE', dia_semana=0, hora_inicio=time(7, 30),
+                                    duracion=60, profesor_id=1, capacidad_maxima=20, tipo_clase='RIDE'))
+        clases = [
+            # Juan: 2 clases puntuales, 10 alumnos de media
+            (1, date(2025, 3, 3), time(7, 25), 12),
+            (1, date(2025, 3, 10), time(7, 30), 8),
+            # Ana: 3 clases, una sin registro de llegada, 20 alumnos de media
+            (2, date(2025, 3, 4), time(7, 35), 20),
+            (2, date(2025, 3, 11), time(7, 29), 25),
+            (2, date(2025, 3, 18), None, 15),
+            # Luis: fuera del periodo consultado
+            (3, date(2024, 12, 2), time(7, 30), 30),
+        ]
+        for profesor_id, fecha, llegada, alumnos in clases:
+            db.session.add(ClaseRealizada(fecha=fecha, horario_id=1, profesor_id=profesor_id,
+                                          hora_llegada_profesor=llegada, cantidad_alumnos=alumnos))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+class TestRankingProfesores:
+    """Pruebas para el ranking calculado con una única consulta agregada."""
+
+    def test_coincide_con_el_calculo_por_clase(self, app_ranking):
+        """Las métricas agregadas coinciden con las calculadas clase a clase."""
+        ranking = Profesor.obtener_ranking_profesores(
+            'total_clases', fecha_inicio=date(2025, 3, 1), fecha_fin=date(2025, 3, 31))
+        por_id = {fila['id']: fila for fila in ranking}
+        assert set(por_id) == {1, 2}
+
+        for profesor_id, fila in por_id.items():
+            clases = ClaseRealizada.query.filter_by(profesor_id=profesor_id).all()
+            con_registro = [c for c in clases if c.hora_llegada_profesor is not None]
+            puntuales = sum(1 for c in con_registro if c.puntualidad == "Puntual")
+            assert fila['total_clases'] == len(clases)
+            assert fila['promedio_alumnos'] == pytest.approx(sum(c.cantidad_alumnos for c in clases) / len(clases))
+            assert fila['puntualidad'] == pytest.approx(puntuales / len(con_registro) * 100)
+
+    def test_orden_por_metrica(self, app_ranking):
+        """El orden y el límite se aplican sobre la métrica solicitada."""
+        periodo = {'fecha_inicio': date(2025, 3, 1), 'fecha_fin': date(2025, 3, 31)}
+        assert [f['id'] for f in Profesor.obtener_ranking_profesores('puntualidad', **periodo)] == [1, 2]
+        assert [f['id'] for f in Profesor.obtener_ranking_profesores('alumnos', **periodo)] == [2, 1]
+        assert [f['id'] for f in Profesor.obtener_ranking_profesores('clases', limite=1, **periodo)] == [2]
+
+    def test_periodo_arbitrario(self, app_ranking):
+        """El periodo consultado determina qué clases entran en el ranking."""
+        ranking = Profesor.obtener_ranking_profesores(
+            'alumnos', fecha_inicio=date(2024, 12, 1), fecha_fin=date(2024, 12, 31))
+        assert [(f['id'], f['total_clases']) for f in ranking] == [(3, 1)]
+        assert ranking[0]['clases_por_mes'] == pytest.approx(1)
@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+import pytest
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import utils.renderizado as renderizado
+from utils.renderizado import PoolRenderizado, RenderizadoEnCurso, TiempoAgotado
+
+
+def dormir(segundos, valor):
+    time.sleep(segundos)
+    return valor, os.getpid()
+
+
+def fallar(mensaje):
+    raise ValueError(mensaje)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(renderizado, 'INTERVALO_VIGILANCIA', 0.05)
+    pool = PoolRenderizado(procesos=2, tiempo_limite=0.5)
+    yield pool
+    pool.cerrar()
+
+
+class TestPoolRenderizado:
+    """Pruebas para el pool de procesos de renderizado."""
+
+    def test_deduplicacion(self, pool):
+        """Las peticiones del mismo trabajo en curso comparten el futuro y se ejecutan una vez."""
+        primero = pool.enviar('picos', dormir, 0.2, 'a')
+        segundo = pool.enviar('picos', dormir, 0.2, 'b')
+        assert primero is segundo
+        valor, pid = primero.result(timeout=5)
+        assert valor == 'a'
+        if pool.usa_procesos:
+            assert pid != os.getpid()
+
+        # Terminado el trabajo, la misma clave vuelve a ejecutarse
+        assert pool.ejecutar('picos', dormir, 0, 'c', espera=5)[0] == 'c'
+
+    def test_en_curso(self, pool):
+        """Si el trabajo no termina durante la espera se informa que está en curso y sigue ejecutándose."""
+        with pytest.raises(RenderizadoEnCurso):
+            pool.ejecutar('lento', dormir, 0.3, 'x', espera=0.01)
+        assert [t['clave'] for t in pool.estado()['en_curso']] == ['lento']
+        assert pool.ejecutar('lento', dormir, 0.3, 'otro', espera=5)[0] == 'x'
+
+    def test_errores(self, pool):
+        with pytest.raises(ValueError, match='audio dañado'):
+            pool.ejecutar('roto', fallar, 'audio dañado', espera=5)
+
+    def test_tiempo_limite(self, pool):
+        """Un trabajo que supera el tiempo límite se detiene y el pool sigue atendiendo trabajos."""
+        if not pool.usa_procesos:
+            pytest.skip('Sin procesos no se pueden terminar los trabajos')
+        with pytest.raises(TiempoAgotado):
+            pool.ejecutar('colgado', dormir, 30, 'x', espera=10)
+        assert pool.estado()['reinicios'] == 1
+        assert pool.ejecutar('siguiente', dormir, 0, 'y', espera=5)[0] == 'y'
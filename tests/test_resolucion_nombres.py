@@ -0,0 +1,58 @@
+import os
+import sys
+import pytest
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.resolucion_nombres import IndiceNombres, normalizar_nombre
+
+
+@pytest.fixture
+def indice():
+    """Índice con tres profesores, dos de ellos con el mismo nombre de pila."""
+    indice = IndiceNombres()
+    for id_, nombre, apellido in ((1, 'Juan Carlos', 'Pérez'), (2, 'María José', 'Núñez'), (3, 'Juan', 'Gómez')):
+        indice.agregar(id_, nombre, f'{nombre} {apellido}')
+    return indice
+
+
+class TestNormalizarNombre:
+    """Pruebas para la normalización de nombres."""
+
+    def test_tildes_mayusculas_y_orden(self):
+        assert normalizar_nombre('  Pérez,  JUAN   Carlos ') == 'carlos juan perez'
+        assert normalizar_nombre('Núñez') == normalizar_nombre('nunez')
+        assert normalizar_nombre(None) == ''
+
+
+class TestIndiceNombres:
+    """Pruebas para la resolución por niveles."""
+
+    def test_niveles(self, indice):
+        """Cada forma de escribir el nombre se resuelve en el nivel más estricto posible."""
+        assert indice.resolver('Juan Carlos') == (1, 'exacto', ())
+        assert indice.resolver('perez juan carlos') == (1, 'normalizado', ())
+        assert indice.resolver('MARIA JOSE') == (2, 'normalizado', ())
+        assert indice.resolver('Carlos') == (1, 'palabras', ())
+        assert indice.resolver('Maria Jose Nuñes') == (2, 'aproximado', ())
+        assert indice.resolver('Pedro') == (None, None, ())
+
+    def test_ambiguos(self, indice):
+        """Un nombre que coincide con varios profesores no se asigna a ninguno."""
+        assert indice.resolver('juan') == (3, 'normalizado', ())
+        assert indice.resolver('Pérez Gómez') == (None, None, ())
+        indice.agregar(4, 'Juan', 'Torres')
+        assert indice.resolver('Juan') == (None, 'exacto', (3, 4))
+
+    def test_alias(self, indice):
+        """Un alias tiene prioridad sobre el resto de coincidencias."""
+        indice.agregar_alias('JC', 1)
+        indice.agregar_alias('Juan', 1)
+        assert indice.resolver('jc') == (1, 'alias', ())
+        assert indice.resolver('JUAN') == (1, 'alias', ())
+
+    def test_sin_aproximacion(self):
+        indice = IndiceNombres(umbral=None)
+        indice.agregar(1, 'Maria Jose')
+        assert indice.resolver('Maria Jos') == (None, None, ())
@@ -0,0 +1,154 @@
+import json
+import os
+import sqlite3
+import sys
+import zipfile
+from contextlib import contextmanager
+import pytest
+
+# Añadir el directorio raíz del proyecto al PATH para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.backup_completo import archivos_audio, escribir_zip, NOMBRE_MANIFIESTO
+from utils.restauracion import (restaurar_zip, restaurar_base_datos, resumir_informe, ControlAccesos,
+                                RestauracionInvalida)
+
+
+def crear_base(ruta, filas):
+    conexion = sqlite3.connect(ruta)
+    conexion.execute("CREATE TABLE clase (id INTEGER PRIMARY KEY, texto TEXT)")
+    conexion.executemany("INSERT INTO clase (texto) VALUES (?)", [(str(i),) for i in range(filas)])
+    conexion.commit()
+    conexion.close()
+
+
+@pytest.fixture
+def entorno(tmp_path):
+    """Base y audios en uso, y un backup ZIP con otra base y otros audios."""
+    en_uso = tmp_path / 'app'
+    (en_uso / 'audios').mkdir(parents=True)
+    crear_base(str(en_uso / 'gimnasio.db'), 5)
+    (en_uso / 'audios' / 'actual.mp3').write_bytes(b'actual')
+    (en_uso / 'audios' / 'comun.mp3').write_bytes(b'comun')
+
+    origen = tmp_path / 'origen'
+    (origen / 'audios' / 'permanent' / '2').mkdir(parents=True)
+    crear_base(str(origen / 'backup.db'), 8)
+    (origen / 'audios' / 'comun.mp3').write_bytes(b'comun')
+    (origen / 'audios' / 'permanent' / '2' / 'nuevo.mp3').write_bytes(b'nuevo' * 100)
+    zip_path = str(tmp_path / 'backup.zip')
+    escribir_zip([(str(origen / 'backup.db'), 'gimnasio_backup.db')] + archivos_audio(str(origen / 'audios')),
+                 zip_path)
+    return en_uso, zip_path
+
+
+def filas(ruta):
+    conexion = sqlite3.connect(ruta)
+    try:
+        return conexion.execute("SELECT COUNT(*) FROM clase").fetchone()[0]
+    finally:
+        conexion.close()
+
+
+class TestRestauracion:
+    """Pruebas para la restauración verificable de backups."""
+
+    def test_simulacion(self, entorno):
+        """La simulación informa de los cambios sin modificar nada."""
+        en_uso, zip_path = entorno
+        informe = restaurar_zip(zip_path, str(en_uso / 'gimnasio.db'), str(en_uso / 'audios'), simular=True)
+
+        assert informe['base_datos']['tablas'] == {'clase': {'actual': 5, 'backup': 8}}
+        assert informe['audios'] == {'nuevos': 1, 'eliminados': 1, 'modificados': 0, 'sin_cambios': 1}
+        assert resumir_informe(informe).startswith('Simulación')
+        assert filas(str(en_uso / 'gimnasio.db')) == 5
+        assert sorted(os.listdir(en_uso)) == ['audios', 'gimnasio.db']
+
+    def test_restaurar(self, entorno):
+        """Se migra la base preparada y se intercambian base y audios dentro del drenaje."""
+        en_uso, zip_path = entorno
+        llamadas = []
+
+        def migrar(ruta):
+            llamadas.append(('migrar', filas(ruta)))
+            return {}
+
+        @contextmanager
+        def drenar():
+            llamadas.append(('drenar', filas(str(en_uso / 'gimnasio.db'))))
+            yield
+
+        progreso = []
+        informe = restaurar_zip(zip_path, str(en_uso / 'gimnasio.db'), str(en_uso / 'audios'),
+                                migrar=migrar, drenar=drenar, progreso=progreso.append)
+
+        assert llamadas == [('migrar', 8), ('drenar', 5)]
+        assert informe['archivos'] == 3 and progreso[-1]['procesados'] == 3
+        assert filas(str(en_uso / 'gimnasio.db')) == 8
+        assert sorted(os.listdir(en_uso / 'audios')) == ['comun.mp3', 'permanent']
+        assert (en_uso / 'audios' / 'permanent' / '2' / 'nuevo.mp3').read_bytes() == b'nuevo' * 100
+        assert sorted(os.listdir(en_uso)) == ['audios', 'gimnasio.db']
+
+    def test_suma_incorrecta(self, entorno, tmp_path):
+        """Un archivo que no coincide con el manifiesto detiene la restauración sin tocar nada."""
+        en_uso, zip_path = entorno
+        alterado = str(tmp_path / 'alterado.zip')
+        with zipfile.ZipFile(zip_path) as original, zipfile.ZipFile(alterado, 'w') as destino:
+            for info in original.infolist():
+                datos = original.read(info)
+                if info.filename == 'audios/comun.mp3':
+                    datos = b'COMUN'
+                destino.writestr(info, datos)
+
+        with pytest.raises(RestauracionInvalida, match='SHA-256'):
+            restaurar_zip(alterado, str(en_uso / 'gimnasio.db'), str(en_uso / 'audios'))
+        assert filas(str(en_uso / 'gimnasio.db')) == 5
+        assert sorted(os.listdir(en_uso / 'audios')) == ['actual.mp3', 'comun.mp3']
+        assert sorted(os.listdir(en_uso)) == ['audios', 'gimnasio.db']
+
+    def test_estructura_invalida(self, entorno, tmp_path):
+        """Rutas fuera de la carpeta, manifiestos incompletos o ZIP sin base de datos se rechazan."""
+        en_uso, zip_path = entorno
+        casos = {
+            'ruta': {'../fuera.mp3': b'x', 'gimnasio.db': b'x'},
+            'sin_base': {'audios/a.mp3': b'x'},
+            'manifiesto': {'gimnasio.db': b'x', NOMBRE_MANIFIESTO: json.dumps({'archivos': []}).encode()},
+        }
+        for nombre, contenido in casos.items():
+            ruta = str(tmp_path / f'{nombre}.zip')
+            with zipfile.ZipFile(ruta, 'w') as zipf:
+                for archivo, datos in contenido.items():
+                    zipf.writestr(archivo, datos)
+            with pytest.raises(RestauracionInvalida):
+                restaurar_zip(ruta, str(en_uso / 'gimnasio.db'), str(en_uso / 'audios'))
+
+    def test_archivo_db(self, entorno, tmp_path):
+        """Un archivo que no es una base SQLite no reemplaza la base en uso."""
+        en_uso, _ = entorno
+        falso = tmp_path / 'falso.db'
+        falso.write_bytes(b'no es sqlite')
+        with pytest.raises(RestauracionInvalida):
+            restaurar_base_datos(str(falso), str(en_uso / 'gimnasio.db'))
+        assert filas(str(en_uso / 'gimnasio.db')) == 5
+
+        crear_base(str(tmp_path / 'otra.db'), 2)
+        informe = restaurar_base_datos(str(tmp_path / 'otra.db'), str(en_uso / 'gimnasio.db'))
+        assert informe['base_datos']['tablas'] == {'clase': {'actual': 5, 'backup': 2}}
+        assert filas(str(en_uso / 'gimnasio.db')) == 2
+
+
+class TestControlAccesos:
+    """Pruebas para el drenaje de peticiones."""
+
+    def test_drenar(self):
+        control = ControlAccesos()
+        assert control.entrar()
+        with pytest.raises(RestauracionInvalida):
+            with control.drenar(espera=0.05):
+                pass
+        assert control.entrar()
+        control.salir()
+        with control.drenar(propias=1, espera=0.05):
+            assert not control.entrar()
+        control.salir()
+        assert control.entrar()
@@ -0,0 +1,163 @@
+"""
+Backup completo (base de datos y audios) generado como un ZIP en streaming.
+
+El ZIP se escribe sobre un objeto que solo acumula lo escrito desde la última
+lectura, de modo que el generador entrega el archivo por bloques a medida que
+se construye: no se copia nada a una carpeta temporal y la memoria usada no
+depende del tamaño de los audios. Los audios ya están comprimidos y se guardan
+sin recompresión (ZIP_STORED); la base de datos, que se toma de una instantánea
+consistente, sí se comprime. Al final se añade manifiesto.json con el tamaño y
+el SHA-256 de cada archivo, calculados mientras se escriben.
+
+Estructura del ZIP (la misma que espera la restauración):
+
+    gimnasio_backup_<fecha>.db
+    audios/<archivo>
+    audios/permanent/<horario_id>/<archivo>
+    manifiesto.json
+"""
+import hashlib
+import json
+import os
+import zipfile
+from datetime import datetime
+
+
+# Bytes leídos de cada archivo por paso (y tamaño aproximado de los bloques entregados)
+TAMANO_BLOQUE = 1024 * 1024
+
+NOMBRE_MANIFIESTO = 'manifiesto.json'
+VERSION_MANIFIESTO = 1
+
+
+class _Salida:
+    """Destino de escritura del ZIP sin posibilidad de seek (zipfile usa descriptores de datos)."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        """Devuelve lo escrito desde la última llamada."""
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def archivos_audio(carpeta, prefijo='audios'):
+    """
+    Lista los audios de la carpeta de subidas (incluida permanent/<horario_id>/).
+
+    Returns:
+        list: Tuplas (ruta, nombre dentro del ZIP) ordenadas por nombre
+    """
+    entradas = []
+    if not os.path.isdir(carpeta):
+        return entradas
+    for raiz, directorios, archivos in os.walk(carpeta):
+        directorios[:] = [d for d in directorios if not d.startswith('.')]
+        relativa = os.path.relpath(raiz, carpeta)
+        for archivo in archivos:
+            if archivo.startswith('.'):
+                continue
+            nombre = archivo if relativa == '.' else os.path.join(relativa, archivo)
+            entradas.append((os.path.join(raiz, archivo), f"{prefijo}/{nombre.replace(os.sep, '/')}"))
+    entradas.sort(key=lambda entrada: entrada[1])
+    return entradas
+
+
+def generar_zip(entradas, comprimidas=(), tamano_bloque=TAMANO_BLOQUE, resumen=None):
+    """
+    Genera el ZIP por bloques de bytes.
+
+    Args:
+        entradas (list): Tuplas (ruta, nombre dentro del ZIP)
+        comprimidas (iterable): Nombres que se guardan con ZIP_DEFLATED (el resto
+            se guarda sin comprimir)
+        tamano_bloque (int): Bytes leídos de cada archivo por paso
+        resumen (dict): Si se indica, se completa al terminar con archivos,
+            bytes, errores y el manifiesto
+
+    Yields:
+        bytes: Fragmentos consecutivos del archivo ZIP
+    """
+    comprimidas = set(comprimidas)
+    salida = _Salida()
+    manifiesto = {'version': VERSION_MANIFIESTO, 'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                  'archivos': [], 'errores': []}
+    total_bytes = 0
+
+    with zipfile.ZipFile(salida, 'w', allowZip64=True) as zipf:
+        for ruta, nombre in entradas:
+            try:
+                origen = open(ruta, 'rb')
+            except OSError as e:
+                # El archivo pudo eliminarse después de listarlo: se omite y se informa
+                print(f"Error al agregar archivo al ZIP {nombre}: {str(e)}")
+                manifiesto['errores'].append({'ruta': nombre, 'error': str(e)})
+                continue
+
+            with origen:
+                info = zipfile.ZipInfo.from_file(ruta, nombre)
+                info.compress_type = zipfile.ZIP_DEFLATED if nombre in comprimidas else zipfile.ZIP_STORED
+                suma = hashlib.sha256()
+                tamano = 0
+                with zipf.open(info, 'w') as destino:
+                    while True:
+                        bloque = origen.read(tamano_bloque)
+                        if not bloque:
+                            break
+                        suma.update(bloque)
+                        tamano += len(bloque)
+                        destino.write(bloque)
+                        datos = salida.vaciar()
+                        if datos:
+                            yield datos
+
+            manifiesto['archivos'].append({'ruta': nombre, 'tamano': tamano, 'sha256': suma.hexdigest()})
+            total_bytes += tamano
+            datos = salida.vaciar()
+            if datos:
+                yield datos
+
+        zipf.writestr(NOMBRE_MANIFIESTO, json.dumps(manifiesto, ensure_ascii=False, indent=2),
+                      compress_type=zipfile.ZIP_DEFLATED)
+
+    # Al cerrar se escribe el directorio central
+    yield salida.vaciar()
+
+    if resumen is not None:
+        resumen.update({'archivos': len(manifiesto['archivos']), 'bytes': total_bytes,
+                        'errores': len(manifiesto['errores']), 'manifiesto': manifiesto})
+
+
+def escribir_zip(entradas, destino, comprimidas=(), tamano_bloque=TAMANO_BLOQUE):
+    """
+    Escribe el ZIP en un archivo (primero en <destino>.parcial y luego lo renombra).
+
+    Returns:
+        dict: Resumen con archivos, bytes, errores y el manifiesto
+    """
+    resumen = {}
+    parcial = destino + '.parcial'
+    try:
+        with open(parcial, 'wb') as f:
+            for datos in generar_zip(entradas, comprimidas, tamano_bloque, resumen):
+                f.write(datos)
+    except BaseException:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+        raise
+    os.replace(parcial, destino)
+    return resumen
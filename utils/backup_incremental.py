@@ -0,0 +1,221 @@
+"""
+Backups incrementales con almacenamiento direccionado por contenido.
+
+Cada archivo (audios e instantánea de la base de datos) se guarda una única vez
+en el almacén, con su SHA-256 como nombre:
+
+    <directorio>/blobs/<2 primeros caracteres>/<sha256>
+    <directorio>/manifiestos/<fecha>[_<etiqueta>].json
+
+Un backup es solo su manifiesto: la lista de archivos (ruta, tamaño, fecha de
+modificación y SHA-256) y la instantánea de la base de datos. En cada ejecución
+únicamente se escriben los contenidos que todavía no están en el almacén, y
+los audios cuyo tamaño y fecha de modificación coinciden con el último
+manifiesto ni siquiera se vuelven a leer, de modo que el tiempo y el espacio de
+un backup diario dependen de las grabaciones nuevas y no del historial.
+
+La restauración reconstruye la base de datos y el árbol de audios a partir del
+manifiesto elegido, comprobando el SHA-256 de cada archivo al copiarlo.
+"""
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+
+from utils.backup_completo import archivos_audio, TAMANO_BLOQUE
+
+
+DIRECTORIO_BLOBS = 'blobs'
+DIRECTORIO_MANIFIESTOS = 'manifiestos'
+VERSION_MANIFIESTO = 1
+
+# Prefijo de las rutas de audio en los manifiestos (el mismo que en el ZIP del backup completo)
+PREFIJO_AUDIOS = 'audios'
+
+
+class BackupIncrementalInvalido(Exception):
+    """El manifiesto no existe o un contenido del almacén falta o no coincide con su SHA-256."""
+
+
+def ruta_blob(directorio, sha256):
+    return os.path.join(directorio, DIRECTORIO_BLOBS, sha256[:2], sha256)
+
+
+def _sha256_archivo(ruta):
+    suma = hashlib.sha256()
+    tamano = 0
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE), b''):
+            suma.update(bloque)
+            tamano += len(bloque)
+    return suma.hexdigest(), tamano
+
+
+def _copiar_verificando(origen, destino, sha256):
+    """Copia origen en destino (vía <destino>.parcial) y comprueba el SHA-256 de lo copiado."""
+    parcial = f'{destino}.{uuid.uuid4().hex}.parcial'
+    suma = hashlib.sha256()
+    try:
+        with open(origen, 'rb') as entrada, open(parcial, 'wb') as salida:
+            for bloque in iter(lambda: entrada.read(TAMANO_BLOQUE), b''):
+                suma.update(bloque)
+                salida.write(bloque)
+        if suma.hexdigest() != sha256:
+            raise BackupIncrementalInvalido(f"El contenido de {origen} no coincide con su SHA-256 ({sha256})")
+        shutil.copystat(origen, parcial)
+        os.replace(parcial, destino)
+    finally:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+
+
+def _guardar_blob(directorio, ruta, sha256):
+    """Guarda el contenido en el almacén si aún no está. Devuelve True si se escribió."""
+    destino = ruta_blob(directorio, sha256)
+    if os.path.exists(destino):
+        return False
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    _copiar_verificando(ruta, destino, sha256)
+    return True
+
+
+def cargar_manifiesto(directorio, nombre):
+    ruta = os.path.join(directorio, DIRECTORIO_MANIFIESTOS, os.path.basename(nombre))
+    if not ruta.endswith('.json'):
+        ruta += '.json'
+    if not os.path.exists(ruta):
+        raise BackupIncrementalInvalido(f"No existe el manifiesto {nombre}")
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def listar_manifiestos(directorio, limite=None):
+    """Manifiestos del almacén, del más reciente al más antiguo."""
+    carpeta = os.path.join(directorio, DIRECTORIO_MANIFIESTOS)
+    if not os.path.isdir(carpeta):
+        return []
+    nombres = sorted((n for n in os.listdir(carpeta) if n.endswith('.json')), reverse=True)
+    manifiestos = []
+    for nombre in nombres[:limite] if limite else nombres:
+        try:
+            with open(os.path.join(carpeta, nombre), encoding='utf-8') as f:
+                manifiestos.append(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Error al leer el manifiesto {nombre}: {str(e)}")
+    return manifiestos
+
+
+def crear_backup_incremental(directorio, ruta_db, carpeta_audios, etiqueta=None, metadatos_db=None):
+    """
+    Crea un backup incremental: guarda los contenidos nuevos y escribe el manifiesto.
+
+    Args:
+        directorio (str): Directorio del almacén
+        ruta_db (str): Instantánea consistente de la base de datos
+        carpeta_audios (str): Carpeta de audios (static/uploads/audios)
+        etiqueta (str): Texto añadido al nombre del manifiesto (por ejemplo 'antes_importar')
+        metadatos_db (dict): Metadatos de la instantánea que se guardan en el manifiesto
+
+    Returns:
+        dict: Manifiesto escrito; su clave 'resumen' tiene archivos, bytes,
+        nuevos (contenidos escritos) y bytes_nuevos
+    """
+    fecha = datetime.now()
+    anterior = listar_manifiestos(directorio, limite=1)
+    # Audios sin cambios (mismo tamaño y fecha de modificación) según el último manifiesto
+    conocidos = {archivo['ruta']: archivo for archivo in anterior[0]['archivos']} if anterior else {}
+
+    resumen = {'archivos': 0, 'bytes': 0, 'nuevos': 0, 'bytes_nuevos': 0, 'reutilizados': 0}
+
+    def agregar(ruta, sha256=None):
+        estado = os.stat(ruta)
+        if sha256 is None:
+            sha256, _ = _sha256_archivo(ruta)
+        if _guardar_blob(directorio, ruta, sha256):
+            resumen['nuevos'] += 1
+            resumen['bytes_nuevos'] += estado.st_size
+        else:
+            resumen['reutilizados'] += 1
+        resumen['archivos'] += 1
+        resumen['bytes'] += estado.st_size
+        return {'tamano': estado.st_size, 'modificado': estado.st_mtime_ns, 'sha256': sha256}
+
+    base_datos = agregar(ruta_db)
+    base_datos['instantanea'] = metadatos_db or {}
+
+    archivos = []
+    for ruta, nombre in archivos_audio(carpeta_audios, prefijo=PREFIJO_AUDIOS):
+        try:
+            estado = os.stat(ruta)
+            previo = conocidos.get(nombre)
+            sin_cambios = (previo and previo['tamano'] == estado.st_size
+                           and previo['modificado'] == estado.st_mtime_ns)
+            archivos.append({'ruta': nombre, **agregar(ruta, previo['sha256'] if sin_cambios else None)})
+        except OSError as e:
+            # El archivo pudo eliminarse después de listarlo
+            print(f"Error al respaldar {nombre}: {str(e)}")
+
+    nombre = fecha.strftime('%Y%m%d_%H%M%S') + (f'_{etiqueta}' if etiqueta else '')
+    carpeta = os.path.join(directorio, DIRECTORIO_MANIFIESTOS)
+    os.makedirs(carpeta, exist_ok=True)
+    sufijo = 1
+    while os.path.exists(os.path.join(carpeta, f'{nombre}.json')):
+        sufijo += 1
+        nombre = f"{fecha.strftime('%Y%m%d_%H%M%S')}_{sufijo}" + (f'_{etiqueta}' if etiqueta else '')
+
+    manifiesto = {
+        'version': VERSION_MANIFIESTO,
+        'nombre': nombre,
+        'fecha': fecha.strftime('%Y-%m-%d %H:%M:%S'),
+        'etiqueta': etiqueta,
+        'base_datos': base_datos,
+        'archivos': archivos,
+        'resumen': resumen,
+    }
+    parcial = os.path.join(carpeta, f'{nombre}.json.parcial')
+    with open(parcial, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=1)
+    os.replace(parcial, os.path.join(carpeta, f'{nombre}.json'))
+    return manifiesto
+
+
+def restaurar_manifiesto(directorio, nombre, carpeta_audios, ruta_db):
+    """
+    Reconstruye la base de datos y el árbol de audios de un manifiesto.
+
+    Args:
+        directorio (str): Directorio del almacén
+        nombre (str): Nombre del manifiesto
+        carpeta_audios (str): Carpeta donde se recrean los audios
+        ruta_db (str): Archivo donde se escribe la base de datos
+
+    Returns:
+        dict: Archivos restaurados y bytes
+
+    Raises:
+        BackupIncrementalInvalido: Si falta un contenido o no coincide con su SHA-256
+    """
+    manifiesto = cargar_manifiesto(directorio, nombre)
+    raiz = os.path.abspath(carpeta_audios)
+
+    destinos = [(manifiesto['base_datos'], os.path.abspath(ruta_db))]
+    for archivo in manifiesto['archivos']:
+        relativa = archivo['ruta'][len(PREFIJO_AUDIOS) + 1:]
+        destino = os.path.abspath(os.path.join(raiz, relativa))
+        if os.path.commonpath([raiz, destino]) != raiz:
+            raise BackupIncrementalInvalido(f"Ruta no válida en el manifiesto: {archivo['ruta']}")
+        destinos.append((archivo, destino))
+
+    restaurados = 0
+    total_bytes = 0
+    for archivo, destino in destinos:
+        blob = ruta_blob(directorio, archivo['sha256'])
+        if not os.path.exists(blob):
+            raise BackupIncrementalInvalido(f"Falta el contenido {archivo['sha256']} en el almacén")
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        _copiar_verificando(blob, destino, archivo['sha256'])
+        restaurados += 1
+        total_bytes += archivo['tamano']
+    return {'archivos': restaurados, 'bytes': total_bytes}
@@ -0,0 +1,140 @@
+"""
+Configuración de la conexión a la base de datos SQLite (gimnasio.db).
+
+Aplica en cada conexión nueva los PRAGMA que permiten leer mientras se
+registra la asistencia (journal en modo WAL, synchronous=NORMAL, mmap, caché
+de páginas y espera ante bloqueos) y define un pool de conexiones adecuado
+para servidores con varios hilos. El modo se elige con la configuración:
+
+    BASE_DATOS_MODO: 'concurrente' (por defecto) aplica los ajustes anteriores;
+                     'simple' deja SQLite y el pool con los valores de SQLAlchemy
+    SQLITE_SYNCHRONOUS: OFF, NORMAL (por defecto) o FULL
+    SQLITE_MMAP_SIZE: bytes del archivo mapeados en memoria (256 MB por defecto)
+    SQLITE_CACHE_SIZE: caché de páginas en KiB por conexión (64 MB por defecto)
+    SQLITE_BUSY_TIMEOUT: milisegundos de espera si la base está bloqueada
+    SQLITE_FOREIGN_KEYS: activar la comprobación de claves foráneas (activada por
+                         defecto, como venía funcionando la aplicación)
+    SQLITE_POOL_SIZE / SQLITE_MAX_OVERFLOW: tamaño del pool de conexiones
+"""
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+
+MODO_CONCURRENTE = 'concurrente'
+MODO_SIMPLE = 'simple'
+
+AJUSTES_POR_DEFECTO = {
+    'BASE_DATOS_MODO': MODO_CONCURRENTE,
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_MMAP_SIZE': 256 * 1024 * 1024,
+    'SQLITE_CACHE_SIZE': 64 * 1024,
+    'SQLITE_BUSY_TIMEOUT': 5000,
+    'SQLITE_FOREIGN_KEYS': True,
+    'SQLITE_POOL_SIZE': 5,
+    'SQLITE_MAX_OVERFLOW': 10,
+}
+
+
+def leer_ajustes(config):
+    """
+    Combina la configuración de la aplicación con los valores por defecto.
+
+    Returns:
+        dict: Ajustes de AJUSTES_POR_DEFECTO con los valores configurados
+    """
+    ajustes = dict(AJUSTES_POR_DEFECTO)
+    for clave in AJUSTES_POR_DEFECTO:
+        if config.get(clave) is not None:
+            ajustes[clave] = config[clave]
+    ajustes['BASE_DATOS_MODO'] = str(ajustes['BASE_DATOS_MODO']).lower()
+    return ajustes
+
+
+def es_sqlite_en_memoria(uri):
+    """Indica si la URI apunta a una base SQLite en memoria (pruebas)."""
+    return uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri
+
+
+def opciones_motor(uri, ajustes):
+    """
+    Opciones para create_engine (SQLALCHEMY_ENGINE_OPTIONS) según el modo.
+
+    En modo concurrente las conexiones se reutilizan desde un QueuePool en
+    lugar de abrir un archivo nuevo en cada petición, y pueden pasar de un
+    hilo a otro porque el pool garantiza que solo las usa un hilo a la vez.
+    """
+    if ajustes['BASE_DATOS_MODO'] != MODO_CONCURRENTE or not uri.startswith('sqlite'):
+        return {}
+    opciones = {
+        'connect_args': {
+            'check_same_thread': False,
+            'timeout': int(ajustes['SQLITE_BUSY_TIMEOUT']) / 1000
+        }
+    }
+    if not es_sqlite_en_memoria(uri):
+        opciones.update({
+            'poolclass': QueuePool,
+            'pool_size': int(ajustes['SQLITE_POOL_SIZE']),
+            'max_overflow': int(ajustes['SQLITE_MAX_OVERFLOW']),
+            'pool_pre_ping': True
+        })
+    return opciones
+
+
+def aplicar_pragmas(dbapi_connection, ajustes):
+    """Ejecuta los PRAGMA del modo configurado sobre una conexión sqlite3."""
+    cursor = dbapi_connection.cursor()
+    try:
+        if ajustes['SQLITE_FOREIGN_KEYS']:
+            cursor.execute("PRAGMA foreign_keys=ON")
+        if ajustes['BASE_DATOS_MODO'] == MODO_CONCURRENTE:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute(f"PRAGMA synchronous={str(ajustes['SQLITE_SYNCHRONOUS']).upper()}")
+            cursor.execute(f"PRAGMA mmap_size={int(ajustes['SQLITE_MMAP_SIZE'])}")
+            # Un valor negativo indica el tamaño en KiB en lugar de en páginas
+            cursor.execute(f"PRAGMA cache_size={-abs(int(ajustes['SQLITE_CACHE_SIZE']))}")
+            cursor.execute(f"PRAGMA busy_timeout={int(ajustes['SQLITE_BUSY_TIMEOUT'])}")
+    finally:
+        cursor.close()
+
+
+def estado_pragmas(engine):
+    """
+    Lee los PRAGMA vigentes en una conexión del motor (para diagnóstico).
+
+    Returns:
+        dict: journal_mode, synchronous, mmap_size, cache_size, busy_timeout y foreign_keys
+    """
+    with engine.connect() as conexion:
+        return {
+            pragma: conexion.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+            for pragma in ('journal_mode', 'synchronous', 'mmap_size',
+                           'cache_size', 'busy_timeout', 'foreign_keys')
+        }
+
+
+def configurar_base_datos(app, db):
+    """
+    Configura el motor de la aplicación. Debe llamarse después de crear la
+    instancia de SQLAlchemy y antes de la primera consulta, ya que las
+    opciones del motor se leen al crearlo.
+
+    Args:
+        app: Aplicación Flask
+        db: Instancia de SQLAlchemy asociada a la aplicación
+
+    Returns:
+        dict: Ajustes aplicados
+    """
+    ajustes = leer_ajustes(app.config)
+    opciones = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    for clave, valor in opciones_motor(app.config['SQLALCHEMY_DATABASE_URI'], ajustes).items():
+        opciones.setdefault(clave, valor)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opciones
+
+    with app.app_context():
+        @event.listens_for(db.engine, 'connect')
+        def _configurar_conexion(dbapi_connection, connection_record):
+            aplicar_pragmas(dbapi_connection, ajustes)
+
+    return ajustes
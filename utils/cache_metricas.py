@@ -0,0 +1,287 @@
+"""
+Caché de métricas de profesores.
+
+Sustituye el diccionario global sin límite por una caché con tamaño máximo
+(LRU), expiración por tiempo y versionado por profesor: invalidar a un
+profesor incrementa su versión, de modo que sus entradas anteriores dejan de
+ser alcanzables sin tener que recorrer la caché. El almacenamiento es
+intercambiable: en memoria (por proceso) o en un archivo SQLite compartido por
+todos los procesos del servidor.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+# Versión usada para invalidar la caché completa (todos los profesores)
+VERSION_GLOBAL = 0
+
+# Versión de los resultados que combinan a todos los profesores (métricas de cohorte);
+# cambia con cualquier invalidación, sea de un profesor o global
+VERSION_COHORTE = -1
+
+
+class CacheMemoriaLRU:
+    """Almacenamiento en memoria del proceso con desalojo LRU."""
+
+    def __init__(self, max_entradas=512):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._versiones = {}
+        self._lock = threading.Lock()
+        self.desalojos = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            self._entradas.move_to_end(clave)
+            return entrada
+
+    def guardar(self, clave, valor, expira):
+        with self._lock:
+            self._entradas[clave] = (valor, expira)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.desalojos += 1
+
+    def eliminar(self, clave):
+        with self._lock:
+            self._entradas.pop(clave, None)
+
+    def version(self, profesor_id):
+        return self._versiones.get(profesor_id, 0)
+
+    def incrementar_version(self, profesor_id):
+        with self._lock:
+            self._versiones[profesor_id] = self._versiones.get(profesor_id, 0) + 1
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._versiones[VERSION_GLOBAL] = self._versiones.get(VERSION_GLOBAL, 0) + 1
+
+    def tamanio(self):
+        return len(self._entradas)
+
+
+class CacheSQLite:
+    """
+    Almacenamiento en un archivo SQLite compartido entre procesos (por ejemplo,
+    varios workers de gunicorn). Los valores se guardan serializados con pickle
+    y las versiones de cada profesor se comparten, por lo que una invalidación
+    en un proceso es visible de inmediato en los demás.
+    """
+
+    def __init__(self, ruta, max_entradas=2048):
+        self.ruta = ruta
+        self.max_entradas = max_entradas
+        self.desalojos = 0
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(directorio, exist_ok=True)
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entrada (
+                    clave TEXT PRIMARY KEY,
+                    valor BLOB NOT NULL,
+                    expira REAL NOT NULL,
+                    ultimo_acceso REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entrada_acceso ON cache_entrada (ultimo_acceso)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_version (
+                    profesor_id INTEGER PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _conectar(self):
+        conn = sqlite3.connect(self.ruta, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def obtener(self, clave):
+        with self._conectar() as conn:
+            fila = conn.execute(
+                "SELECT valor, expira FROM cache_entrada WHERE clave = ?", (clave,)
+            ).fetchone()
+            if fila is None:
+                return None
+            conn.execute("UPDATE cache_entrada SET ultimo_acceso = ? WHERE clave = ?", (time.time(), clave))
+        try:
+            return pickle.loads(fila[0]), fila[1]
+        except Exception:
+            return None
+
+    def guardar(self, clave, valor, expira):
+        datos = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._conectar() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entrada (clave, valor, expira, ultimo_acceso) VALUES (?, ?, ?, ?)",
+                (clave, sqlite3.Binary(datos), expira, time.time())
+            )
+            sobrantes = conn.execute("SELECT COUNT(*) FROM cache_entrada").fetchone()[0] - self.max_entradas
+            if sobrantes > 0:
+                conn.execute("""
+                    DELETE FROM cache_entrada WHERE clave IN (
+                        SELECT clave FROM cache_entrada ORDER BY ultimo_acceso LIMIT ?
+                    )
+                """, (sobrantes,))
+                self.desalojos += sobrantes
+
+    def eliminar(self, clave):
+        with self._conectar() as conn:
+            conn.execute("DELETE FROM cache_entrada WHERE clave = ?", (clave,))
+
+    def version(self, profesor_id):
+        with self._conectar() as conn:
+            fila = conn.execute(
+                "SELECT version FROM cache_version WHERE profesor_id = ?", (profesor_id,)
+            ).fetchone()
+        return fila[0] if fila else 0
+
+    def incrementar_version(self, profesor_id):
+        with self._conectar() as conn:
+            conn.execute("""
+                INSERT INTO cache_version (profesor_id, version) VALUES (?, 1)
+                ON CONFLICT(profesor_id) DO UPDATE SET version = version + 1
+            """, (profesor_id,))
+
+    def limpiar(self):
+        with self._conectar() as conn:
+            conn.execute("DELETE FROM cache_entrada")
+        self.incrementar_version(VERSION_GLOBAL)
+
+    def tamanio(self):
+        with self._conectar() as conn:
+            return conn.execute("SELECT COUNT(*) FROM cache_entrada").fetchone()[0]
+
+
+class CacheMetricas:
+    """
+    Caché de resultados de métricas con versionado por profesor y estadísticas
+    de aciertos y fallos.
+    """
+
+    def __init__(self, almacen=None, ttl=3600):
+        self.almacen = almacen if almacen is not None else CacheMemoriaLRU()
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+
+    def clave(self, nombre, profesor_id, argumentos):
+        """
+        Construye la clave de un resultado incluyendo la versión vigente del
+        profesor. Debe obtenerse antes de calcular el resultado: si el profesor
+        se invalida durante el cálculo, el valor queda guardado con la versión
+        anterior y no se llega a servir.
+        """
+        version_global = self.almacen.version(VERSION_GLOBAL)
+        version = self.almacen.version(profesor_id)
+        return f"{nombre}:{profesor_id}:v{version_global}.{version}:{argumentos}"
+
+    def obtener(self, clave):
+        """
+        Busca un resultado en la caché.
+
+        Returns:
+            tuple: (encontrado, valor)
+        """
+        entrada = self.almacen.obtener(clave)
+        if entrada is not None:
+            valor, expira = entrada
+            if expira > time.time():
+                self.aciertos += 1
+                return True, valor
+            self.almacen.eliminar(clave)
+        self.fallos += 1
+        return False, None
+
+    def guardar(self, clave, valor):
+        """Guarda un resultado; si no se puede serializar simplemente no se cachea."""
+        try:
+            self.almacen.guardar(clave, valor, time.time() + self.ttl)
+        except Exception as e:
+            print(f"No se pudo guardar en la caché de métricas: {str(e)}")
+
+    def invalidar(self, profesor_id=None):
+        """
+        Invalida las métricas de un profesor, o de todos si profesor_id es None.
+        """
+        self.invalidaciones += 1
+        try:
+            if profesor_id is None:
+                self.almacen.limpiar()
+            else:
+                self.almacen.incrementar_version(int(profesor_id))
+                self.almacen.incrementar_version(VERSION_COHORTE)
+        except Exception as e:
+            print(f"Error al invalidar la caché de métricas: {str(e)}")
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Aciertos, fallos, tasa de aciertos, invalidaciones, desalojos y tamaño
+        """
+        consultas = self.aciertos + self.fallos
+        try:
+            tamanio = self.almacen.tamanio()
+        except Exception:
+            tamanio = None
+        return {
+            'backend': 'sqlite' if isinstance(self.almacen, CacheSQLite) else 'memoria',
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'tasa_aciertos': (self.aciertos / consultas * 100) if consultas else 0,
+            'invalidaciones': self.invalidaciones,
+            'desalojos': self.almacen.desalojos,
+            'entradas': tamanio,
+            'max_entradas': self.almacen.max_entradas,
+            'ttl': self.ttl
+        }
+
+
+# Instancia usada por models.cache_metrics; se reemplaza con configurar_cache_metricas()
+cache_metricas = CacheMetricas()
+
+
+def configurar_cache_metricas(config):
+    """
+    Configura la caché de métricas a partir de la configuración de la aplicación.
+
+    Claves reconocidas:
+        METRICAS_CACHE_BACKEND: 'memoria' (por defecto) o 'sqlite'
+        METRICAS_CACHE_RUTA: archivo de la caché compartida (backend 'sqlite')
+        METRICAS_CACHE_MAX_ENTRADAS: número máximo de resultados almacenados
+        METRICAS_CACHE_TTL: segundos de validez de cada resultado
+
+    Returns:
+        CacheMetricas: La caché configurada
+    """
+    backend = (config.get('METRICAS_CACHE_BACKEND') or 'memoria').lower()
+    ttl = int(config.get('METRICAS_CACHE_TTL') or 3600)
+
+    if backend == 'sqlite':
+        almacen = CacheSQLite(
+            config.get('METRICAS_CACHE_RUTA') or os.path.join('instance', 'cache_metricas.db'),
+            max_entradas=int(config.get('METRICAS_CACHE_MAX_ENTRADAS') or 2048)
+        )
+    else:
+        almacen = CacheMemoriaLRU(max_entradas=int(config.get('METRICAS_CACHE_MAX_ENTRADAS') or 512))
+
+    cache_metricas.almacen = almacen
+    cache_metricas.ttl = ttl
+    return cache_metricas
@@ -0,0 +1,258 @@
+"""
+Motor de clases esperadas vs. clases registradas.
+
+Expande el horario semanal en fechas concretas dentro de un rango y lo cruza
+(anti-join) con `clase_realizada` en una única consulta SQL, de modo que los
+informes no tengan que recorrer horario por horario y día por día ni consultar
+el profesor de cada clase faltante por separado.
+"""
+from datetime import datetime, date, time
+from collections import defaultdict
+
+from sqlalchemy import text
+
+
+# Fechas del rango generadas con un CTE recursivo; el día de la semana de SQLite
+# (%w, 0 = domingo) se convierte al formato de HorarioClase.dia_semana (0 = lunes).
+# Las fechas guardadas se comparan con date() para que una fecha con hora
+# ('2025-03-05 00:00:00', de bases sin normalizar) cuente como registrada.
+SQL_SLOTS_NO_REGISTRADOS = """
+WITH RECURSIVE fechas(fecha) AS (
+    SELECT date(:fecha_inicio)
+    UNION ALL
+    SELECT date(fecha, '+1 day') FROM fechas WHERE fecha < date(:fecha_fin)
+)
+SELECT f.fecha, h.id AS horario_id
+FROM fechas f
+JOIN horario_clase h
+  ON h.dia_semana = (CAST(strftime('%w', f.fecha) AS INTEGER) + 6) % 7
+LEFT JOIN clase_realizada cr
+  ON cr.horario_id = h.id AND date(cr.fecha) = f.fecha
+WHERE cr.id IS NULL
+  AND (
+        COALESCE(h.activo, 1) = 1
+        OR (h.fecha_desactivacion IS NOT NULL AND f.fecha < date(h.fecha_desactivacion))
+  )
+"""
+
+# Variante para bases de datos antiguas sin las columnas activo/fecha_desactivacion
+SQL_SLOTS_NO_REGISTRADOS_SIN_ACTIVO = """
+WITH RECURSIVE fechas(fecha) AS (
+    SELECT date(:fecha_inicio)
+    UNION ALL
+    SELECT date(fecha, '+1 day') FROM fechas WHERE fecha < date(:fecha_fin)
+)
+SELECT f.fecha, h.id AS horario_id
+FROM fechas f
+JOIN horario_clase h
+  ON h.dia_semana = (CAST(strftime('%w', f.fecha) AS INTEGER) + 6) % 7
+LEFT JOIN clase_realizada cr
+  ON cr.horario_id = h.id AND date(cr.fecha) = f.fecha
+WHERE cr.id IS NULL
+"""
+
+
+def _ejecutar(conexion, sql, params=None):
+    """Ejecuta una consulta usando la conexión indicada o la sesión de los modelos."""
+    if conexion is None:
+        from models import db
+        conexion = db.session
+    return conexion.execute(text(sql), params or {})
+
+
+def parsear_hora(valor):
+    """
+    Convierte el valor almacenado de una hora (time o string con o sin
+    microsegundos) en un objeto time.
+
+    Args:
+        valor: Valor leído de la base de datos
+
+    Returns:
+        time: Hora normalizada, o None si no se puede interpretar
+    """
+    if valor is None or valor == '':
+        return None
+    if isinstance(valor, time):
+        return valor
+    if isinstance(valor, datetime):
+        return valor.time()
+    partes = str(valor).split('.')[0].split(':')
+    if len(partes) < 2:
+        return None
+    try:
+        return time(hour=int(partes[0]), minute=int(partes[1]))
+    except (ValueError, TypeError):
+        return None
+
+
+def parsear_fecha(valor):
+    """
+    Convierte el valor almacenado de una fecha en un objeto date.
+
+    Args:
+        valor: Valor leído de la base de datos (date, datetime o string)
+
+    Returns:
+        date: Fecha normalizada, o None si no se puede interpretar
+    """
+    if valor is None or valor == '':
+        return None
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(str(valor)[:10], formato).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _hora_fin_str(hora_inicio, duracion):
+    if hora_inicio is None:
+        return "N/A"
+    minutos_totales = hora_inicio.hour * 60 + hora_inicio.minute + (duracion or 60)
+    horas, minutos = divmod(minutos_totales, 60)
+    return f"{horas % 24:02d}:{minutos:02d}"
+
+
+def cargar_profesores(conexion=None):
+    """
+    Carga todos los profesores en un diccionario indexado por ID.
+
+    Returns:
+        dict: {profesor_id: {'id', 'nombre', 'apellido'}}
+    """
+    resultado = _ejecutar(conexion, "SELECT id, nombre, apellido FROM profesor")
+    return {
+        row.id: {'id': row.id, 'nombre': row.nombre, 'apellido': row.apellido}
+        for row in resultado
+    }
+
+
+def cargar_horarios(conexion=None):
+    """
+    Carga todos los horarios con sus horas ya normalizadas, en una sola consulta.
+
+    Returns:
+        dict: {horario_id: dict con el formato usado por las plantillas de informes}
+    """
+    try:
+        resultado = _ejecutar(conexion, """
+            SELECT id, nombre, hora_inicio, tipo_clase, dia_semana, profesor_id, duracion,
+                   activo, fecha_desactivacion
+            FROM horario_clase
+        """).fetchall()
+    except Exception:
+        # Bases de datos antiguas sin la columna activo
+        resultado = _ejecutar(conexion, """
+            SELECT id, nombre, hora_inicio, tipo_clase, dia_semana, profesor_id, duracion
+            FROM horario_clase
+        """).fetchall()
+
+    horarios = {}
+    for row in resultado:
+        hora_inicio = parsear_hora(row.hora_inicio) or time(hour=0, minute=0)
+        duracion = row.duracion if row.duracion is not None else 60
+        activo = getattr(row, 'activo', True)
+        horarios[row.id] = {
+            'id': row.id,
+            'nombre': row.nombre,
+            'hora_inicio': hora_inicio.strftime('%H:%M'),
+            'hora_inicio_obj': hora_inicio,
+            'tipo_clase': row.tipo_clase,
+            'dia_semana': row.dia_semana,
+            'profesor_id': row.profesor_id,
+            'duracion': duracion,
+            'hora_fin_str': _hora_fin_str(hora_inicio, duracion),
+            'activo': True if activo is None else bool(activo),
+            'fecha_desactivacion': parsear_fecha(getattr(row, 'fecha_desactivacion', None))
+        }
+    return horarios
+
+
+def obtener_slots_no_registrados(fecha_inicio, fecha_fin, conexion=None):
+    """
+    Calcula los pares (fecha, horario_id) esperados según el horario semanal
+    que no tienen una clase registrada, respetando activo/fecha_desactivacion.
+
+    Args:
+        fecha_inicio (date): Primer día del rango (incluido)
+        fecha_fin (date): Último día del rango (incluido)
+        conexion: Sesión o conexión SQLAlchemy; por defecto la sesión de los modelos
+
+    Returns:
+        list: Lista de tuplas (date, horario_id)
+    """
+    if fecha_inicio > fecha_fin:
+        return []
+
+    params = {
+        'fecha_inicio': fecha_inicio.strftime('%Y-%m-%d'),
+        'fecha_fin': fecha_fin.strftime('%Y-%m-%d')
+    }
+    try:
+        filas = _ejecutar(conexion, SQL_SLOTS_NO_REGISTRADOS, params).fetchall()
+    except Exception:
+        filas = _ejecutar(conexion, SQL_SLOTS_NO_REGISTRADOS_SIN_ACTIVO, params).fetchall()
+
+    return [(parsear_fecha(fila.fecha), fila.horario_id) for fila in filas]
+
+
+def calcular_clases_no_registradas(fecha_inicio, fecha_fin, profesor_id=None, conexion=None,
+                                   horarios=None, profesores=None):
+    """
+    Obtiene las clases que deberían haberse realizado en el rango y no están registradas.
+
+    Args:
+        fecha_inicio (date): Primer día del rango (incluido)
+        fecha_fin (date): Último día del rango (incluido)
+        profesor_id (int, optional): Filtrar por el profesor asignado al horario
+        conexion: Sesión o conexión SQLAlchemy; por defecto la sesión de los modelos
+        horarios (dict, optional): Horarios ya cargados con cargar_horarios()
+        profesores (dict, optional): Profesores ya cargados con cargar_profesores()
+
+    Returns:
+        list: Clases esperadas ordenadas por fecha y hora de inicio, con el formato
+              {'fecha', 'horario', 'profesor', 'tipo_clase', 'id_combinado'}
+    """
+    if horarios is None:
+        horarios = cargar_horarios(conexion)
+    if profesores is None:
+        profesores = cargar_profesores(conexion)
+
+    profesor_desconocido = {'id': 0, 'nombre': 'Desconocido', 'apellido': ''}
+
+    clases_no_registradas = []
+    for fecha, horario_id in obtener_slots_no_registrados(fecha_inicio, fecha_fin, conexion):
+        horario = horarios.get(horario_id)
+        if horario is None or fecha is None:
+            continue
+        if profesor_id and horario['profesor_id'] != profesor_id:
+            continue
+
+        clases_no_registradas.append({
+            'fecha': fecha,
+            'horario': horario.copy(),
+            'profesor': profesores.get(horario['profesor_id'], profesor_desconocido),
+            'tipo_clase': horario['tipo_clase'],
+            'id_combinado': f"{fecha.strftime('%Y-%m-%d')}|{horario_id}"
+        })
+
+    clases_no_registradas.sort(key=lambda x: (x['fecha'], x['horario']['hora_inicio_obj']))
+    return clases_no_registradas
+
+
+def agrupar_por_horario(clases_no_registradas):
+    """
+    Agrupa las clases no registradas por horario.
+
+    Returns:
+        dict: {horario_id: lista de fechas sin registro}
+    """
+    agrupadas = defaultdict(list)
+    for clase in clases_no_registradas:
+        agrupadas[clase['horario']['id']].append(clase['fecha'])
+    return dict(agrupadas)
@@ -0,0 +1,88 @@
+"""
+Envío de los archivos de audio con rangos de bytes, validación y caché.
+
+El reproductor del navegador pide los audios por rangos (Range: bytes=...) al
+saltar a otro punto de la grabación. Los audios se sirven con send_file
+condicional: 206 con el rango pedido, 304 si coincide el ETag (el SHA-256 del
+índice de audios cuando se conoce) o la fecha de modificación, y
+Accept-Ranges: bytes.
+
+Los nombres con marca de tiempo (audio_<ts>_<nombre>, audio_<id>_<ts>_<nombre>,
+clase_<id>_<fecha>.<ext>) nunca cambian de contenido: una subida nueva crea
+otro nombre. Se envían con Cache-Control: public, max-age=1 año, immutable.
+El temporal temp_horario_<id>.<ext> se sobrescribe al volver a grabar y se
+revalida siempre (no-cache).
+
+Detrás de un servidor web se puede delegar el envío (el servidor atiende los
+rangos y las validaciones):
+
+    AUDIO_ENVIO_SERVIDOR = 'x-sendfile'        Apache/lighttpd: X-Sendfile con la ruta absoluta
+    AUDIO_ENVIO_SERVIDOR = 'x-accel-redirect'  nginx: X-Accel-Redirect con AUDIO_X_ACCEL_PREFIJO
+                                                más la ruta relativa a UPLOAD_FOLDER
+
+Con nginx, AUDIO_X_ACCEL_PREFIJO es una location `internal` con alias a la
+carpeta de subidas, p. ej.:
+
+    location /uploads-internos/ { internal; alias /srv/gimnasio/static/uploads/; }
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from flask import abort, current_app, send_file
+
+
+MAX_AGE_INMUTABLE = 365 * 24 * 3600
+
+_INMUTABLE = re.compile(r'^(audio_\d+_|clase_\d+_\d+\.)')
+
+
+def es_inmutable(nombre):
+    """True si el nombre lleva marca de tiempo (su contenido no cambia nunca)."""
+    return bool(_INMUTABLE.match(os.path.basename(nombre)))
+
+
+def tipo_audio(ruta):
+    tipo, _ = mimetypes.guess_type(ruta)
+    return tipo or 'application/octet-stream'
+
+
+def _cabeceras_cache(respuesta, ruta):
+    if es_inmutable(ruta):
+        respuesta.cache_control.no_cache = None
+        respuesta.cache_control.public = True
+        respuesta.cache_control.max_age = MAX_AGE_INMUTABLE
+        respuesta.cache_control.immutable = True
+    else:
+        respuesta.cache_control.no_cache = True
+    return respuesta
+
+
+def enviar_audio(ruta, etag=None):
+    """
+    Respuesta con el archivo de audio ruta (en disco, dentro de UPLOAD_FOLDER).
+
+    Args:
+        ruta (str): Ruta del archivo
+        etag (str): Validador del contenido (p. ej. el SHA-256 del índice); si no, el de send_file
+
+    Returns:
+        Response: 200/206/304 (o la cabecera para el servidor web si AUDIO_ENVIO_SERVIDOR está configurado)
+    """
+    if not os.path.isfile(ruta):
+        abort(404)
+
+    servidor = (current_app.config.get('AUDIO_ENVIO_SERVIDOR') or '').lower()
+    if servidor in ('x-sendfile', 'x-accel-redirect'):
+        respuesta = current_app.response_class(mimetype=tipo_audio(ruta))
+        if servidor == 'x-sendfile':
+            respuesta.headers['X-Sendfile'] = os.path.abspath(ruta)
+        else:
+            relativa = os.path.relpath(ruta, current_app.config['UPLOAD_FOLDER']).replace(os.sep, '/')
+            prefijo = current_app.config.get('AUDIO_X_ACCEL_PREFIJO', '/uploads-internos/').rstrip('/')
+            respuesta.headers['X-Accel-Redirect'] = f'{prefijo}/{quote(relativa)}'
+        return _cabeceras_cache(respuesta, ruta)
+
+    respuesta = send_file(ruta, mimetype=tipo_audio(ruta), conditional=True, etag=etag or True)
+    return _cabeceras_cache(respuesta, ruta)
@@ -0,0 +1,271 @@
+"""
+Espectrogramas calculados una vez por audio y guardados en disco.
+
+Generar el espectrograma en cada petición obliga a decodificar el audio, hacer
+la STFT completa y dibujarlo con matplotlib. Aquí el espectrograma (mel o con
+el eje de frecuencias logarítmico) se calcula una sola vez por contenido del
+audio y tipo, por bloques de frames para no tener la STFT entera en memoria,
+y se guarda cuantizado a 8 bits (0 = RANGO_DB dB por debajo del máximo) en
+
+    <directorio>/<sha256[:2]>/<sha256>/<tipo>-<parámetros>/matriz.npy
+                                                         /meta.json
+                                                         /<nivel>/<x>.png
+
+La clave incluye la huella SHA-256 del audio y un resumen de los parámetros,
+de modo que un audio nuevo o un cambio de parámetros nunca reutiliza datos
+anteriores. Las imágenes se sirven por teselas de ANCHO_TESELA columnas: el
+nivel 0 es una única tesela con la grabación completa y cada nivel duplica el
+número de teselas hasta llegar a un frame por columna. Cada tesela se dibuja
+la primera vez que se pide (de la matriz abierta con mmap, sin matplotlib) y
+se guarda como PNG.
+"""
+import hashlib
+import io
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+ANCHO_TESELA = 512
+RANGO_DB = 80.0
+BLOQUE_FRAMES = 2048
+TAMANO_BLOQUE_LECTURA = 1024 * 1024
+MAX_HUELLAS = 1024
+
+PARAMETROS = {
+    'mel': {'sr': 22050, 'n_fft': 2048, 'hop_length': 512, 'n_mels': 128},
+    'log': {'sr': 22050, 'n_fft': 2048, 'hop_length': 512, 'bandas': 256, 'fmin': 32.0},
+}
+
+MAPA_COLORES = 'magma'
+
+
+class EspectrogramaNoDisponible(Exception):
+    """No hay espectrograma calculado para esa huella y tipo."""
+
+
+def huella_audio(ruta):
+    """SHA-256 del contenido del archivo."""
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE_LECTURA), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def clave_parametros(tipo):
+    """Nombre de la carpeta de un tipo: cambia si cambian sus parámetros."""
+    if tipo not in PARAMETROS:
+        raise ValueError(f"Tipo de espectrograma no válido: {tipo} (use {', '.join(PARAMETROS)})")
+    resumen = hashlib.sha256(json.dumps(PARAMETROS[tipo], sort_keys=True).encode()).hexdigest()[:8]
+    return f'{tipo}-{resumen}'
+
+
+def numero_niveles(frames):
+    """Niveles de zoom: el último tiene al menos un frame por columna."""
+    return max(0, math.ceil(math.log2(max(frames, 1) / ANCHO_TESELA))) + 1
+
+
+def _bandas_logaritmicas(sr, n_fft, bandas, fmin):
+    """Primer bin de la STFT de cada banda de frecuencias espaciadas logarítmicamente."""
+    limites = np.geomspace(fmin, sr / 2, bandas + 1)[:-1]
+    return np.clip(np.round(limites * n_fft / sr).astype(np.intp), 0, n_fft // 2)
+
+
+def calcular_matriz(muestras, tipo):
+    """
+    Espectrograma en dB (bandas x frames) cuantizado a uint8, calculado por bloques de frames.
+
+    Equivale a la STFT centrada de librosa, pero solo tiene en memoria BLOQUE_FRAMES frames a la vez.
+    """
+    import librosa
+
+    parametros = PARAMETROS[tipo]
+    n_fft, hop = parametros['n_fft'], parametros['hop_length']
+    muestras = np.asarray(muestras, dtype=np.float32)
+    frames = 1 + len(muestras) // hop
+
+    if tipo == 'mel':
+        filtros = librosa.filters.mel(sr=parametros['sr'], n_fft=n_fft, n_mels=parametros['n_mels'])
+        reducir = lambda potencia: filtros @ potencia
+        filas = parametros['n_mels']
+    else:
+        inicios = _bandas_logaritmicas(parametros['sr'], n_fft, parametros['bandas'], parametros['fmin'])
+        reducir = lambda potencia: np.maximum.reduceat(potencia, inicios, axis=0)
+        filas = parametros['bandas']
+
+    db = np.empty((filas, frames), dtype=np.float16)
+    for inicio in range(0, frames, BLOQUE_FRAMES):
+        cantidad = min(BLOQUE_FRAMES, frames - inicio)
+        # Muestras del bloque con el relleno de ceros de la STFT centrada (n_fft // 2 a cada lado de la señal)
+        desde = inicio * hop - n_fft // 2
+        hasta = desde + (cantidad - 1) * hop + n_fft
+        tramo = muestras[max(desde, 0):hasta]
+        izquierda = max(-desde, 0)
+        tramo = np.pad(tramo, (izquierda, (hasta - desde) - izquierda - len(tramo)))
+        potencia = np.abs(librosa.stft(tramo, n_fft=n_fft, hop_length=hop, center=False)) ** 2
+        db[:, inicio:inicio + cantidad] = 10 * np.log10(np.maximum(reducir(potencia), 1e-10))
+
+    # Cuantizar respecto del máximo de toda la grabación (por bloques, para no duplicar la matriz en float32)
+    referencia = float(db.max()) if db.size else 0.0
+    escala = 255 / RANGO_DB
+    matriz = np.empty(db.shape, dtype=np.uint8)
+    for inicio in range(0, frames, BLOQUE_FRAMES):
+        bloque = (db[:, inicio:inicio + BLOQUE_FRAMES].astype(np.float32) - (referencia - RANGO_DB)) * escala
+        matriz[:, inicio:inicio + BLOQUE_FRAMES] = np.clip(bloque, 0, 255)
+    return matriz
+
+
+class ServicioEspectrogramas:
+    """Calcula, guarda y dibuja por teselas los espectrogramas de los audios."""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self._huellas = OrderedDict()
+        self._bloqueos = {}
+        self._lock = threading.Lock()
+        self._colores = None
+
+    def huella(self, ruta_audio):
+        """
+        Huella del audio, recordada mientras no cambien su tamaño ni su fecha de
+        modificación (como mucho MAX_HUELLAS audios, se olvidan los menos usados).
+        """
+        estado = os.stat(ruta_audio)
+        clave = (os.path.abspath(ruta_audio), estado.st_size, estado.st_mtime_ns)
+        with self._lock:
+            huella = self._huellas.get(clave)
+            if huella is not None:
+                self._huellas.move_to_end(clave)
+                return huella
+        huella = huella_audio(ruta_audio)
+        with self._lock:
+            self._huellas[clave] = huella
+            if len(self._huellas) > MAX_HUELLAS:
+                self._huellas.popitem(last=False)
+        return huella
+
+    def carpeta(self, huella, tipo):
+        return os.path.join(self.directorio, huella[:2], huella, clave_parametros(tipo))
+
+    def _bloqueo(self, clave):
+        with self._lock:
+            return self._bloqueos.setdefault(clave, threading.Lock())
+
+    def metadatos(self, huella, tipo):
+        """Metadatos del espectrograma calculado, o None si aún no se ha calculado."""
+        try:
+            with open(os.path.join(self.carpeta(huella, tipo), 'meta.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def calcular(self, ruta_audio, tipo='mel'):
+        """
+        Calcula (si no estaba en disco) el espectrograma del audio.
+
+        Las peticiones simultáneas del mismo audio y tipo esperan al primer cálculo.
+        Devuelve los metadatos: huella, tipo, parámetros, bandas, frames, duración y niveles.
+        """
+        huella = self.huella(ruta_audio)
+        meta = self.metadatos(huella, tipo)
+        if meta is not None:
+            return meta
+
+        with self._bloqueo((huella, tipo)):
+            meta = self.metadatos(huella, tipo)
+            if meta is not None:
+                return meta
+
+            import librosa
+
+            parametros = PARAMETROS[tipo]
+            muestras, sr = librosa.load(ruta_audio, sr=parametros['sr'], mono=True)
+            matriz = calcular_matriz(muestras, tipo)
+
+            carpeta = self.carpeta(huella, tipo)
+            os.makedirs(carpeta, exist_ok=True)
+            temporal = os.path.join(carpeta, 'matriz.parcial.npy')
+            np.save(temporal, matriz)
+            os.replace(temporal, os.path.join(carpeta, 'matriz.npy'))
+
+            meta = {
+                'huella': huella,
+                'tipo': tipo,
+                'parametros': parametros,
+                'bandas': int(matriz.shape[0]),
+                'frames': int(matriz.shape[1]),
+                'duracion': round(len(muestras) / sr, 3),
+                'niveles': numero_niveles(matriz.shape[1]),
+                'ancho_tesela': ANCHO_TESELA,
+                'rango_db': RANGO_DB,
+            }
+            # meta.json se escribe al final: su presencia indica que el cálculo terminó
+            temporal = os.path.join(carpeta, 'meta.parcial.json')
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(temporal, os.path.join(carpeta, 'meta.json'))
+            return meta
+
+    def _tabla_colores(self):
+        if self._colores is None:
+            import matplotlib
+            mapa = matplotlib.colormaps[MAPA_COLORES]
+            self._colores = (mapa(np.linspace(0, 1, 256))[:, :3] * 255).astype(np.uint8)
+        return self._colores
+
+    def ruta_tesela(self, huella, tipo, nivel=0, x=0):
+        return os.path.join(self.carpeta(huella, tipo), str(nivel), f'{x}.png')
+
+    def tesela(self, huella, tipo, nivel=0, x=0):
+        """
+        Ruta del PNG de la tesela x del nivel indicado (se dibuja y guarda la primera vez).
+
+        Lanza EspectrogramaNoDisponible si no está calculado, y ValueError si la tesela no existe.
+        """
+        meta = self.metadatos(huella, tipo)
+        if meta is None:
+            raise EspectrogramaNoDisponible(f'No hay espectrograma {tipo} calculado para {huella}')
+        if not 0 <= nivel < meta['niveles'] or not 0 <= x < 2 ** nivel:
+            raise ValueError(f'Tesela fuera de rango: nivel {nivel}, x {x}')
+
+        carpeta = self.carpeta(huella, tipo)
+        ruta = self.ruta_tesela(huella, tipo, nivel, x)
+        if os.path.exists(ruta):
+            return ruta
+
+        from PIL import Image
+
+        matriz = np.load(os.path.join(carpeta, 'matriz.npy'), mmap_mode='r')
+        frames = matriz.shape[1]
+        columnas = ANCHO_TESELA * 2 ** nivel
+        # Frame inicial de cada columna de la tesela (en el último nivel un frame puede ocupar varias columnas)
+        inicios = np.arange(x * ANCHO_TESELA, (x + 1) * ANCHO_TESELA) * frames // columnas
+        fin = (x + 1) * ANCHO_TESELA * frames // columnas
+        tramo = np.asarray(matriz[:, inicios[0]:max(fin, inicios[-1] + 1)])
+        valores = np.maximum.reduceat(tramo, inicios - inicios[0], axis=1)
+
+        # Frecuencias bajas abajo
+        imagen = Image.fromarray(self._tabla_colores()[valores[::-1]])
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        buffer = io.BytesIO()
+        imagen.save(buffer, format='PNG')
+        temporal = ruta + '.parcial'
+        with open(temporal, 'wb') as f:
+            f.write(buffer.getvalue())
+        os.replace(temporal, ruta)
+        return ruta
+
+
+# Funciones para el pool de renderizado (se ejecutan en otro proceso, con un servicio propio)
+
+def calcular_espectrograma(directorio, ruta_audio, tipo):
+    return ServicioEspectrogramas(directorio).calcular(ruta_audio, tipo)
+
+
+def dibujar_tesela(directorio, huella, tipo, nivel, x):
+    return ServicioEspectrogramas(directorio).tesela(huella, tipo, nivel, x)
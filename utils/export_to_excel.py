@@ -1,136 +1,412 @@
+"""
+Exportación de las tablas de la base de datos a Excel, CSV o Parquet.
+
+Cada tabla se lee con un cursor por bloques de filas (CHUNK_SIZE) y se escribe
+a medida que se lee: en Excel con xlsxwriter en modo constant_memory (o, si no
+está instalado, con un libro openpyxl en modo write_only), que no guardan las
+celdas en memoria, y en CSV/Parquet fila a fila o por lotes. La
+memoria usada no depende del tamaño de las tablas. Los archivos por tabla y el
+libro unificado se generan en paralelo en un pool de procesos (uno solo para
+todas las exportaciones, creado al primer uso), cada uno con su propia conexión
+de solo lectura (en modo WAL no bloquean a los escritores).
+
+Formatos:
+
+    xlsx     un libro por tabla y, opcionalmente, uno unificado con una hoja por tabla
+    csv      un archivo UTF-8 por tabla, separado por comas (para otros programas)
+    parquet  un archivo por tabla (requiere pyarrow)
+"""
+import csv
+import multiprocessing
 import os
 import sqlite3
+import threading
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from time import perf_counter
 import time
-import re
+
+try:
+    import xlsxwriter
+except ImportError:  # Se usa openpyxl (más lento) para escribir los libros
+    xlsxwriter = None
+
+# Filas leídas y escritas por bloque
+CHUNK_SIZE = 5000
+
+FORMATS = ('xlsx', 'csv', 'parquet')
+
+# Lista de nombres de columnas que pueden contener datos sensibles
+SENSITIVE_COLUMNS = ['telefono', 'email', 'correo', 'celular', 'movil', 'contacto']
+
+# Longitud máxima del nombre de una hoja de Excel
+MAX_SHEET_NAME = 31
+
+def _is_email_column(col):
+    return 'email' in col.lower() or 'correo' in col.lower()
+
+def _protect_value(x, is_email, level):
+    """Oculta total o parcialmente un valor sensible (los nulos no cambian)."""
+    if x is None or (not isinstance(x, str) and pd.isna(x)):
+        return x
+    if level == 'completa':
+        # Ocultar completamente el email o el teléfono
+        return '******@****.***' if is_email else '**********'
+    if is_email:
+        # Mostrar solo el dominio del email
+        return f'*****@{x.split("@")[1]}' if '@' in str(x) else '******@****.***'
+    # Mostrar solo los últimos 3 dígitos del teléfono
+    return f'*******{str(x)[-3:]}' if len(str(x)) >= 3 else '**********'
+
+def sensitive_columns(columns):
+    """Columnas que pueden contener datos sensibles."""
+    return [col for col in columns if any(sensitive in col.lower() for sensitive in SENSITIVE_COLUMNS)]
 
 def protect_sensitive_data(df, level='completa'):
     """
     Protege datos sensibles en el DataFrame según el nivel especificado.
-    
+
     Args:
         df (DataFrame): DataFrame con datos a proteger
         level (str): Nivel de protección ('completa', 'parcial', 'ninguna')
-    
+
     Returns:
         DataFrame: DataFrame con datos protegidos
     """
     # Si el nivel es 'ninguna', devolver el DataFrame sin cambios
-    if level == 'ninguna':
+    if level not in ('completa', 'parcial'):
         return df
-    
+
     # Crear una copia del DataFrame para no modificar el original
     protected_df = df.copy()
-    
-    # Lista de nombres de columnas que pueden contener datos sensibles
-    sensitive_columns = ['telefono', 'email', 'correo', 'celular', 'movil', 'contacto']
-    
-    # Buscar columnas sensibles en el DataFrame
-    columns_to_protect = []
-    for col in protected_df.columns:
-        col_lower = col.lower()
-        if any(sensitive in col_lower for sensitive in sensitive_columns):
-            columns_to_protect.append(col)
-    
-    # Aplicar protección a las columnas sensibles
-    for col in columns_to_protect:
-        if col in protected_df.columns:
-            if level == 'completa':
-                if 'email' in col.lower() or 'correo' in col.lower():
-                    # Ocultar completamente el email
-                    protected_df[col] = protected_df[col].apply(lambda x: '******@****.***' if pd.notna(x) else x)
-                else:
-                    # Ocultar completamente el teléfono
-                    protected_df[col] = protected_df[col].apply(lambda x: '**********' if pd.notna(x) else x)
-            elif level == 'parcial':
-                if 'email' in col.lower() or 'correo' in col.lower():
-                    # Mostrar solo el dominio del email
-                    protected_df[col] = protected_df[col].apply(
-                        lambda x: f'*****@{x.split("@")[1]}' if pd.notna(x) and '@' in str(x) else '******@****.***' if pd.notna(x) else x
-                    )
-                else:
-                    # Mostrar solo los últimos 3 dígitos del teléfono
-                    protected_df[col] = protected_df[col].apply(
-                        lambda x: f'*******{str(x)[-3:]}' if pd.notna(x) and len(str(x)) >= 3 else '**********' if pd.notna(x) else x
-                    )
-    
+    for col in sensitive_columns(protected_df.columns):
+        is_email = _is_email_column(col)
+        protected_df[col] = protected_df[col].apply(lambda x: _protect_value(x, is_email, level))
     return protected_df
 
-def export_tables_to_excel(db_path='gimnasio.db', output_dir='backups', protection_level='completa', 
-                          create_unified=True, create_individual=True):
+def row_protector(columns, level='completa'):
+    """
+    Función que aplica la protección de datos sensibles a una fila (tupla) de la tabla.
+
+    Returns:
+        callable: Recibe una tupla y devuelve la fila protegida (la misma tupla
+        si no hay columnas sensibles o el nivel es 'ninguna')
+    """
+    if level not in ('completa', 'parcial'):
+        return lambda row: row
+    positions = [(columns.index(col), _is_email_column(col)) for col in sensitive_columns(columns)]
+    if not positions:
+        return lambda row: row
+
+    def protect(row):
+        row = list(row)
+        for position, is_email in positions:
+            row[position] = _protect_value(row[position], is_email, level)
+        return row
+    return protect
+
+def _connect_readonly(db_path):
+    return sqlite3.connect(f'file:{os.path.abspath(db_path)}?mode=ro', uri=True)
+
+def list_tables(db_path):
+    """Tablas de la base de datos (sin las del sistema de SQLite)."""
+    conn = _connect_readonly(db_path)
+    try:
+        return [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+    finally:
+        conn.close()
+
+def iter_table(conn, table_name, protection_level='completa', chunk_size=CHUNK_SIZE):
+    """
+    Lee una tabla por bloques aplicando la protección de datos sensibles.
+
+    Returns:
+        tuple: (lista de columnas, generador de listas de filas)
+    """
+    cursor = conn.execute(f'SELECT * FROM "{table_name}"')
+    columns = [description[0] for description in cursor.description]
+    protect = row_protector(columns, protection_level)
+
+    def chunks():
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [protect(row) for row in rows]
+    return columns, chunks()
+
+def _excel_value(value, illegal_characters):
+    # openpyxl no admite bytes ni caracteres de control en las celdas
+    if isinstance(value, str):
+        return illegal_characters.sub('', value)
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+class _XlsxWriterBook:
+    """Libro xlsxwriter en modo constant_memory (cada fila se escribe al disco al pasar a la siguiente)."""
+
+    def __init__(self, output_file):
+        self.workbook = xlsxwriter.Workbook(output_file, {
+            'constant_memory': True,
+            'nan_inf_to_errors': True,
+            # Los textos se guardan tal cual (sin convertirlos en números, fórmulas o enlaces)
+            'strings_to_numbers': False,
+            'strings_to_formulas': False,
+            'strings_to_urls': False,
+        })
+
+    def add_sheet(self, title, blob_positions):
+        sheet = self.workbook.add_worksheet(title)
+        next_row = [0]
+
+        def append(values):
+            if blob_positions:
+                values = list(values)
+                for position in blob_positions:
+                    if isinstance(values[position], bytes):
+                        values[position] = values[position].hex()
+            sheet.write_row(next_row[0], 0, values)
+            next_row[0] += 1
+        return append
+
+    def save(self):
+        self.workbook.close()
+
+class _OpenpyxlBook:
+    """Libro openpyxl en modo write_only."""
+
+    def __init__(self, output_file):
+        from openpyxl import Workbook
+        self.output_file = output_file
+        self.workbook = Workbook(write_only=True)
+
+    def add_sheet(self, title, blob_positions):
+        from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+        sheet = self.workbook.create_sheet(title=title)
+        return lambda values: sheet.append([_excel_value(value, ILLEGAL_CHARACTERS_RE) for value in values])
+
+    def save(self):
+        self.workbook.save(self.output_file)
+
+def _open_workbook(output_file):
+    return _XlsxWriterBook(output_file) if xlsxwriter is not None else _OpenpyxlBook(output_file)
+
+def _blob_positions(conn, table_name):
+    """Posiciones de las columnas que pueden guardar bytes (tipo BLOB o sin tipo)."""
+    return [position for position, _, declared_type, *_ in conn.execute(f'PRAGMA table_info("{table_name}")')
+            if not declared_type or 'BLOB' in declared_type.upper()]
+
+def _write_sheet(workbook, conn, table_name, protection_level, chunk_size):
+    append = workbook.add_sheet(table_name[:MAX_SHEET_NAME], _blob_positions(conn, table_name))
+    columns, chunks = iter_table(conn, table_name, protection_level, chunk_size)
+    append(columns)
+    row_count = 0
+    for rows in chunks:
+        for row in rows:
+            append(row)
+        row_count += len(rows)
+    return row_count
+
+def _parquet_schema(conn, table_name, protected):
+    """Esquema Arrow a partir de los tipos declarados en SQLite (las columnas protegidas son texto)."""
+    import pyarrow as pa
+    fields = []
+    for _, name, declared_type, *_ in conn.execute(f'PRAGMA table_info("{table_name}")'):
+        declared_type = (declared_type or '').upper()
+        if name in protected:
+            arrow_type = pa.string()
+        elif 'INT' in declared_type or declared_type == 'BOOLEAN':
+            arrow_type = pa.int64()
+        elif any(tipo in declared_type for tipo in ('REAL', 'FLOA', 'DOUB', 'NUMERIC', 'DECIMAL')):
+            arrow_type = pa.float64()
+        elif 'BLOB' in declared_type:
+            arrow_type = pa.binary()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+def export_table(db_path, table_name, output_file, file_format='xlsx', protection_level='completa',
+                 chunk_size=CHUNK_SIZE):
+    """
+    Exporta una tabla a un archivo, leyendo y escribiendo por bloques.
+
+    Args:
+        db_path (str): Ruta al archivo de base de datos SQLite
+        table_name (str): Tabla a exportar
+        output_file (str): Archivo de salida
+        file_format (str): 'xlsx', 'csv' o 'parquet'
+        protection_level (str): Nivel de protección de datos ('completa', 'parcial', 'ninguna')
+        chunk_size (int): Filas por bloque
+
+    Returns:
+        dict: file_path, row_count y segundos
+    """
+    start = perf_counter()
+    conn = _connect_readonly(db_path)
+    try:
+        if file_format == 'xlsx':
+            workbook = _open_workbook(output_file)
+            row_count = _write_sheet(workbook, conn, table_name, protection_level, chunk_size)
+            workbook.save()
+        elif file_format == 'csv':
+            columns, chunks = iter_table(conn, table_name, protection_level, chunk_size)
+            row_count = 0
+            with open(output_file, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                for rows in chunks:
+                    writer.writerows(rows)
+                    row_count += len(rows)
+        elif file_format == 'parquet':
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise RuntimeError("La exportación a Parquet requiere el paquete pyarrow")
+            columns, chunks = iter_table(conn, table_name, protection_level, chunk_size)
+            protected = sensitive_columns(columns) if protection_level in ('completa', 'parcial') else []
+            schema = _parquet_schema(conn, table_name, set(protected))
+            row_count = 0
+            with pq.ParquetWriter(output_file, schema) as writer:
+                for rows in chunks:
+                    data = {name: [row[i] for row in rows] for i, name in enumerate(columns)}
+                    writer.write_table(pa.Table.from_pydict(data, schema=schema))
+                    row_count += len(rows)
+        else:
+            raise ValueError(f"Formato de exportación no válido: {file_format}")
+    finally:
+        conn.close()
+    return {'file_path': output_file, 'row_count': row_count, 'segundos': round(perf_counter() - start, 3)}
+
+def export_unified_workbook(db_path, table_names, output_file, protection_level='completa', chunk_size=CHUNK_SIZE):
+    """
+    Crea un libro Excel con una hoja por tabla (en memoria constante, por bloques).
+
+    Returns:
+        dict: file_path, row_count (total) y segundos
+    """
+    start = perf_counter()
+    conn = _connect_readonly(db_path)
+    try:
+        workbook = _open_workbook(output_file)
+        row_count = sum(_write_sheet(workbook, conn, table_name, protection_level, chunk_size)
+                        for table_name in table_names)
+        workbook.save()
+    finally:
+        conn.close()
+    return {'file_path': output_file, 'row_count': row_count, 'segundos': round(perf_counter() - start, 3)}
+
+def _process_context():
+    """
+    Contexto 'forkserver' para el pool de procesos. La exportación se pide desde
+    un servidor con varios hilos, y 'fork' copiaría los locks que esos hilos
+    tengan tomados; los procesos salen del servidor de procesos (un proceso de un
+    solo hilo) y reciben por referencia las funciones de este módulo. El servidor
+    importa el módulo principal como '__mp_main__' (con 'python app.py', la
+    aplicación, que bajo ese nombre no aplica las migraciones). Donde no existe
+    (Windows) la exportación se hace en el mismo proceso.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return None
+
+_executor = None
+_executor_processes = None
+_executor_lock = threading.Lock()
+
+def _get_executor(processes, context):
+    """
+    Pool de procesos compartido por las exportaciones. Se crea al primer uso y
+    solo se vuelve a crear si cambia el número de procesos o si se rompió.
+    """
+    global _executor, _executor_processes
+    with _executor_lock:
+        if _executor is not None and _executor_processes != processes:
+            _executor.shutdown(wait=False)
+            _executor = None
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=processes, mp_context=context)
+            _executor_processes = processes
+        return _executor
+
+def _discard_executor(executor):
+    """Descarta el pool compartido si es el indicado (p. ej. tras un BrokenProcessPool)."""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+def export_tables_to_excel(db_path='gimnasio.db', output_dir='backups', protection_level='completa',
+                          create_unified=True, create_individual=True, file_format='xlsx',
+                          processes=None, chunk_size=CHUNK_SIZE):
     """
     Exporta tablas de la base de datos SQLite a archivos Excel con protección de datos sensibles.
-    
+
     Args:
         db_path (str): Ruta al archivo de base de datos SQLite
         output_dir (str): Directorio donde se guardarán los archivos Excel
         protection_level (str): Nivel de protección de datos ('completa', 'parcial', 'ninguna')
         create_unified (bool): Si se debe crear un archivo Excel unificado con todas las tablas
+            (solo en formato xlsx)
         create_individual (bool): Si se deben crear archivos Excel individuales para cada tabla
-    
+        file_format (str): 'xlsx', 'csv' o 'parquet' para los archivos individuales
+        processes (int): Procesos del pool compartido (None: uno por núcleo; 1: sin pool)
+        chunk_size (int): Filas leídas y escritas por bloque
+
     Returns:
         dict: Diccionario con información de los archivos exportados
     """
+    if file_format not in FORMATS:
+        raise ValueError(f"Formato de exportación no válido: {file_format}")
+
     # Crear directorio de respaldo si no existe
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
-    
+
     # Timestamp para los nombres de archivo
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    
-    # Conectar a la base de datos
-    conn = sqlite3.connect(db_path)
-    
-    # Obtener lista de tablas
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
-    
-    exported_files = {}
-    dataframes = {}
-    
-    for table in tables:
-        table_name = table[0]
-        # Saltear tablas del sistema SQLite
-        if table_name.startswith('sqlite_'):
-            continue
-            
-        # Leer tabla en un DataFrame
-        df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
-        
-        # Proteger datos sensibles
-        protected_df = protect_sensitive_data(df, level=protection_level)
-        dataframes[table_name] = protected_df
-        
-        # Exportar a Excel si se solicita archivos individuales
-        if create_individual:
-            # Nombre del archivo de salida
-            output_file = os.path.join(output_dir, f"{table_name}_{timestamp}.xlsx")
-            
-            # Exportar a Excel
-            protected_df.to_excel(output_file, index=False)
-            
-            # Guardar info en diccionario de resultados
-            exported_files[table_name] = {
-                'file_path': output_file,
-                'row_count': len(protected_df)
-            }
-            
-            print(f"Tabla '{table_name}' exportada a '{output_file}' ({len(protected_df)} registros)")
-    
-    # También crear un archivo Excel con todas las tablas en distintas hojas si se solicita
-    if create_unified:
+    table_names = list_tables(db_path)
+
+    # Tareas: un archivo por tabla y el libro unificado
+    tasks = {}
+    if create_individual:
+        for table_name in table_names:
+            output_file = os.path.join(output_dir, f"{table_name}_{timestamp}.{file_format}")
+            tasks[table_name] = (export_table, (db_path, table_name, output_file, file_format,
+                                                protection_level, chunk_size))
+    if create_unified and file_format == 'xlsx':
         output_file_all = os.path.join(output_dir, f"gimnasio_completo_{timestamp}.xlsx")
-        with pd.ExcelWriter(output_file_all) as writer:
-            for table_name, protected_df in dataframes.items():
-                protected_df.to_excel(writer, sheet_name=table_name, index=False)
-        
-        print(f"Backup completo creado en '{output_file_all}'")
-        exported_files['completo'] = {'file_path': output_file_all}
-    
-    conn.close()
-    
+        tasks['completo'] = (export_unified_workbook, (db_path, table_names, output_file_all,
+                                                       protection_level, chunk_size))
+
+    processes = processes or os.cpu_count() or 1
+    context = _process_context()
+    exported_files = {}
+    if min(processes, len(tasks)) > 1 and context is not None:
+        executor = _get_executor(processes, context)
+        try:
+            futures = {name: executor.submit(function, *args) for name, (function, args) in tasks.items()}
+            for name, future in futures.items():
+                exported_files[name] = future.result()
+        except BrokenProcessPool:
+            _discard_executor(executor)
+            raise
+    else:
+        for name, (function, args) in tasks.items():
+            exported_files[name] = function(*args)
+
+    for name, info in exported_files.items():
+        if name == 'completo':
+            print(f"Backup completo creado en '{info['file_path']}'")
+        else:
+            print(f"Tabla '{name}' exportada a '{info['file_path']}' ({info['row_count']} registros, {info['segundos']} s)")
+
     return exported_files
 
 if __name__ == "__main__":
@@ -139,4 +415,4 @@ if __name__ == "__main__":
         print("\nExportación completada con éxito.")
     except Exception as e:
         print(f"\nError durante la exportación: {str(e)}")
-        time.sleep(5)  # Pausa para leer el error 
\ No newline at end of file
+        time.sleep(5)  # Pausa para leer el error
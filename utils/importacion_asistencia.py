@@ -0,0 +1,640 @@
+"""
+Motor de importación masiva de asistencias desde Excel.
+
+Sustituye el recorrido fila a fila (df.iterrows con una búsqueda de profesor,
+otra de horario, otra de clase existente y un commit por fila) por un proceso
+por etapas:
+
+    1. Conversión y validación de las columnas del DataFrame con pandas
+       (cada valor distinto de hora se interpreta una sola vez).
+    2. Resolución de profesores y horarios con mapas en memoria construidos
+       con una consulta por tabla (nombres normalizados, alias y coincidencia
+       aproximada; ver utils/resolucion_nombres.py); los que faltan se crean
+       juntos y los nombres ambiguos se informan como errores de la fila.
+    3. Detección de clases ya registradas (fecha, horario_id) con una única
+       consulta sobre el rango de fechas del archivo.
+    4. Inserciones y actualizaciones en lotes, con un commit por lote para no
+       bloquear la base de datos durante toda la importación.
+
+La importación es idempotente: cada fila lleva una huella de su contenido
+normalizado (fecha, hora, instructor, clase y asistencia) que se guarda en la
+clase; una fila cuya huella coincide con la de la clase registrada se marca
+'Sin cambios' y no se escribe. Las escrituras son INSERT ... ON CONFLICT sobre
+la clave única (fecha, horario_id), así que reimportar no duplica clases, y el
+archivo completo se identifica por su SHA-256 (huella_archivo) para saltarse
+una importación idéntica.
+
+El resultado es un diccionario con los contadores y el detalle de cada fila,
+incluidos los errores por fila.
+
+Los libros .xlsx se leen en streaming (openpyxl en modo read_only) y se
+importan por bloques de filas, de modo que la memoria no crece con el tamaño
+del archivo; el resultado incluye el rendimiento en filas por segundo.
+"""
+import hashlib
+from datetime import datetime, date, time
+from time import perf_counter
+
+import openpyxl
+import pandas as pd
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import (db, Profesor, HorarioClase, ClaseRealizada, MetricaMensualProfesor, AliasProfesor,
+                    existe_clave_clases)
+from utils.cache_metricas import cache_metricas
+from utils.resolucion_nombres import IndiceNombres, normalizar_nombre, UMBRAL_SIMILITUD
+
+
+TAMANO_LOTE = 500
+
+# Filas leídas del libro e importadas de una vez
+TAMANO_BLOQUE = 2000
+
+FORMATOS_FECHA = ['%d/%m/%Y', '%Y-%m-%d', '%m/%d/%Y', '%d-%m-%Y', '%d.%m.%Y']
+
+# Textos de la columna Hora que indican que el profesor no asistió
+PATRON_AUSENCIA = r'NO ASISTIO|NO ASISTIÓ|AUSENTE|CANCELADO'
+
+OBSERVACION_AUSENCIA = "PROFESOR NO ASISTIÓ"
+
+# Un horario se identifica por día, hora de inicio y nombre o tipo de clase
+CLAVES_HORARIO = ('nombre', 'tipo_clase')
+
+# Bytes leídos por vez al calcular la huella de un archivo
+TAMANO_LECTURA = 1024 * 1024
+
+
+def _texto(serie):
+    """Columna como texto sin espacios; los valores vacíos quedan como ''."""
+    return serie.where(serie.notna(), '').astype(str).str.strip()
+
+
+def convertir_fechas(serie):
+    """
+    Convierte la columna Fecha a objetos date.
+
+    Los valores que ya son fechas se usan directamente; el texto se prueba con
+    cada formato de FORMATOS_FECHA sobre toda la columna y, lo que quede, con
+    el analizador de pandas (día primero).
+
+    Returns:
+        pd.Series: date o None para los valores vacíos o no reconocidos
+    """
+    es_fecha = serie.map(lambda valor: isinstance(valor, (datetime, date)))
+    fechas = pd.to_datetime(serie.where(es_fecha), errors='coerce')
+
+    texto = _texto(serie).where(~es_fecha & serie.notna())
+    for formato in FORMATOS_FECHA:
+        pendientes = fechas.isna() & texto.notna()
+        if not pendientes.any():
+            break
+        fechas = fechas.fillna(pd.to_datetime(texto[pendientes], format=formato, errors='coerce'))
+
+    pendientes = fechas.isna() & texto.notna()
+    for indice in pendientes[pendientes].index:
+        fechas[indice] = pd.to_datetime(texto[indice], dayfirst=True, errors='coerce')
+
+    return pd.Series([f.date() if not pd.isna(f) else None for f in fechas], index=serie.index, dtype=object)
+
+
+def convertir_hora(valor):
+    """
+    Convierte un valor de la columna Hora (time, datetime, decimal de Excel o
+    texto como '7:30', '07:30 PM') en un objeto time sin segundos de sobra.
+
+    Raises:
+        ValueError: Si el valor no se reconoce como hora
+    """
+    if isinstance(valor, datetime):
+        return valor.time()
+    if isinstance(valor, time):
+        return valor
+    if isinstance(valor, (int, float)):
+        segundos = int(round(float(valor) * 86400))
+        if not 0 <= segundos < 86400:
+            raise ValueError(f"No se pudo convertir el valor {valor} a formato de hora")
+        return time(segundos // 3600, (segundos % 3600) // 60, segundos % 60)
+
+    texto = str(valor).strip().upper()
+    try:
+        if ':' in texto or '.' in texto:
+            es_pm = 'PM' in texto
+            es_am = 'AM' in texto
+            partes = texto.replace('AM', '').replace('PM', '').strip().replace('.', ':').split(':')
+            horas = int(partes[0])
+            minutos = int(partes[1]) if len(partes) > 1 else 0
+            if es_pm and horas < 12:
+                horas += 12
+            elif es_am and horas == 12:
+                horas = 0
+            return time(horas, minutos)
+        return pd.to_datetime(texto).time()
+    except Exception as e:
+        raise ValueError(f"No se pudo convertir la hora '{valor}': {str(e)}")
+
+
+def preparar_filas(df, columna_alumnos='Alumnos', fila_inicial=0):
+    """
+    Convierte y valida todas las filas del archivo.
+
+    Args:
+        df (pd.DataFrame): Hoja leída con las columnas Fecha, Hora, Intructor y Clase
+        columna_alumnos (str): Columna con la cantidad de alumnos
+        fila_inicial (int): Desplazamiento del número de fila mostrado en los errores
+
+    Returns:
+        pd.DataFrame: fila, fecha, hora, no_asistio, instructor, nombre (de la
+        clase), alumnos y error (None si la fila es válida)
+    """
+    filas = pd.DataFrame({
+        'fila': df.index + fila_inicial,
+        'fecha_original': df['Fecha'].astype(str).values,
+        'fecha': convertir_fechas(df['Fecha']).values,
+        'instructor': _texto(df['Intructor']).values,
+        'nombre': _texto(df['Clase']).values,
+        'alumnos': pd.to_numeric(df[columna_alumnos], errors='coerce').fillna(0).astype(int).values,
+    })
+
+    horas = df['Hora']
+    no_asistio = horas.map(lambda valor: isinstance(valor, str)) & \
+        _texto(horas).str.upper().str.contains(PATRON_AUSENCIA)
+    filas['no_asistio'] = no_asistio.values
+
+    # Cada valor distinto de hora se interpreta una sola vez
+    convertidas = {}
+    for valor in pd.unique(horas[horas.notna() & ~no_asistio]):
+        try:
+            convertidas[valor] = (convertir_hora(valor), None)
+        except ValueError as e:
+            convertidas[valor] = (None, str(e))
+    # Ausencias y celdas vacías usan medianoche como hora del horario
+    resultado_horas = [
+        (time(0, 0), None) if ausente or pd.isna(valor) else convertidas[valor]
+        for valor, ausente in zip(horas, no_asistio)
+    ]
+    filas['hora'] = [hora for hora, _ in resultado_horas]
+
+    errores = pd.Series([error for _, error in resultado_horas], index=filas.index, dtype=object)
+    errores = errores.mask(filas['nombre'] == '', "El nombre de la clase está vacío")
+    errores = errores.mask(filas['instructor'] == '', "El nombre del instructor está vacío")
+    errores = errores.mask(filas['fecha'].isna() & df['Fecha'].notna().values,
+                           "No se pudo convertir la fecha '" + filas['fecha_original'] + "'")
+    errores = errores.mask(df['Fecha'].isna().values, "La fecha está vacía")
+    filas['error'] = errores
+    return filas
+
+
+def _nombre_normalizado(texto):
+    return ' '.join(texto.lower().split())
+
+
+def huella_fila(fila):
+    """
+    Huella de una fila válida de preparar_filas: SHA-1 de la fecha, la hora (o la
+    ausencia), el instructor y la clase normalizados y la cantidad de alumnos.
+    """
+    contenido = '|'.join((
+        fila.fecha.isoformat(),
+        'AUSENTE' if fila.no_asistio else fila.hora.strftime('%H:%M:%S'),
+        _nombre_normalizado(fila.instructor),
+        _nombre_normalizado(fila.nombre),
+        str(int(fila.alumnos)),
+    ))
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+
+
+def huella_archivo(archivo):
+    """SHA-256 del contenido de un archivo (ruta o archivo binario), leído por partes."""
+    sha = hashlib.sha256()
+    if isinstance(archivo, str):
+        with open(archivo, 'rb') as f:
+            for parte in iter(lambda: f.read(TAMANO_LECTURA), b''):
+                sha.update(parte)
+    else:
+        posicion = archivo.tell()
+        for parte in iter(lambda: archivo.read(TAMANO_LECTURA), b''):
+            sha.update(parte)
+        archivo.seek(posicion)
+    return sha.hexdigest()
+
+
+class _MapaProfesores:
+    """
+    Resolución de profesores por nombre con un IndiceNombres construido con una
+    consulta por tabla (profesores y alias), y alta conjunta de los que no
+    existen. Los nombres ambiguos no se asignan ni se crean: quedan en `ambiguos`.
+    """
+
+    def __init__(self, umbral=UMBRAL_SIMILITUD):
+        self.indice = IndiceNombres(umbral)
+        self.etiquetas = {}
+        for id_, nombre, apellido in db.session.query(Profesor.id, Profesor.nombre, Profesor.apellido):
+            completo = f"{nombre or ''} {apellido or ''}".strip()
+            self.indice.agregar(id_, nombre, completo)
+            self.etiquetas[id_] = completo
+        for alias, profesor_id in db.session.query(AliasProfesor.alias, AliasProfesor.profesor_id):
+            # Alias de profesores ya eliminados (sin ON DELETE CASCADE efectivo): se ignoran
+            if profesor_id in self.etiquetas:
+                self.indice.agregar_alias(alias, profesor_id)
+        self.resueltos = {}
+        self.nuevos = {}
+        self.ambiguos = {}
+
+    def resolver(self, nombre):
+        """Devuelve el id del profesor, o None si hay que crearlo con crear_nuevos() o es ambiguo."""
+        if nombre not in self.resueltos:
+            coincidencia = self.indice.resolver(nombre)
+            if coincidencia.candidatos:
+                self.ambiguos[nombre] = coincidencia.candidatos
+            elif coincidencia.id is None:
+                self.nuevos.setdefault(normalizar_nombre(nombre), nombre)
+            self.resueltos[nombre] = coincidencia.id
+        return self.resueltos[nombre]
+
+    def error(self, nombre):
+        """Mensaje para un nombre ambiguo, o None."""
+        candidatos = self.ambiguos.get(nombre)
+        if not candidatos:
+            return None
+        return (f"El instructor '{nombre}' es ambiguo: coincide con "
+                + ", ".join(f"{self.etiquetas.get(id_, id_)} (id {id_})" for id_ in candidatos))
+
+    def crear_nuevos(self):
+        """Inserta los profesores pendientes en una sola sentencia y completa sus ids."""
+        if not self.nuevos:
+            return
+        db.session.execute(Profesor.__table__.insert(), [
+            {'nombre': nombre, 'apellido': '', 'email': '', 'telefono': '', 'tarifa_por_clase': 0.0}
+            for nombre in self.nuevos.values()
+        ])
+        ids = dict(db.session.query(Profesor.nombre, db.func.max(Profesor.id)).filter(
+            Profesor.nombre.in_(list(self.nuevos.values()))).group_by(Profesor.nombre))
+        for nombre, resuelto in self.resueltos.items():
+            if resuelto is None and nombre not in self.ambiguos:
+                self.resueltos[nombre] = ids[self.nuevos[normalizar_nombre(nombre)]]
+
+
+def _cargar_horarios(clave_horario):
+    """
+    Mapa (día, hora de inicio, nombre o tipo normalizado) -> (id, nombre), el
+    primero por id; 'power  bike' y 'POWER BIKE' identifican el mismo horario.
+    """
+    horarios = {}
+    for id_, nombre, dia_semana, hora_inicio, tipo in db.session.query(
+            HorarioClase.id, HorarioClase.nombre, HorarioClase.dia_semana, HorarioClase.hora_inicio,
+            HorarioClase.tipo_clase).order_by(HorarioClase.id):
+        campo = nombre if clave_horario == 'nombre' else tipo
+        horarios.setdefault((dia_semana, hora_inicio, normalizar_nombre(campo)), (id_, nombre))
+    return horarios
+
+
+def importar_asistencias(df, columna_alumnos='Alumnos', clave_horario='nombre', tipo_clase=None,
+                         fila_inicial=0, tamano_lote=TAMANO_LOTE, umbral_similitud=UMBRAL_SIMILITUD):
+    """
+    Importa las asistencias de una hoja de Excel.
+
+    Args:
+        df (pd.DataFrame): Hoja con las columnas Fecha, Hora, Intructor, Clase y la de alumnos
+        columna_alumnos (str): 'Alumnos' o 'Asistentes' según la plantilla
+        clave_horario (str): Cómo se identifica el horario de cada fila: 'nombre'
+            (día, hora y nombre de la clase) o 'tipo_clase' (día, hora y tipo indicado)
+        tipo_clase (str, optional): Tipo de los horarios nuevos ('OTRO' por defecto)
+        fila_inicial (int): Desplazamiento del número de fila mostrado en el detalle
+        tamano_lote (int): Filas por transacción al escribir
+        umbral_similitud (float): Similitud mínima para asignar un instructor por
+            coincidencia aproximada (None la desactiva)
+
+    Returns:
+        dict: {'total', 'nuevos', 'actualizados', 'sin_cambios', 'errores', 'detalles'};
+        cada detalle tiene fila, profesor, fecha, clase, estado ('Nuevo',
+        'Actualizado', 'Sin cambios' o 'Error') y nota o errores
+    """
+    if clave_horario not in CLAVES_HORARIO:
+        raise ValueError(f"Clave de horario no válida: {clave_horario}")
+    resultado = {'total': len(df), 'nuevos': 0, 'actualizados': 0, 'sin_cambios': 0, 'errores': 0,
+                 'detalles': []}
+    if df.empty:
+        return resultado
+
+    filas = preparar_filas(df, columna_alumnos, fila_inicial)
+    filas['tipo_clase'] = tipo_clase or 'OTRO'
+
+    # Profesores: índice de nombres en memoria; un nombre ambiguo es un error de la fila
+    profesores = _MapaProfesores(umbral_similitud)
+    instructores = filas.loc[filas['error'].isna(), 'instructor']
+    for nombre in pd.unique(instructores):
+        profesores.resolver(nombre)
+    if profesores.ambiguos:
+        filas.loc[instructores.index, 'error'] = instructores.map(profesores.error)
+    validas = filas[filas['error'].isna()]
+
+    # Horarios: mapa en memoria y alta conjunta, con los profesores, de los que faltan
+    horarios = _cargar_horarios(clave_horario)
+    nuevos_horarios = {}
+    for fila in validas.itertuples():
+        clave = (fila.fecha.weekday(), fila.hora, normalizar_nombre(getattr(fila, clave_horario)))
+        if clave not in horarios and clave not in nuevos_horarios:
+            nuevos_horarios[clave] = fila
+
+    try:
+        profesores.crear_nuevos()
+        if nuevos_horarios:
+            # El profesor asignado a un horario nuevo es el de la primera fila que lo usa
+            db.session.execute(HorarioClase.__table__.insert(), [
+                {'nombre': fila.nombre, 'dia_semana': fila.fecha.weekday(), 'hora_inicio': fila.hora,
+                 'duracion': 60, 'profesor_id': profesores.resolver(fila.instructor), 'tipo_clase': fila.tipo_clase}
+                for fila in nuevos_horarios.values()
+            ])
+            horarios = _cargar_horarios(clave_horario)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        raise ValueError(f"Error al crear profesores u horarios: {str(e)}")
+
+    asignaciones = [
+        (fila, profesores.resolver(fila.instructor),
+         horarios[(fila.fecha.weekday(), fila.hora, normalizar_nombre(getattr(fila, clave_horario)))])
+        for fila in validas.itertuples()
+    ]
+    nombres_profesor = dict(db.session.query(Profesor.id, Profesor.nombre).filter(
+        Profesor.id.in_({profesor_id for _, profesor_id, _ in asignaciones})))
+
+    # Clases ya registradas en el rango de fechas del archivo, con una sola consulta
+    existentes = {}
+    if asignaciones:
+        fechas = [fila.fecha for fila, _, _ in asignaciones]
+        consulta = db.session.query(ClaseRealizada.fecha, ClaseRealizada.horario_id,
+                                    ClaseRealizada.profesor_id, ClaseRealizada.huella_importacion)
+        for fecha, horario_id, profesor_id, huella in consulta.filter(
+                ClaseRealizada.fecha >= min(fechas), ClaseRealizada.fecha <= max(fechas)):
+            existentes[(fecha, horario_id)] = {'profesor_anterior': profesor_id, 'huella': huella}
+
+    # Una fila repetida (misma fecha y horario) actualiza la anterior, como al importar fila a fila;
+    # una fila con la misma huella que la clase registrada no se vuelve a escribir
+    escrituras = {}
+    meses_afectados = []
+    detalles = {}
+    for fila, profesor_id, (horario_id, nombre_horario) in asignaciones:
+        clave_clase = (fila.fecha, horario_id)
+        huella = huella_fila(fila)
+        registrada = escrituras.get(clave_clase) or existentes.get(clave_clase)
+        if registrada is not None and registrada.get('huella') == huella:
+            estado = 'Sin cambios'
+        else:
+            if registrada is not None:
+                meses_afectados.append((registrada.get('profesor_id', registrada.get('profesor_anterior')),
+                                        fila.fecha))
+            estado = 'Nuevo' if registrada is None else 'Actualizado'
+            escritura = escrituras.setdefault(clave_clase, {'fecha': fila.fecha, 'horario_id': horario_id,
+                                                            'filas': []})
+            escritura.update({
+                'profesor_id': profesor_id,
+                'hora_llegada_profesor': None if fila.no_asistio else fila.hora,
+                'cantidad_alumnos': int(fila.alumnos),
+                'observaciones': OBSERVACION_AUSENCIA if fila.no_asistio else escritura.get('observaciones', ''),
+                'huella': huella,
+            })
+            escritura['filas'].append(fila.fila)
+            meses_afectados.append((profesor_id, fila.fecha))
+        detalles[fila.fila] = {
+            'fila': fila.fila,
+            'profesor': nombres_profesor.get(profesor_id, fila.instructor),
+            'fecha': fila.fecha.strftime('%d/%m/%Y'),
+            'clase': nombre_horario,
+            'estado': estado,
+            'nota': 'AUSENTE' if fila.no_asistio else ''
+        }
+
+    # Escritura en lotes con INSERT ... ON CONFLICT (fecha, horario_id): un fallo solo
+    # afecta a las filas de su lote. En una clase existente se conservan las
+    # observaciones salvo que la fila sea una ausencia.
+    tabla = ClaseRealizada.__table__
+    upsert = sqlite_insert(tabla)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[tabla.c.fecha, tabla.c.horario_id],
+        set_={
+            'profesor_id': upsert.excluded.profesor_id,
+            'hora_llegada_profesor': upsert.excluded.hora_llegada_profesor,
+            'cantidad_alumnos': upsert.excluded.cantidad_alumnos,
+            'observaciones': db.case((upsert.excluded.observaciones == OBSERVACION_AUSENCIA,
+                                      upsert.excluded.observaciones), else_=tabla.c.observaciones),
+            'huella_importacion': upsert.excluded.huella_importacion,
+        }
+    )
+    # ON CONFLICT necesita el índice único, que no se crea mientras haya clases duplicadas
+    # (ver asegurar_clave_clases): entonces cada clase se actualiza o se inserta por separado
+    registros = list(escrituras.values())
+    con_clave = existe_clave_clases() if registros else True
+    for inicio in range(0, len(registros), tamano_lote):
+        lote = registros[inicio:inicio + tamano_lote]
+        valores = [
+            {'fecha': r['fecha'], 'horario_id': r['horario_id'], 'profesor_id': r['profesor_id'],
+             'hora_llegada_profesor': r['hora_llegada_profesor'], 'cantidad_alumnos': r['cantidad_alumnos'],
+             'observaciones': r['observaciones'], 'huella_importacion': r['huella']}
+            for r in lote
+        ]
+        try:
+            if con_clave:
+                db.session.execute(upsert, valores)
+            else:
+                for valor in valores:
+                    _guardar_sin_clave(tabla, valor)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for registro in lote:
+                for numero in registro['filas']:
+                    detalles[numero].update(estado='Error', errores=[f"({type(e).__name__}) {str(e)}"])
+
+    # Errores de validación
+    originales = df.reset_index(drop=True)
+    for posicion, fila in enumerate(filas.itertuples()):
+        if pd.notna(fila.error):
+            detalles[fila.fila] = {
+                'fila': fila.fila,
+                'profesor': str(originales.at[posicion, 'Intructor']),
+                'fecha': str(originales.at[posicion, 'Fecha']),
+                'hora': str(originales.at[posicion, 'Hora']),
+                'clase': str(originales.at[posicion, 'Clase']),
+                'estado': 'Error',
+                'errores': [f"(ValueError) {fila.error}"]
+            }
+
+    # Las sentencias en lote no pasan por los eventos del ORM: resumen y caché se actualizan aquí
+    if escrituras or nuevos_horarios or profesores.nuevos:
+        MetricaMensualProfesor.actualizar_meses(meses_afectados)
+        cache_metricas.invalidar()
+
+    resultado['detalles'] = [detalles[numero] for numero in filas['fila']]
+    for detalle in resultado['detalles']:
+        if detalle['estado'] == 'Nuevo':
+            resultado['nuevos'] += 1
+        elif detalle['estado'] == 'Actualizado':
+            resultado['actualizados'] += 1
+        elif detalle['estado'] == 'Sin cambios':
+            resultado['sin_cambios'] += 1
+        else:
+            resultado['errores'] += 1
+    return resultado
+
+
+def _guardar_sin_clave(tabla, valor):
+    """
+    Equivalente del INSERT ... ON CONFLICT sin el índice único: actualiza la clase
+    de menor id con esa fecha y horario (la que conserva la depuración de
+    duplicados) o inserta una nueva.
+    """
+    cambios = {columna: valor[columna] for columna in
+               ('profesor_id', 'hora_llegada_profesor', 'cantidad_alumnos', 'huella_importacion')}
+    if valor['observaciones'] == OBSERVACION_AUSENCIA:
+        cambios['observaciones'] = valor['observaciones']
+    primera = (db.select(db.func.min(tabla.c.id))
+               .where(tabla.c.fecha == valor['fecha'], tabla.c.horario_id == valor['horario_id'])
+               .scalar_subquery())
+    if not db.session.execute(tabla.update().where(tabla.c.id == primera).values(**cambios)).rowcount:
+        db.session.execute(tabla.insert().values(**valor))
+
+
+class LectorExcel:
+    """
+    Lee la primera hoja de un libro .xlsx fila a fila con openpyxl en modo
+    read_only y la entrega en DataFrames de como mucho tamano_bloque filas.
+
+    Los encabezados se normalizan (sin espacios alrededor), las filas vacías
+    se omiten y el índice de cada bloque es la posición de la fila de datos en
+    la hoja (0 = primera fila bajo el encabezado), igual que con pd.read_excel.
+    """
+
+    def __init__(self, archivo, tamano_bloque=TAMANO_BLOQUE):
+        self.tamano_bloque = tamano_bloque
+        self.filas_leidas = 0
+        self.libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+        hoja = self.libro.worksheets[0]
+        # Dimensión declarada en el archivo (sin recorrerlo); sirve para mostrar el progreso
+        self.total_estimado = max((hoja.max_row or 1) - 1, 0)
+        self._filas = hoja.iter_rows(values_only=True)
+        encabezado = next(self._filas, ())
+        self.columnas = [str(valor).strip() if valor is not None else '' for valor in encabezado]
+
+    def faltantes(self, requeridas):
+        """Columnas requeridas que no están en el encabezado."""
+        return [columna for columna in requeridas if columna not in self.columnas]
+
+    def bloques(self):
+        """Genera los bloques de filas como DataFrames con las columnas del encabezado."""
+        ancho = len(self.columnas)
+        valores, indices = [], []
+        for posicion, fila in enumerate(self._filas):
+            if all(valor is None or (isinstance(valor, str) and not valor.strip()) for valor in fila):
+                continue
+            fila = tuple(fila[:ancho])
+            valores.append(fila + (None,) * (ancho - len(fila)))
+            indices.append(posicion)
+            if len(valores) == self.tamano_bloque:
+                yield self._bloque(valores, indices)
+                valores, indices = [], []
+        if valores:
+            yield self._bloque(valores, indices)
+
+    def _bloque(self, valores, indices):
+        self.filas_leidas += len(valores)
+        return pd.DataFrame(valores, columns=self.columnas, index=indices)
+
+    def cerrar(self):
+        self.libro.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
+
+
+class LectorDataFrame(LectorExcel):
+    """
+    Misma interfaz que LectorExcel para los formatos que openpyxl no lee (.xls),
+    que se cargan completos con pandas y se entregan por bloques.
+    """
+
+    def __init__(self, df, tamano_bloque=TAMANO_BLOQUE):
+        self.tamano_bloque = tamano_bloque
+        self.filas_leidas = 0
+        self.df = df.rename(columns=lambda columna: str(columna).strip())
+        self.columnas = list(self.df.columns)
+        self.total_estimado = len(self.df)
+
+    def bloques(self):
+        for inicio in range(0, len(self.df), self.tamano_bloque):
+            bloque = self.df.iloc[inicio:inicio + self.tamano_bloque]
+            self.filas_leidas += len(bloque)
+            yield bloque
+
+    def cerrar(self):
+        pass
+
+
+def abrir_libro(archivo, nombre_archivo='', tamano_bloque=TAMANO_BLOQUE):
+    """
+    Abre un libro de asistencia para leerlo por bloques.
+
+    Args:
+        archivo: Ruta o archivo binario (por ejemplo, el stream de la subida)
+        nombre_archivo (str): Nombre original, para distinguir .xls de .xlsx
+        tamano_bloque (int): Filas por bloque
+
+    Returns:
+        LectorExcel: Lector con columnas, faltantes() y bloques()
+    """
+    if nombre_archivo.lower().endswith('.xls'):
+        return LectorDataFrame(pd.read_excel(archivo), tamano_bloque)
+    return LectorExcel(archivo, tamano_bloque)
+
+
+def importar_por_bloques(lector, progreso=None, **opciones):
+    """
+    Importa un libro bloque a bloque con importar_asistencias.
+
+    Cada bloque se importa y confirma antes de leer el siguiente; las filas de
+    un bloque que repiten fecha y horario de uno anterior se tratan como
+    actualizaciones, igual que dentro de un mismo bloque.
+
+    Args:
+        lector (LectorExcel): Libro abierto con abrir_libro
+        progreso (callable, optional): Se llama tras cada bloque con el resultado acumulado
+        **opciones: Argumentos de importar_asistencias (columna_alumnos, clave_horario, ...)
+
+    Returns:
+        dict: Resultado acumulado de importar_asistencias más 'bloques',
+        'segundos' y 'filas_por_segundo'
+    """
+    inicio = perf_counter()
+    resultado = {'total': 0, 'nuevos': 0, 'actualizados': 0, 'sin_cambios': 0, 'errores': 0, 'detalles': [],
+                 'bloques': 0}
+    for bloque in lector.bloques():
+        parcial = importar_asistencias(bloque, **opciones)
+        for clave in ('total', 'nuevos', 'actualizados', 'sin_cambios', 'errores'):
+            resultado[clave] += parcial[clave]
+        resultado['detalles'].extend(parcial['detalles'])
+        resultado['bloques'] += 1
+        if progreso:
+            progreso(resultado)
+    segundos = perf_counter() - inicio
+    resultado['segundos'] = round(segundos, 3)
+    resultado['filas_por_segundo'] = round(resultado['total'] / segundos, 1) if segundos > 0 else 0.0
+    return resultado
+
+
+def registrar_errores(resultado, ruta='import_errors.log'):
+    """Escribe en el registro de errores, en una sola apertura, las filas con error."""
+    errores = [detalle for detalle in resultado['detalles'] if detalle['estado'] == 'Error']
+    if not errores:
+        return
+    try:
+        with open(ruta, 'a', encoding='utf-8') as f:
+            for detalle in errores:
+                f.write(f"ERROR EN FILA {detalle['fila']}:\n")
+                for clave, valor in detalle.items():
+                    f.write(f"  {clave}: {valor}\n")
+                f.write("\n" + "-"*50 + "\n")
+    except Exception as e:
+        print(f"Error al escribir el registro de errores de importación: {str(e)}")
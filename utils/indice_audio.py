@@ -0,0 +1,131 @@
+"""
+Índice de los archivos de audio de la carpeta de subidas (tabla archivo_audio).
+
+Las rutas y páginas de asistencia buscaban los audios listando
+static/uploads/audios/permanent/horario_<id>, ordenando nombres y probando
+temp_horario_<id>.{mp3,wav,ogg} con os.path.exists. Ahora la subida y el
+borrado mantienen la tabla ArchivoAudio y las búsquedas son consultas por
+índice. Este módulo describe los archivos (tamaño, SHA-256, códec y duración)
+y compara el índice con el disco para `flask reconciliar-audios`.
+
+Dónde están los audios (rutas relativas a UPLOAD_FOLDER):
+
+    audios/permanent/horario_<id>/audio_<ts>_<nombre>   subidas actuales
+    audios/audio_<id>_<ts>_<nombre>, audios/<nombre>     formato anterior
+    temp_horario_<id>.<ext>                              pendientes de registrar la clase
+    clase_<id>_<fecha>.<ext>                             temporales ya registrados
+"""
+import hashlib
+import os
+import re
+
+from utils.picos_audio import duracion_picos, es_archivo_picos
+
+
+EXTENSIONES = {'mp3', 'wav', 'ogg', 'webm', 'm4a', 'aac'}
+TAMANO_BLOQUE = 1024 * 1024
+
+_HORARIO = (
+    re.compile(r'(?:^|/)horario_(\d+)/'),
+    re.compile(r'^temp_horario_(\d+)\.'),
+    re.compile(r'^clase_(\d+)_'),
+    re.compile(r'^audios/audio_(\d+)_\d+_'),
+)
+
+
+def es_audio(nombre):
+    return '.' in nombre and nombre.rsplit('.', 1)[1].lower() in EXTENSIONES and not es_archivo_picos(nombre)
+
+
+def ruta_indice(carpeta_subidas, ruta):
+    """Ruta de un archivo tal como se guarda en el índice (relativa a la carpeta de subidas, con '/')."""
+    return os.path.relpath(ruta, carpeta_subidas).replace(os.sep, '/')
+
+
+def es_temporal(ruta):
+    return ruta.startswith('temp_horario_')
+
+
+def horario_de_ruta(ruta):
+    """Id del horario que indica la ruta del índice, o None."""
+    for patron in _HORARIO:
+        coincidencia = patron.search(ruta)
+        if coincidencia:
+            return int(coincidencia.group(1))
+    return None
+
+
+def detectar_codec(ruta):
+    """Formato del audio según sus primeros bytes (la extensión si no se reconoce)."""
+    with open(ruta, 'rb') as f:
+        cabecera = f.read(12)
+    if len(cabecera) > 1 and cabecera[0] == 0xFF and cabecera[1] & 0xF6 == 0xF0:
+        return 'aac'  # Trama ADTS (sincronía 0xFFF y capa 00)
+    if cabecera[:3] == b'ID3' or (len(cabecera) > 1 and cabecera[0] == 0xFF and cabecera[1] & 0xE0 == 0xE0):
+        return 'mp3'
+    if cabecera[:4] == b'RIFF' and cabecera[8:12] == b'WAVE':
+        return 'wav'
+    if cabecera[:4] == b'OggS':
+        return 'ogg'
+    if cabecera[4:8] == b'ftyp':
+        return 'm4a'
+    if cabecera[:4] == b'\x1aE\xdf\xa3':
+        return 'webm'
+    return os.path.splitext(ruta)[1].lstrip('.').lower() or None
+
+
+def huella(ruta):
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def describir_archivo(ruta, duracion=None):
+    """Datos del índice de un archivo: tamano, duracion, codec y sha256."""
+    return {
+        'tamano': os.path.getsize(ruta),
+        'duracion': duracion if duracion is not None else duracion_picos(ruta),
+        'codec': detectar_codec(ruta),
+        'sha256': huella(ruta),
+    }
+
+
+def archivos_en_disco(carpeta_subidas):
+    """Audios de la carpeta de subidas: {ruta del índice: ruta en disco}."""
+    encontrados = {}
+    if not os.path.isdir(carpeta_subidas):
+        return encontrados
+    # Temporales y audios movidos al registrar la clase, en la raíz (sin recorrer el resto de static/uploads)
+    for nombre in os.listdir(carpeta_subidas):
+        ruta = os.path.join(carpeta_subidas, nombre)
+        if es_audio(nombre) and os.path.isfile(ruta):
+            encontrados[nombre] = ruta
+    for raiz, _, nombres in os.walk(os.path.join(carpeta_subidas, 'audios')):
+        for nombre in nombres:
+            if es_audio(nombre):
+                ruta = os.path.join(raiz, nombre)
+                encontrados[ruta_indice(carpeta_subidas, ruta)] = ruta
+    return encontrados
+
+
+def comparar_con_disco(carpeta_subidas, indexados):
+    """
+    Compara el índice con el disco.
+
+    Args:
+        carpeta_subidas (str): UPLOAD_FOLDER
+        indexados (dict): {ruta: tamano} de los registros del índice
+
+    Returns:
+        dict: 'nuevos' y 'modificados' ({ruta: ruta en disco}, sin registro o con otro tamaño)
+            y 'eliminados' (rutas del índice que ya no existen)
+    """
+    en_disco = archivos_en_disco(carpeta_subidas)
+    return {
+        'nuevos': {ruta: real for ruta, real in en_disco.items() if ruta not in indexados},
+        'modificados': {ruta: real for ruta, real in en_disco.items()
+                        if ruta in indexados and indexados[ruta] != os.path.getsize(real)},
+        'eliminados': sorted(ruta for ruta in indexados if ruta not in en_disco),
+    }
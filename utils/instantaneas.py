@@ -0,0 +1,144 @@
+"""
+Instantáneas consistentes de la base de datos SQLite.
+
+Copiar gimnasio.db con shutil mientras la aplicación escribe puede producir un
+archivo a medias (y en modo WAL deja fuera las páginas que aún están en
+gimnasio.db-wal). Las instantáneas se toman con la API de backup de sqlite3
+por pasos de unas pocas páginas, con una pausa entre pasos para que los
+escritores no queden bloqueados, o con VACUUM INTO para obtener un archivo
+compacto. El resultado se comprueba con PRAGMA integrity_check y sus datos
+(tamaño, páginas, duración, integridad) se guardan junto al archivo en
+<instantanea>.json, que es lo que listan las páginas de configuración.
+
+Configuración:
+
+    INSTANTANEA_PAGINAS_POR_PASO: páginas copiadas en cada paso (256)
+    INSTANTANEA_PAUSA: segundos de pausa entre pasos (0.005)
+"""
+import glob
+import json
+import os
+import sqlite3
+from datetime import datetime
+from time import perf_counter
+
+
+PAGINAS_POR_PASO = 256
+PAUSA_ENTRE_PASOS = 0.005
+
+# Segundos de espera si la base está bloqueada al abrirla para copiar
+ESPERA_BLOQUEO = 30
+
+EXTENSION_METADATOS = '.json'
+
+
+class InstantaneaInvalida(Exception):
+    """La instantánea no superó PRAGMA integrity_check."""
+
+
+def ruta_base_datos(engine):
+    """Ruta del archivo SQLite del motor (None si es una base en memoria)."""
+    ruta = engine.url.database
+    return os.path.abspath(ruta) if ruta and ruta != ':memory:' else None
+
+
+def comprobar_integridad(ruta):
+    """
+    Ejecuta PRAGMA integrity_check sobre un archivo de base de datos.
+
+    Returns:
+        list: Problemas encontrados (vacía si la base está íntegra)
+    """
+    conexion = sqlite3.connect(f'file:{ruta}?mode=ro', uri=True)
+    try:
+        resultado = [fila[0] for fila in conexion.execute("PRAGMA integrity_check")]
+    finally:
+        conexion.close()
+    return [] if resultado == ['ok'] else resultado
+
+
+def crear_instantanea(origen, destino, compactar=False, verificar=True,
+                      paginas_por_paso=PAGINAS_POR_PASO, pausa=PAUSA_ENTRE_PASOS):
+    """
+    Crea una instantánea consistente de una base de datos SQLite.
+
+    Args:
+        origen (str): Archivo de la base de datos en uso
+        destino (str): Archivo de la instantánea (se reemplaza si existe)
+        compactar (bool): Usar VACUUM INTO (archivo sin páginas libres) en lugar
+            de la copia por páginas
+        verificar (bool): Comprobar la instantánea con PRAGMA integrity_check
+        paginas_por_paso (int): Páginas copiadas en cada paso del backup
+        pausa (float): Segundos de pausa entre pasos
+
+    Returns:
+        dict: Metadatos de la instantánea (archivo, fecha, tamano, paginas,
+        tamano_pagina, segundos, compactada, integridad, problemas)
+
+    Raises:
+        InstantaneaInvalida: Si la comprobación de integridad falla (el archivo
+            se elimina)
+    """
+    inicio = perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+    parcial = destino + '.parcial'
+    if os.path.exists(parcial):
+        os.remove(parcial)
+
+    fuente = sqlite3.connect(origen, timeout=ESPERA_BLOQUEO)
+    try:
+        if compactar:
+            # Una única transacción de lectura: en modo WAL no bloquea a los escritores
+            fuente.execute("VACUUM INTO ?", (parcial,))
+        else:
+            copia = sqlite3.connect(parcial)
+            try:
+                fuente.backup(copia, pages=paginas_por_paso, sleep=pausa)
+            finally:
+                copia.close()
+    finally:
+        fuente.close()
+
+    # La instantánea es un único archivo autocontenido (sin -wal)
+    copia = sqlite3.connect(parcial)
+    try:
+        copia.execute("PRAGMA journal_mode=DELETE")
+        paginas = copia.execute("PRAGMA page_count").fetchone()[0]
+        tamano_pagina = copia.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        copia.close()
+
+    problemas = comprobar_integridad(parcial) if verificar else []
+    if problemas:
+        os.remove(parcial)
+        raise InstantaneaInvalida(f"La instantánea no superó integrity_check: {'; '.join(problemas[:5])}")
+    os.replace(parcial, destino)
+
+    metadatos = {
+        'archivo': os.path.basename(destino),
+        'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'tamano': os.path.getsize(destino),
+        'paginas': paginas,
+        'tamano_pagina': tamano_pagina,
+        'segundos': round(perf_counter() - inicio, 3),
+        'compactada': bool(compactar),
+        'integridad': 'ok' if verificar else 'sin comprobar',
+    }
+    with open(destino + EXTENSION_METADATOS, 'w', encoding='utf-8') as f:
+        json.dump(metadatos, f, ensure_ascii=False, indent=2)
+    return metadatos
+
+
+def listar_instantaneas(directorio, limite=None):
+    """Metadatos de las instantáneas de un directorio, de la más reciente a la más antigua."""
+    instantaneas = []
+    for ruta in glob.glob(os.path.join(directorio, '*.db' + EXTENSION_METADATOS)):
+        if not os.path.exists(ruta[:-len(EXTENSION_METADATOS)]):
+            continue
+        try:
+            with open(ruta, encoding='utf-8') as f:
+                instantaneas.append(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Error al leer los metadatos de la instantánea {ruta}: {str(e)}")
+    instantaneas.sort(key=lambda datos: datos.get('fecha', ''), reverse=True)
+    return instantaneas[:limite] if limite else instantaneas
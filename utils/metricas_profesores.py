@@ -226,63 +226,149 @@ def calcular_tendencia_asistencia(clases, periodo_meses=3):
         'datos_mensuales': datos_mensuales
     }
 
+
+def calcular_tendencia_desde_resumen(meses):
+    """
+    Calcula la tendencia de asistencia a partir del resumen mensual precalculado
+    (MetricaMensualProfesor.obtener_meses), sin recorrer las clases individuales.
+    
+    Args:
+        meses (list): Diccionarios por mes con total_clases, total_alumnos,
+                      conteos de puntualidad y clases_por_tipo
+        
+    Returns:
+        dict: Mismo formato que calcular_tendencia_asistencia
+    """
+    MESES_ES = {
+        1: 'Enero', 2: 'Febrero', 3: 'Marzo', 4: 'Abril', 
+        5: 'Mayo', 6: 'Junio', 7: 'Julio', 8: 'Agosto', 
+        9: 'Septiembre', 10: 'Octubre', 11: 'Noviembre', 12: 'Diciembre'
+    }
+    
+    datos_mensuales = []
+    for mes in sorted(meses, key=lambda m: (m['anio'], m['mes'])):
+        total_clases = mes['total_clases']
+        if not total_clases:
+            continue
+        
+        con_registro = mes['puntual'] + mes['retraso_leve'] + mes['retraso_significativo']
+        clases_por_tipo = dict(mes.get('clases_por_tipo') or {})
+        for tipo in ['MOVE', 'RIDE', 'BOX', 'OTRO']:
+            clases_por_tipo.setdefault(tipo, 0)
+        
+        datos_mensuales.append({
+            'anio': mes['anio'],
+            'mes': mes['mes'],
+            'etiqueta': f"{MESES_ES[mes['mes']]} {mes['anio']}",
+            'total_clases': total_clases,
+            'promedio_alumnos': mes['total_alumnos'] / total_clases,
+            'puntualidad': (mes['puntual'] / con_registro * 100) if con_registro > 0 else 0,
+            'clases_por_tipo': clases_por_tipo
+        })
+    
+    tendencia = 0
+    if len(datos_mensuales) >= 2:
+        prom_alumnos_anterior = np.mean([m['promedio_alumnos'] for m in datos_mensuales[:-1]])
+        if prom_alumnos_anterior > 0:
+            tendencia = ((datos_mensuales[-1]['promedio_alumnos'] / prom_alumnos_anterior) - 1) * 100
+    
+    return {
+        'tendencia': tendencia,
+        'datos_mensuales': datos_mensuales
+    }
+
+
+def calcular_totales_desde_resumen(meses, mes=None):
+    """
+    Calcula los totales de un periodo (clases, alumnos, puntualidad y distribución
+    por tipo) a partir del resumen mensual precalculado.
+    
+    Args:
+        meses (list): Diccionarios por mes de MetricaMensualProfesor.obtener_meses
+        mes (tuple, optional): Tuple (año, mes) para limitar los totales a ese mes
+        
+    Returns:
+        dict: total_clases, total_alumnos, promedio_alumnos y, con el mismo formato que
+              calcular_tasa_puntualidad y calcular_distribucion_clases, puntualidad y distribucion
+    """
+    if mes:
+        meses = [m for m in meses if (m['anio'], m['mes']) == tuple(mes)]
+    
+    total_clases = sum(m['total_clases'] for m in meses)
+    total_alumnos = sum(m['total_alumnos'] for m in meses)
+    puntual = sum(m['puntual'] for m in meses)
+    retraso_leve = sum(m['retraso_leve'] for m in meses)
+    retraso_significativo = sum(m['retraso_significativo'] for m in meses)
+    con_registro = puntual + retraso_leve + retraso_significativo
+    
+    tipos = defaultdict(int)
+    for tipo in ['MOVE', 'RIDE', 'BOX', 'OTRO']:
+        tipos[tipo] = 0
+    for m in meses:
+        for tipo, cantidad in (m.get('clases_por_tipo') or {}).items():
+            tipos[tipo] += cantidad
+    
+    return {
+        'total_clases': total_clases,
+        'total_alumnos': total_alumnos,
+        'promedio_alumnos': total_alumnos / total_clases if total_clases else 0.0,
+        'puntualidad': {
+            'tasa': (puntual / con_registro * 100) if con_registro > 0 else 0,
+            'puntual': puntual,
+            'retraso_leve': retraso_leve,
+            'retraso_significativo': retraso_significativo,
+            'total': con_registro
+        },
+        'distribucion': {
+            'total': total_clases,
+            'tipos': dict(tipos),
+            'porcentajes': {tipo: (cantidad / total_clases * 100) for tipo, cantidad in tipos.items()}
+                           if total_clases else {}
+        }
+    }
+
 # ... existing code ...
 
-def get_profesores_promedio(exclude_profesor_id=None):
+def get_profesores_promedio(exclude_profesor_id=None, fecha_inicio=None, fecha_fin=None):
     """
     Calcula los promedios de métricas para todos los profesores.
+    Las métricas individuales salen de calcular_metricas_cohorte (una sola
+    consulta para todos los profesores, memorizada por periodo).
     
     Args:
         exclude_profesor_id (int, optional): ID del profesor a excluir del cálculo
+        fecha_inicio (date, optional): Inicio del periodo. Por defecto, 90 días antes de fecha_fin
+        fecha_fin (date, optional): Fin del periodo. Por defecto, la fecha actual
         
     Returns:
         dict: Diccionario con promedios de métricas para todos los profesores
     """
-    from models import Profesor, ClaseRealizada
+    from utils.metricas_vectorizadas import calcular_metricas_cohorte
     
-    # Obtener datos de todos los profesores para los últimos 3 meses
-    fecha_fin = datetime.now().date()
-    fecha_inicio = fecha_fin - timedelta(days=90)
+    # Por defecto, datos de todos los profesores para los últimos 3 meses
+    if fecha_fin is None:
+        fecha_fin = datetime.now().date()
+    if fecha_inicio is None:
+        fecha_inicio = fecha_fin - timedelta(days=90)
     
-    profesores = Profesor.query.all()
+    cohorte = calcular_metricas_cohorte(fecha_inicio, fecha_fin)
     stats_puntualidad = []
     stats_alumnos = []
     stats_clases = []
     stats_variedad = []
     stats_costo_por_alumno = []
     
-    for prof in profesores:
-        if exclude_profesor_id and prof.id == exclude_profesor_id:
+    for profesor_id, metricas_prof in cohorte.items():
+        if exclude_profesor_id and profesor_id == exclude_profesor_id:
             continue  # Excluir al profesor actual para no afectar el promedio
-            
-        clases_prof = prof.get_clases_periodo(fecha_inicio, fecha_fin)
-        if not clases_prof:
-            continue
-            
-        # Calcular puntualidad
-        puntualidad = calcular_tasa_puntualidad(clases_prof)
-        if puntualidad['total'] > 0:
-            stats_puntualidad.append(puntualidad['tasa'])
-        
-        # Calcular promedio de alumnos
-        prom_alumnos = calcular_promedio_alumnos(clases_prof)
-        stats_alumnos.append(prom_alumnos)
         
-        # Calcular clases por mes
-        # Asumiendo un período de 3 meses completos
-        stats_clases.append(len(clases_prof) / 3)
-        
-        # Calcular variedad de clases
-        distribucion = calcular_distribucion_clases(clases_prof)
-        tipos_distintos = len([t for t, c in distribucion['tipos'].items() if c > 0])
-        total_tipos_posibles = 4  # MOVE, RIDE, BOX, OTRO
-        variedad = (tipos_distintos / total_tipos_posibles) * 100
-        stats_variedad.append(variedad)
-        
-        # Calcular costo por alumno
-        costo_por_alumno = calcular_costo_por_alumno(clases_prof)
-        if costo_por_alumno > 0:
-            stats_costo_por_alumno.append(costo_por_alumno)
+        if metricas_prof['puntualidad']['total'] > 0:
+            stats_puntualidad.append(metricas_prof['puntualidad']['tasa'])
+        stats_alumnos.append(metricas_prof['promedio_alumnos'])
+        stats_clases.append(metricas_prof['clases_por_mes'])
+        stats_variedad.append(metricas_prof['variedad_clases'])
+        if metricas_prof['costo_por_alumno'] > 0:
+            stats_costo_por_alumno.append(metricas_prof['costo_por_alumno'])
     
     # Calcular promedios finales
     prom_puntualidad = np.mean(stats_puntualidad) if stats_puntualidad else 0
@@ -390,7 +476,7 @@ def calcular_costo_por_alumno(clases):
     # Calcular costo promedio por alumno
     return total_costo / total_alumnos if total_alumnos > 0 else 0.0
 
-def calcular_metricas_profesor(profesor_id, clases=None, mes_actual=None, mes_comparacion=None, usar_promedios=False, generar_resumen=True):
+def calcular_metricas_profesor(profesor_id, clases=None, mes_actual=None, mes_comparacion=None, usar_promedios=False, generar_resumen=True, datos_mensuales=None, totales=None):
     """
     Calcula las métricas para un profesor específico.
     
@@ -401,6 +487,10 @@ def calcular_metricas_profesor(profesor_id, clases=None, mes_actual=None, mes_co
         mes_comparacion (tuple, optional): Tuple (año, mes) para comparar con el mes actual.
         usar_promedios (bool, optional): Si True, usa promedios globales en vez de datos específicos del profesor.
         generar_resumen (bool, optional): Si True, incluye un resumen estructurado del rendimiento.
+        datos_mensuales (list, optional): Evolución mensual ya calculada a partir del resumen
+            mensual precalculado. Si es None, se calcula recorriendo las clases.
+        totales (dict, optional): Totales del periodo mostrado (calcular_totales_desde_resumen).
+            Si es None, se calculan recorriendo las clases.
         
     Returns:
         dict: Diccionario con las métricas calculadas
@@ -447,9 +537,11 @@ def calcular_metricas_profesor(profesor_id, clases=None, mes_actual=None, mes_co
     clases_a_procesar = clases
     
     # Calcular tendencia general para todos los meses (evolución mensual)
-    tendencia_general = calcular_tendencia_asistencia(clases, periodo_meses=12)
+    if datos_mensuales is None:
+        tendencia_general = calcular_tendencia_asistencia(clases, periodo_meses=12)
+        datos_mensuales = tendencia_general['datos_mensuales']
     # Asegurarnos de tener esta información en el resultado final
-    metricas['datos_mensuales'] = tendencia_general['datos_mensuales']
+    metricas['datos_mensuales'] = datos_mensuales
     
     # Si se solicita comparación de meses
     if mes_actual and mes_comparacion:
@@ -671,29 +763,38 @@ def calcular_metricas_profesor(profesor_id, clases=None, mes_actual=None, mes_co
         # Ordenar clases por fecha descendente (más recientes primero)
         clases_ordenadas = sorted(clases_a_procesar, key=lambda c: c.fecha, reverse=True)
         
-        # Calcular métricas básicas para mostrar
-        total_clases = len(clases_a_procesar)
-        distribucion = calcular_distribucion_clases(clases_a_procesar)
-        puntualidad = calcular_tasa_puntualidad(clases_a_procesar)
         tendencia = calcular_tendencia_asistencia(clases_a_procesar)
         
-        # Calcular total de alumnos
-        total_alumnos = 0
-        for c in clases_a_procesar:
-            if c.cantidad_alumnos is not None:
-                try:
-                    # Convertir a entero si es una cadena o cualquier otro tipo
-                    if isinstance(c.cantidad_alumnos, str):
-                        total_alumnos += int(c.cantidad_alumnos)
-                    else:
-                        total_alumnos += c.cantidad_alumnos
-                except (ValueError, TypeError):
-                    # Si hay error en la conversión, ignorar este valor
-                    print(f"Error al calcular total_alumnos: {c.cantidad_alumnos} de tipo {type(c.cantidad_alumnos)}")
-                    continue
-        
-        # Calcular promedio de alumnos por clase
-        promedio_alumnos = calcular_promedio_alumnos(clases_a_procesar)
+        if totales is not None:
+            # Totales leídos del resumen mensual precalculado
+            total_clases = totales['total_clases']
+            total_alumnos = totales['total_alumnos']
+            promedio_alumnos = totales['promedio_alumnos']
+            puntualidad = totales['puntualidad']
+            distribucion = totales['distribucion']
+        else:
+            # Calcular métricas básicas para mostrar
+            total_clases = len(clases_a_procesar)
+            distribucion = calcular_distribucion_clases(clases_a_procesar)
+            puntualidad = calcular_tasa_puntualidad(clases_a_procesar)
+            
+            # Calcular total de alumnos
+            total_alumnos = 0
+            for c in clases_a_procesar:
+                if c.cantidad_alumnos is not None:
+                    try:
+                        # Convertir a entero si es una cadena o cualquier otro tipo
+                        if isinstance(c.cantidad_alumnos, str):
+                            total_alumnos += int(c.cantidad_alumnos)
+                        else:
+                            total_alumnos += c.cantidad_alumnos
+                    except (ValueError, TypeError):
+                        # Si hay error en la conversión, ignorar este valor
+                        print(f"Error al calcular total_alumnos: {c.cantidad_alumnos} de tipo {type(c.cantidad_alumnos)}")
+                        continue
+            
+            # Calcular promedio de alumnos por clase
+            promedio_alumnos = calcular_promedio_alumnos(clases_a_procesar)
         
         # Calcular clases por mes (promedio)
         fechas = [c.fecha for c in clases_a_procesar]
@@ -0,0 +1,307 @@
+"""
+Motor vectorizado de métricas de profesores.
+
+Alternativa a las funciones de utils/metricas_profesores.py que recorren los
+objetos ClaseRealizada uno a uno (con conversiones por elemento y cargas
+perezosas de horario y profesor). Aquí las clases se cargan una sola vez en
+columnas de pandas (fecha, minutos de retraso, alumnos, tipo de clase y
+tarifa) y todas las métricas se calculan con operaciones vectorizadas,
+devolviendo exactamente los mismos diccionarios.
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from utils.cache_metricas import cache_metricas, VERSION_COHORTE
+
+
+TIPOS_CLASE = ['MOVE', 'RIDE', 'BOX', 'OTRO']
+
+MESES_ES = {
+    1: 'Enero', 2: 'Febrero', 3: 'Marzo', 4: 'Abril',
+    5: 'Mayo', 6: 'Junio', 7: 'Julio', 8: 'Agosto',
+    9: 'Septiembre', 10: 'Octubre', 11: 'Noviembre', 12: 'Diciembre'
+}
+
+COLUMNAS = ['fecha', 'profesor_id', 'minutos_retraso', 'alumnos', 'tipo_clase', 'tarifa']
+
+# Minutos de retraso con las columnas en minutos (llegada_min, hora_inicio_min)
+SQL_CLASES_COLUMNAR = """
+SELECT cr.fecha,
+       cr.profesor_id,
+       cr.llegada_min - hc.hora_inicio_min AS minutos_retraso,
+       cr.cantidad_alumnos AS alumnos,
+       COALESCE(NULLIF(hc.tipo_clase, ''), 'OTRO') AS tipo_clase,
+       p.tarifa_por_clase AS tarifa
+FROM clase_realizada cr
+JOIN horario_clase hc ON cr.horario_id = hc.id
+JOIN profesor p ON cr.profesor_id = p.id
+WHERE 1 = 1 {filtros}
+ORDER BY cr.fecha
+"""
+
+
+def _normalizar(df):
+    """Aplica los tipos de cada columna de una sola vez."""
+    df = df.reindex(columns=COLUMNAS)
+    df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
+    df['minutos_retraso'] = pd.to_numeric(df['minutos_retraso'], errors='coerce')
+    df['alumnos'] = pd.to_numeric(df['alumnos'], errors='coerce')
+    df['tarifa'] = pd.to_numeric(df['tarifa'], errors='coerce')
+    df['tipo_clase'] = df['tipo_clase'].where(df['tipo_clase'].notna() & (df['tipo_clase'] != ''), 'OTRO')
+    return df
+
+
+def cargar_clases(profesor_id=None, fecha_inicio=None, fecha_fin=None, conexion=None):
+    """
+    Carga las clases en columnas con una única consulta.
+
+    Args:
+        profesor_id (int, optional): Filtrar por profesor
+        fecha_inicio (date, optional): Primer día incluido
+        fecha_fin (date, optional): Último día incluido
+        conexion: Sesión o conexión SQLAlchemy; por defecto la sesión de los modelos
+
+    Returns:
+        DataFrame: Columnas fecha, profesor_id, minutos_retraso, alumnos, tipo_clase, tarifa
+    """
+    if conexion is None:
+        from models import db
+        conexion = db.session
+
+    filtros = []
+    params = {}
+    if profesor_id:
+        filtros.append("AND cr.profesor_id = :profesor_id")
+        params['profesor_id'] = profesor_id
+    if fecha_inicio:
+        filtros.append("AND cr.fecha >= :fecha_inicio")
+        params['fecha_inicio'] = fecha_inicio.isoformat()
+    if fecha_fin:
+        filtros.append("AND cr.fecha <= :fecha_fin")
+        params['fecha_fin'] = fecha_fin.isoformat()
+
+    filas = conexion.execute(text(SQL_CLASES_COLUMNAR.format(filtros=' '.join(filtros))), params).fetchall()
+    return _normalizar(pd.DataFrame([tuple(f) for f in filas], columns=COLUMNAS))
+
+
+def clases_a_columnas(clases):
+    """
+    Convierte una lista de objetos ClaseRealizada ya cargados al formato columnar.
+
+    Returns:
+        DataFrame: Mismo formato que cargar_clases
+    """
+    registros = []
+    for clase in clases:
+        horario = clase.horario
+        llegada = clase.hora_llegada_profesor
+        minutos = None
+        if llegada and horario is not None:
+            minutos = ((llegada.hour * 60 + llegada.minute) -
+                       (horario.hora_inicio.hour * 60 + horario.hora_inicio.minute))
+        registros.append((
+            clase.fecha,
+            clase.profesor_id,
+            minutos,
+            clase.cantidad_alumnos,
+            horario.tipo_clase if horario is not None and horario.tipo_clase else 'OTRO',
+            clase.profesor.tarifa_por_clase if clase.profesor is not None else None
+        ))
+    return _normalizar(pd.DataFrame(registros, columns=COLUMNAS))
+
+
+def tasa_puntualidad(df):
+    """Equivalente vectorizado de calcular_tasa_puntualidad."""
+    minutos = df['minutos_retraso'].dropna()
+    puntual = int((minutos <= 0).sum())
+    retraso_leve = int(((minutos > 0) & (minutos <= 10)).sum())
+    retraso_significativo = int((minutos > 10).sum())
+    total = puntual + retraso_leve + retraso_significativo
+    return {
+        'tasa': (puntual / total * 100) if total > 0 else 0,
+        'puntual': puntual,
+        'retraso_leve': retraso_leve,
+        'retraso_significativo': retraso_significativo,
+        'total': total
+    }
+
+
+def promedio_alumnos(df):
+    """Equivalente vectorizado de calcular_promedio_alumnos."""
+    alumnos = df['alumnos'].dropna()
+    if alumnos.empty:
+        return 0.0
+    return float(alumnos.sum() / len(alumnos))
+
+
+def distribucion_clases(df):
+    """Equivalente vectorizado de calcular_distribucion_clases."""
+    if df.empty:
+        return {
+            'total': 0,
+            'tipos': {},
+            'porcentajes': {}
+        }
+    conteo = {tipo: int(n) for tipo, n in df['tipo_clase'].value_counts(sort=False).items()}
+    for tipo in TIPOS_CLASE:
+        conteo.setdefault(tipo, 0)
+    total = len(df)
+    return {
+        'total': total,
+        'tipos': conteo,
+        'porcentajes': {tipo: (n / total * 100) for tipo, n in conteo.items()}
+    }
+
+
+def costo_por_alumno(df):
+    """Equivalente vectorizado de calcular_costo_por_alumno."""
+    validas = df[(df['tarifa'] > 0) & (df['alumnos'] > 0)]
+    total_alumnos = validas['alumnos'].sum()
+    return float(validas['tarifa'].sum() / total_alumnos) if total_alumnos > 0 else 0.0
+
+
+def tendencia_asistencia(df):
+    """Equivalente vectorizado de calcular_tendencia_asistencia."""
+    df = df[df['fecha'].notna()]
+    if df.empty:
+        return {
+            'tendencia': 0,
+            'datos_mensuales': []
+        }
+
+    minutos = df['minutos_retraso']
+    columnas = pd.DataFrame({
+        'anio': df['fecha'].dt.year,
+        'mes': df['fecha'].dt.month,
+        'alumnos': df['alumnos'].fillna(0),
+        'con_registro': minutos.notna(),
+        'puntual': minutos <= 0,
+        'tipo_clase': df['tipo_clase']
+    })
+    grupos = columnas.groupby(['anio', 'mes'], sort=True)
+    resumen = grupos.agg(
+        total_clases=('alumnos', 'size'),
+        total_alumnos=('alumnos', 'sum'),
+        con_registro=('con_registro', 'sum'),
+        puntual=('puntual', 'sum')
+    )
+    tipos = columnas.groupby(['anio', 'mes', 'tipo_clase']).size().unstack(fill_value=0)
+
+    datos_mensuales = []
+    for (anio, mes), fila in resumen.iterrows():
+        clases_por_tipo = {tipo: int(n) for tipo, n in tipos.loc[(anio, mes)].items() if n > 0}
+        for tipo in TIPOS_CLASE:
+            clases_por_tipo.setdefault(tipo, 0)
+        con_registro = int(fila['con_registro'])
+        datos_mensuales.append({
+            'anio': int(anio),
+            'mes': int(mes),
+            'etiqueta': f"{MESES_ES[int(mes)]} {int(anio)}",
+            'total_clases': int(fila['total_clases']),
+            'promedio_alumnos': float(fila['total_alumnos'] / fila['total_clases']),
+            'puntualidad': (int(fila['puntual']) / con_registro * 100) if con_registro > 0 else 0,
+            'clases_por_tipo': clases_por_tipo
+        })
+
+    tendencia = 0
+    if len(datos_mensuales) >= 2:
+        prom_alumnos_anterior = np.mean([m['promedio_alumnos'] for m in datos_mensuales[:-1]])
+        if prom_alumnos_anterior > 0:
+            tendencia = ((datos_mensuales[-1]['promedio_alumnos'] / prom_alumnos_anterior) - 1) * 100
+
+    return {
+        'tendencia': tendencia,
+        'datos_mensuales': datos_mensuales
+    }
+
+
+def calcular_metricas_basicas(df):
+    """
+    Calcula de una vez todas las métricas básicas de un conjunto de clases.
+
+    Returns:
+        dict: puntualidad, promedio_alumnos, distribucion, costo_por_alumno y tendencia,
+              con los mismos formatos que las funciones de metricas_profesores
+    """
+    return {
+        'puntualidad': tasa_puntualidad(df),
+        'promedio_alumnos': promedio_alumnos(df),
+        'distribucion': distribucion_clases(df),
+        'costo_por_alumno': costo_por_alumno(df),
+        'tendencia': tendencia_asistencia(df)
+    }
+
+
+def calcular_metricas_cohorte(fecha_inicio, fecha_fin, conexion=None):
+    """
+    Calcula las métricas de todos los profesores de un periodo con una única
+    consulta y agregaciones agrupadas por profesor. El resultado se memoriza por
+    periodo y se invalida con cualquier cambio en clases u horarios.
+
+    Args:
+        fecha_inicio (date): Primer día del periodo
+        fecha_fin (date): Último día del periodo
+        conexion: Sesión o conexión SQLAlchemy; por defecto la sesión de los modelos
+
+    Returns:
+        dict: {profesor_id: {'total_clases', 'puntualidad' (mismo formato que
+              calcular_tasa_puntualidad), 'promedio_alumnos', 'clases_por_mes',
+              'variedad_clases', 'costo_por_alumno'}} solo para profesores con clases
+    """
+    clave = cache_metricas.clave('metricas_cohorte', VERSION_COHORTE, f"{fecha_inicio}_{fecha_fin}")
+    encontrado, resultado = cache_metricas.obtener(clave)
+    if encontrado:
+        return resultado
+
+    df = cargar_clases(fecha_inicio=fecha_inicio, fecha_fin=fecha_fin, conexion=conexion)
+    # Meses del periodo para el promedio de clases por mes (90 días = 3 meses)
+    meses_periodo = max((fecha_fin - fecha_inicio).days / 30, 1)
+
+    minutos = df['minutos_retraso']
+    validas_costo = (df['tarifa'] > 0) & (df['alumnos'] > 0)
+    columnas = pd.DataFrame({
+        'profesor_id': df['profesor_id'],
+        'puntual': minutos <= 0,
+        'retraso_leve': (minutos > 0) & (minutos <= 10),
+        'retraso_significativo': minutos > 10,
+        'alumnos': df['alumnos'],
+        'tipo_clase': df['tipo_clase'],
+        'tarifa_costo': df['tarifa'].where(validas_costo, 0),
+        'alumnos_costo': df['alumnos'].where(validas_costo, 0)
+    })
+    resumen = columnas.groupby('profesor_id').agg(
+        total_clases=('puntual', 'size'),
+        puntual=('puntual', 'sum'),
+        retraso_leve=('retraso_leve', 'sum'),
+        retraso_significativo=('retraso_significativo', 'sum'),
+        suma_alumnos=('alumnos', 'sum'),
+        clases_con_alumnos=('alumnos', 'count'),
+        tipos_distintos=('tipo_clase', 'nunique'),
+        tarifa_costo=('tarifa_costo', 'sum'),
+        alumnos_costo=('alumnos_costo', 'sum')
+    )
+
+    resultado = {}
+    for profesor_id, fila in resumen.iterrows():
+        puntual = int(fila['puntual'])
+        total_registro = puntual + int(fila['retraso_leve']) + int(fila['retraso_significativo'])
+        resultado[int(profesor_id)] = {
+            'total_clases': int(fila['total_clases']),
+            'puntualidad': {
+                'tasa': (puntual / total_registro * 100) if total_registro > 0 else 0,
+                'puntual': puntual,
+                'retraso_leve': int(fila['retraso_leve']),
+                'retraso_significativo': int(fila['retraso_significativo']),
+                'total': total_registro
+            },
+            'promedio_alumnos': (float(fila['suma_alumnos'] / fila['clases_con_alumnos'])
+                                 if fila['clases_con_alumnos'] > 0 else 0.0),
+            'clases_por_mes': int(fila['total_clases']) / meses_periodo,
+            'variedad_clases': (int(fila['tipos_distintos']) / len(TIPOS_CLASE)) * 100,
+            'costo_por_alumno': (float(fila['tarifa_costo'] / fila['alumnos_costo'])
+                                 if fila['alumnos_costo'] > 0 else 0.0)
+        }
+
+    cache_metricas.guardar(clave, resultado)
+    return resultado
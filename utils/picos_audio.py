@@ -0,0 +1,205 @@
+"""
+Picos precalculados para dibujar la forma de onda de los audios.
+
+Dibujar la forma de onda a partir del audio obliga a decodificar la grabación
+completa (una clase entera son ~60 minutos) en cada petición. Al subir un audio
+se decodifica una sola vez y se guardan, por cada bloque de MUESTRAS_POR_PICO
+muestras, el mínimo y el máximo de la señal en un archivo de picos junto al
+audio (picos_<audio>.dat). El formato es el .dat versión 1 de audiowaveform
+(bbc/peaks.js), de modo que también puede dibujarse en el navegador:
+
+    int32  versión (1)
+    uint32 opciones (1: picos de 8 bits, 0: de 16 bits)
+    int32  frecuencia de muestreo
+    int32  muestras por pico
+    uint32 número de picos
+    pares (mínimo, máximo) de int8 o int16
+
+Todos los enteros son little-endian. Leer los picos y reducirlos al ancho
+pedido lleva unos milisegundos y no usa librosa.
+"""
+import io
+import os
+import struct
+
+import numpy as np
+
+
+MUESTRAS_POR_PICO = 512
+PREFIJO = 'picos_'
+EXTENSION = '.dat'
+
+_CABECERA = struct.Struct('<iIiiI')
+_VERSION = 1
+_OPCION_8_BITS = 1
+
+# Colores de la imagen (los de la forma de onda que se dibujaba con matplotlib)
+COLOR_ONDA = (0, 0, 255, 153)
+COLOR_FONDO = (255, 255, 255, 0)
+
+
+class PicosInvalidos(Exception):
+    """El archivo de picos no tiene el formato esperado."""
+
+
+def ruta_picos(ruta_audio):
+    """Ruta del archivo de picos de un audio (en la misma carpeta)."""
+    carpeta, nombre = os.path.split(ruta_audio)
+    return os.path.join(carpeta, f'{PREFIJO}{nombre}{EXTENSION}')
+
+
+def es_archivo_picos(nombre):
+    return nombre.startswith(PREFIJO) and nombre.endswith(EXTENSION)
+
+
+def calcular_picos(muestras, muestras_por_pico=MUESTRAS_POR_PICO):
+    """Mínimo y máximo de cada bloque de muestras (señal mono en [-1, 1])."""
+    muestras = np.asarray(muestras, dtype=np.float32)
+    cantidad = -(-len(muestras) // muestras_por_pico)
+    if cantidad == 0:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+    # Completar el último bloque repitiendo su última muestra para no alterar su mínimo/máximo
+    relleno = cantidad * muestras_por_pico - len(muestras)
+    bloques = np.pad(muestras, (0, relleno), mode='edge').reshape(cantidad, muestras_por_pico)
+    return bloques.min(axis=1), bloques.max(axis=1)
+
+
+def escribir_picos(destino, minimos, maximos, sample_rate, muestras_por_pico=MUESTRAS_POR_PICO, bits=8):
+    """Guarda los picos en formato .dat (escribe en un temporal y lo renombra)."""
+    escala = 127 if bits == 8 else 32767
+    tipo = '<i1' if bits == 8 else '<i2'
+    pares = np.empty(len(minimos) * 2, dtype=tipo)
+    pares[0::2] = np.clip(np.round(np.asarray(minimos) * escala), -escala, escala)
+    pares[1::2] = np.clip(np.round(np.asarray(maximos) * escala), -escala, escala)
+
+    temporal = destino + '.parcial'
+    with open(temporal, 'wb') as f:
+        f.write(_CABECERA.pack(_VERSION, _OPCION_8_BITS if bits == 8 else 0, int(sample_rate),
+                               int(muestras_por_pico), len(minimos)))
+        f.write(pares.tobytes())
+    os.replace(temporal, destino)
+    return destino
+
+
+def generar_picos(ruta_audio, muestras_por_pico=MUESTRAS_POR_PICO, bits=8):
+    """
+    Decodifica el audio una vez y guarda su archivo de picos.
+
+    Devuelve un diccionario con la ruta del archivo, la duración y el número de picos.
+    """
+    import librosa
+
+    muestras, sample_rate = librosa.load(ruta_audio, sr=None, mono=True)
+    minimos, maximos = calcular_picos(muestras, muestras_por_pico)
+    destino = escribir_picos(ruta_picos(ruta_audio), minimos, maximos, sample_rate, muestras_por_pico, bits)
+    return {
+        'ruta': destino,
+        'duracion': len(muestras) / sample_rate if sample_rate else 0,
+        'picos': len(minimos),
+    }
+
+
+def picos_actualizados(ruta_audio):
+    """True si el audio tiene un archivo de picos posterior a la última modificación del audio."""
+    try:
+        return os.path.getmtime(ruta_picos(ruta_audio)) >= os.path.getmtime(ruta_audio)
+    except OSError:
+        return False
+
+
+def duracion_picos(ruta_audio):
+    """Duración del audio según la cabecera de su archivo de picos (None si no tiene)."""
+    try:
+        with open(ruta_picos(ruta_audio), 'rb') as f:
+            version, _, sample_rate, muestras_por_pico, cantidad = _CABECERA.unpack(f.read(_CABECERA.size))
+    except (OSError, struct.error):
+        return None
+    if version != _VERSION or not sample_rate:
+        return None
+    return cantidad * muestras_por_pico / sample_rate
+
+
+def leer_picos(ruta):
+    """
+    Lee un archivo de picos.
+
+    Devuelve sample_rate, muestras_por_pico y los mínimos/máximos normalizados a [-1, 1].
+    """
+    with open(ruta, 'rb') as f:
+        cabecera = f.read(_CABECERA.size)
+        if len(cabecera) < _CABECERA.size:
+            raise PicosInvalidos(f'{ruta}: cabecera incompleta')
+        version, opciones, sample_rate, muestras_por_pico, cantidad = _CABECERA.unpack(cabecera)
+        if version != _VERSION:
+            raise PicosInvalidos(f'{ruta}: versión {version} no soportada')
+        tipo = np.dtype('<i1') if opciones & _OPCION_8_BITS else np.dtype('<i2')
+        pares = np.frombuffer(f.read(), dtype=tipo)
+    if len(pares) != cantidad * 2:
+        raise PicosInvalidos(f'{ruta}: se esperaban {cantidad} picos y hay {len(pares) // 2}')
+
+    escala = 127.0 if tipo.itemsize == 1 else 32767.0
+    return {
+        'sample_rate': sample_rate,
+        'muestras_por_pico': muestras_por_pico,
+        'duracion': cantidad * muestras_por_pico / sample_rate if sample_rate else 0,
+        'minimos': pares[0::2].astype(np.float32) / escala,
+        'maximos': pares[1::2].astype(np.float32) / escala,
+    }
+
+
+def reducir_picos(picos, ancho):
+    """Agrupa los picos en como máximo `ancho` columnas (mínimo de los mínimos, máximo de los máximos)."""
+    cantidad = len(picos['minimos'])
+    if ancho <= 0 or cantidad <= ancho:
+        return picos
+    factor = -(-cantidad // ancho)
+    grupos = -(-cantidad // factor)
+    relleno = grupos * factor - cantidad
+    minimos = np.pad(picos['minimos'], (0, relleno), mode='edge').reshape(grupos, factor).min(axis=1)
+    maximos = np.pad(picos['maximos'], (0, relleno), mode='edge').reshape(grupos, factor).max(axis=1)
+    return dict(picos, muestras_por_pico=picos['muestras_por_pico'] * factor, minimos=minimos, maximos=maximos)
+
+
+def picos_a_json(picos):
+    """Picos en un diccionario serializable (pares mínimo/máximo intercalados, como en audiowaveform)."""
+    pares = np.empty(len(picos['minimos']) * 2, dtype=np.float32)
+    pares[0::2] = picos['minimos']
+    pares[1::2] = picos['maximos']
+    return {
+        'sample_rate': picos['sample_rate'],
+        'muestras_por_pico': picos['muestras_por_pico'],
+        'duracion': round(picos['duracion'], 3),
+        'picos': np.round(pares, 4).tolist(),
+    }
+
+
+def dibujar_picos(picos, ancho=1000, alto=200):
+    """
+    Dibuja la forma de onda como PNG (bytes) a partir de los picos, sin matplotlib.
+
+    Cada columna se rellena entre el mínimo y el máximo de los picos que le corresponden.
+    """
+    from PIL import Image
+
+    picos = reducir_picos(picos, ancho)
+    columnas = len(picos['minimos'])
+    imagen = np.empty((alto, max(columnas, 1), 4), dtype=np.uint8)
+    imagen[:] = COLOR_FONDO
+    if columnas:
+        centro = (alto - 1) / 2
+        superior = np.floor(centro - picos['maximos'] * centro).astype(np.int32)
+        inferior = np.ceil(centro - picos['minimos'] * centro).astype(np.int32)
+        filas = np.arange(alto)[:, None]
+        imagen[(filas >= superior) & (filas <= inferior)] = COLOR_ONDA
+
+    imagen = Image.fromarray(imagen)
+    if imagen.width != ancho:
+        imagen = imagen.resize((ancho, alto), Image.NEAREST)
+    buffer = io.BytesIO()
+    imagen.save(buffer, format='PNG', optimize=False)
+    return buffer.getvalue()
+
+
+def dibujar_marcador(ancho=1000, alto=200):
+    """PNG con una forma de onda plana, para mostrar mientras se calculan los picos."""
+    return dibujar_picos({'muestras_por_pico': 1, 'minimos': np.zeros(1), 'maximos': np.zeros(1)}, ancho, alto)
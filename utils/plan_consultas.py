@@ -0,0 +1,88 @@
+"""
+Comprobación de los planes de ejecución de las consultas más frecuentes.
+
+Ejecuta EXPLAIN QUERY PLAN sobre cada consulta de CONSULTAS_FRECUENTES y
+detecta las que recorren una tabla completa (SCAN sin índice) en lugar de
+buscar con uno de los índices declarados en los modelos.
+"""
+import re
+
+from sqlalchemy import text
+
+
+# Consultas de los listados y búsquedas más usados, sin alias de tabla para que
+# el plan indique directamente qué tabla se recorre
+CONSULTAS_FRECUENTES = {
+    'clases_del_dia': (
+        "SELECT * FROM clase_realizada WHERE fecha = :fecha",
+        {'fecha': '2025-01-01'}
+    ),
+    'historial_por_fechas': (
+        "SELECT * FROM clase_realizada WHERE fecha >= :fecha_inicio AND fecha <= :fecha_fin "
+        "ORDER BY fecha DESC, id DESC",
+        {'fecha_inicio': '2025-01-01', 'fecha_fin': '2025-01-31'}
+    ),
+    'clases_profesor_periodo': (
+        "SELECT * FROM clase_realizada WHERE profesor_id = :profesor_id "
+        "AND fecha >= :fecha_inicio AND fecha <= :fecha_fin ORDER BY fecha DESC",
+        {'profesor_id': 1, 'fecha_inicio': '2025-01-01', 'fecha_fin': '2025-01-31'}
+    ),
+    'todas_clases_profesor': (
+        "SELECT * FROM clase_realizada WHERE profesor_id = :profesor_id ORDER BY fecha DESC",
+        {'profesor_id': 1}
+    ),
+    'clase_existente': (
+        "SELECT * FROM clase_realizada WHERE horario_id = :horario_id AND fecha = :fecha",
+        {'horario_id': 1, 'fecha': '2025-01-01'}
+    ),
+    'ultima_clase_horario': (
+        "SELECT * FROM clase_realizada WHERE horario_id = :horario_id ORDER BY id DESC LIMIT 1",
+        {'horario_id': 1}
+    ),
+    'horarios_del_dia': (
+        "SELECT * FROM horario_clase WHERE dia_semana = :dia_semana AND activo = 1",
+        {'dia_semana': 0}
+    ),
+    'horarios_profesor': (
+        "SELECT * FROM horario_clase WHERE profesor_id = :profesor_id",
+        {'profesor_id': 1}
+    ),
+}
+
+# "SCAN tabla" sin "USING ... INDEX" es un recorrido completo de la tabla
+_PATRON_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?!.*USING)')
+
+
+def plan_consulta(conexion, sql, parametros=None):
+    """
+    Devuelve las líneas de detalle de EXPLAIN QUERY PLAN de una consulta.
+
+    Args:
+        conexion: Sesión o conexión SQLAlchemy
+        sql (str): Consulta con parámetros con nombre
+        parametros (dict, optional): Valores de los parámetros
+
+    Returns:
+        list: Texto de cada paso del plan
+    """
+    filas = conexion.execute(text(f"EXPLAIN QUERY PLAN {sql}"), parametros or {}).fetchall()
+    return [fila[-1] for fila in filas]
+
+
+def verificar_planes(conexion, consultas=None):
+    """
+    Comprueba que ninguna consulta frecuente recorra una tabla completa.
+
+    Returns:
+        dict: {nombre: {'plan': [...], 'tablas_recorridas': [...], 'correcto': bool}}
+    """
+    resultado = {}
+    for nombre, (sql, parametros) in (consultas or CONSULTAS_FRECUENTES).items():
+        plan = plan_consulta(conexion, sql, parametros)
+        recorridas = [coincidencia.group(1) for coincidencia in map(_PATRON_SCAN.match, plan) if coincidencia]
+        resultado[nombre] = {
+            'plan': plan,
+            'tablas_recorridas': recorridas,
+            'correcto': not recorridas
+        }
+    return resultado
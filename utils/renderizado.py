@@ -0,0 +1,195 @@
+"""
+Pool de procesos para decodificar y dibujar los audios.
+
+Decodificar con librosa, calcular espectrogramas y dibujar imágenes ocupa la
+CPU durante segundos y, dentro de los hilos de Flask, las peticiones
+simultáneas se turnan en el GIL (y el estado global de pyplot no admite hilos).
+Todo ese trabajo se envía a un ProcessPoolExecutor:
+
+- Deduplicación: las peticiones del mismo trabajo (misma clave, p. ej. los
+  picos de un audio) mientras está en curso comparten el mismo futuro.
+- Espera limitada: la ruta espera el resultado como mucho RENDERIZADO_ESPERA
+  segundos; si no termina, responde "en curso" (202) y el trabajo continúa.
+- Tiempo límite: un trabajo que lleva más de RENDERIZADO_TIEMPO_LIMITE
+  segundos ejecutándose se da por agotado y se terminan los procesos del pool
+  (los trabajos pendientes fallan y se vuelven a enviar en la próxima petición).
+
+Los procesos se crean con 'forkserver': el pool se inicia con los hilos de
+Flask ya en marcha, y 'fork' copiaría los locks que otros hilos tengan tomados
+en ese momento. Los trabajos son funciones de nivel de módulo (se envían por
+referencia). El servidor de procesos importa el módulo principal como
+'__mp_main__': con 'python app.py' vuelve a ejecutar app.py, que por eso no
+aplica las migraciones ni abre los registros bajo ese nombre. Donde
+'forkserver' no existe (Windows) se usa un único hilo: el trabajo sigue fuera
+de la petición, pero sin poder terminarlo por tiempo.
+
+Configuración:
+
+    RENDERIZADO_PROCESOS: procesos del pool (2)
+    RENDERIZADO_TIEMPO_LIMITE: segundos máximos de ejecución de un trabajo (300)
+    RENDERIZADO_ESPERA: segundos que una petición espera el resultado (10)
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FuturoSinTerminar
+from concurrent.futures.process import BrokenProcessPool
+
+
+PROCESOS = 2
+TIEMPO_LIMITE = 300
+ESPERA = 10
+
+# Segundos entre revisiones del tiempo de los trabajos en ejecución
+INTERVALO_VIGILANCIA = 1.0
+
+
+class RenderizadoEnCurso(Exception):
+    """El trabajo sigue ejecutándose; se puede volver a pedir más tarde."""
+
+    def __init__(self, clave):
+        super().__init__(f'Trabajo en curso: {clave}')
+        self.clave = clave
+
+
+class TiempoAgotado(Exception):
+    """El trabajo superó el tiempo límite y se detuvo."""
+
+
+class PoolRenderizado:
+    """Ejecuta los trabajos de renderizado en procesos, sin repetir los que ya están en curso."""
+
+    def __init__(self, procesos=PROCESOS, tiempo_limite=TIEMPO_LIMITE):
+        self.procesos = max(1, int(procesos))
+        self.tiempo_limite = tiempo_limite
+        self._contexto = multiprocessing.get_context('forkserver') \
+            if 'forkserver' in multiprocessing.get_all_start_methods() else None
+        self._ejecutor = None
+        self._en_curso = {}
+        self._inicios = {}
+        # Reentrante: cancelar futuros al reiniciar ejecuta _terminado en el mismo hilo
+        self._lock = threading.RLock()
+        self._vigilante = None
+        self.completados = 0
+        self.errores = 0
+        self.reinicios = 0
+
+    @property
+    def usa_procesos(self):
+        return self._contexto is not None
+
+    def _obtener_ejecutor(self):
+        if self._ejecutor is None:
+            if self.usa_procesos:
+                self._ejecutor = ProcessPoolExecutor(max_workers=self.procesos, mp_context=self._contexto)
+            else:
+                self._ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='renderizado')
+        if self._vigilante is None or not self._vigilante.is_alive():
+            self._vigilante = threading.Thread(target=self._vigilar, name='renderizado-vigilante', daemon=True)
+            self._vigilante.start()
+        return self._ejecutor
+
+    def enviar(self, clave, funcion, *args):
+        """Envía funcion(*args) al pool, o devuelve el futuro del mismo trabajo si ya está en curso."""
+        with self._lock:
+            futuro = self._en_curso.get(clave)
+            if futuro is not None and not futuro.done():
+                return futuro
+            try:
+                futuro = self._obtener_ejecutor().submit(funcion, *args)
+            except (BrokenProcessPool, RuntimeError):
+                # El pool se rompió (un proceso murió) o se cerró: se crea uno nuevo
+                self._ejecutor = None
+                futuro = self._obtener_ejecutor().submit(funcion, *args)
+            self._en_curso[clave] = futuro
+        futuro.add_done_callback(lambda f: self._terminado(clave, f))
+        return futuro
+
+    def _terminado(self, clave, futuro):
+        with self._lock:
+            if self._en_curso.get(clave) is futuro:
+                del self._en_curso[clave]
+            self._inicios.pop(futuro, None)
+            if futuro.cancelled() or futuro.exception() is not None:
+                self.errores += 1
+            else:
+                self.completados += 1
+
+    def ejecutar(self, clave, funcion, *args, espera=ESPERA):
+        """
+        Envía el trabajo (o se une al que está en curso) y espera su resultado.
+
+        Lanza RenderizadoEnCurso si no termina en `espera` segundos, TiempoAgotado si
+        superó el tiempo límite, y la excepción de la función si falló.
+        """
+        futuro = self.enviar(clave, funcion, *args)
+        try:
+            return futuro.result(timeout=espera)
+        except FuturoSinTerminar:
+            raise RenderizadoEnCurso(clave)
+        except BrokenProcessPool:
+            if getattr(futuro, 'agotado', False):
+                raise TiempoAgotado(f'{clave}: superó {self.tiempo_limite} s')
+            raise
+
+    def _vigilar(self):
+        while True:
+            time.sleep(INTERVALO_VIGILANCIA)
+            with self._lock:
+                ahora = time.monotonic()
+                for futuro in self._en_curso.values():
+                    if futuro.running():
+                        self._inicios.setdefault(futuro, ahora)
+                agotados = [futuro for futuro, inicio in self._inicios.items()
+                            if ahora - inicio > self.tiempo_limite and not futuro.done()]
+                if agotados and self.usa_procesos:
+                    for futuro in agotados:
+                        futuro.agotado = True
+                    self._reiniciar()
+
+    def _reiniciar(self):
+        """Termina los procesos del pool; sus futuros fallan con BrokenProcessPool (con el lock tomado)."""
+        ejecutor, self._ejecutor = self._ejecutor, None
+        self._inicios.clear()
+        self.reinicios += 1
+        if ejecutor is None:
+            return
+        for proceso in list((ejecutor._processes or {}).values()):
+            proceso.terminate()
+        ejecutor.shutdown(wait=False, cancel_futures=True)
+
+    def estado(self):
+        with self._lock:
+            ahora = time.monotonic()
+            return {
+                'procesos': self.procesos if self.usa_procesos else 0,
+                'en_curso': [{'clave': str(clave), 'ejecutando': futuro.running(),
+                              'segundos': round(ahora - self._inicios[futuro], 1) if futuro in self._inicios
+                              else None}
+                             for clave, futuro in self._en_curso.items()],
+                'completados': self.completados,
+                'errores': self.errores,
+                'reinicios': self.reinicios,
+            }
+
+    def cerrar(self):
+        with self._lock:
+            ejecutor, self._ejecutor = self._ejecutor, None
+        if ejecutor is not None:
+            ejecutor.shutdown(wait=False, cancel_futures=True)
+
+
+def configurar_renderizado(app):
+    """Valores por defecto de la configuración y pool de la aplicación (app.extensions['renderizado'])."""
+    app.config.setdefault('RENDERIZADO_PROCESOS', PROCESOS)
+    app.config.setdefault('RENDERIZADO_TIEMPO_LIMITE', TIEMPO_LIMITE)
+    app.config.setdefault('RENDERIZADO_ESPERA', ESPERA)
+    app.extensions['renderizado'] = PoolRenderizado(app.config['RENDERIZADO_PROCESOS'],
+                                                    app.config['RENDERIZADO_TIEMPO_LIMITE'])
+    return app.extensions['renderizado']
+
+
+def renderizar(app, clave, funcion, *args):
+    """Ejecuta el trabajo en el pool de la aplicación esperando como mucho RENDERIZADO_ESPERA segundos."""
+    pool = app.extensions.get('renderizado') or configurar_renderizado(app)
+    return pool.ejecutar(clave, funcion, *args, espera=app.config['RENDERIZADO_ESPERA'])
@@ -0,0 +1,122 @@
+"""
+Índice de nombres para resolver instructores y clases de los archivos importados.
+
+Los nombres de las planillas llegan con otras mayúsculas, sin tildes, con el
+apellido delante o con espacios de más. El índice se construye una sola vez
+por importación con los nombres de la base de datos y resuelve cada nombre
+por niveles, de más a menos estricto:
+
+    1. alias       tabla de alias configurada (AliasProfesor)
+    2. exacto      el texto tal cual
+    3. normalizado sin tildes, sin mayúsculas y con las palabras ordenadas
+    4. palabras    todas las palabras del texto están en el nombre ("Juan" ->
+                   "Juan Carlos Pérez"), como el antiguo ILIKE '%texto%' pero
+                   sin coincidencias dentro de una palabra
+    5. aproximado  similitud (difflib) por encima de un umbral
+
+Cada nivel es una búsqueda en diccionario salvo el aproximado, y el resultado
+de cada nombre distinto se memoriza. Si un nivel encuentra varios candidatos
+la coincidencia se informa como ambigua en lugar de elegir uno.
+"""
+import difflib
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+
+
+# Similitud mínima (0-1) para aceptar una coincidencia aproximada
+UMBRAL_SIMILITUD = 0.88
+
+# Diferencia mínima de similitud con el segundo candidato para no considerarla ambigua
+MARGEN_AMBIGUEDAD = 0.05
+
+NIVELES = ('alias', 'exacto', 'normalizado', 'palabras', 'aproximado')
+
+# id: el encontrado (None si no hay o es ambiguo); nivel: el de la coincidencia;
+# candidatos: ids posibles cuando la coincidencia es ambigua
+Coincidencia = namedtuple('Coincidencia', ['id', 'nivel', 'candidatos'])
+
+SIN_COINCIDENCIA = Coincidencia(None, None, ())
+
+
+def normalizar_nombre(nombre):
+    """'  Pérez,  JUAN ' -> 'juan perez' (sin tildes ni signos, minúsculas y palabras ordenadas)."""
+    texto = unicodedata.normalize('NFKD', str(nombre or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).casefold()
+    return ' '.join(sorted(re.findall(r'\w+', texto)))
+
+
+class IndiceNombres:
+    """
+    Índice en memoria de nombres -> ids.
+
+    Args:
+        umbral (float): Similitud mínima para la coincidencia aproximada
+            (None desactiva ese nivel)
+    """
+
+    def __init__(self, umbral=UMBRAL_SIMILITUD):
+        self.umbral = umbral
+        self.alias = {}
+        self.exactos = defaultdict(set)
+        self.normalizados = defaultdict(set)
+        self.palabras = defaultdict(set)
+        self._resueltos = {}
+
+    def agregar(self, id_, *nombres):
+        """Registra las formas de un nombre (por ejemplo, nombre y nombre completo)."""
+        for nombre in nombres:
+            if not nombre or not str(nombre).strip():
+                continue
+            self.exactos[str(nombre).strip()].add(id_)
+            clave = normalizar_nombre(nombre)
+            self.normalizados[clave].add(id_)
+            for palabra in clave.split():
+                self.palabras[palabra].add(id_)
+        self._resueltos.clear()
+
+    def agregar_alias(self, alias, id_):
+        self.alias[normalizar_nombre(alias)] = id_
+        self._resueltos.clear()
+
+    def resolver(self, nombre):
+        """Devuelve la Coincidencia del nombre (memorizada por texto)."""
+        if nombre not in self._resueltos:
+            self._resueltos[nombre] = self._resolver(nombre)
+        return self._resueltos[nombre]
+
+    def _resolver(self, nombre):
+        clave = normalizar_nombre(nombre)
+        if not clave:
+            return SIN_COINCIDENCIA
+        if clave in self.alias:
+            return Coincidencia(self.alias[clave], 'alias', ())
+
+        palabras = clave.split()
+        por_palabras = set.intersection(*(self.palabras.get(p, set()) for p in palabras))
+        for nivel, ids in (('exacto', self.exactos.get(str(nombre).strip(), ())),
+                           ('normalizado', self.normalizados.get(clave, ())),
+                           ('palabras', por_palabras)):
+            if len(ids) == 1:
+                return Coincidencia(next(iter(ids)), nivel, ())
+            if ids:
+                return Coincidencia(None, nivel, tuple(sorted(ids)))
+        return self._aproximado(clave)
+
+    def _aproximado(self, clave):
+        if self.umbral is None or not self.normalizados:
+            return SIN_COINCIDENCIA
+        similares = [
+            (difflib.SequenceMatcher(None, clave, candidata).ratio(), candidata)
+            for candidata in difflib.get_close_matches(clave, self.normalizados.keys(), n=3, cutoff=self.umbral)
+        ]
+        if not similares:
+            return SIN_COINCIDENCIA
+        mejor = similares[0][0]
+        ids = set()
+        for similitud, candidata in similares:
+            if mejor - similitud < MARGEN_AMBIGUEDAD:
+                ids |= self.normalizados[candidata]
+        if len(ids) == 1:
+            return Coincidencia(next(iter(ids)), 'aproximado', ())
+        return Coincidencia(None, 'aproximado', tuple(sorted(ids)))
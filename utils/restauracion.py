@@ -0,0 +1,377 @@
+"""
+Restauración verificable de backups (ZIP completo o archivo .db).
+
+La base de datos en uso y la carpeta de audios no se tocan hasta el final:
+
+    1. Se valida la estructura del ZIP y su manifiesto.json (el que escribe
+       utils/backup_completo.py): rutas seguras, una base de datos y los mismos
+       archivos y tamaños que lista el manifiesto.
+    2. Cada archivo se extrae una sola vez, leyendo el ZIP por bloques y
+       calculando su SHA-256 al mismo tiempo, directamente en la zona de
+       preparación junto a su destino definitivo (<gimnasio.db>.restauracion y
+       <audios>.restauracion), de modo que el cambio final es un rename dentro
+       del mismo sistema de archivos.
+    3. Sobre la base de datos preparada se ejecutan PRAGMA integrity_check y las
+       migraciones del esquema.
+    4. Con las peticiones drenadas y las conexiones cerradas se intercambian la
+       carpeta de audios y la base de datos con os.replace/os.rename.
+
+En modo simulación se hacen las comprobaciones (incluidas las sumas de todos
+los audios, sin escribirlos) y se informa de lo que cambiaría, sin reemplazar
+nada. Los backups anteriores a los manifiestos se restauran igualmente, con la
+comprobación del CRC del propio ZIP.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import zipfile
+from contextlib import contextmanager, nullcontext
+
+from utils.backup_completo import NOMBRE_MANIFIESTO, TAMANO_BLOQUE
+from utils.instantaneas import comprobar_integridad
+
+
+PREFIJO_AUDIOS = 'audios/'
+SUFIJO_PREPARACION = '.restauracion'
+SUFIJO_ANTERIOR = '.anterior'
+
+# Segundos de espera a que terminen las peticiones en curso antes del intercambio
+ESPERA_DRENAJE = 30
+
+CABECERA_SQLITE = b'SQLite format 3\x00'
+
+
+class RestauracionInvalida(Exception):
+    """El backup no supera la validación, las sumas de comprobación o la comprobación de integridad."""
+
+
+class ControlAccesos:
+    """
+    Cuenta las peticiones en curso y permite drenarlas: mientras dura el
+    drenaje las peticiones nuevas se rechazan (la aplicación responde 503).
+    """
+
+    def __init__(self):
+        self._condicion = threading.Condition()
+        self._activas = 0
+        self.en_mantenimiento = False
+
+    def entrar(self):
+        """Registra una petición. Devuelve False si hay una restauración en curso."""
+        with self._condicion:
+            if self.en_mantenimiento:
+                return False
+            self._activas += 1
+            return True
+
+    def salir(self):
+        with self._condicion:
+            self._activas -= 1
+            self._condicion.notify_all()
+
+    @contextmanager
+    def drenar(self, propias=0, espera=ESPERA_DRENAJE):
+        """
+        Rechaza peticiones nuevas y espera a que terminen las que están en curso.
+
+        Args:
+            propias (int): Peticiones que no se esperan (la que ejecuta la
+                restauración, si se ejecuta dentro de una petición)
+            espera (float): Segundos máximos de espera
+        """
+        with self._condicion:
+            self.en_mantenimiento = True
+            if not self._condicion.wait_for(lambda: self._activas <= propias, timeout=espera):
+                self.en_mantenimiento = False
+                raise RestauracionInvalida(
+                    f"Hay {self._activas - propias} peticiones en curso después de {espera} s; inténtelo más tarde")
+        try:
+            yield
+        finally:
+            with self._condicion:
+                self.en_mantenimiento = False
+                self._condicion.notify_all()
+
+
+def _ruta_segura(nombre):
+    partes = nombre.split('/')
+    return not (nombre.startswith('/') or '\\' in nombre or ':' in partes[0] or '..' in partes)
+
+
+def leer_backup(zipf):
+    """
+    Valida la estructura del ZIP y su manifiesto.
+
+    Returns:
+        tuple: (ZipInfo de la base de datos, lista de ZipInfo de audios,
+        dict nombre -> sha256 del manifiesto o None si el ZIP no tiene)
+    """
+    infos = [info for info in zipf.infolist() if not info.is_dir()]
+    inseguros = [info.filename for info in infos if not _ruta_segura(info.filename)]
+    if inseguros:
+        raise RestauracionInvalida(f"El ZIP contiene rutas no permitidas: {', '.join(inseguros[:5])}")
+
+    bases = [info for info in infos if info.filename.endswith('.db') and '/' not in info.filename]
+    if not bases:
+        raise RestauracionInvalida("El archivo ZIP no contiene una base de datos válida")
+    if len(bases) > 1:
+        raise RestauracionInvalida(f"El archivo ZIP contiene {len(bases)} bases de datos")
+    audios = [info for info in infos if info.filename.startswith(PREFIJO_AUDIOS)]
+
+    if NOMBRE_MANIFIESTO not in zipf.namelist():
+        return bases[0], audios, None
+    try:
+        manifiesto = json.loads(zipf.read(NOMBRE_MANIFIESTO))
+        archivos = {archivo['ruta']: archivo for archivo in manifiesto['archivos']}
+    except (ValueError, KeyError, TypeError) as e:
+        raise RestauracionInvalida(f"El manifiesto del backup no es válido: {str(e)}")
+
+    contenidos = {info.filename: info for info in [bases[0]] + audios}
+    faltan = sorted(set(archivos) - set(contenidos))
+    sobran = sorted(set(contenidos) - set(archivos))
+    distintos = sorted(nombre for nombre, archivo in archivos.items()
+                       if nombre in contenidos and contenidos[nombre].file_size != archivo['tamano'])
+    for problema, nombres in (('faltan en el ZIP', faltan), ('no están en el manifiesto', sobran),
+                              ('tienen un tamaño distinto al del manifiesto', distintos)):
+        if nombres:
+            raise RestauracionInvalida(f"Archivos que {problema}: {', '.join(nombres[:5])}")
+    return bases[0], audios, {nombre: archivo['sha256'] for nombre, archivo in archivos.items()}
+
+
+def extraer_verificando(zipf, info, destino, sha256=None):
+    """
+    Extrae una entrada por bloques calculando su SHA-256 (destino None solo comprueba).
+
+    Raises:
+        RestauracionInvalida: Si la suma no coincide con la del manifiesto o el CRC falla
+    """
+    suma = hashlib.sha256()
+    try:
+        with zipf.open(info) as origen, (open(destino, 'wb') if destino else nullcontext()) as salida:
+            for bloque in iter(lambda: origen.read(TAMANO_BLOQUE), b''):
+                suma.update(bloque)
+                if salida:
+                    salida.write(bloque)
+    except zipfile.BadZipFile as e:
+        raise RestauracionInvalida(f"{info.filename}: {str(e)}")
+    if sha256 and suma.hexdigest() != sha256:
+        raise RestauracionInvalida(f"La suma SHA-256 de {info.filename} no coincide con la del manifiesto")
+    return suma.hexdigest()
+
+
+def contar_filas(ruta):
+    """Filas por tabla de una base de datos ({} si el archivo no existe)."""
+    if not ruta or not os.path.exists(ruta):
+        return {}
+    conexion = sqlite3.connect(f'file:{ruta}?mode=ro', uri=True)
+    try:
+        tablas = [fila[0] for fila in conexion.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+        return {tabla: conexion.execute(f'SELECT COUNT(*) FROM "{tabla}"').fetchone()[0] for tabla in tablas}
+    finally:
+        conexion.close()
+
+
+def _comparar_tablas(actual, restaurada):
+    return {tabla: {'actual': actual.get(tabla, 0), 'backup': restaurada.get(tabla, 0)}
+            for tabla in sorted(set(actual) | set(restaurada))
+            if actual.get(tabla, 0) != restaurada.get(tabla, 0)}
+
+
+def _sha256_archivo(ruta):
+    suma = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE), b''):
+            suma.update(bloque)
+    return suma.hexdigest()
+
+
+def _comparar_audios(carpeta, audios, sumas):
+    """Audios nuevos, eliminados, modificados y sin cambios respecto a la carpeta actual."""
+    actuales = {}
+    if os.path.isdir(carpeta):
+        for raiz, _, archivos in os.walk(carpeta):
+            for archivo in archivos:
+                ruta = os.path.join(raiz, archivo)
+                actuales[os.path.relpath(ruta, carpeta).replace(os.sep, '/')] = ruta
+    cambios = {'nuevos': 0, 'eliminados': 0, 'modificados': 0, 'sin_cambios': 0}
+    en_backup = set()
+    for info in audios:
+        relativa = info.filename[len(PREFIJO_AUDIOS):]
+        en_backup.add(relativa)
+        ruta = actuales.get(relativa)
+        if ruta is None:
+            cambios['nuevos'] += 1
+        elif os.path.getsize(ruta) != info.file_size or (
+                sumas and _sha256_archivo(ruta) != sumas.get(info.filename)):
+            cambios['modificados'] += 1
+        else:
+            cambios['sin_cambios'] += 1
+    cambios['eliminados'] = len(set(actuales) - en_backup)
+    return cambios
+
+
+def _eliminar(ruta):
+    if os.path.isdir(ruta):
+        shutil.rmtree(ruta)
+    elif os.path.exists(ruta):
+        os.remove(ruta)
+
+
+def _preparar_base(ruta_preparada, ruta_db, migrar):
+    """Comprobación de integridad y migraciones sobre la base preparada; devuelve el informe."""
+    with open(ruta_preparada, 'rb') as f:
+        if f.read(len(CABECERA_SQLITE)) != CABECERA_SQLITE:
+            raise RestauracionInvalida("El archivo no es una base de datos SQLite")
+    problemas = comprobar_integridad(ruta_preparada)
+    if problemas:
+        raise RestauracionInvalida(f"La base de datos del backup no superó integrity_check: {'; '.join(problemas[:5])}")
+    migracion = migrar(ruta_preparada) if migrar else {}
+    return {'tablas': _comparar_tablas(contar_filas(ruta_db), contar_filas(ruta_preparada)),
+            'migracion': migracion}
+
+
+def _intercambiar(ruta_preparada, ruta_db, audios_preparados, carpeta_audios, drenar):
+    """Reemplaza la carpeta de audios (si se indica) y la base de datos con renames."""
+    anterior = carpeta_audios.rstrip(os.sep) + SUFIJO_ANTERIOR if audios_preparados else None
+    if anterior:
+        _eliminar(anterior)
+    with drenar():
+        movida = instalada = False
+        try:
+            if anterior:
+                if os.path.exists(carpeta_audios):
+                    os.rename(carpeta_audios, anterior)
+                    movida = True
+                os.rename(audios_preparados, carpeta_audios)
+                instalada = True
+            for sufijo in ('-wal', '-shm'):
+                _eliminar(ruta_db + sufijo)
+            os.replace(ruta_preparada, ruta_db)
+        except OSError:
+            # Se deja la carpeta de audios como estaba
+            if instalada:
+                os.rename(carpeta_audios, audios_preparados)
+            if movida:
+                os.rename(anterior, carpeta_audios)
+            raise
+    if anterior:
+        _eliminar(anterior)
+
+
+def restaurar_zip(zip_path, ruta_db, carpeta_audios, migrar=None, drenar=nullcontext,
+                  simular=False, progreso=None):
+    """
+    Restaura un backup completo (ZIP con base de datos, audios y manifiesto).
+
+    Args:
+        zip_path (str): Archivo ZIP
+        ruta_db (str): Base de datos en uso
+        carpeta_audios (str): Carpeta de audios en uso
+        migrar (callable): migrar(ruta) aplica las migraciones a la base preparada
+            y devuelve un resumen
+        drenar (callable): Devuelve el contexto durante el que se hace el
+            intercambio (sin peticiones en curso y con las conexiones cerradas)
+        simular (bool): Solo comprobar e informar de los cambios
+        progreso (callable): Recibe los contadores total/leidas/procesados/errores
+
+    Returns:
+        dict: Informe con simulacion, manifiesto, base_datos (tablas que
+        cambian y migración), audios (nuevos, eliminados, modificados,
+        sin_cambios; None si el backup no incluye audios) y archivos (extraídos o
+        comprobados)
+
+    Raises:
+        RestauracionInvalida: Si el backup no supera alguna comprobación (no se
+            modifica nada)
+    """
+    progreso = progreso or (lambda parcial: None)
+    ruta_preparada = ruta_db + SUFIJO_PREPARACION
+    audios_preparados = carpeta_audios.rstrip(os.sep) + SUFIJO_PREPARACION
+    try:
+        zipf = zipfile.ZipFile(zip_path)
+    except zipfile.BadZipFile:
+        raise RestauracionInvalida("El archivo no es un ZIP válido o está corrupto")
+
+    try:
+        with zipf:
+            info_db, audios, sumas = leer_backup(zipf)
+            progreso({'total': len(audios) + 1, 'leidas': 0, 'procesados': 0, 'errores': 0})
+            _eliminar(ruta_preparada)
+            _eliminar(audios_preparados)
+
+            extraer_verificando(zipf, info_db, ruta_preparada, sumas and sumas[info_db.filename])
+            informe = {'simulacion': simular, 'manifiesto': sumas is not None,
+                       'base_datos': _preparar_base(ruta_preparada, ruta_db, migrar),
+                       'audios': _comparar_audios(carpeta_audios, audios, sumas) if audios else None}
+            progreso({'leidas': 1, 'procesados': 1})
+
+            for numero, info in enumerate(audios, start=2):
+                destino = None
+                if not simular:
+                    destino = os.path.join(audios_preparados, *info.filename[len(PREFIJO_AUDIOS):].split('/'))
+                    os.makedirs(os.path.dirname(destino), exist_ok=True)
+                extraer_verificando(zipf, info, destino, sumas and sumas[info.filename])
+                if numero % 50 == 0:
+                    progreso({'leidas': numero, 'procesados': numero})
+            informe['archivos'] = len(audios) + 1
+            progreso({'leidas': informe['archivos'], 'procesados': informe['archivos']})
+
+        if not simular:
+            # Un backup sin audios conserva la carpeta actual
+            _intercambiar(ruta_preparada, ruta_db, audios_preparados if audios else None, carpeta_audios, drenar)
+        return informe
+    finally:
+        _eliminar(ruta_preparada)
+        _eliminar(audios_preparados)
+
+
+def restaurar_base_datos(ruta_archivo, ruta_db, migrar=None, drenar=nullcontext, simular=False):
+    """
+    Restaura solo la base de datos a partir de un archivo .db (los audios no cambian).
+    El archivo se mueve a la zona de preparación (sin copiarlo si está en el
+    mismo sistema de archivos).
+
+    Returns:
+        dict: Informe con simulacion y base_datos (tablas que cambian y migración)
+
+    Raises:
+        RestauracionInvalida: Si el archivo no es una base SQLite íntegra
+    """
+    ruta_preparada = ruta_db + SUFIJO_PREPARACION
+    _eliminar(ruta_preparada)
+    try:
+        shutil.move(ruta_archivo, ruta_preparada)
+        informe = {'simulacion': simular, 'base_datos': _preparar_base(ruta_preparada, ruta_db, migrar)}
+        if not simular:
+            _intercambiar(ruta_preparada, ruta_db, None, None, drenar)
+        return informe
+    finally:
+        _eliminar(ruta_preparada)
+
+
+def resumir_informe(informe):
+    """Texto con lo que cambia (o cambiaría, en una simulación) al restaurar."""
+    partes = ['Simulación: no se modificó nada.' if informe['simulacion'] else 'Backup restaurado.']
+    tablas = informe['base_datos']['tablas']
+    if tablas:
+        partes.append('Filas por tabla (actual → backup): ' + ', '.join(
+            f"{tabla} {filas['actual']} → {filas['backup']}" for tabla, filas in tablas.items()) + '.')
+    else:
+        partes.append('La base de datos tiene las mismas filas por tabla.')
+    duplicadas = informe['base_datos'].get('migracion', {}).get('clases_duplicadas')
+    if duplicadas:
+        partes.append(f"La base tiene {duplicadas} grupos de clases duplicadas (misma fecha y horario): "
+                      f"revíselos con `flask depurar-clases-duplicadas`.")
+    audios = informe.get('audios')
+    if 'audios' in informe and audios is None:
+        partes.append('El backup no incluye audios: se conservan los actuales.')
+    elif audios:
+        partes.append(f"Audios: {audios['nuevos']} nuevos, {audios['modificados']} modificados, "
+                      f"{audios['eliminados']} eliminados, {audios['sin_cambios']} sin cambios.")
+    if informe.get('manifiesto') is False:
+        partes.append('El backup no tiene manifiesto: solo se comprobó el CRC del ZIP.')
+    return ' '.join(partes)
@@ -0,0 +1,177 @@
+"""
+Trabajos de importación en segundo plano.
+
+Las importaciones largas (Excel de asistencia, backup completo) se encolan en
+lugar de ejecutarse dentro de la petición: el archivo subido se guarda en el
+directorio del trabajo, un hilo del ejecutor lo procesa dentro de un contexto
+de la aplicación y va actualizando la fila de TrabajoImportacion con el estado
+y los contadores. La página consulta /importar/jobs/<id> hasta que termina.
+
+Configuración:
+
+    IMPORTACION_SEGUNDO_PLANO: False ejecuta el trabajo en la misma petición
+                               (útil para depurar); True por defecto
+    IMPORTACION_HILOS: hilos del ejecutor (1 por defecto, ya que SQLite admite
+                       un único escritor a la vez)
+    IMPORTACION_DIRECTORIO: carpeta de los trabajos (instance/importaciones)
+"""
+import csv
+import json
+import os
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from models import db, TrabajoImportacion
+
+
+PENDIENTE = 'pendiente'
+EN_PROCESO = 'en_proceso'
+COMPLETADO = 'completado'
+ERROR = 'error'
+
+CONTADORES = ('total', 'leidas', 'procesados', 'nuevos', 'actualizados', 'errores')
+
+ARCHIVO_DETALLES = 'detalles.json'
+ARCHIVO_ERRORES = 'errores.csv'
+
+_ejecutor = None
+_futuros = {}
+_lock = threading.Lock()
+
+
+def configurar_trabajos(app):
+    """Valores por defecto de la configuración y creación de la tabla de trabajos."""
+    app.config.setdefault('IMPORTACION_SEGUNDO_PLANO', True)
+    app.config.setdefault('IMPORTACION_HILOS', 1)
+    app.config.setdefault('IMPORTACION_DIRECTORIO', os.path.join(app.instance_path, 'importaciones'))
+    with app.app_context():
+        TrabajoImportacion.asegurar_tabla()
+
+
+def _obtener_ejecutor(app):
+    global _ejecutor
+    with _lock:
+        if _ejecutor is None:
+            _ejecutor = ThreadPoolExecutor(max_workers=int(app.config.get('IMPORTACION_HILOS', 1)),
+                                           thread_name_prefix='importacion')
+        return _ejecutor
+
+
+def encolar(app, tipo, archivo, funcion, **parametros):
+    """
+    Guarda el archivo subido y encola su importación.
+
+    Args:
+        app: Aplicación Flask (el trabajo se ejecuta en un contexto propio)
+        tipo (str): Tipo de importación, para mostrarlo en la página
+        archivo: FileStorage de la petición
+        funcion (callable): funcion(ruta, progreso, **parametros) que devuelve
+            un diccionario con los contadores, 'mensaje' y opcionalmente 'detalles'
+        **parametros: Argumentos adicionales para funcion
+
+    Returns:
+        str: Id del trabajo
+    """
+    trabajo_id = uuid.uuid4().hex
+    directorio = os.path.join(app.config['IMPORTACION_DIRECTORIO'], trabajo_id)
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, 'subida' + os.path.splitext(archivo.filename or '')[1].lower())
+    archivo.save(ruta)
+
+    db.session.add(TrabajoImportacion(id=trabajo_id, tipo=tipo, archivo=archivo.filename,
+                                      estado=PENDIENTE, directorio=directorio))
+    db.session.commit()
+
+    if app.config.get('IMPORTACION_SEGUNDO_PLANO', True):
+        futuro = _obtener_ejecutor(app).submit(_ejecutar, app, trabajo_id, funcion, ruta, parametros)
+        _futuros[trabajo_id] = futuro
+        futuro.add_done_callback(lambda _: _futuros.pop(trabajo_id, None))
+    else:
+        _ejecutar(app, trabajo_id, funcion, ruta, parametros)
+    return trabajo_id
+
+
+def actualizar(trabajo_id, fila=None, **valores):
+    """
+    Actualiza la fila del trabajo en su propia transacción.
+
+    Si la fila ya no existe (la restauración de un backup completo reemplaza
+    la base de datos mientras el trabajo se ejecuta) se vuelve a crear a partir
+    de `fila`, los valores del trabajo leídos al empezar.
+    """
+    tabla = TrabajoImportacion.__table__
+    resultado = db.session.execute(tabla.update().where(tabla.c.id == trabajo_id).values(**valores))
+    if fila is not None:
+        fila.update(valores)
+    if resultado.rowcount == 0 and fila is not None:
+        tabla.create(bind=db.engine, checkfirst=True)
+        db.session.execute(tabla.insert().values(**fila))
+    db.session.commit()
+
+
+def _contadores(resultado):
+    return {clave: int(resultado[clave]) for clave in CONTADORES if clave in resultado}
+
+
+def _ejecutar(app, trabajo_id, funcion, ruta, parametros):
+    with app.app_context():
+        tabla = TrabajoImportacion.__table__
+        fila = dict(db.session.execute(tabla.select().where(tabla.c.id == trabajo_id)).mappings().one())
+        try:
+            actualizar(trabajo_id, fila, estado=EN_PROCESO, fecha_inicio=datetime.utcnow())
+            resultado = funcion(ruta, lambda parcial: actualizar(trabajo_id, fila, **_contadores(parcial)),
+                                **parametros)
+            guardar_detalles(os.path.dirname(ruta), resultado.get('detalles', []))
+            actualizar(trabajo_id, fila, estado=COMPLETADO, mensaje=resultado.get('mensaje'),
+                       fecha_fin=datetime.utcnow(), **_contadores(resultado))
+        except Exception as e:
+            db.session.rollback()
+            with open('import_errors.log', 'a', encoding='utf-8') as f:
+                f.write(f"ERROR GLOBAL (trabajo {trabajo_id}): {str(e)}\n")
+                f.write(f"{traceback.format_exc()}\n")
+            actualizar(trabajo_id, fila, estado=ERROR, mensaje=str(e), fecha_fin=datetime.utcnow())
+        finally:
+            if os.path.exists(ruta):
+                os.remove(ruta)
+            db.session.remove()
+
+
+def guardar_detalles(directorio, detalles):
+    """Guarda el detalle por fila (JSON) y el reporte de errores descargable (CSV)."""
+    with open(os.path.join(directorio, ARCHIVO_DETALLES), 'w', encoding='utf-8') as f:
+        json.dump(detalles, f, ensure_ascii=False, default=str)
+    errores = [detalle for detalle in detalles if detalle.get('estado') == 'Error']
+    if errores:
+        with open(os.path.join(directorio, ARCHIVO_ERRORES), 'w', encoding='utf-8-sig', newline='') as f:
+            escritor = csv.writer(f, delimiter=';')
+            escritor.writerow(['Fila', 'Instructor', 'Fecha', 'Hora', 'Clase', 'Error'])
+            for detalle in errores:
+                escritor.writerow([detalle.get('fila'), detalle.get('profesor'), detalle.get('fecha'),
+                                   detalle.get('hora', ''), detalle.get('clase'),
+                                   ' | '.join(detalle.get('errores', []))])
+
+
+def cargar_detalles(trabajo):
+    """Detalle por fila de un trabajo terminado ([] si no lo tiene)."""
+    ruta = os.path.join(trabajo.directorio or '', ARCHIVO_DETALLES)
+    if not os.path.exists(ruta):
+        return []
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def ruta_reporte_errores(trabajo):
+    """Ruta del CSV de errores del trabajo, o None si no hubo errores."""
+    ruta = os.path.join(trabajo.directorio or '', ARCHIVO_ERRORES)
+    return ruta if os.path.exists(ruta) else None
+
+
+def esperar(trabajo_id, timeout=None):
+    """Espera a que termine un trabajo encolado en este proceso."""
+    futuro = _futuros.get(trabajo_id)
+    if futuro is not None:
+        futuro.result(timeout)
+